@@ -3,15 +3,27 @@ Sistema de seguridad y protección de datos personales.
 Implementa hashing, versionado y separación de datos sensibles.
 """
 import os
+import atexit
 import hashlib
+import io
 import json
+import queue
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta
 from typing import Dict, Optional, Any, List
 from dataclasses import dataclass
+from collections import OrderedDict
 from enum import Enum
 import logging
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+import psycopg2.errors
+from psycopg2.extras import execute_values
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -37,13 +49,67 @@ class DataVersion:
     changes_summary: Dict[str, Any]
 
 
+# Normalización de las dos partes de cada tipo de hash: (primera, segunda)
+# ('' = sin cambios, como el f-string de los métodos unitarios)
+_NORMALIZACION_HASH = {
+    'direccion': ('lower', ''),
+    'cups': ('upper', ''),
+    'client': ('upper', 'lower'),
+}
+
+
+def _normalizar_lote(valores, modo: str) -> List[str]:
+    """Normaliza una columna completa: vectorizado si es una Series de pandas."""
+    if hasattr(valores, 'str') and hasattr(valores, 'astype'):
+        columna = valores.astype(str)
+        if modo:
+            columna = getattr(columna.str, modo)().str.strip()
+        return columna.tolist()
+    if modo == 'lower':
+        return [str(v).lower().strip() for v in valores]
+    if modo == 'upper':
+        return [str(v).upper().strip() for v in valores]
+    return [f"{v}" for v in valores]
+
+
+def _sha256_lote(primeros: List[str], segundos: List[str], salt: str) -> List[str]:
+    """
+    SHA256 de "primero|segundo|salt" para cada par. El salt va al final del mensaje
+    (formato de los hashes ya almacenados), así que se codifica una sola vez por lote.
+    """
+    sufijo = f"|{salt}".encode('utf-8')
+    sha256 = hashlib.sha256
+    return [sha256(f"{a}|{b}".encode('utf-8') + sufijo).hexdigest() for a, b in zip(primeros, segundos)]
+
+
+def _sha256_lote_args(args) -> List[str]:
+    """Adaptador para ProcessPoolExecutor.map."""
+    return _sha256_lote(*args)
+
+
 class DataHasher:
     """
     Genera hashes seguros para anonimización de datos personales.
     Usa salts únicos por tipo de dato para evitar rainbow tables.
+    
+    Los métodos unitarios memorizan los últimos MEMO_SIZE hashes (LRU) por entrada
+    normalizada y versión de salts: un CUPS o dirección repetido en cada factura
+    mensual cuesta una búsqueda en diccionario. Cambiar un salt invalida la memoria.
+    
+    Los métodos *_many hashean columnas completas (listas, arrays o Series) con el
+    mismo resultado que los unitarios; a partir de PARALLEL_THRESHOLD elementos
+    reparten el trabajo en un pool de procesos (sin memoria: entradas mayoritariamente únicas).
     """
     
-    def __init__(self):
+    PARALLEL_THRESHOLD = int(os.getenv('HASH_PARALLEL_THRESHOLD', '200000'))
+    CHUNK_SIZE = 50000
+    MEMO_SIZE = int(os.getenv('HASH_MEMO_SIZE', '100000'))
+    
+    def __init__(self, memo_size: Optional[int] = None):
+        self._salts: Dict[str, str] = {}
+        self._salt_version = 0
+        self._memo = lru_cache(maxsize=self.MEMO_SIZE if memo_size is None else memo_size)(self._hash_uncached)
+        
         # Cargar salts desde variables de entorno
         self.direccion_salt = os.getenv('HASH_SALT_DIRECCION', self._generate_salt())
         self.cups_salt = os.getenv('HASH_SALT_CUPS', self._generate_salt())
@@ -57,6 +123,57 @@ class DataHasher:
         """Genera un salt aleatorio de 256 bits."""
         return hashlib.sha256(uuid.uuid4().bytes + datetime.now().isoformat().encode()).hexdigest()
     
+    # ------------------------------------------------------------------
+    # Salts (asignar uno nuevo invalida la memoria de hashes)
+    # ------------------------------------------------------------------
+    
+    def _set_salt(self, tipo: str, salt: str):
+        if self._salts.get(tipo) != salt:
+            self._salts[tipo] = salt
+            self.invalidate_memo()
+    
+    direccion_salt = property(lambda self: self._salts['direccion'],
+                              lambda self, salt: self._set_salt('direccion', salt))
+    cups_salt = property(lambda self: self._salts['cups'],
+                         lambda self, salt: self._set_salt('cups', salt))
+    client_salt = property(lambda self: self._salts['client'],
+                           lambda self, salt: self._set_salt('client', salt))
+    
+    def rotate_salts(self, direccion: Optional[str] = None, cups: Optional[str] = None,
+                     client: Optional[str] = None):
+        """Sustituye los salts indicados (rotación) e invalida la memoria de hashes."""
+        for tipo, salt in (('direccion', direccion), ('cups', cups), ('client', client)):
+            if salt is not None:
+                self._set_salt(tipo, salt)
+        logger.info(f"🔑 Salts rotados (versión {self._salt_version})")
+    
+    # ------------------------------------------------------------------
+    # Memoria LRU
+    # ------------------------------------------------------------------
+    
+    def invalidate_memo(self):
+        """Vacía la memoria de hashes y pasa a una nueva versión de salts."""
+        self._salt_version += 1
+        self._memo.cache_clear()
+    
+    def memo_stats(self) -> Dict[str, Any]:
+        """Aciertos, fallos, tamaño y tasa de acierto de la memoria desde la última invalidación."""
+        info = self._memo.cache_info()
+        consultas = info.hits + info.misses
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize,
+            'hit_rate': info.hits / consultas if consultas else 0.0,
+            'salt_version': self._salt_version,
+        }
+    
+    def _hash_uncached(self, tipo: str, primero: str, segundo: str, salt_version: int) -> str:
+        """SHA256 de "primero|segundo|salt" (entradas ya normalizadas)."""
+        data = f"{primero}|{segundo}|{self._salts[tipo]}"
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+    
     def hash_direccion(self, direccion_completa: str, codigo_postal: str) -> str:
         """
         Genera hash de dirección para enriquecimiento anónimo.
@@ -68,8 +185,8 @@ class DataHasher:
         Returns:
             Hash SHA256 de 64 caracteres
         """
-        data = f"{direccion_completa.lower().strip()}|{codigo_postal}|{self.direccion_salt}"
-        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+        return self._memo('direccion', direccion_completa.lower().strip(), f"{codigo_postal}",
+                          self._salt_version)
     
     def hash_cups(self, cups: str, fecha_vinculacion: str) -> str:
         """
@@ -82,8 +199,7 @@ class DataHasher:
         Returns:
             Hash SHA256 de 64 caracteres
         """
-        data = f"{cups.upper().strip()}|{fecha_vinculacion}|{self.cups_salt}"
-        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+        return self._memo('cups', cups.upper().strip(), f"{fecha_vinculacion}", self._salt_version)
     
     def hash_client(self, nif_cif: str, nombre_fiscal: str) -> str:
         """
@@ -96,19 +212,83 @@ class DataHasher:
         Returns:
             Hash SHA256 de 64 caracteres
         """
-        data = f"{nif_cif.upper().strip()}|{nombre_fiscal.lower().strip()}|{self.client_salt}"
-        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+        return self._memo('client', nif_cif.upper().strip(), nombre_fiscal.lower().strip(),
+                          self._salt_version)
+    
+    def hash_direccion_many(self, direcciones, codigos_postales,
+                            workers: Optional[int] = None) -> List[str]:
+        """Hashes de dirección en bloque (mismo resultado que hash_direccion por elemento)."""
+        return self._hash_many('direccion', direcciones, codigos_postales, self.direccion_salt, workers)
+    
+    def hash_cups_many(self, cups, fechas_vinculacion, workers: Optional[int] = None) -> List[str]:
+        """Hashes de CUPS en bloque (mismo resultado que hash_cups por elemento)."""
+        return self._hash_many('cups', cups, fechas_vinculacion, self.cups_salt, workers)
+    
+    def hash_client_many(self, nifs_cifs, nombres_fiscales, workers: Optional[int] = None) -> List[str]:
+        """Hashes de cliente en bloque (mismo resultado que hash_client por elemento)."""
+        return self._hash_many('client', nifs_cifs, nombres_fiscales, self.client_salt, workers)
+    
+    def _hash_many(self, tipo: str, primeros, segundos, salt: str,
+                   workers: Optional[int]) -> List[str]:
+        """
+        Normaliza ambas columnas de una vez y hashea en el proceso actual o, si el lote
+        supera PARALLEL_THRESHOLD (o se pide workers > 1), en trozos de CHUNK_SIZE
+        repartidos en un ProcessPoolExecutor.
+        """
+        modo_a, modo_b = _NORMALIZACION_HASH[tipo]
+        primeros = _normalizar_lote(primeros, modo_a)
+        segundos = _normalizar_lote(segundos, modo_b)
+        if len(primeros) != len(segundos):
+            raise ValueError(f"Longitudes distintas en hash_{tipo}_many: {len(primeros)} != {len(segundos)}")
+        
+        if workers is None:
+            workers = (os.cpu_count() or 1) if len(primeros) >= self.PARALLEL_THRESHOLD else 1
+        if workers <= 1 or len(primeros) <= self.CHUNK_SIZE:
+            return _sha256_lote(primeros, segundos, salt)
+        
+        trozos = [(primeros[i:i + self.CHUNK_SIZE], segundos[i:i + self.CHUNK_SIZE], salt)
+                  for i in range(0, len(primeros), self.CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return [h for trozo in executor.map(_sha256_lote_args, trozos) for h in trozo]
 
 
 class DataVersionManager:
     """
     Gestiona el versionado completo de datos de cliente en db_N1.
     Mantiene histórico de cambios y fuentes de información.
+    
+    Cada cliente tiene un hash canónico de su contenido (client_version_heads,
+    sql/security/client_versions_cambios_N1.sql): si los datos no cambian no se escribe
+    versión nueva; si cambian, changes_summary recoge qué campos se añadieron,
+    cambiaron o desaparecieron (solo nombres: los valores no se guardan en claro).
+    Dentro de batch() las versiones se acumulan y se insertan juntas al salir; el
+    proceso que crea versiones en bloque debe envolver su bucle en batch():
+    
+        with version_manager.batch(client_hashes):
+            for cliente in clientes:
+                version_manager.create_version(cliente, DataSource.FACTURA)
     """
     
-    def __init__(self, db_manager):
+    # Campos de control que no forman parte del contenido del cliente
+    IGNORED_FIELDS = {'timestamp', 'created_at', 'updated_at', 'processed_at', 'fecha_procesamiento'}
+    
+    # Cabeceras de cliente retenidas en memoria (LRU); el resto se relee de client_version_heads
+    HEADS_CACHE_SIZE = int(os.getenv('VERSION_HEADS_CACHE_SIZE', '50000'))
+    
+    # Migración que crea client_version_heads y las columnas de hash de client_versions
+    SCHEMA_MIGRATION = 'sql/security/client_versions_cambios_N1.sql'
+    
+    def __init__(self, db_manager, hasher: Optional[DataHasher] = None,
+                 heads_cache_size: Optional[int] = None):
         self.db_manager = db_manager
-        self.hasher = DataHasher()
+        self.hasher = hasher or DataHasher()
+        self.heads_cache_size = heads_cache_size or self.HEADS_CACHE_SIZE
+        # client_hash → {'version_id', 'content_hash', 'field_hashes'} de la última versión (LRU)
+        self._heads: OrderedDict = OrderedDict()
+        self._pending: Dict[tuple, tuple] = {}
+        self._batch_depth = 0
+        self._lock = threading.RLock()
+        self._schema_checked = False
     
     def create_version(self, client_data: Dict[str, Any], source: DataSource) -> str:
         """
@@ -119,27 +299,93 @@ class DataVersionManager:
             source: Fuente de los datos
             
         Returns:
-            version_id generado
+            version_id generado, o el de la versión vigente si el contenido no cambió
         """
-        version_id = f"v{datetime.now().strftime('%Y%m%d_%H%M%S')}_{source.name.lower()}"
-        
-        # Calcular score de calidad basado en completitud
-        quality_score = self._calculate_quality_score(client_data)
-        
-        version = DataVersion(
-            version_id=version_id,
-            source_priority=source,
-            enrichment_timestamp=datetime.now() if source == DataSource.ENRIQUECIMIENTO else None,
-            data_quality_score=quality_score,
-            created_at=datetime.now(),
-            updated_at=datetime.now(),
-            changes_summary=self._detect_changes(client_data)
-        )
+        client_hash = self.hasher.hash_client(client_data.get('nif_cif', ''), client_data.get('nombre_fiscal', ''))
+        field_hashes = self._field_hashes(client_data)
+        content_hash = self._content_hash(field_hashes)
         
-        # Guardar versión en db_N1
-        self._save_version_to_db(version, client_data)
+        with self._lock:
+            head = self._get_head(client_hash)
+            if head and head['content_hash'] == content_hash:
+                logger.debug(f"⏭️ Sin cambios para cliente {client_hash[:8]}... (versión {head['version_id']})")
+                return head['version_id']
+            
+            version_id = self._new_version_id(source, client_hash, head)
+            
+            # Calcular score de calidad basado en completitud
+            quality_score = self._calculate_quality_score(client_data)
+            
+            version = DataVersion(
+                version_id=version_id,
+                source_priority=source,
+                enrichment_timestamp=datetime.now() if source == DataSource.ENRIQUECIMIENTO else None,
+                data_quality_score=quality_score,
+                created_at=datetime.now(),
+                updated_at=datetime.now(),
+                changes_summary=self._detect_changes(field_hashes, head)
+            )
+            
+            self._pending[(version_id, client_hash)] = (version, client_hash, content_hash, field_hashes)
+            self._remember_head(client_hash, {
+                'version_id': version_id, 'content_hash': content_hash, 'field_hashes': field_hashes
+            })
+            if not self._batch_depth:
+                self.flush_versions()
         
-        logger.info(f"✅ Nueva versión creada: {version_id} (calidad: {quality_score:.1f}%)")
+        logger.info(f"✅ Nueva versión creada: {version_id} (calidad: {quality_score:.1f}%, "
+                    f"cambios: {len(version.changes_summary.get('changed', []))})")
+        return version_id
+    
+    @contextmanager
+    def batch(self, client_hashes: Optional[List[str]] = None):
+        """
+        Acumula las versiones de una ejecución del pipeline y las inserta juntas al salir.
+        Si se conocen los clientes del lote, sus últimas versiones se cargan en una consulta.
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            if client_hashes:
+                self._load_heads(client_hashes)
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.flush_versions()
+    
+    def flush_versions(self) -> int:
+        """Inserta las versiones pendientes (un INSERT multi-fila) y actualiza las cabeceras."""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        if not pending:
+            return 0
+        
+        try:
+            self._save_versions_to_db(pending)
+        except Exception:
+            # Las cabeceras en memoria ya no reflejan la BD: se recargan en el próximo uso
+            with self._lock:
+                for _, client_hash, _, _ in pending:
+                    self._heads.pop(client_hash, None)
+            raise
+        
+        with self._lock:
+            self._trim_heads()
+        if len(pending) > 1:
+            logger.info(f"📊 {len(pending)} versiones de cliente guardadas en lote")
+        return len(pending)
+    
+    def _new_version_id(self, source: DataSource, client_hash: str,
+                        head: Optional[Dict[str, Any]]) -> str:
+        """Identificador con microsegundos; si coincide con otra versión del cliente se numera."""
+        base = f"v{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{source.name.lower()}"
+        version_id, sequence = base, 1
+        while (head and head['version_id'] == version_id) or (version_id, client_hash) in self._pending:
+            sequence += 1
+            version_id = f"{base}_{sequence}"
         return version_id
     
     def _calculate_quality_score(self, data: Dict[str, Any]) -> float:
@@ -152,29 +398,166 @@ class DataVersionManager:
         completed = sum(1 for field in critical_fields if data.get(field))
         return (completed / len(critical_fields)) * 100
     
-    def _detect_changes(self, new_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Detecta cambios respecto a la versión anterior."""
-        # TODO: Implementar comparación con versión anterior
-        return {"new_fields": len(new_data), "timestamp": datetime.now().isoformat()}
+    # ------------------------------------------------------------------
+    # Hash canónico y diferencias por campo
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _canonical_value(value: Any) -> Any:
+        """Forma canónica de un valor: cadenas sin espacios de borde, números sin ceros decimales."""
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, dict):
+            return {k: DataVersionManager._canonical_value(v) for k, v in value.items()
+                    if v is not None and v != ''}
+        if isinstance(value, (list, tuple)):
+            return [DataVersionManager._canonical_value(v) for v in value]
+        return value
+    
+    def _field_hashes(self, data: Dict[str, Any]) -> Dict[str, str]:
+        """Hash corto (salado) del valor canónico de cada campo informado."""
+        salt = self.hasher.client_salt
+        hashes = {}
+        for field, value in data.items():
+            if field in self.IGNORED_FIELDS or value is None or value == '':
+                continue
+            canonical = json.dumps(self._canonical_value(value), sort_keys=True,
+                                   separators=(',', ':'), ensure_ascii=False, default=str)
+            hashes[field] = hashlib.sha256(f"{field}|{canonical}|{salt}".encode('utf-8')).hexdigest()[:16]
+        return hashes
     
-    def _save_version_to_db(self, version: DataVersion, data: Dict[str, Any]):
-        """Guarda versión en la tabla de versionado de db_N1."""
+    @staticmethod
+    def _content_hash(field_hashes: Dict[str, str]) -> str:
+        """Hash del contenido completo, independiente del orden de los campos."""
+        canonical = json.dumps(field_hashes, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def _detect_changes(self, field_hashes: Dict[str, str],
+                        head: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Detecta cambios respecto a la versión anterior (nombres de campo, sin valores)."""
+        previous = (head or {}).get('field_hashes') or {}
+        return {
+            'previous_version': head['version_id'] if head else None,
+            'added': sorted(f for f in field_hashes if f not in previous),
+            'changed': sorted(f for f in field_hashes if f in previous and previous[f] != field_hashes[f]),
+            'removed': sorted(f for f in previous if f not in field_hashes),
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+    
+    def _check_schema(self, cursor):
+        """Comprueba una sola vez que db_N1 tiene aplicada la migración de cabeceras y hashes."""
+        if self._schema_checked:
+            return
+        cursor.execute("""
+            SELECT to_regclass('client_version_heads') IS NOT NULL AS heads,
+                   EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_name = 'client_versions' AND column_name = 'content_hash'
+                             AND table_schema = ANY(current_schemas(false))) AS hashes
+        """)
+        row = cursor.fetchone()
+        if not (row['heads'] and row['hashes']):
+            raise RuntimeError(f"❌ db_N1 sin client_version_heads / client_versions.content_hash: "
+                               f"aplicar {self.SCHEMA_MIGRATION} antes de versionar clientes")
+        self._schema_checked = True
+    
+    def _get_head(self, client_hash: str) -> Optional[Dict[str, Any]]:
+        if client_hash not in self._heads:
+            self._load_heads([client_hash])
+        head = self._heads.get(client_hash)
+        if head is not None:
+            self._heads.move_to_end(client_hash)
+        return head
+    
+    def _remember_head(self, client_hash: str, head: Dict[str, Any]):
+        """Guarda la cabecera como la más reciente y descarta las menos usadas."""
+        self._heads[client_hash] = head
+        self._heads.move_to_end(client_hash)
+        self._trim_heads()
+    
+    def _trim_heads(self):
+        if len(self._heads) <= self.heads_cache_size:
+            return
+        # Las cabeceras con versiones sin guardar no se descartan (la BD aún no las tiene)
+        pending_clients = {client_hash for _, client_hash in self._pending}
+        for old_hash in list(self._heads):
+            if len(self._heads) <= self.heads_cache_size:
+                break
+            if old_hash not in pending_clients:
+                del self._heads[old_hash]
+    
+    def _load_heads(self, client_hashes: List[str]):
+        """Carga en memoria la última versión de los clientes indicados (una consulta)."""
+        missing = [h for h in set(client_hashes) if h not in self._heads]
+        if not missing:
+            return
         with self.db_manager.transaction('N1') as cursor:
+            self._check_schema(cursor)
             cursor.execute("""
+                SELECT client_hash, version_id, content_hash, field_hashes
+                FROM client_version_heads
+                WHERE client_hash = ANY(%s)
+            """, (missing,))
+            rows = cursor.fetchall()
+        with self._lock:
+            for row in rows:
+                field_hashes = row['field_hashes']
+                if isinstance(field_hashes, str):
+                    field_hashes = json.loads(field_hashes)
+                if row['client_hash'] not in self._heads:
+                    self._remember_head(row['client_hash'], {
+                        'version_id': row['version_id'],
+                        'content_hash': row['content_hash'],
+                        'field_hashes': field_hashes or {}
+                    })
+    
+    def _save_versions_to_db(self, pending: List[tuple]):
+        """Guarda versiones en la tabla de versionado de db_N1 y mueve la cabecera de cada cliente."""
+        with self.db_manager.transaction('N1') as cursor:
+            self._check_schema(cursor)
+            execute_values(cursor, """
                 INSERT INTO client_versions (
                     version_id, client_hash, source_priority, enrichment_timestamp,
-                    data_quality_score, created_at, updated_at, changes_summary
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
+                    data_quality_score, created_at, updated_at, changes_summary,
+                    content_hash, field_hashes
+                ) VALUES %s
+                ON CONFLICT (version_id, client_hash) DO UPDATE SET
+                    source_priority = EXCLUDED.source_priority,
+                    data_quality_score = EXCLUDED.data_quality_score,
+                    updated_at = EXCLUDED.updated_at,
+                    changes_summary = EXCLUDED.changes_summary,
+                    content_hash = EXCLUDED.content_hash,
+                    field_hashes = EXCLUDED.field_hashes
+            """, [(
                 version.version_id,
-                self.hasher.hash_client(data.get('nif_cif', ''), data.get('nombre_fiscal', '')),
+                client_hash,
                 version.source_priority.value,
                 version.enrichment_timestamp,
                 version.data_quality_score,
                 version.created_at,
                 version.updated_at,
-                json.dumps(version.changes_summary)
-            ))
+                json.dumps(version.changes_summary),
+                content_hash,
+                json.dumps(field_hashes)
+            ) for version, client_hash, content_hash, field_hashes in pending], page_size=1000)
+            
+            # Un cliente aparece una sola vez por lote en la cabecera (la última versión)
+            heads = {client_hash: (client_hash, version.version_id, content_hash, json.dumps(field_hashes))
+                     for version, client_hash, content_hash, field_hashes in pending}
+            execute_values(cursor, """
+                INSERT INTO client_version_heads (client_hash, version_id, content_hash, field_hashes)
+                VALUES %s
+                ON CONFLICT (client_hash) DO UPDATE SET
+                    version_id = EXCLUDED.version_id,
+                    content_hash = EXCLUDED.content_hash,
+                    field_hashes = EXCLUDED.field_hashes,
+                    updated_at = CURRENT_TIMESTAMP
+            """, list(heads.values()), page_size=1000)
 
 
 class EnrichmentQueue:
@@ -183,9 +566,9 @@ class EnrichmentQueue:
     Procesa solicitudes de APIs externas sin bloquear el pipeline principal.
     """
     
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, hasher: Optional[DataHasher] = None):
         self.db_manager = db_manager
-        self.hasher = DataHasher()
+        self.hasher = hasher or DataHasher()
     
     def enqueue_enrichment(self, client_data: Dict[str, Any], priority: str = 'medium') -> bool:
         """
@@ -301,15 +684,51 @@ class EnrichmentQueue:
             return False
 
 
+@dataclass
+class CleanupResult:
+    """Resultado de la limpieza TTL de una tabla."""
+    db_name: str
+    table: str
+    deleted: int = 0
+    batches: int = 0
+    partitions_dropped: int = 0
+    seconds: float = 0.0
+    cancelled: bool = False
+    # Siguiente clave primaria a revisar si la limpieza se interrumpió (para reanudar)
+    resume_from: Optional[int] = None
+    
+    @property
+    def rows_per_second(self) -> float:
+        return self.deleted / self.seconds if self.seconds > 0 else 0.0
+
+
 class TTLManager:
     """
     Gestiona la limpieza automática de datos temporales con TTL.
+    
+    La limpieza borra por lotes acotados de clave primaria, cada uno en su propia
+    transacción corta y con lock_timeout, con una pausa entre lotes para no saturar
+    WAL ni bloquear a los procesos de ingesta. Se puede cancelar (cancel()) y la
+    siguiente ejecución continúa desde el último lote confirmado.
     """
     
+    # Filas por lote, pausa entre lotes y espera máxima de bloqueos por lote
+    BATCH_SIZE = int(os.getenv('TTL_BATCH_SIZE', '5000'))
+    BATCH_PAUSE = float(os.getenv('TTL_BATCH_PAUSE', '0.05'))
+    LOCK_TIMEOUT = os.getenv('TTL_LOCK_TIMEOUT', '2s')
+    LOCK_RETRIES = 3
+    
     def __init__(self, db_manager):
         self.db_manager = db_manager
+        self._cancel = threading.Event()
+        # (db, tabla) → siguiente clave primaria pendiente de una limpieza cancelada
+        self._resume: Dict[tuple, int] = {}
     
-    def cleanup_expired_data(self):
+    def cancel(self):
+        """Detiene la limpieza en curso al terminar el lote actual."""
+        self._cancel.set()
+    
+    def cleanup_expired_data(self) -> List[CleanupResult]:
         """Limpia datos expirados de todas las bases temporales."""
         cleanup_tasks = [
             ('N0', 'documents', 30),  # 30 días
@@ -318,33 +737,254 @@ class TTLManager:
             ('encuesta', 'questionnaire_sessions', 365),  # 1 año
         ]
         
+        self._cancel.clear()
+        results = []
         for db_name, table, days in cleanup_tasks:
+            if self._cancel.is_set():
+                break
             try:
-                deleted = self._cleanup_table(db_name, table, days)
-                logger.info(f"🗑️ {db_name}.{table}: {deleted} registros eliminados (TTL: {days} días)")
+                result = self._cleanup_table(db_name, table, days)
+                results.append(result)
+                estado = "⏸️ cancelada" if result.cancelled else "🗑️"
+                logger.info(f"{estado} {db_name}.{table}: {result.deleted} registros eliminados "
+                            f"({result.batches} lotes, {result.partitions_dropped} particiones, "
+                            f"{result.rows_per_second:.0f} filas/s, TTL: {days} días)")
             except Exception as e:
                 logger.error(f"❌ Error limpiando {db_name}.{table}: {e}")
+        
+        if not self._cancel.is_set():
+            self.manage_partitions()
+        return results
     
-    def _cleanup_table(self, db_name: str, table: str, ttl_days: int) -> int:
-        """Limpia registros expirados de una tabla específica."""
-        cutoff_date = datetime.now() - timedelta(days=ttl_days)
+    def manage_partitions(self, meses_futuros: int = 2):
+        """
+        Mantiene las tablas horarias particionadas por mes (sql/particionado):
+        crea los meses futuros y retira los meses fuera de retención desacoplando
+        particiones ('archivar' las mueve al esquema archivo, 'eliminar' las borra).
+        Las tablas aún sin particionar se omiten.
+        """
+        partition_tasks = [
+            ('Ncore', 'core_esios_valor_horario', 5 * 365, 'archivar'),
+            ('Ncore', 'core_precios_omie', 10 * 365, 'archivar'),
+            ('sistema_electrico', 'omie_precios', 10 * 365, 'archivar'),
+            ('sistema_electrico', 'precios_horarios_pvpc', 10 * 365, 'archivar'),
+            ('sistema_electrico', 'perfiles_consumo', 3 * 365, 'archivar'),
+            ('N1', 'data_audit_log', 2 * 365, 'archivar'),
+        ]
+        
+        for db_name, table, days, modo in partition_tasks:
+            try:
+                creadas, retiradas = self._manage_table_partitions(db_name, table, days, modo, meses_futuros)
+                if creadas is None:
+                    logger.debug(f"⏭️ {db_name}.{table}: no particionada, se omite")
+                    continue
+                logger.info(f"🗂️ {db_name}.{table}: {creadas} particiones creadas, "
+                            f"{len(retiradas)} retiradas ({modo}, TTL: {days} días)")
+            except Exception as e:
+                logger.error(f"❌ Error gestionando particiones de {db_name}.{table}: {e}")
+    
+    def _manage_table_partitions(self, db_name: str, table: str, ttl_days: int,
+                                 modo: str, meses_futuros: int):
+        """Asegura y retira particiones de una tabla. (None, []) si no está particionada."""
+        # Solo se retiran meses completos anteriores al corte
+        cutoff_date = (datetime.now() - timedelta(days=ttl_days)).date()
         
         with self.db_manager.transaction(db_name) as cursor:
-            cursor.execute(f"""
-                DELETE FROM {table} 
-                WHERE created_at < %s
-            """, (cutoff_date,))
+            if self._monthly_partition_column(cursor, table) is None:
+                return None, []
+            
+            cursor.execute("SELECT asegurar_particiones_mensuales(%s, %s) AS creadas", (table, meses_futuros))
+            creadas = cursor.fetchone()['creadas']
+            cursor.execute("SELECT retirar_particiones_mensuales(%s, %s, %s) AS particion",
+                           (table, cutoff_date, modo))
+            retiradas = [row['particion'] for row in cursor.fetchall()]
+            
+            return creadas, retiradas
+    
+    def _cleanup_table(self, db_name: str, table: str, ttl_days: int,
+                       batch_size: Optional[int] = None) -> CleanupResult:
+        """
+        Limpia registros expirados de una tabla específica.
+        
+        - Tablas particionadas por created_at: se eliminan las particiones completas
+          anteriores al corte y solo el mes frontera se borra por lotes
+        - Resto: lotes por rangos de clave primaria entera (o por ctid si no la hay)
+        """
+        cutoff_date = datetime.now() - timedelta(days=ttl_days)
+        batch_size = batch_size or self.BATCH_SIZE
+        result = CleanupResult(db_name, table)
+        inicio = time.monotonic()
+        
+        try:
+            with self.db_manager.transaction(db_name) as cursor:
+                if self._monthly_partition_column(cursor, table) == 'created_at':
+                    cursor.execute("SELECT retirar_particiones_mensuales(%s, %s, 'eliminar') AS particion",
+                                   (table, cutoff_date.date()))
+                    result.partitions_dropped = len(cursor.fetchall())
+                
+                pk_column = self._integer_pk(cursor, table)
             
-            return cursor.rowcount
+            if pk_column:
+                self._delete_by_pk_ranges(db_name, table, pk_column, cutoff_date, batch_size, result)
+            else:
+                self._delete_by_ctid(db_name, table, cutoff_date, batch_size, result)
+        finally:
+            result.seconds = time.monotonic() - inicio
+        
+        return result
+    
+    @staticmethod
+    def _monthly_partition_column(cursor, table: str) -> Optional[str]:
+        """
+        Columna de partición por rango de la tabla si está particionada y las funciones de
+        sql/particionado están instaladas en la base; None en otro caso.
+        
+        Solo consulta catálogos: las funciones de particionado no existen en todas las bases
+        y PostgreSQL resuelve los nombres de función al analizar la consulta.
+        """
+        cursor.execute("""
+            SELECT a.attname AS columna,
+                   to_regprocedure('retirar_particiones_mensuales(text,date,text)') IS NOT NULL AS funciones
+            FROM pg_partitioned_table pt
+            JOIN pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0]
+            WHERE pt.partrelid = to_regclass(%s)
+              AND pt.partstrat = 'r'
+              AND pt.partnatts = 1
+        """, (table,))
+        row = cursor.fetchone()
+        return row['columna'] if row and row['funciones'] else None
+    
+    @staticmethod
+    def _integer_pk(cursor, table: str) -> Optional[str]:
+        """Columna de la clave primaria si es una sola columna entera; None en otro caso."""
+        cursor.execute("""
+            SELECT a.attname AS columna
+            FROM pg_index ix
+            JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = ANY(ix.indkey)
+            WHERE ix.indrelid = to_regclass(%s) AND ix.indisprimary
+              AND array_length(ix.indkey::int2[], 1) = 1
+              AND a.atttypid IN ('int2'::regtype, 'int4'::regtype, 'int8'::regtype)
+        """, (table,))
+        row = cursor.fetchone()
+        return row['columna'] if row else None
+    
+    def _delete_by_pk_ranges(self, db_name: str, table: str, pk_column: str,
+                             cutoff_date: datetime, batch_size: int, result: CleanupResult):
+        """
+        Lotes por keyset: cada lote toma las siguientes batch_size claves expiradas posteriores
+        a la última borrada (claves dispersas no generan lotes vacíos).
+        """
+        # resume_from es la primera clave aún no revisada
+        desde = self._resume.pop((db_name, table), None)
+        while True:
+            if self._cancel.is_set():
+                result.cancelled = True
+                result.resume_from = desde
+                if desde is not None:
+                    self._resume[(db_name, table)] = desde
+                return
+            
+            try:
+                with self.db_manager.transaction(db_name) as cursor:
+                    cursor.execute(f"""
+                        SELECT {pk_column} AS clave FROM {table}
+                        WHERE created_at < %s AND ({pk_column} >= %s OR %s IS NULL)
+                        ORDER BY {pk_column}
+                        LIMIT %s
+                    """, (cutoff_date, desde, desde, batch_size))
+                    claves = [row['clave'] for row in cursor.fetchall()]
+                if not claves:
+                    return
+                
+                result.deleted += self._run_batch(db_name, f"""
+                    DELETE FROM {table}
+                    WHERE {pk_column} = ANY(%s)
+                      AND created_at < %s
+                """, (claves, cutoff_date))
+            except Exception:
+                # Los lotes anteriores ya están confirmados: la próxima ejecución sigue aquí
+                result.resume_from = desde
+                if desde is not None:
+                    self._resume[(db_name, table)] = desde
+                raise
+            result.batches += 1
+            desde = claves[-1] + 1
+            if len(claves) < batch_size:
+                return
+            time.sleep(self.BATCH_PAUSE)
+    
+    def _delete_by_ctid(self, db_name: str, table: str, cutoff_date: datetime,
+                        batch_size: int, result: CleanupResult):
+        """Tablas sin clave entera: lotes de batch_size filas localizadas por ctid."""
+        while True:
+            if self._cancel.is_set():
+                result.cancelled = True
+                return
+            
+            deleted = self._run_batch(db_name, f"""
+                DELETE FROM {table}
+                WHERE ctid = ANY(ARRAY(
+                    SELECT ctid FROM {table}
+                    WHERE created_at < %s
+                    LIMIT %s
+                ))
+                  AND created_at < %s
+            """, (cutoff_date, batch_size, cutoff_date))
+            result.deleted += deleted
+            result.batches += 1
+            if deleted < batch_size:
+                return
+            time.sleep(self.BATCH_PAUSE)
+    
+    def _run_batch(self, db_name: str, sql: str, params: tuple) -> int:
+        """Un lote en transacción propia; si no obtiene los bloqueos a tiempo, reintenta con espera."""
+        for intento in range(1, self.LOCK_RETRIES + 1):
+            try:
+                with self.db_manager.transaction(db_name) as cursor:
+                    cursor.execute("SELECT set_config('lock_timeout', %s, true)", (self.LOCK_TIMEOUT,))
+                    cursor.execute(sql, params)
+                    return cursor.rowcount
+            except psycopg2.errors.LockNotAvailable:
+                if intento == self.LOCK_RETRIES:
+                    raise
+                logger.warning(f"⏳ Lote TTL bloqueado en {db_name}, reintento {intento}/{self.LOCK_RETRIES}")
+                time.sleep(self.BATCH_PAUSE * 10 * intento)
+        return 0
 
 
 class AuditLogger:
     """
     Sistema de auditoría y trazabilidad para operaciones sensibles.
+    
+    Los registros se encolan en memoria (cola acotada) y un hilo de fondo los escribe
+    en data_audit_log (db_N1, sql/security/audit_log_particionado_N1.sql) con COPY
+    cada `batch_size` registros o `flush_interval` segundos. Si la BD no está
+    disponible o la cola se llena, los registros se vuelcan a disco (JSON Lines) y se
+    reenvían en la siguiente escritura correcta. flush() se ejecuta al salir del proceso.
+    
+    Si el COPY falla por un registro inválido (dato demasiado largo, NULL obligatorio),
+    el lote se reintenta fila a fila y los registros que siguen fallando se apartan a
+    rechazados_<fecha>.jsonl en el directorio de volcado (no se reenvían).
     """
     
-    def __init__(self, db_manager):
+    COLUMNS = ('timestamp', 'user_id', 'operation', 'table_name', 'client_hash', 'details')
+    
+    def __init__(self, db_manager, db_name: str = 'N1',
+                 batch_size: int = int(os.getenv('AUDIT_BATCH_SIZE', '500')),
+                 flush_interval: float = float(os.getenv('AUDIT_FLUSH_SECONDS', '5')),
+                 max_queue: int = int(os.getenv('AUDIT_QUEUE_MAX', '10000')),
+                 spool_dir: Optional[Path] = None):
         self.db_manager = db_manager
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = Path(spool_dir or os.getenv('AUDIT_SPOOL_DIR', Path(__file__).parent / '.audit_spool'))
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._write_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
     
     def log_data_access(self, user: str, operation: str, table: str, 
                        client_hash: Optional[str] = None, details: Dict[str, Any] = None):
@@ -359,7 +999,6 @@ class AuditLogger:
             details: Detalles adicionales
         """
         try:
-            # TODO: Crear tabla de auditoría si no existe
             audit_record = {
                 'timestamp': datetime.now().isoformat(),
                 'user': user,
@@ -370,18 +1009,244 @@ class AuditLogger:
             }
             
             logger.info(f"📋 AUDIT: {user} - {operation} on {table}")
-            # TODO: Guardar en tabla de auditoría
+            self._ensure_writer()
+            try:
+                self._queue.put_nowait(audit_record)
+            except queue.Full:
+                # No se bloquea al llamante: el registro va directo a disco
+                self._spool([audit_record])
             
         except Exception as e:
             logger.error(f"❌ Error registrando auditoría: {e}")
+    
+    def flush(self) -> int:
+        """Escribe ya todo lo pendiente (cola y volcados en disco). Devuelve registros escritos."""
+        written = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            written += self._write(batch) or 0
+        return written + self._replay_spool()
+    
+    def close(self):
+        """Detiene el hilo escritor y vacía la cola (registrado con atexit)."""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join(timeout=self.flush_interval + 5)
+        self.flush()
+    
+    # ------------------------------------------------------------------
+    # Escritor en segundo plano
+    # ------------------------------------------------------------------
+    
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and not self._stop.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+                    except queue.Empty:
+                        continue
+                if batch and self._write(batch) is not None:
+                    self._replay_spool()
+            except Exception as e:
+                # El hilo escritor no debe morir: la cola seguiría creciendo sin escritor
+                logger.error(f"❌ Error en el escritor de auditoría: {e}")
+                time.sleep(1)
+    
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _write(self, batch: List[Dict[str, Any]]) -> Optional[int]:
+        """
+        COPY del lote a data_audit_log. Devuelve registros escritos, o None si la BD
+        no estaba disponible y el lote se volcó a disco.
+        """
+        try:
+            with self._write_lock, self.db_manager.transaction(self.db_name) as cursor:
+                cursor.copy_expert(
+                    f"COPY data_audit_log ({', '.join(self.COLUMNS)}) FROM STDIN",
+                    io.StringIO(''.join(self._copy_line(record) for record in batch))
+                )
+            return len(batch)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            # Algún registro no es válido: reenviarlo a disco lo haría fallar para siempre
+            logger.warning(f"⚠️ COPY de auditoría rechazado ({e}); reintento fila a fila")
+            return self._write_rows(batch)
+        except Exception as e:
+            logger.warning(f"⚠️ Auditoría sin BD ({e}); {len(batch)} registros volcados a disco")
+            self._spool(batch)
+            return None
+    
+    def _write_rows(self, batch: List[Dict[str, Any]]) -> Optional[int]:
+        """Inserta registro a registro (un SAVEPOINT cada uno) y aparta los que fallan."""
+        insert = (f"INSERT INTO data_audit_log ({', '.join(self.COLUMNS)}) "
+                  f"VALUES ({', '.join(['%s'] * len(self.COLUMNS))})")
+        rejected = []
+        try:
+            with self._write_lock, self.db_manager.transaction(self.db_name) as cursor:
+                for record in batch:
+                    cursor.execute("SAVEPOINT audit_registro")
+                    try:
+                        cursor.execute(insert, self._row_values(record))
+                        cursor.execute("RELEASE SAVEPOINT audit_registro")
+                    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT audit_registro")
+                        rejected.append((record, str(e).strip()))
+        except Exception as e:
+            # Se perdió la conexión a mitad: nada confirmado, se vuelcan los válidos
+            logger.warning(f"⚠️ Auditoría sin BD ({e}); registros volcados a disco")
+            rejected_ids = {id(record) for record, _ in rejected}
+            self._spool([record for record in batch if id(record) not in rejected_ids])
+            self._quarantine(rejected)
+            return None
+        
+        self._quarantine(rejected)
+        return len(batch) - len(rejected)
+    
+    @staticmethod
+    def _row_values(record: Dict[str, Any]) -> tuple:
+        details = record.get('details')
+        if isinstance(details, dict):
+            details = json.dumps(details, ensure_ascii=False, default=str)
+        return (record.get('timestamp'), record.get('user'), record.get('operation'),
+                record.get('table'), record.get('client_hash'), details)
+    
+    @staticmethod
+    def _copy_line(record: Dict[str, Any]) -> str:
+        """Línea en formato texto de COPY (tabuladores, \\N para NULL)."""
+        def campo(valor):
+            if valor is None:
+                return '\\N'
+            if isinstance(valor, dict):
+                valor = json.dumps(valor, ensure_ascii=False, default=str)
+            return (str(valor).replace('\\', '\\\\').replace('\t', '\\t')
+                    .replace('\n', '\\n').replace('\r', '\\r'))
+        
+        return '\t'.join(campo(record.get(key)) for key in
+                         ('timestamp', 'user', 'operation', 'table', 'client_hash', 'details')) + '\n'
+    
+    # ------------------------------------------------------------------
+    # Volcado a disco
+    # ------------------------------------------------------------------
+    
+    def _spool(self, records: List[Dict[str, Any]]):
+        try:
+            with self._spool_lock:
+                self.spool_dir.mkdir(parents=True, exist_ok=True)
+                spool_file = self.spool_dir / f"audit_{datetime.now():%Y%m%d}.jsonl"
+                with open(spool_file, 'a', encoding='utf-8') as f:
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        except Exception as e:
+            logger.error(f"❌ Error volcando auditoría a disco: {e}")
+    
+    def _quarantine(self, rejected: List[tuple]):
+        """Aparta registros que la BD rechaza (con el error) para revisión manual."""
+        if not rejected:
+            return
+        logger.error(f"❌ Auditoría: {len(rejected)} registros rechazados por la BD apartados en {self.spool_dir}")
+        try:
+            with self._spool_lock:
+                self.spool_dir.mkdir(parents=True, exist_ok=True)
+                with open(self.spool_dir / f"rechazados_{datetime.now():%Y%m%d}.jsonl", 'a', encoding='utf-8') as f:
+                    for record, error in rejected:
+                        f.write(json.dumps({'record': record, 'error': error}, ensure_ascii=False, default=str) + '\n')
+        except Exception as e:
+            logger.error(f"❌ Error apartando registros de auditoría rechazados: {e}")
+    
+    @staticmethod
+    def _is_orphan(sending_file: Path) -> bool:
+        """True si el .sending es de un proceso que ya no existe (audit_<fecha>.<pid>.<id>.sending)."""
+        partes = sending_file.name.split('.')
+        if len(partes) != 4 or not partes[1].isdigit():
+            return True  # Formato antiguo sin PID
+        pid = int(partes[1])
+        if pid == os.getpid():
+            return False  # Lo está reenviando otro hilo de este proceso
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+    
+    def _replay_spool(self) -> int:
+        """Reenvía a la BD los ficheros volcados (los que vuelvan a fallar se vuelcan de nuevo)."""
+        if not self.spool_dir.exists():
+            return 0
+        # Se reclaman los ficheros renombrándolos a .sending con el PID: otro hilo u otro
+        # proceso no los reenvía dos veces. Solo se recuperan .sending de procesos muertos.
+        with self._spool_lock:
+            claimed = []
+            candidates = sorted(self.spool_dir.glob('audit_*.jsonl')) + \
+                [f for f in sorted(self.spool_dir.glob('audit_*.sending')) if self._is_orphan(f)]
+            for spool_file in candidates:
+                target = spool_file.with_name(
+                    f"{spool_file.name.split('.')[0]}.{os.getpid()}.{uuid.uuid4().hex[:8]}.sending")
+                try:
+                    spool_file.rename(target)
+                except FileNotFoundError:
+                    continue  # Reclamado por otro proceso
+                claimed.append(target)
+        
+        written = 0
+        for spool_file in claimed:
+            try:
+                records, corruptas = [], []
+                with open(spool_file, encoding='utf-8') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            records.append(json.loads(line))
+                        except json.JSONDecodeError as e:
+                            corruptas.append((line.rstrip('\n'), f"JSON no válido: {e}"))
+                self._quarantine(corruptas)
+                for i in range(0, len(records), self.batch_size):
+                    written += self._write(records[i:i + self.batch_size]) or 0
+                spool_file.unlink()
+            except Exception as e:
+                # Se devuelve a la cola de disco para el siguiente reenvío
+                logger.error(f"❌ Error reenviando {spool_file.name}: {e}")
+                try:
+                    spool_file.rename(spool_file.with_name(f"{spool_file.name.split('.')[0]}.{uuid.uuid4().hex[:8]}.jsonl"))
+                except OSError:
+                    pass
+        if written:
+            logger.info(f"📋 Auditoría: {written} registros recuperados de disco")
+        return written
 
 
 # Instancia global para uso en toda la aplicación
 from .db_connections import db_manager
 
 data_hasher = DataHasher()
-version_manager = DataVersionManager(db_manager)
-enrichment_queue = EnrichmentQueue(db_manager)
+# Versionado y cola comparten el hasher (y su memoria de hashes)
+version_manager = DataVersionManager(db_manager, data_hasher)
+enrichment_queue = EnrichmentQueue(db_manager, data_hasher)
 ttl_manager = TTLManager(db_manager)
 audit_logger = AuditLogger(db_manager)
 
@@ -58,6 +58,11 @@ class DatabaseManager:
             return
 
         self.connection_pools = {}
+        # Tamaño (min, max) por BD y semáforo que hace esperar cuando el pool está agotado
+        self.pool_sizes = {}
+        self._pool_slots = {}
+        self._pools_lock = threading.Lock()
+        self.pool_timeout = float(os.getenv('DB_POOL_TIMEOUT', '30'))
         self._initialized = True
         
         # Configuración base desde .env
@@ -116,33 +121,51 @@ class DatabaseManager:
         # NO inicializar pools automáticamente - usar inicialización bajo demanda
         # self._init_connection_pools()
 
-    def _init_specific_pool(self, db_name: str):
+    def configure_pool(self, db_name: str, min_conn: int = 1, max_conn: int = 2):
         """
-        Inicializa pool de conexión para una BD específica bajo demanda.
+        Fija el tamaño del pool de una BD (servicios con concurrencia alta, p. ej. APIs).
+        Debe llamarse antes de la primera conexión a esa BD.
         """
-        if db_name in self.connection_pools:
-            return  # Ya existe
-            
         if db_name not in self.db_configs:
             raise ValueError(f"❌ BD '{db_name}' no configurada")
-            
-        config = self.db_configs[db_name]
-        
-        try:
-            # Tamaño mínimo del pool para eficiencia
-            min_conn, max_conn = 1, 2  # Mínimo necesario
-            
-            self.connection_pools[db_name] = psycopg2.pool.ThreadedConnectionPool(
-                minconn=min_conn,
-                maxconn=max_conn,
-                **config
-            )
-            logger.info(f"✅ Pool creado para '{db_name}' ({min_conn}-{max_conn} conexiones)")
-            
-        except psycopg2.Error as e:
-            error_msg = f"❌ ERROR: No se pudo conectar a '{db_name}': {e}"
-            logger.error(error_msg)
-            raise RuntimeError(error_msg)
+        with self._pools_lock:
+            if db_name in self.connection_pools:
+                pool_actual = self.connection_pools[db_name]
+                if (pool_actual.minconn, pool_actual.maxconn) != (min_conn, max_conn):
+                    logger.warning(f"⚠️ Pool de '{db_name}' ya creado ({pool_actual.minconn}-{pool_actual.maxconn}); "
+                                   f"se ignora {min_conn}-{max_conn}")
+                return
+            self.pool_sizes[db_name] = (min_conn, max_conn)
+
+    def _init_specific_pool(self, db_name: str):
+        """
+        Inicializa pool de conexión para una BD específica bajo demanda.
+        """
+        with self._pools_lock:
+            if db_name in self.connection_pools:
+                return  # Ya existe
+
+            if db_name not in self.db_configs:
+                raise ValueError(f"❌ BD '{db_name}' no configurada")
+
+            config = self.db_configs[db_name]
+
+            try:
+                # Tamaño mínimo del pool para eficiencia salvo configure_pool
+                min_conn, max_conn = self.pool_sizes.get(db_name, (1, 2))
+
+                self.connection_pools[db_name] = psycopg2.pool.ThreadedConnectionPool(
+                    minconn=min_conn,
+                    maxconn=max_conn,
+                    **config
+                )
+                self._pool_slots[db_name] = threading.BoundedSemaphore(max_conn)
+                logger.info(f"✅ Pool creado para '{db_name}' ({min_conn}-{max_conn} conexiones)")
+
+            except psycopg2.Error as e:
+                error_msg = f"❌ ERROR: No se pudo conectar a '{db_name}': {e}"
+                logger.error(error_msg)
+                raise RuntimeError(error_msg)
 
     def get_connection(self, db_name: str) -> psycopg2.extensions.connection:
         """
@@ -165,11 +188,19 @@ class DatabaseManager:
         if self.connection_pools[db_name] is None:
             raise RuntimeError(f"❌ Pool de '{db_name}' no disponible")
         
+        # Con el pool agotado se espera a que se devuelva una conexión (getconn fallaría)
+        slots = self._pool_slots[db_name]
+        if not slots.acquire(timeout=self.pool_timeout):
+            error_msg = f"❌ Pool de '{db_name}' agotado tras esperar {self.pool_timeout:.0f}s"
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
+        
         try:
             connection = self.connection_pools[db_name].getconn()
             logger.debug(f"🔗 Conexión obtenida para '{db_name}'")
             return connection
         except psycopg2.Error as e:
+            slots.release()
             error_msg = f"❌ Error obteniendo conexión para '{db_name}': {e}"
             logger.error(error_msg)
             raise RuntimeError(error_msg)
@@ -178,12 +209,15 @@ class DatabaseManager:
         """Devuelve una conexión al pool."""
         if db_name in self.connection_pools and self.connection_pools[db_name]:
             try:
-                self.connection_pools[db_name].putconn(conn)
+                # Las conexiones rotas se descartan; el pool abrirá otra al pedirla
+                self.connection_pools[db_name].putconn(conn, close=bool(conn.closed))
                 logger.debug(f"🔙 Conexión devuelta al pool '{db_name}'")
             except Exception as e:
                 logger.error(f"Error al devolver conexión al pool '{db_name}': {e}")
                 if conn:
                     conn.close()
+            finally:
+                self._pool_slots[db_name].release()
 
     @contextmanager
     def transaction(self, db_name: str):
@@ -308,6 +342,7 @@ class DatabaseManager:
             except Exception as e:
                 logger.error(f"Error cerrando pool '{db_name}': {e}")
         self.connection_pools.clear()
+        self._pool_slots.clear()
         logger.info("Todos los pools cerrados")
 
     def __del__(self):
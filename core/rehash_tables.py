@@ -0,0 +1,177 @@
+"""
+Reescritura de hashes de pseudonimización tabla a tabla (rotación de salts).
+
+Recalcula una columna hash a partir de las columnas en claro de la misma tabla con
+los salts actuales del entorno (HASH_SALT_*), en streaming:
+- lectura con cursor de servidor por lotes en orden de clave (no se carga la tabla en memoria)
+- hashes del lote con DataHasher.*_many (pool de procesos en lotes grandes)
+- COPY del lote (clave, hash) a una tabla temporal + UPDATE ... FROM, una transacción por lote
+- tras cada lote se registra la última clave confirmada; si el proceso se interrumpe,
+  --desde <clave> continúa a partir de ella (claves > <clave>)
+
+Uso:
+    python -m core.rehash_tables \
+        --tarea "<bd>.<tabla>:id:cups_hash:cups:cups,fecha_vinculacion" \
+        --tarea "<bd>.<tabla>:id:direccion_hash:direccion:direccion,codigo_postal" \
+        --lote 50000
+
+Formato de --tarea: <bd>.<tabla>:<clave>:<columna_hash>:<tipo>:<col1>,<col2>
+con tipo en direccion | cups | client (mismas dos partes que DataHasher.hash_<tipo>).
+
+Reanudación (una sola --tarea):
+    python -m core.rehash_tables --tarea "..." --desde 1843000
+"""
+
+import argparse
+import io
+import logging
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from psycopg2 import sql
+
+from .data_security import DataHasher
+from .db_connections import db_manager
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RehashTask:
+    """Columna hash de una tabla y las dos columnas en claro de las que se calcula."""
+    db_name: str
+    table: str
+    key: str
+    hash_column: str
+    tipo: str
+    source_columns: List[str]
+
+    @classmethod
+    def parse(cls, spec: str) -> 'RehashTask':
+        try:
+            destino, key, hash_column, tipo, columnas = spec.split(':')
+            db_name, table = destino.split('.', 1)
+            source_columns = columnas.split(',')
+        except ValueError:
+            raise ValueError(f"Tarea no válida: {spec!r} "
+                             "(formato <bd>.<tabla>:<clave>:<columna_hash>:<tipo>:<col1>,<col2>)")
+        if tipo not in ('direccion', 'cups', 'client') or len(source_columns) != 2:
+            raise ValueError(f"Tarea no válida: {spec!r} (tipo direccion|cups|client y dos columnas)")
+        return cls(db_name, table, key, hash_column, tipo, source_columns)
+
+
+def _copy_value(valor) -> str:
+    if valor is None:
+        return '\\N'
+    return (str(valor).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def rehash_table(task: RehashTask, hasher: DataHasher, batch_size: int = 50000,
+                 workers: Optional[int] = None, desde: Optional[str] = None) -> int:
+    """
+    Reescribe task.hash_column en toda la tabla (o en las claves > desde).
+    Devuelve filas actualizadas.
+    """
+    hash_many = getattr(hasher, f"hash_{task.tipo}_many")
+    tabla = sql.Identifier(task.table)
+    clave = sql.Identifier(task.key)
+    columna_hash = sql.Identifier(task.hash_column)
+    origen_a, origen_b = (sql.Identifier(c) for c in task.source_columns)
+
+    lectura = db_manager.get_connection(task.db_name)
+    escritura = db_manager.get_connection(task.db_name)
+    actualizadas = 0
+    ultima_clave = desde
+    inicio = time.monotonic()
+    try:
+        with escritura.cursor() as cur:
+            # Misma definición de tipos que la tabla: el UPDATE ... FROM usa el índice de la clave
+            cur.execute(sql.SQL("""
+                CREATE TEMP TABLE IF NOT EXISTS tmp_rehash AS
+                SELECT {clave} AS clave, {columna_hash} AS hash FROM {tabla} WITH NO DATA
+            """).format(clave=clave, columna_hash=columna_hash, tabla=tabla))
+        escritura.commit()
+
+        with lectura.cursor(name=f"rehash_{task.table}") as origen:
+            origen.itersize = batch_size
+            # Orden de clave: la última clave confirmada delimita lo ya reescrito
+            origen.execute(sql.SQL("""
+                SELECT {clave}, {a}, {b} FROM {tabla}
+                WHERE {a} IS NOT NULL AND {b} IS NOT NULL
+                  AND (%(desde)s::text IS NULL OR {clave} > %(desde)s)
+                ORDER BY {clave}
+            """).format(clave=clave, a=origen_a, b=origen_b, tabla=tabla), {'desde': desde})
+
+            while True:
+                filas = origen.fetchmany(batch_size)
+                if not filas:
+                    break
+                claves, primeros, segundos = zip(*filas)
+                hashes = hash_many(list(primeros), list(segundos), workers=workers)
+                datos = io.StringIO(''.join(f"{_copy_value(k)}\t{h}\n" for k, h in zip(claves, hashes)))
+
+                with escritura.cursor() as cur:
+                    cur.execute("TRUNCATE tmp_rehash")
+                    cur.copy_expert("COPY tmp_rehash (clave, hash) FROM STDIN", datos)
+                    cur.execute(sql.SQL("""
+                        UPDATE {tabla} t SET {columna_hash} = tmp.hash
+                        FROM tmp_rehash tmp
+                        WHERE t.{clave} = tmp.clave
+                          AND t.{columna_hash} IS DISTINCT FROM tmp.hash
+                    """).format(tabla=tabla, columna_hash=columna_hash, clave=clave))
+                    actualizadas += cur.rowcount
+                escritura.commit()
+                ultima_clave = claves[-1]
+
+                segundos_totales = time.monotonic() - inicio
+                logger.info(f"🔒 {task.db_name}.{task.table}.{task.hash_column}: {actualizadas} filas "
+                            f"({actualizadas / segundos_totales if segundos_totales else 0:.0f} filas/s), "
+                            f"última clave confirmada: {ultima_clave}")
+        lectura.commit()
+    except BaseException:
+        lectura.rollback()
+        escritura.rollback()
+        if ultima_clave is not None:
+            logger.error(f"❌ {task.db_name}.{task.table}: reescritura interrumpida; "
+                         f"reanudar con --desde {ultima_clave}")
+        raise
+    finally:
+        try:
+            with escritura.cursor() as cur:
+                cur.execute("DROP TABLE IF EXISTS tmp_rehash")
+            escritura.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo eliminar tmp_rehash: {e}")
+        db_manager.return_connection(task.db_name, lectura)
+        db_manager.return_connection(task.db_name, escritura)
+
+    return actualizadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reescritura de hashes tabla a tabla con los salts actuales')
+    parser.add_argument('--tarea', action='append', required=True,
+                        help='<bd>.<tabla>:<clave>:<columna_hash>:<tipo>:<col1>,<col2> (repetible)')
+    parser.add_argument('--lote', type=int, default=50000, help='Filas por lote (lectura, COPY y UPDATE)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos para hashear (por defecto automático según tamaño de lote)')
+    parser.add_argument('--desde', default=None,
+                        help='Reanudar tras esta clave (última clave confirmada en el log); una sola --tarea')
+    args = parser.parse_args()
+    if args.desde is not None and len(args.tarea) != 1:
+        parser.error('--desde solo admite una --tarea')
+
+    logging.basicConfig(level=logging.INFO)
+    tareas = [RehashTask.parse(spec) for spec in args.tarea]
+    hasher = DataHasher()
+
+    for task in tareas:
+        logger.info(f"🚀 Reescribiendo {task.db_name}.{task.table}.{task.hash_column} ({task.tipo})")
+        total = rehash_table(task, hasher, args.lote, args.workers, args.desde)
+        logger.info(f"✅ {task.db_name}.{task.table}: {total} hashes reescritos")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,9 +5,38 @@ Mapeador de Campos N0 a Schemas Electricidad
 Mapea la estructura jerárquica de N0 a los campos esperados en schemas.
 """
 
-from typing import Dict, List, Set, Any, Optional
+from typing import Dict, List, Set, Any, Optional, Tuple
+from functools import lru_cache
 import json
 from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from path_accessors import get_path
+from field_index import IndiceCampos, CacheIndice, normalizar_clave, tokens_clave
+
+
+@lru_cache(maxsize=65536)
+def _similares(campo1: str, campo2: str) -> bool:
+    """Similitud entre claves, memoizada por pareja entre facturas."""
+    campo1_clean = normalizar_clave(campo1)
+    campo2_clean = normalizar_clave(campo2)
+    
+    # Coincidencia exacta sin separadores o uno contiene al otro
+    if campo1_clean in campo2_clean or campo2_clean in campo1_clean:
+        return True
+    
+    # Al menos 2 palabras en común
+    return len(tokens_clave(campo1) & tokens_clave(campo2)) >= 2
+
+
+@lru_cache(maxsize=65536)
+def _coincide_patron(clave: str, patrones: Tuple[str, ...], campo_objetivo: str) -> bool:
+    """La clave contiene algún patrón de la categoría y alguna parte del campo objetivo."""
+    key_lower = clave.lower()
+    return (any(patron in key_lower for patron in patrones) and
+            any(parte in key_lower for parte in campo_objetivo.lower().split('_')))
+
 
 class N0FieldMapper:
     """Mapea campos de facturas N0 a estructura esperada por schemas."""
@@ -80,17 +109,17 @@ class N0FieldMapper:
             'reactiva': ['reactiva', 'reactive', 'kvarh', 'penalizacion'],
             'autoconsumo': ['autoconsumo', 'self_consumption', 'excedentes', 'generacion']
         }
+        
+        # Índice de la última factura consultada (una pasada por factura)
+        self._cache_indice = CacheIndice()
+    
+    def indexar(self, datos: dict) -> IndiceCampos:
+        """Devuelve el índice clave → nodos de la factura (reutilizado mientras no cambie)."""
+        return self._cache_indice.obtener(datos)
     
     def extraer_valor_por_ruta(self, datos: dict, ruta: str) -> Any:
         """Extrae valor de datos siguiendo una ruta con notación punto."""
-        partes = ruta.split('.')
-        valor_actual = datos
-        
-        for parte in partes:
-            if isinstance(valor_actual, dict) and parte in valor_actual:
-                valor_actual = valor_actual[parte]
-            else:
-                return None
+        valor_actual = get_path(datos, ruta)
         
         # Si es un dict con 'value', extraer el valor
         if isinstance(valor_actual, dict) and 'value' in valor_actual:
@@ -119,83 +148,23 @@ class N0FieldMapper:
         return self._buscar_recursivo(datos, campo_objetivo)
     
     def _buscar_por_patron(self, datos: dict, patrones: List[str], campo_objetivo: str) -> Optional[Any]:
-        """Busca usando patrones específicos."""
-        def buscar_en_nivel(obj, nivel_actual=""):
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    key_lower = key.lower()
-                    
-                    # Verificar si la clave contiene algún patrón
-                    if any(patron in key_lower for patron in patrones):
-                        # Si el campo objetivo también está en la clave, es una buena coincidencia
-                        if any(parte in key_lower for parte in campo_objetivo.lower().split('_')):
-                            if isinstance(value, dict) and 'value' in value:
-                                return value['value']
-                            elif not isinstance(value, dict):
-                                return value
-                    
-                    # Búsqueda recursiva
-                    if isinstance(value, dict):
-                        resultado = buscar_en_nivel(value, f"{nivel_actual}.{key}" if nivel_actual else key)
-                        if resultado is not None:
-                            return resultado
-            
-            return None
-        
-        return buscar_en_nivel(datos)
+        """Busca usando patrones específicos (consulta sobre el índice de la factura)."""
+        patrones = tuple(patrones)
+        entrada = self.indexar(datos).primera_que_cumple(
+            lambda clave: _coincide_patron(clave, patrones, campo_objetivo), omitir_nulos=True
+        )
+        return entrada.valor_plano if entrada else None
     
     def _buscar_recursivo(self, datos: dict, campo_objetivo: str) -> Optional[Any]:
-        """Búsqueda recursiva por nombre exacto o similar."""
-        def buscar_en_nivel(obj):
-            if isinstance(obj, dict):
-                # Búsqueda exacta
-                if campo_objetivo in obj:
-                    valor = obj[campo_objetivo]
-                    if isinstance(valor, dict) and 'value' in valor:
-                        return valor['value']
-                    return valor
-                
-                # Búsqueda por similitud
-                for key, value in obj.items():
-                    if self._son_similares(key, campo_objetivo):
-                        if isinstance(value, dict) and 'value' in value:
-                            return value['value']
-                        elif not isinstance(value, dict):
-                            return value
-                
-                # Búsqueda recursiva
-                for value in obj.values():
-                    if isinstance(value, dict):
-                        resultado = buscar_en_nivel(value)
-                        if resultado is not None:
-                            return resultado
-            
-            return None
-        
-        return buscar_en_nivel(datos)
+        """Búsqueda por nombre exacto o similar: en cada nivel gana la clave exacta."""
+        entrada = self.indexar(datos).mejor_por_nivel(
+            campo_objetivo, lambda clave: _similares(clave, campo_objetivo)
+        )
+        return entrada.valor_plano if entrada else None
     
     def _son_similares(self, campo1: str, campo2: str) -> bool:
         """Determina si dos campos son similares."""
-        campo1_clean = campo1.lower().replace('_', '').replace('-', '')
-        campo2_clean = campo2.lower().replace('_', '').replace('-', '')
-        
-        # Coincidencia exacta sin separadores
-        if campo1_clean == campo2_clean:
-            return True
-        
-        # Uno contiene al otro
-        if campo1_clean in campo2_clean or campo2_clean in campo1_clean:
-            return True
-        
-        # Coincidencia de palabras clave
-        palabras1 = set(campo1.lower().split('_'))
-        palabras2 = set(campo2.lower().split('_'))
-        
-        # Al menos 2 palabras en común
-        if len(palabras1.intersection(palabras2)) >= 2:
-            return True
-        
-        return False
+        return _similares(campo1, campo2)
     
     def mapear_factura_completa(self, datos_factura: dict) -> Dict[str, Any]:
         """Mapea una factura completa a estructura esperada por schemas."""
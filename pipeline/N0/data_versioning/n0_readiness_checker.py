@@ -7,9 +7,33 @@ Enfoque pragmático: verifica si N0 tiene los campos críticos necesarios para e
 
 import json
 from pathlib import Path
+import sys
 from typing import Dict, List, Set, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
+
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from path_accessors import get_path
+from field_index import IndiceCampos, CacheIndice, normalizar_clave
+
+# Palabras clave importantes para la similitud entre nombres de campo
+PALABRAS_CLAVE_SIMILITUD = ('consumo', 'potencia', 'factura', 'cups', 'fecha', 'tarifa', 'energia', 'reactiva')
+
+
+@lru_cache(maxsize=65536)
+def _similares(campo1: str, campo2: str) -> bool:
+    """Similitud entre claves, memoizada por pareja entre facturas."""
+    campo1_clean = normalizar_clave(campo1)
+    campo2_clean = normalizar_clave(campo2)
+    
+    # Coincidencia exacta sin separadores o uno contiene al otro
+    if campo1_clean in campo2_clean or campo2_clean in campo1_clean:
+        return True
+    
+    # Coincidencia de palabras clave importantes
+    return any(palabra in campo1_clean and palabra in campo2_clean for palabra in PALABRAS_CLAVE_SIMILITUD)
+
 
 @dataclass
 class CampoEscore:
@@ -132,17 +156,17 @@ class N0ReadinessChecker:
                        "Excedentes de autoconsumo", 
                        ["self_consumption.excedentes_kwh", "autoconsumo.excedentes"])
         ]
+        
+        # Índice de la última factura consultada (una pasada por factura)
+        self._cache_indice = CacheIndice()
+    
+    def indexar(self, datos_factura: dict) -> IndiceCampos:
+        """Devuelve el índice clave → nodos de la factura (reutilizado mientras no cambie)."""
+        return self._cache_indice.obtener(datos_factura)
     
     def extraer_valor_por_ruta(self, datos: dict, ruta: str) -> Optional[any]:
         """Extrae valor siguiendo una ruta con notación punto."""
-        partes = ruta.split('.')
-        valor_actual = datos
-        
-        for parte in partes:
-            if isinstance(valor_actual, dict) and parte in valor_actual:
-                valor_actual = valor_actual[parte]
-            else:
-                return None
+        valor_actual = get_path(datos, ruta)
         
         # Si es un dict con 'value', extraer el valor
         if isinstance(valor_actual, dict) and 'value' in valor_actual:
@@ -172,67 +196,22 @@ class N0ReadinessChecker:
         return None
     
     def _buscar_recursivo(self, datos: dict, campo_objetivo: str, prefijo: str = "") -> Optional[str]:
-        """Búsqueda recursiva por nombre exacto."""
-        if isinstance(datos, dict):
-            for key, value in datos.items():
-                ruta_actual = f"{prefijo}.{key}" if prefijo else key
-                
-                # Coincidencia exacta
-                if key == campo_objetivo:
-                    if isinstance(value, dict) and 'value' in value:
-                        return ruta_actual
-                    elif not isinstance(value, dict):
-                        return ruta_actual
-                
-                # Búsqueda recursiva
-                if isinstance(value, dict):
-                    resultado = self._buscar_recursivo(value, campo_objetivo, ruta_actual)
-                    if resultado:
-                        return resultado
-        
-        return None
+        """Búsqueda por nombre exacto (primer nodo-valor en profundidad)."""
+        entrada = self.indexar(datos).primera_exacta(campo_objetivo)
+        if entrada is None:
+            return None
+        return f"{prefijo}.{entrada.ruta}" if prefijo else entrada.ruta
     
     def _buscar_similar(self, datos: dict, campo_objetivo: str, prefijo: str = "") -> Optional[str]:
-        """Búsqueda por similitud de nombres."""
-        if isinstance(datos, dict):
-            for key, value in datos.items():
-                ruta_actual = f"{prefijo}.{key}" if prefijo else key
-                
-                # Similitud por palabras clave
-                if self._son_similares(key, campo_objetivo):
-                    if isinstance(value, dict) and 'value' in value:
-                        return ruta_actual
-                    elif not isinstance(value, dict):
-                        return ruta_actual
-                
-                # Búsqueda recursiva
-                if isinstance(value, dict):
-                    resultado = self._buscar_similar(value, campo_objetivo, ruta_actual)
-                    if resultado:
-                        return resultado
-        
-        return None
+        """Búsqueda por similitud de nombres (predicado memoizado por clave distinta)."""
+        entrada = self.indexar(datos).primera_que_cumple(lambda clave: _similares(clave, campo_objetivo))
+        if entrada is None:
+            return None
+        return f"{prefijo}.{entrada.ruta}" if prefijo else entrada.ruta
     
     def _son_similares(self, campo1: str, campo2: str) -> bool:
         """Determina si dos campos son similares."""
-        campo1_clean = campo1.lower().replace('_', '').replace('-', '')
-        campo2_clean = campo2.lower().replace('_', '').replace('-', '')
-        
-        # Coincidencia exacta sin separadores
-        if campo1_clean == campo2_clean:
-            return True
-        
-        # Uno contiene al otro
-        if campo1_clean in campo2_clean or campo2_clean in campo1_clean:
-            return True
-        
-        # Coincidencia de palabras clave importantes
-        palabras_clave = ['consumo', 'potencia', 'factura', 'cups', 'fecha', 'tarifa', 'energia', 'reactiva']
-        for palabra in palabras_clave:
-            if palabra in campo1_clean and palabra in campo2_clean:
-                return True
-        
-        return False
+        return _similares(campo1, campo2)
     
     def verificar_preparacion_n0(self, directorio_n0: str = "/Users/vagalumeenergiamovil/PROYECTOS/Entorno/Data_out") -> ResultadoPreparacion:
         """Verifica si N0 está preparado para eSCORE."""
@@ -8,13 +8,21 @@ Verifica que todos los campos de los schemas ES electricity existen en N0 con no
 import os
 import json
 import glob
+import hashlib
 from pathlib import Path
 from typing import Dict, List, Set, Tuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import logging
 from n0_field_mapper import N0FieldMapper
 
+# Versión del formato de la caché de campos de schema
+VERSION_CACHE_SCHEMAS = 1
+
+# Directorio por defecto de la caché de schemas compilados
+DIRECTORIO_CACHE_SCHEMAS = Path(__file__).parent / '.schema_cache'
+
 @dataclass
 class CampoSchema:
     """Información de un campo del schema."""
@@ -34,16 +42,59 @@ class ResultadoValidacion:
     campos_extra_n0: List[str]
     coincidencia_nombres: float
     facturas_validadas: int
-    errores_validacion: List[str]
+    errores_validacion: List[str]  # Muestra acotada de errores
+    total_errores: int = 0
+
+
+# Mapeador por proceso worker (se crea una vez en el inicializador del pool)
+_mapper_worker: Optional[N0FieldMapper] = None
+
+
+def _inicializar_worker():
+    """Crea el mapeador de campos del proceso worker."""
+    global _mapper_worker
+    _mapper_worker = N0FieldMapper()
+
+
+def _validar_lote(rutas: List[str], max_muestras_error: int) -> Tuple[Set[str], int, List[str], int]:
+    """
+    Lee y mapea un lote de facturas, una a una, sin retenerlas en memoria.
+
+    Args:
+        rutas: Rutas de facturas N0 del lote
+        max_muestras_error: Máximo de mensajes de error devueltos
+
+    Returns:
+        (campos mapeados, facturas procesadas, muestra de errores, total errores)
+    """
+    mapper = _mapper_worker or N0FieldMapper()
+    campos = set()
+    procesadas = 0
+    errores = []
+    total_errores = 0
+    for ruta in rutas:
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                datos_factura = json.load(f)
+            campos.update(mapper.mapear_factura_completa(datos_factura).keys())
+            procesadas += 1
+        except Exception as e:
+            total_errores += 1
+            if len(errores) < max_muestras_error:
+                errores.append(f"Error procesando {Path(ruta).name}: {str(e)[:100]}")
+    return campos, procesadas, errores, total_errores
+
 
 class N0SchemaValidator:
     """Validador de schemas N0 contra schemas de electricidad ES."""
     
     def __init__(self, 
                  schemas_path: str = "/Users/vagalumeenergiamovil/PROYECTOS/Entorno/motores/motor_extraccion/schemas/data/ES/electricity",
-                 n0_data_path: str = "/Users/vagalumeenergiamovil/PROYECTOS/Entorno/Data_out"):
+                 n0_data_path: str = "/Users/vagalumeenergiamovil/PROYECTOS/Entorno/Data_out",
+                 cache_dir: Optional[str] = None):
         self.schemas_path = Path(schemas_path)
         self.n0_data_path = Path(n0_data_path)
+        self.cache_dir = Path(cache_dir) if cache_dir else DIRECTORIO_CACHE_SCHEMAS
         self.logger = logging.getLogger(__name__)
         
         # Campos del schema cargados
@@ -71,11 +122,16 @@ class N0SchemaValidator:
             return False
         
         # Buscar todos los archivos JSON de schema
-        patron_schemas = self.schemas_path / "**/*.json"
-        archivos_schema = list(self.schemas_path.glob("**/*.json"))
+        archivos_schema = sorted(self.schemas_path.glob("**/*.json"))
         
         print(f"📄 Encontrados {len(archivos_schema)} archivos de schema")
         
+        # Caché en disco indexada por rutas y mtimes de los schemas
+        archivo_cache = self._ruta_cache_schemas(archivos_schema)
+        if self._cargar_cache_schemas(archivo_cache):
+            print(f"✅ Cargados {len(self.campos_schema)} campos únicos de schemas (caché)")
+            return len(self.campos_schema) > 0
+        
         for archivo_schema in archivos_schema:
             try:
                 with open(archivo_schema, 'r', encoding='utf-8') as f:
@@ -87,9 +143,51 @@ class N0SchemaValidator:
             except Exception as e:
                 print(f"⚠️ Error cargando schema {archivo_schema.name}: {e}")
         
+        self._guardar_cache_schemas(archivo_cache)
         print(f"✅ Cargados {len(self.campos_schema)} campos únicos de schemas")
         return len(self.campos_schema) > 0
     
+    def _ruta_cache_schemas(self, archivos_schema: List[Path]) -> Path:
+        """Fichero de caché cuya clave es el hash de (ruta, tamaño, mtime) de cada schema."""
+        huella = hashlib.sha256(str(self.schemas_path.resolve()).encode('utf-8'))
+        for archivo in archivos_schema:
+            stat = archivo.stat()
+            huella.update(f"{archivo.relative_to(self.schemas_path)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode('utf-8'))
+        return self.cache_dir / f"campos_schema_{huella.hexdigest()[:24]}.json"
+    
+    def _cargar_cache_schemas(self, archivo_cache: Path) -> bool:
+        """Carga los campos compilados desde la caché si es válida."""
+        if not archivo_cache.exists():
+            return False
+        try:
+            with open(archivo_cache, 'r', encoding='utf-8') as f:
+                contenido = json.load(f)
+            if contenido.get('version') != VERSION_CACHE_SCHEMAS:
+                return False
+            self.campos_schema = {c['nombre']: CampoSchema(**c) for c in contenido['campos']}
+            return True
+        except Exception as e:
+            self.logger.warning(f"⚠️ Caché de schemas inválida, se recompila: {e}")
+            return False
+    
+    def _guardar_cache_schemas(self, archivo_cache: Path):
+        """Guarda los campos compilados y elimina cachés obsoletas de este directorio."""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for obsoleta in self.cache_dir.glob("campos_schema_*.json"):
+                if obsoleta != archivo_cache:
+                    obsoleta.unlink()
+            temporal = archivo_cache.with_suffix('.tmp')
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': VERSION_CACHE_SCHEMAS,
+                    'schemas_path': str(self.schemas_path),
+                    'campos': [asdict(c) for c in self.campos_schema.values()]
+                }, f, ensure_ascii=False)
+            os.replace(temporal, archivo_cache)
+        except Exception as e:
+            self.logger.warning(f"⚠️ No se pudo guardar la caché de schemas: {e}")
+    
     def _extraer_campos_schema(self, schema_data: dict, archivo_schema: Path, prefijo: str = ""):
         """Extrae campos de un schema JSON recursivamente."""
         
@@ -126,47 +224,65 @@ class N0SchemaValidator:
                     if isinstance(value, dict):
                         self._extraer_campos_schema(value, archivo_schema, prefijo)
     
-    def validar_facturas_n0(self) -> ResultadoValidacion:
-        """Valida todas las facturas N0 contra los schemas usando mapeo inteligente."""
+    def validar_facturas_n0(self, workers: Optional[int] = None, tam_lote: int = 32,
+                            max_muestras_error: int = 50) -> ResultadoValidacion:
+        """
+        Valida todas las facturas N0 contra los schemas usando mapeo inteligente.
+        Cada factura se valida al leerla (streaming) repartiendo lotes en un pool
+        de procesos; solo se conservan los campos encontrados y una muestra de errores.
+        
+        Args:
+            workers: Procesos del pool (1 = en el proceso actual; None = núcleos)
+            tam_lote: Facturas por lote enviado a cada worker
+            max_muestras_error: Máximo de mensajes de error conservados
+        """
         print(f"\n🔍 Validando facturas N0 en: {self.n0_data_path}")
         
-        facturas_json = list(self.n0_data_path.glob("*.json"))
+        facturas_json = sorted(str(p) for p in self.n0_data_path.glob("*.json"))
         print(f"📄 Encontradas {len(facturas_json)} facturas N0")
         
         campos_n0_mapeados = set()
         errores_validacion = []
-        facturas_procesadas = 0
-        facturas_datos = []
         
-        # Cargar y procesar facturas
-        for i, archivo_factura in enumerate(facturas_json, 1):
-            try:
-                with open(archivo_factura, 'r', encoding='utf-8') as f:
-                    datos_factura = json.load(f)
-                
-                facturas_datos.append(datos_factura)
-                facturas_procesadas += 1
-                
-                if i <= 5:  # Mostrar progreso para las primeras 5
-                    print(f"  📄 {archivo_factura.name}: cargada")
-                
-            except Exception as e:
-                error_msg = f"Error procesando {archivo_factura.name}: {str(e)[:100]}"
-                errores_validacion.append(error_msg)
-                print(f"  ❌ {error_msg}")
+        lotes = [facturas_json[i:i + tam_lote] for i in range(0, len(facturas_json), tam_lote)]
         
-        # Usar mapeo inteligente para encontrar campos
-        print(f"🧠 Aplicando mapeo inteligente de campos...")
+        print(f"🧠 Aplicando mapeo inteligente de campos ({len(lotes)} lotes)...")
         
-        for datos_factura in facturas_datos:
-            factura_mapeada = self.field_mapper.mapear_factura_completa(datos_factura)
-            campos_n0_mapeados.update(factura_mapeada.keys())
+        if workers == 1 or len(lotes) <= 1:
+            resultados = (_validar_lote(lote, max_muestras_error) for lote in lotes)
+            facturas_procesadas, total_errores = self._acumular_lotes(
+                resultados, campos_n0_mapeados, errores_validacion, max_muestras_error)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as executor:
+                resultados = executor.map(_validar_lote, lotes, [max_muestras_error] * len(lotes))
+                facturas_procesadas, total_errores = self._acumular_lotes(
+                    resultados, campos_n0_mapeados, errores_validacion, max_muestras_error)
         
         self.campos_n0_encontrados = campos_n0_mapeados
         print(f"✅ Campos mapeados encontrados: {len(campos_n0_mapeados)}")
         
         # Analizar coincidencias
-        return self._analizar_coincidencias(facturas_procesadas, errores_validacion)
+        return self._analizar_coincidencias(facturas_procesadas, errores_validacion, total_errores)
+    
+    def _acumular_lotes(self, resultados, campos: Set[str], errores: List[str],
+                        max_muestras_error: int) -> Tuple[int, int]:
+        """
+        Fusiona los resultados de cada lote a medida que llegan.
+        
+        Returns:
+            (facturas procesadas, total de errores)
+        """
+        total_procesadas = 0
+        total_errores = 0
+        for campos_lote, procesadas, errores_lote, total_errores_lote in resultados:
+            campos.update(campos_lote)
+            total_procesadas += procesadas
+            total_errores += total_errores_lote
+            for error in errores_lote:
+                if len(errores) < max_muestras_error:
+                    errores.append(error)
+                    print(f"  ❌ {error}")
+        return total_procesadas, total_errores
     
     def _extraer_campos_factura(self, datos_factura: dict, prefijo: str = "") -> Set[str]:
         """Extrae todos los campos de una factura recursivamente."""
@@ -190,7 +306,8 @@ class N0SchemaValidator:
         
         return campos
     
-    def _analizar_coincidencias(self, facturas_procesadas: int, errores: List[str]) -> ResultadoValidacion:
+    def _analizar_coincidencias(self, facturas_procesadas: int, errores: List[str],
+                                total_errores: Optional[int] = None) -> ResultadoValidacion:
         """Analiza las coincidencias entre schemas y datos N0."""
         
         # Aplicar mapeo de nombres alternativos
@@ -219,7 +336,8 @@ class N0SchemaValidator:
             campos_extra_n0=sorted(list(campos_extra)),
             coincidencia_nombres=coincidencia,
             facturas_validadas=facturas_procesadas,
-            errores_validacion=errores
+            errores_validacion=errores,
+            total_errores=total_errores if total_errores is not None else len(errores)
         )
     
     def generar_reporte_validacion(self, resultado: ResultadoValidacion) -> str:
@@ -314,8 +432,9 @@ class N0SchemaValidator:
             reporte.append("")
             for error in resultado.errores_validacion[:5]:
                 reporte.append(f"- {error}")
-            if len(resultado.errores_validacion) > 5:
-                reporte.append(f"- ... y {len(resultado.errores_validacion) - 5} errores más")
+            total_errores = max(resultado.total_errores, len(resultado.errores_validacion))
+            if total_errores > 5:
+                reporte.append(f"- ... y {total_errores - 5} errores más")
             reporte.append("")
         
         # Recomendaciones
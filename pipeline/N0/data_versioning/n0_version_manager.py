@@ -9,12 +9,75 @@ import os
 import json
 import hashlib
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Set
+from typing import Any, Dict, List, Optional, Tuple, Set
 from dataclasses import dataclass, asdict
 import logging
 
+# Pragmas de la conexión: WAL (lectores no bloquean al escritor), fsync solo en checkpoint,
+# 64 MB de caché de páginas y temporales en memoria
+PRAGMAS_SQLITE = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Sentencias fijas: sqlite3 reutiliza la sentencia compilada por texto SQL (cached_statements)
+SQL_INSERTAR_VERSION = '''
+    INSERT INTO facturas_versiones (
+        numero_factura, cups, fecha_factura, archivo_original,
+        hash_contenido, numero_campos, campos_principales, campos_nuevos,
+        version, fecha_procesamiento, tamano_archivo, calidad_extraccion
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SQL_VERSIONES_ACTUALES = '''
+    SELECT * FROM (
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY numero_factura, cups, fecha_factura ORDER BY version DESC
+        ) AS orden
+        FROM facturas_versiones
+    ) WHERE orden = 1
+'''
+
+# Estado de cada fichero de Data_out en el último escaneo: si tamaño y mtime no cambian
+# el fichero no se vuelve a abrir
+SQL_GUARDAR_ESCANEO = '''
+    INSERT INTO archivos_escaneados (ruta, tamano, mtime_ns, hash_contenido, fecha_escaneo)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(ruta) DO UPDATE SET
+        tamano = excluded.tamano,
+        mtime_ns = excluded.mtime_ns,
+        hash_contenido = excluded.hash_contenido,
+        fecha_escaneo = excluded.fecha_escaneo
+'''
+
+# Agregados acumulados (fila única) que se actualizan en cada versión registrada
+SQL_GUARDAR_AGREGADOS = '''
+    INSERT OR REPLACE INTO agregados_extraccion (
+        id, total_facturas_unicas, total_versiones, suma_calidad, version_maxima,
+        excelente, buena, regular, mala, fecha_actualizacion
+    ) VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+NIVELES_CALIDAD = ('excelente', 'buena', 'regular', 'mala')
+
+
+def clasificar_calidad(calidad: float) -> str:
+    """Nivel de calidad de extracción (excelente, buena, regular, mala)."""
+    if calidad >= 0.9:
+        return 'excelente'
+    if calidad >= 0.7:
+        return 'buena'
+    if calidad >= 0.5:
+        return 'regular'
+    return 'mala'
+
 @dataclass
 class FacturaVersion:
     """Información de versión de una factura."""
@@ -58,11 +121,70 @@ class N0VersionManager:
             'datos_tecnicos': ['tarifa_acceso', 'tipo_peaje', 'zona_geografica']
         }
         
+        # Conexión única para todo el proceso (autocommit salvo dentro de lote())
+        self._conn = sqlite3.connect(self.db_path, isolation_level=None, cached_statements=256)
+        self._conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS_SQLITE:
+            self._conn.execute(pragma)
+        self._en_lote = False
+        # Hasta terminar __init__ no hay estado en memoria que recargar tras un ROLLBACK
+        self._inicializado = False
+        
         self._inicializar_bd()
+        
+        # Índice en memoria de la versión actual de cada factura, cargado una vez
+        self._versiones_actuales: Dict[Tuple[str, str, str], FacturaVersion] = {}
+        self._numeros_factura: Set[str] = set()
+        self._cargar_versiones_actuales()
+        
+        # Estado del último escaneo por ruta absoluta: (tamaño, mtime_ns, hash del contenido)
+        self._archivos_escaneados: Dict[str, Tuple[int, int, Optional[str]]] = {}
+        self._cargar_archivos_escaneados()
+        
+        # Agregados acumulados para el reporte (se inicializan una vez desde facturas_versiones)
+        self._agregados: Dict[str, Any] = {}
+        self._cargar_agregados()
+        self._inicializado = True
+    
+    def cerrar(self):
+        """Cierra la conexión (hace checkpoint del WAL)."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.cerrar()
+    
+    @contextmanager
+    def lote(self):
+        """Agrupa los registros de versión en una única transacción (una ejecución de directorio)."""
+        if self._en_lote:
+            yield
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._en_lote = True
+        try:
+            yield
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            if not self._inicializado:
+                raise
+            # El estado en memoria incluía cambios descartados
+            self._cargar_versiones_actuales()
+            self._cargar_archivos_escaneados()
+            self._cargar_agregados()
+            raise
+        finally:
+            self._en_lote = False
     
     def _inicializar_bd(self):
         """Inicializa la base de datos de versiones."""
-        with sqlite3.connect(self.db_path) as conn:
+        conn = self._conn
+        with self.lote():
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS facturas_versiones (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -104,6 +226,37 @@ class N0VersionManager:
                 CREATE INDEX IF NOT EXISTS idx_fecha_procesamiento 
                 ON facturas_versiones(fecha_procesamiento DESC)
             ''')
+            
+            # Solo facturas con más de una versión (top de facturas más actualizadas)
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_facturas_reversionadas
+                ON facturas_versiones(numero_factura) WHERE version > 1
+            ''')
+            
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS archivos_escaneados (
+                    ruta TEXT PRIMARY KEY,
+                    tamano INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    hash_contenido TEXT,  -- NULL si el fichero no se pudo leer
+                    fecha_escaneo TEXT NOT NULL
+                )
+            ''')
+            
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS agregados_extraccion (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_facturas_unicas INTEGER NOT NULL,
+                    total_versiones INTEGER NOT NULL,
+                    suma_calidad REAL NOT NULL,
+                    version_maxima INTEGER,
+                    excelente INTEGER NOT NULL,  -- versiones actuales por nivel de calidad
+                    buena INTEGER NOT NULL,
+                    regular INTEGER NOT NULL,
+                    mala INTEGER NOT NULL,
+                    fecha_actualizacion TEXT NOT NULL
+                )
+            ''')
     
     def calcular_hash_factura(self, datos_factura: dict) -> str:
         """Calcula hash del contenido relevante de la factura."""
@@ -154,33 +307,83 @@ class N0VersionManager:
         
         return min(1.0, calidad_base + bonificacion)
     
+    def _cargar_versiones_actuales(self):
+        """Carga en memoria la versión más reciente de cada factura (una consulta)."""
+        self._versiones_actuales = {}
+        for row in self._conn.execute(SQL_VERSIONES_ACTUALES):
+            version = FacturaVersion(
+                numero_factura=row['numero_factura'],
+                cups=row['cups'],
+                fecha_factura=row['fecha_factura'],
+                archivo_original=row['archivo_original'],
+                hash_contenido=row['hash_contenido'],
+                numero_campos=row['numero_campos'],
+                campos_principales=json.loads(row['campos_principales']),
+                campos_nuevos=json.loads(row['campos_nuevos'] or '[]'),
+                version=row['version'],
+                fecha_procesamiento=row['fecha_procesamiento'],
+                tamano_archivo=row['tamano_archivo'],
+                calidad_extraccion=row['calidad_extraccion']
+            )
+            self._versiones_actuales[(version.numero_factura, version.cups, version.fecha_factura)] = version
+        self._numeros_factura = {clave[0] for clave in self._versiones_actuales}
+        self.logger.info(f"📚 Versiones actuales cargadas: {len(self._versiones_actuales)}")
+    
+    def _cargar_archivos_escaneados(self):
+        """Carga en memoria el estado del último escaneo de Data_out."""
+        self._archivos_escaneados = {
+            row['ruta']: (row['tamano'], row['mtime_ns'], row['hash_contenido'])
+            for row in self._conn.execute('SELECT * FROM archivos_escaneados')
+        }
+    
+    def _cargar_agregados(self):
+        """Carga los agregados acumulados; la primera vez los calcula desde facturas_versiones."""
+        row = self._conn.execute('SELECT * FROM agregados_extraccion WHERE id = 1').fetchone()
+        if row is not None:
+            self._agregados = dict(row)
+            return
+        
+        # Inicialización única (BD creada antes de existir la tabla de agregados)
+        row = self._conn.execute('''
+            SELECT COUNT(DISTINCT numero_factura) AS total_facturas_unicas,
+                   COUNT(*) AS total_versiones,
+                   COALESCE(SUM(calidad_extraccion), 0) AS suma_calidad,
+                   MAX(version) AS version_maxima
+            FROM facturas_versiones
+        ''').fetchone()
+        self._agregados = dict(row)
+        self._agregados.update({nivel: 0 for nivel in NIVELES_CALIDAD})
+        for version in self._versiones_actuales.values():
+            self._agregados[clasificar_calidad(version.calidad_extraccion)] += 1
+        self._guardar_agregados()
+    
+    def _guardar_agregados(self):
+        """Persiste la fila de agregados (dentro de lote() se confirma con las versiones)."""
+        self._agregados['fecha_actualizacion'] = datetime.now().isoformat()
+        a = self._agregados
+        self._conn.execute(SQL_GUARDAR_AGREGADOS, (
+            a['total_facturas_unicas'], a['total_versiones'], a['suma_calidad'], a['version_maxima'],
+            a['excelente'], a['buena'], a['regular'], a['mala'], a['fecha_actualizacion']
+        ))
+    
+    def _actualizar_agregados(self, nueva: FacturaVersion, anterior: Optional[FacturaVersion]):
+        """Suma una versión nueva a los agregados acumulados."""
+        a = self._agregados
+        if nueva.numero_factura not in self._numeros_factura:
+            self._numeros_factura.add(nueva.numero_factura)
+            a['total_facturas_unicas'] += 1
+        a['total_versiones'] += 1
+        a['suma_calidad'] += nueva.calidad_extraccion
+        a['version_maxima'] = max(a['version_maxima'] or 0, nueva.version)
+        # La distribución de calidad cuenta solo la versión actual de cada factura
+        if anterior is not None:
+            a[clasificar_calidad(anterior.calidad_extraccion)] -= 1
+        a[clasificar_calidad(nueva.calidad_extraccion)] += 1
+        self._guardar_agregados()
+    
     def obtener_version_actual(self, numero_factura: str, cups: str, fecha_factura: str) -> Optional[FacturaVersion]:
         """Obtiene la versión más reciente de una factura."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute('''
-                SELECT * FROM facturas_versiones 
-                WHERE numero_factura = ? AND cups = ? AND fecha_factura = ?
-                ORDER BY version DESC LIMIT 1
-            ''', (numero_factura, cups, fecha_factura))
-            
-            row = cursor.fetchone()
-            if row:
-                return FacturaVersion(
-                    numero_factura=row['numero_factura'],
-                    cups=row['cups'],
-                    fecha_factura=row['fecha_factura'],
-                    archivo_original=row['archivo_original'],
-                    hash_contenido=row['hash_contenido'],
-                    numero_campos=row['numero_campos'],
-                    campos_principales=json.loads(row['campos_principales']),
-                    campos_nuevos=json.loads(row['campos_nuevos'] or '[]'),
-                    version=row['version'],
-                    fecha_procesamiento=row['fecha_procesamiento'],
-                    tamano_archivo=row['tamano_archivo'],
-                    calidad_extraccion=row['calidad_extraccion']
-                )
-        return None
+        return self._versiones_actuales.get((numero_factura, cups, fecha_factura))
     
     def debe_actualizar_factura(self, archivo_factura: Path, datos_factura: dict) -> Tuple[bool, str]:
         """Determina si una factura debe actualizarse."""
@@ -249,102 +452,173 @@ class N0VersionManager:
             calidad_extraccion=calidad
         )
         
-        # Guardar en BD
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                INSERT INTO facturas_versiones (
-                    numero_factura, cups, fecha_factura, archivo_original,
-                    hash_contenido, numero_campos, campos_principales, campos_nuevos,
-                    version, fecha_procesamiento, tamano_archivo, calidad_extraccion
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                factura_version.numero_factura,
-                factura_version.cups,
-                factura_version.fecha_factura,
-                factura_version.archivo_original,
-                factura_version.hash_contenido,
-                factura_version.numero_campos,
-                json.dumps(factura_version.campos_principales),
-                json.dumps(factura_version.campos_nuevos),
-                factura_version.version,
-                factura_version.fecha_procesamiento,
-                factura_version.tamano_archivo,
-                factura_version.calidad_extraccion
-            ))
+        # Guardar en BD (dentro de lote() se confirma al final del directorio)
+        self._conn.execute(SQL_INSERTAR_VERSION, (
+            factura_version.numero_factura,
+            factura_version.cups,
+            factura_version.fecha_factura,
+            factura_version.archivo_original,
+            factura_version.hash_contenido,
+            factura_version.numero_campos,
+            json.dumps(factura_version.campos_principales),
+            json.dumps(factura_version.campos_nuevos),
+            factura_version.version,
+            factura_version.fecha_procesamiento,
+            factura_version.tamano_archivo,
+            factura_version.calidad_extraccion
+        ))
+        self._versiones_actuales[(numero_factura, cups, fecha_factura)] = factura_version
+        self._actualizar_agregados(factura_version, version_anterior)
         
         return factura_version
     
-    def procesar_directorio_facturas(self) -> Dict[str, any]:
-        """Procesa todas las facturas del directorio y actualiza versiones."""
+    def _escanear_directorio(self, incremental: bool = True) -> Tuple[List[Tuple[Path, os.stat_result]], int, int]:
+        """Recorre Data_out con os.scandir y devuelve los ficheros cuyo tamaño o mtime cambió.
+        
+        Returns:
+            (pendientes [(ruta, stat)], total de ficheros JSON, ficheros sin cambios)
+        """
+        pendientes = []
+        vistos = set()
+        sin_cambios = 0
+        with os.scandir(self.data_dir) as entradas:
+            for entrada in entradas:
+                if not entrada.name.endswith('.json') or not entrada.is_file():
+                    continue
+                ruta = self._ruta_escaneo(entrada.path)
+                vistos.add(ruta)
+                stat = entrada.stat()
+                previo = self._archivos_escaneados.get(ruta)
+                # Los ficheros que fallaron (hash None) se reintentan aunque no cambien
+                if (incremental and previo and previo[2] is not None
+                        and previo[:2] == (stat.st_size, stat.st_mtime_ns)):
+                    sin_cambios += 1
+                    continue
+                pendientes.append((Path(ruta), stat))
+        
+        # Ficheros que ya no están en el directorio
+        eliminados = [ruta for ruta in self._archivos_escaneados if ruta not in vistos]
+        if eliminados:
+            self._conn.executemany('DELETE FROM archivos_escaneados WHERE ruta = ?', [(r,) for r in eliminados])
+            for ruta in eliminados:
+                del self._archivos_escaneados[ruta]
+        
+        pendientes.sort(key=lambda p: p[0].name)
+        return pendientes, len(vistos), sin_cambios
+    
+    @staticmethod
+    def _ruta_escaneo(ruta) -> str:
+        """Clave de archivos_escaneados: ruta absoluta normalizada (independiente de data_dir)."""
+        return os.path.abspath(ruta)
+    
+    def _guardar_escaneo(self, archivo: Path, stat: os.stat_result, hash_contenido: Optional[str]):
+        """Registra tamaño, mtime y hash con los que se procesó el fichero (None si falló)."""
+        ruta = self._ruta_escaneo(archivo)
+        self._conn.execute(SQL_GUARDAR_ESCANEO, (
+            ruta, stat.st_size, stat.st_mtime_ns, hash_contenido, datetime.now().isoformat()
+        ))
+        self._archivos_escaneados[ruta] = (stat.st_size, stat.st_mtime_ns, hash_contenido)
+    
+    def procesar_directorio_facturas(self, incremental: bool = True) -> Dict[str, Any]:
+        """Procesa las facturas del directorio y actualiza versiones.
+        
+        En modo incremental solo se abren los ficheros nuevos o cuyo tamaño/mtime cambió
+        desde el último escaneo; incremental=False relee todo el directorio.
+        """
         print(f"\n🔍 Procesando facturas en: {self.data_dir}")
         print("=" * 80)
         
-        facturas_json = list(self.data_dir.glob("*.json"))
         resultados = {
-            'total_facturas': len(facturas_json),
+            'total_facturas': 0,
             'facturas_nuevas': 0,
             'facturas_actualizadas': 0,
             'facturas_ignoradas': 0,
+            'facturas_sin_cambios': 0,
             'errores': 0,
             'mejoras_detectadas': [],
-            'estadisticas_calidad': {'excelente': 0, 'buena': 0, 'regular': 0, 'mala': 0}
+            'estadisticas_calidad': {nivel: 0 for nivel in NIVELES_CALIDAD}
         }
         
-        for i, archivo_factura in enumerate(facturas_json, 1):
-            print(f"\n📄 [{i}/{len(facturas_json)}] {archivo_factura.name}")
+        # Todas las versiones del directorio en una transacción
+        with self.lote():
+            pendientes, resultados['total_facturas'], resultados['facturas_sin_cambios'] = \
+                self._escanear_directorio(incremental)
+            print(f"📂 {resultados['total_facturas']} facturas, {len(pendientes)} nuevas o modificadas, "
+                  f"{resultados['facturas_sin_cambios']} sin cambios")
             
-            try:
-                # Cargar factura
-                with open(archivo_factura, 'r', encoding='utf-8') as f:
-                    datos_factura = json.load(f)
+            for i, (archivo_factura, stat) in enumerate(pendientes, 1):
+                print(f"\n📄 [{i}/{len(pendientes)}] {archivo_factura.name}")
+                
+                # Cada factura en su savepoint: un fallo a mitad no deja filas sueltas
+                self._conn.execute("SAVEPOINT factura")
+                cambios_previos = self._conn.total_changes
+                try:
+                    # Cargar factura
+                    with open(archivo_factura, 'r', encoding='utf-8') as f:
+                        datos_factura = json.load(f)
+                    
+                    # Mismo contenido con otro mtime (copia, touch): solo se actualiza el escaneo
+                    hash_contenido = self.calcular_hash_factura(datos_factura)
+                    previo = self._archivos_escaneados.get(self._ruta_escaneo(archivo_factura))
+                    if incremental and previo and previo[2] == hash_contenido:
+                        self._guardar_escaneo(archivo_factura, stat, hash_contenido)
+                        self._conn.execute("RELEASE SAVEPOINT factura")
+                        resultados['facturas_sin_cambios'] += 1
+                        print("  ⏭️ Sin cambios de contenido")
+                        continue
                 
-                # Verificar si debe actualizarse
-                debe_actualizar, razon = self.debe_actualizar_factura(archivo_factura, datos_factura)
+                    # Verificar si debe actualizarse
+                    debe_actualizar, razon = self.debe_actualizar_factura(archivo_factura, datos_factura)
                 
-                if debe_actualizar:
-                    # Registrar nueva versión
-                    version = self.registrar_version_factura(archivo_factura, datos_factura)
+                    if debe_actualizar:
+                        # Registrar nueva versión
+                        version = self.registrar_version_factura(archivo_factura, datos_factura)
                     
-                    if version.version == 1:
-                        resultados['facturas_nuevas'] += 1
-                        print(f"  ✅ Nueva factura registrada (v{version.version})")
-                    else:
-                        resultados['facturas_actualizadas'] += 1
-                        print(f"  🔄 Factura actualizada (v{version.version})")
+                        if version.version == 1:
+                            resultados['facturas_nuevas'] += 1
+                            print(f"  ✅ Nueva factura registrada (v{version.version})")
+                        else:
+                            resultados['facturas_actualizadas'] += 1
+                            print(f"  🔄 Factura actualizada (v{version.version})")
                         
-                        if version.campos_nuevos:
-                            mejora = {
-                                'factura': archivo_factura.name,
-                                'version_anterior': version.version - 1,
-                                'version_nueva': version.version,
-                                'campos_nuevos': version.campos_nuevos,
-                                'mejora_calidad': version.calidad_extraccion
-                            }
-                            resultados['mejoras_detectadas'].append(mejora)
+                            if version.campos_nuevos:
+                                mejora = {
+                                    'factura': archivo_factura.name,
+                                    'version_anterior': version.version - 1,
+                                    'version_nueva': version.version,
+                                    'campos_nuevos': version.campos_nuevos,
+                                    'mejora_calidad': version.calidad_extraccion
+                                }
+                                resultados['mejoras_detectadas'].append(mejora)
                     
-                    print(f"     📊 Campos: {version.numero_campos}")
-                    print(f"     🎯 Calidad: {version.calidad_extraccion:.2f}")
+                        print(f"     📊 Campos: {version.numero_campos}")
+                        print(f"     🎯 Calidad: {version.calidad_extraccion:.2f}")
                     
-                    # Clasificar calidad
-                    if version.calidad_extraccion >= 0.9:
-                        resultados['estadisticas_calidad']['excelente'] += 1
-                    elif version.calidad_extraccion >= 0.7:
-                        resultados['estadisticas_calidad']['buena'] += 1
-                    elif version.calidad_extraccion >= 0.5:
-                        resultados['estadisticas_calidad']['regular'] += 1
-                    else:
-                        resultados['estadisticas_calidad']['mala'] += 1
+                        # Clasificar calidad
+                        resultados['estadisticas_calidad'][clasificar_calidad(version.calidad_extraccion)] += 1
                         
-                else:
-                    resultados['facturas_ignoradas'] += 1
-                    print(f"  ⏭️ Ignorada: {razon}")
+                    else:
+                        resultados['facturas_ignoradas'] += 1
+                        print(f"  ⏭️ Ignorada: {razon}")
+                    
+                    # Solo se marca como escaneada una vez procesada sin errores
+                    self._guardar_escaneo(archivo_factura, stat, hash_contenido)
+                    self._conn.execute("RELEASE SAVEPOINT factura")
                 
-            except Exception as e:
-                resultados['errores'] += 1
-                print(f"  ❌ Error: {str(e)[:100]}...")
+                except Exception as e:
+                    resultados['errores'] += 1
+                    print(f"  ❌ Error: {str(e)[:100]}...")
+                    self._conn.execute("ROLLBACK TO SAVEPOINT factura")
+                    self._conn.execute("RELEASE SAVEPOINT factura")
+                    if self._conn.total_changes != cambios_previos:
+                        # El estado en memoria puede incluir la versión descartada
+                        self._cargar_versiones_actuales()
+                        self._cargar_agregados()
+                    # Sin hash: se vuelve a procesar en la siguiente ejecución
+                    self._guardar_escaneo(archivo_factura, stat, None)
         
-        # Guardar estadísticas de mejora
-        self._guardar_estadisticas_mejora(resultados)
+            # Guardar estadísticas de mejora
+            self._guardar_estadisticas_mejora(resultados)
         
         return resultados
     
@@ -358,8 +632,8 @@ class N0VersionManager:
             facturas_por_calidad=resultados['estadisticas_calidad']
         )
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
+        with self.lote():
+            self._conn.execute('''
                 INSERT INTO mejoras_extraccion (
                     fecha_analisis, total_facturas, facturas_actualizadas,
                     campos_nuevos_detectados, mejora_promedio_calidad,
@@ -377,42 +651,43 @@ class N0VersionManager:
     
     def generar_reporte_mejoras(self) -> dict:
         """Genera reporte de mejoras en extracción."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            
-            # Estadísticas generales
-            cursor = conn.execute('''
-                SELECT 
-                    COUNT(DISTINCT numero_factura) as total_facturas_unicas,
-                    COUNT(*) as total_versiones,
-                    AVG(calidad_extraccion) as calidad_promedio,
-                    MAX(version) as version_maxima
-                FROM facturas_versiones
-            ''')
-            stats_generales = cursor.fetchone()
-            
-            # Mejoras recientes (último mes)
-            cursor = conn.execute('''
-                SELECT * FROM mejoras_extraccion 
-                WHERE fecha_creacion >= date('now', '-30 days')
-                ORDER BY fecha_creacion DESC
-            ''')
-            mejoras_recientes = cursor.fetchall()
-            
-            # Top facturas con más versiones
-            cursor = conn.execute('''
-                SELECT numero_factura, cups, COUNT(*) as num_versiones,
-                       MAX(calidad_extraccion) as mejor_calidad
-                FROM facturas_versiones 
-                GROUP BY numero_factura, cups
-                HAVING num_versiones > 1
-                ORDER BY num_versiones DESC, mejor_calidad DESC
-                LIMIT 10
-            ''')
-            top_actualizadas = cursor.fetchall()
+        conn = self._conn
+        
+        # Estadísticas generales desde los agregados acumulados (sin recorrer facturas_versiones)
+        a = self._agregados
+        stats_generales = {
+            'total_facturas_unicas': a['total_facturas_unicas'],
+            'total_versiones': a['total_versiones'],
+            'calidad_promedio': a['suma_calidad'] / a['total_versiones'] if a['total_versiones'] else None,
+            'version_maxima': a['version_maxima'],
+        }
+        
+        # Mejoras recientes (último mes)
+        cursor = conn.execute('''
+            SELECT * FROM mejoras_extraccion 
+            WHERE fecha_creacion >= date('now', '-30 days')
+            ORDER BY fecha_creacion DESC
+        ''')
+        mejoras_recientes = cursor.fetchall()
+        
+        # Top facturas con más versiones (solo las que tienen alguna versión > 1)
+        cursor = conn.execute('''
+            SELECT numero_factura, cups, COUNT(*) as num_versiones,
+                   MAX(calidad_extraccion) as mejor_calidad
+            FROM facturas_versiones 
+            WHERE numero_factura IN (
+                SELECT numero_factura FROM facturas_versiones WHERE version > 1
+            )
+            GROUP BY numero_factura, cups
+            HAVING num_versiones > 1
+            ORDER BY num_versiones DESC, mejor_calidad DESC
+            LIMIT 10
+        ''')
+        top_actualizadas = cursor.fetchall()
         
         return {
-            'estadisticas_generales': dict(stats_generales),
+            'estadisticas_generales': stats_generales,
+            'distribucion_calidad': {nivel: a[nivel] for nivel in NIVELES_CALIDAD},
             'mejoras_recientes': [dict(row) for row in mejoras_recientes],
             'facturas_mas_actualizadas': [dict(row) for row in top_actualizadas],
             'fecha_reporte': datetime.now().isoformat()
@@ -430,8 +705,10 @@ class N0VersionManager:
         print(f"\n📈 ESTADÍSTICAS GENERALES:")
         print(f"  • Facturas únicas: {stats['total_facturas_unicas']}")
         print(f"  • Total versiones: {stats['total_versiones']}")
-        print(f"  • Calidad promedio: {stats['calidad_promedio']:.2f}")
+        print(f"  • Calidad promedio: {stats['calidad_promedio'] or 0:.2f}")
         print(f"  • Versión máxima: {stats['version_maxima']}")
+        print(f"  • Calidad (versión actual): " +
+              ", ".join(f"{nivel} {n}" for nivel, n in reporte['distribucion_calidad'].items()))
         
         if reporte['mejoras_recientes']:
             print(f"\n🔄 MEJORAS RECIENTES (último mes):")
@@ -461,6 +738,7 @@ def main():
     print(f"✅ Facturas nuevas: {resultados['facturas_nuevas']}")
     print(f"🔄 Facturas actualizadas: {resultados['facturas_actualizadas']}")
     print(f"⏭️ Facturas ignoradas: {resultados['facturas_ignoradas']}")
+    print(f"💤 Sin cambios desde el último escaneo: {resultados['facturas_sin_cambios']}")
     print(f"❌ Errores: {resultados['errores']}")
     
     if resultados['mejoras_detectadas']:
@@ -474,6 +752,7 @@ def main():
     
     # Generar reporte completo
     manager.imprimir_reporte_completo()
+    manager.cerrar()
 
 if __name__ == "__main__":
     main()
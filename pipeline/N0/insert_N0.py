@@ -128,19 +128,14 @@ class N0Inserter:
             
             # IDs insertados para referencias FK
             ids_insertados = {}
-            
-            for tabla in orden_insercion:
-                # Solo procesar tablas que tenemos mapeador
-                if tabla not in self.tabla_mapper:
-                    continue
-                    
+
+            # Mapear todas las tablas en una sola pasada (secciones resueltas una vez)
+            tablas_mapeadas = self.mapeos.mapear_documento(
+                datos_aplanados, [t for t in orden_insercion if t in self.tabla_mapper]
+            )
+
+            for tabla, datos_mapeados in tablas_mapeadas.items():
                 try:
-                    # Obtener función de mapeo
-                    mapper_func = self.tabla_mapper[tabla]
-                    
-                    # Mapear datos
-                    datos_mapeados = mapper_func(datos_aplanados)
-                    
                     # Agregar FK si es necesario
                     if tabla == 'supply_address' and 'supply_point' in ids_insertados:
                         datos_mapeados['supply_point_id'] = ids_insertados['supply_point']
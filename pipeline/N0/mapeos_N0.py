@@ -3,680 +3,379 @@
 """
 Mapeos centralizados para N0 - Extrae la lógica de mapeo del insertador
 para mantener el código más limpio y mantenible.
+
+Los mapeos son DECLARATIVOS: cada tabla es una lista de campo(columna, rutas...)
+que se compila una vez al importar (ver pipeline/shared/mapping_compiler.py).
 """
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Iterable
+from pathlib import Path
 import logging
-import re
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent / 'shared'))
+from path_accessors import get_path
+from mapping_compiler import ProgramaMapeo, campo, buscar_clave_con_sufijo, parsear_fecha
 
 logger = logging.getLogger(__name__)
 
+# Centinela para distinguir ruta inexistente de valor None
+_AUSENTE = object()
+
+PERIODOS = range(1, 7)
+
+
+def limpiar_valor_n0(valor: Any, es_cups: bool) -> Any:
+    """Normalización N0: recorta cadenas, limita CUPS a 22 caracteres y vacíos → None."""
+    if isinstance(valor, str):
+        valor = valor.strip()
+        # Validación especial para CUPS - máximo 22 caracteres
+        if es_cups and len(valor) > 22:
+            logger.warning(f"CUPS excede 22 caracteres: {valor[:10]}... (largo: {len(valor)})")
+            valor = valor[:22]
+    return valor if valor else None
+
+
+def _impuesto(posicion: int):
+    """Resolutor de sección para invoice_summary.impuestos[posicion]."""
+    def resolver(datos: dict) -> Any:
+        impuestos = get_path(datos, 'invoice_summary.impuestos')
+        if isinstance(impuestos, list) and len(impuestos) > posicion:
+            return impuestos[posicion]
+        return None
+    return resolver
+
+
+def _por_periodo(columna: str, *fuentes: str, **opciones) -> List:
+    """Expande un campo con '{p}' a los seis periodos P1-P6."""
+    return [campo(columna.format(p=p), *(f.format(p=p) for f in fuentes), **opciones) for p in PERIODOS]
+
+
+def _directos(seccion: str, columnas: Iterable[str]) -> List:
+    """Campos cuya columna BD coincide con la clave en la sección."""
+    return [campo(c, f'{seccion}:{c}') for c in columnas]
+
+
+def _crudos(seccion: str, columnas: Iterable[str]) -> List:
+    """Como _directos, pero con el valor tal cual (0, False y '' se conservan)."""
+    return [campo(c, f'{seccion}:{c}', crudo=True) for c in columnas]
+
+
+# =============================================================================
+# SECCIONES DEL JSON N0 (se resuelven una vez por documento)
+# =============================================================================
+
+SECCIONES_N0 = {
+    'client': ('client',),
+    'provider': ('provider',),
+    'direccion_fiscal': ('provider.direccion_fiscal',),
+    'supply_point': ('supply_point',),
+    'supply_address': (
+        'supply_point.datos_suministro.direccion_suministro',
+        'supply_address',
+        'direccion_suministro',
+        'address',
+        'supply_point.address',
+    ),
+    # Busca con cualquier sufijo numérico (NxM) y, si no, la clave sin sufijo
+    'contract': ('contract_NxM', 'contract'),
+    'consumo': ('energy_consumption', 'consumo_energia', 'consumption'),
+    'termino_potencia': ('termino_potencia',),
+    'invoice': ('invoice_NxM', 'invoice', 'factura'),
+    'metadata': ('metadata',),
+    'metering': ('metering_NxM', 'metering', 'medicion'),
+    'sustainability': ('sustainability',),
+    'invoice_summary': ('invoice_summary',),
+    'impuesto_1': (_impuesto(0),),
+    'impuesto_2': (_impuesto(1),),
+}
+
+# =============================================================================
+# TABLAS N0: columna BD ← rutas fuente (la primera con valor gana)
+# =============================================================================
+
+TABLAS_N0 = {
+    # CORREGIDO para datos aplanados por flattener (nif_titular ya procesado)
+    'client': [
+        campo('nombre_cliente', 'client:nombre_cliente', 'client:titular', 'client:nombre_titular', 'titular_contrato'),
+        campo('nif_titular_value', 'client:nif_titular_value', 'client:nif', 'nif_titular'),
+        *_crudos('client', ('nif_titular_confidence', 'nif_titular_pattern', 'nif_titular_source')),
+    ],
+    'provider': _crudos('provider', (
+        'nif_proveedor', 'email_proveedor', 'web_proveedor', 'entidad_bancaria', 'datos_bancarios_iban')),
+    'direccion_fiscal': [
+        campo('provider_id'),  # Se asociará posteriormente
+        *_crudos('direccion_fiscal', (
+            'codigo_postal', 'comunidad_autonoma', 'municipio', 'nombre_via', 'numero',
+            'pais', 'planta', 'poblacion', 'provincia', 'puerta', 'tipo_via')),
+    ],
+    # NOTA: direccion_suministro_* NO existe en esquema BD real - datos van a tabla supply_address
+    'supply_point': [
+        campo('cups', 'supply_point:cups', 'contract.cups_electricidad', 'cups'),
+        campo('numero_contrato_poliza', 'supply_point:numero_contrato_poliza', 'supply_point:poliza', 'numero_poliza'),
+    ],
+    'supply_address': [
+        campo('codigo_postal', 'supply_address:codigo_postal', 'supply_address:cp', 'supply_address:postal_code'),
+        campo('comunidad_autonoma', 'supply_address:comunidad_autonoma', 'supply_address:ca',
+              'supply_address:autonomous_community'),
+        campo('municipio', 'supply_address:municipio', 'supply_address:municipality'),
+        campo('nombre_via', 'supply_address:nombre_via', 'supply_address:calle', 'supply_address:street_name'),
+        campo('numero', 'supply_address:numero', 'supply_address:number'),
+        campo('pais', 'supply_address:pais', 'supply_address:country'),
+        campo('planta', 'supply_address:planta', 'supply_address:floor'),
+        campo('poblacion', 'supply_address:poblacion', 'supply_address:city', 'supply_address:town'),
+        campo('provincia', 'supply_address:provincia', 'supply_address:province'),
+        campo('puerta', 'supply_address:puerta', 'supply_address:door'),
+        campo('tipo_via', 'supply_address:tipo_via', 'supply_address:street_type'),
+    ],
+    'contract': [
+        campo('comercializadora', 'contract:comercializadora', 'comercializadora'),
+        campo('numero_contrato_comercializadora', 'contract:numero_contrato_comercializadora',
+              'contract:numero_contrato'),
+        campo('fecha_inicio_contrato', 'contract:fecha_inicio_contrato', transformacion='fecha'),
+        campo('fecha_fin_contrato', 'contract:fecha_fin_contrato', transformacion='fecha'),
+        campo('distribuidora', 'contract:distribuidora', 'distribuidora'),
+        campo('numero_contrato_distribuidora', 'contract:numero_contrato_distribuidora'),
+        campo('cups_electricidad', 'contract:cups_electricidad', 'contract:cups', 'cups'),
+        campo('nombre_producto', 'contract:nombre_producto', 'contract:producto'),
+        campo('mercado', 'contract:mercado', 'contract:tipo_mercado'),
+        campo('tarifa_acceso', 'contract:tarifa_acceso', 'contract:tarifa'),
+        # Potencias contratadas y precios unitarios de potencia P1-P6
+        *_por_periodo('potencia_contratada_p{p}', 'contract:potencia_contratada_p{p}', 'contract:potencia_p{p}'),
+        *_por_periodo('precio_unitario_potencia_p{p}', 'contract:precio_unitario_potencia_p{p}',
+                      'contract:precio_potencia_p{p}'),
+    ],
+    'energy_consumption': [
+        campo('inicio_periodo', 'consumo:inicio_periodo', 'consumo:fecha_inicio', transformacion='fecha'),
+        campo('fin_periodo', 'consumo:fin_periodo', 'consumo:fecha_fin', transformacion='fecha'),
+        campo('consumo_medido_kwh', 'consumo:consumo_medido_kwh', 'consumo:consumo_real_kwh'),
+        campo('consumo_facturado_kwh', 'consumo:consumo_facturado_kwh', 'consumo:consumo_kwh'),
+        campo('consumo_kwh', 'consumo:consumo_kwh', 'consumo:consumo_facturado_kwh', 'consumo:consumo_medido_kwh'),
+        # Precios por componente
+        campo('precio_peaje_eur_kwh', 'consumo:precio_peaje_eur_kwh', 'consumo:precio_peaje'),
+        campo('precio_energia_eur_kwh', 'consumo:precio_energia_eur_kwh', 'consumo:precio_energia'),
+        campo('precio_cargos_eur_kwh', 'consumo:precio_cargos_eur_kwh', 'consumo:precio_cargos'),
+        campo('margen_comercializadora_eur_kwh', 'consumo:margen_comercializadora_eur_kwh',
+              'consumo:margen_comercializadora'),
+        campo('precio_total_energia_eur_kwh', 'consumo:precio_total_energia_eur_kwh', 'consumo:precio_total'),
+        # Costes por componente
+        campo('coste_peaje_eur', 'consumo:coste_peaje_eur', 'consumo:coste_peaje'),
+        campo('coste_energia_eur', 'consumo:coste_energia_eur', 'consumo:coste_energia'),
+        campo('coste_cargos_eur', 'consumo:coste_cargos_eur', 'consumo:coste_cargos'),
+        campo('coste_margen_comercializadora_eur', 'consumo:coste_margen_comercializadora_eur',
+              'consumo:coste_margen_comercializadora'),
+        campo('coste_total_energia_eur', 'consumo:coste_total_energia_eur', 'consumo:coste_total'),
+    ],
+    'power_term': [
+        campo('periodo', 'termino_potencia:periodo', default='P1'),
+        *_directos('termino_potencia', (
+            'potencia_contratada_kw', 'dias_facturacion', 'precio_potencia_eur_kw_dia', 'coste_potencia_eur')),
+    ],
+    'invoice': [
+        campo('año', 'invoice:año', 'invoice:ano'),
+        campo('fecha_inicio_periodo', 'invoice:fecha_inicio_periodo', transformacion='fecha'),
+        campo('fecha_fin_periodo', 'invoice:fecha_fin_periodo', transformacion='fecha'),
+        *_directos('invoice', ('dias_periodo_facturado', 'numero_factura_rectificada')),
+        campo('fecha_cargo', 'invoice:fecha_cargo', transformacion='fecha'),
+        *_directos('invoice', (
+            'total_a_pagar', 'tipo_iva', 'importe_iva', 'porcentaje_impuesto_electricidad',
+            'importe_impuesto_electricidad', 'bono_social', 'coste_energia_total', 'coste_potencia_total',
+            'coste_otro_concepto', 'coste_otro_servicio', 'coste_promedio_diario_eur', 'alquiler_contador',
+            'ajuste_mecanismo_iberico', 'descuento_energia', 'descuento_potencia', 'descuento_servicio',
+            'descuento_otro_concepto')),
+        # Consumos P1-P6 - mapeo expandido
+        *_por_periodo('consumo_kwh_p{p}', 'invoice:consumo_facturado_kwh_p{p}', 'invoice:consumo_medido_kwh_p{p}'),
+        # Precios y costes de energía P1-P6
+        *_directos('invoice', (f'{prefijo}_p{p}' for prefijo in (
+            'precio_peaje', 'precio_energia', 'precio_cargos_energia', 'margen_comercializadora',
+            'coste_peaje', 'coste_energia', 'coste_cargos_energia', 'coste_margen_comercializadora',
+            'coste_total_energia') for p in PERIODOS)),
+        # Potencia y Reactiva/Capacitiva
+        campo('consumo_promedio_diario_kwh', 'invoice:consumo_promedio_diario_kwh'),
+        *_directos('invoice', (f'{prefijo}_p{p}' for prefijo in (
+            'potencia_facturada', 'potencia_maxima_demandada_factura', 'potencia_maxima_demandada_año_kw',
+            'consumo_medido_reactiva', 'consumo_facturado_reactiva',
+            'consumo_medido_capacitiva', 'consumo_facturado_capacitiva') for p in PERIODOS)),
+        # Reactiva
+        *_directos('invoice', (f'{prefijo}_p{p}' for p in PERIODOS for prefijo in (
+            'energia_reactiva_facturar', 'penalizacion_reactiva'))),
+        # Autoconsumo y otros - CORREGIDO: campo real es 'autoconsumo'
+        campo('autoconsumo', 'invoice:autoconsumo', 'invoice:self_consumption'),
+        *_directos('invoice', ('energia_vertida_kwh', 'importe_compensacion_excedentes', 'url_qr_comparador_cnmc')),
+        # Potencia por período P1-P6 - precios y costes
+        *_directos('invoice', (f'{prefijo}_p{p}' for prefijo in (
+            'precio_peaje_potencia', 'precio_potencia', 'precio_cargos_potencia',
+            'margen_comercializadora_potencia', 'precio_total_potencia',
+            'coste_peaje_potencia', 'coste_potencia', 'coste_cargos_potencia',
+            'coste_margen_comercializadora_potencia', 'coste_total_potencia') for p in PERIODOS)),
+        campo('fecha_emision', 'invoice:fecha_emision', transformacion='fecha'),
+        campo('numero_factura', 'numero_factura', 'invoice:numero_factura'),
+    ],
+    'metadata': [
+        campo('extraction_timestamp', 'metadata:extraction_timestamp', 'metadata:timestamp', 'timestamp'),
+        campo('extraction_method', 'metadata:extraction_method', 'metadata:method', default='N0_pipeline'),
+        campo('migration_applied', 'metadata:migration_applied', default=False),
+        campo('ai_fields_in_automejora', 'metadata:ai_fields_in_automejora', default=False),
+        campo('detectors_available', 'metadata:detectors_available', default=True),
+        campo('tables_processed', 'metadata:tables_processed', 'metadata:processed_tables'),
+        campo('text_length', 'metadata:text_length', 'metadata:total_text_length'),
+        campo('duration_ms', 'metadata:duration_ms', 'metadata:processing_time_ms'),
+        campo('total_time', 'metadata:total_time', 'metadata:total_processing_time'),
+        campo('reading_time', 'metadata:reading_time', 'metadata:file_reading_time'),
+        campo('classification_time', 'metadata:classification_time', 'metadata:document_classification_time'),
+        campo('metadata_extraction_time', 'metadata:metadata_extraction_time', 'metadata:meta_extraction_time'),
+        campo('schema_loading_time', 'metadata:schema_loading_time', 'metadata:schema_load_time'),
+        campo('data_extraction_time', 'metadata:data_extraction_time', 'metadata:extraction_time'),
+        campo('data_normalization_time', 'metadata:data_normalization_time', 'metadata:normalization_time'),
+        campo('data_transformation_time', 'metadata:data_transformation_time', 'metadata:transformation_time'),
+        campo('json_construction_time', 'metadata:json_construction_time', 'metadata:json_build_time'),
+        campo('extraction_confidence', 'metadata:extraction_confidence', 'metadata:confidence_score'),
+        campo('llm_provider', 'metadata:llm_provider', 'metadata:ai_provider', default='N0_system'),
+        campo('llm_model', 'metadata:llm_model', 'metadata:ai_model', default='N0_model'),
+    ],
+    # Los IDs de foreign keys se asignarán después de las inserciones
+    'documents': [
+        campo('id_cups', 'cups', 'contract.cups_electricidad', 'contract_3x3.cups_electricidad',
+              'contract_2x3.cups_electricidad'),
+        campo('id_cups_confianza', 'cups_confidence', 'contract.cups_confidence', default=0.95),
+        campo('id_cups_pais', 'cups_country', 'country', default='ES'),
+    ],
+    'metering': [
+        campo('fecha_lectura_inicio_contador', 'metering:fecha_lectura_inicio_contador', transformacion='fecha'),
+        campo('fecha_lectura_fin_contador', 'metering:fecha_lectura_fin_contador', transformacion='fecha'),
+        *_directos('metering', ('numero_contador', 'tipo_lectura_contador')),
+        *_directos('metering', (f'lectura_{momento}_contador_p{p}'
+                                for momento in ('anterior', 'actual') for p in (1, 2, 3))),
+    ],
+    'sustainability': _directos('sustainability', (
+        'emisiones_co2_equivalente', 'letra_escala_medioambiental', 'energia_origen_renovable',
+        'energia_origen_nuclear', 'energia_origen_carbon', 'energia_origen_cc_gas_natural',
+        'energia_origen_cogeneracion_alta_eficiencia', 'energia_origen_fuel_gas',
+        'energia_origen_otras_no_renovables')),
+    'invoice_summary': [
+        *_directos('invoice_summary', (
+            'subtotal_factura', 'total_factura',
+            # Mapeo castellano → inglés para campos específicos BD
+            'importe_total_potencia', 'importe_total_energia', 'importe_total_reactiva',
+            'importe_total_excesos_potencia', 'importe_total_autoconsumo', 'importe_impuesto_electrico',
+            'importe_alquiler_equipos', 'importe_otros_conceptos', 'importe_total_iva')),
+        # Impuestos 1 y 2 (primeros elementos de invoice_summary.impuestos)
+        *[campo(f'impuesto_{n}_{c}', f'impuesto_{n}:{c}')
+          for n in (1, 2) for c in ('base_imponible', 'porcentaje', 'importe')],
+    ],
+}
+
+# Compilado una sola vez al importar el módulo
+PROGRAMA_N0 = ProgramaMapeo(SECCIONES_N0, TABLAS_N0, limpiar_valor_n0)
+
+
 class MapeosN0:
     """Clase con todos los mapeos de datos N0."""
-    
+
     def __init__(self):
         """Inicializa la clase de mapeos."""
-        pass
-    
+        self.programa = PROGRAMA_N0
+
+    def mapear_documento(self, datos_json: dict,
+                         tablas: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Mapea todas las tablas N0 (o las indicadas) en una sola pasada.
+
+        Args:
+            datos_json: JSON N0 semi-aplanado
+            tablas: Orden de tablas a mapear; por defecto todas
+
+        Returns:
+            Diccionario tabla → fila mapeada
+        """
+        return self.programa.mapear_documento(datos_json, tablas)
+
     def _buscar_clave_con_sufijo(self, datos_json: dict, nombre_base: str) -> tuple:
         """
         Busca una clave con sufijo numérico (NxM) en el JSON.
-        
+
         Args:
             datos_json: Diccionario JSON donde buscar
             nombre_base: Nombre base (ej: 'contract', 'invoice', 'metering')
-            
+
         Returns:
             tuple: (clave_encontrada, datos) o (None, {})
         """
-        # Primero buscar patrones con sufijos NxM
-        patron = re.compile(rf'^{nombre_base}_\d+x\d+$')
-        claves_con_sufijo = [k for k in datos_json.keys() if patron.match(k)]
-        
-        if claves_con_sufijo:
-            # Ordenar para priorizar (opcional, usar primera coincidencia)
-            clave = claves_con_sufijo[0]
-            return clave, datos_json[clave]
-        
-        # Si no encuentra con sufijo, buscar sin sufijo
-        if nombre_base in datos_json:
-            return nombre_base, datos_json[nombre_base]
-            
-        # No encontrado
-        return None, {}
-    
+        return buscar_clave_con_sufijo(datos_json, nombre_base)
+
     def extraer_valor_seguro(self, diccionario: dict, ruta: str, default=None) -> Any:
         """
         Extrae valor de diccionario anidado de forma segura.
         Soporta notación de puntos para rutas anidadas.
         """
         try:
-            partes = ruta.split('.')
-            valor = diccionario
-            
-            for parte in partes:
-                if isinstance(valor, dict) and parte in valor:
-                    valor = valor[parte]
-                else:
-                    return default
-                    
-            # Limpiar cadenas de espacios extra
-            if isinstance(valor, str):
-                valor = valor.strip()
-                # Validación especial para CUPS - máximo 22 caracteres
-                if 'cups' in ruta.lower() and len(valor) > 22:
-                    logger.warning(f"CUPS excede 22 caracteres: {valor[:10]}... (largo: {len(valor)})")
-                    valor = valor[:22]
-                    
-            return valor if valor else default
-            
+            valor = get_path(diccionario, ruta, _AUSENTE)
+            if valor is _AUSENTE:
+                return default
+            valor = limpiar_valor_n0(valor, 'cups' in ruta.lower())
+            return valor if valor is not None else default
+
         except Exception:
             return default
-    
+
     def _convertir_fecha(self, fecha_str: str) -> str:
         """Convierte fecha de DD/MM/YYYY a YYYY-MM-DD."""
-        if not fecha_str:
-            return None
-            
-        try:
-            fecha_str = str(fecha_str).strip()
-            if '/' in fecha_str:
-                partes = fecha_str.split('/')
-                if len(partes) == 3:
-                    dia, mes, año = partes
-                    return f"{año}-{mes.zfill(2)}-{dia.zfill(2)}"
-            elif '-' in fecha_str and fecha_str.count('-') == 2:
-                # Ya está en formato correcto
-                return fecha_str
-            return None
-        except Exception:
-            return None
-    
+        return parsear_fecha(fecha_str)
+
     def mapear_datos_client(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos de cliente - CORREGIDO para datos aplanados por flattener."""
-        client_data = self.extraer_valor_seguro(datos_json, 'client', {})
-        
-        return {
-            'nombre_cliente': client_data.get('nombre_cliente') or 
-                            client_data.get('titular') or
-                            client_data.get('nombre_titular') or
-                            self.extraer_valor_seguro(datos_json, 'titular_contrato'),
-            # Usar campos aplanados directamente (flattener ya procesó nif_titular)
-            'nif_titular_value': client_data.get('nif_titular_value') or
-                               client_data.get('nif') or
-                               self.extraer_valor_seguro(datos_json, 'nif_titular'),
-            'nif_titular_confidence': client_data.get('nif_titular_confidence'),
-            'nif_titular_pattern': client_data.get('nif_titular_pattern'),
-            'nif_titular_source': client_data.get('nif_titular_source')
-        }
-    
+        return self.programa.mapear_tabla('client', datos_json)
+
     def mapear_datos_provider(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos del proveedor - CORREGIDO para esquema BD real."""
-        provider_data = self.extraer_valor_seguro(datos_json, 'provider', {})
-        
-        return {
-            'nif_proveedor': provider_data.get('nif_proveedor'),
-            'email_proveedor': provider_data.get('email_proveedor'),
-            'web_proveedor': provider_data.get('web_proveedor'),
-            'entidad_bancaria': provider_data.get('entidad_bancaria'),
-            'datos_bancarios_iban': provider_data.get('datos_bancarios_iban')
-        }
-    
+        return self.programa.mapear_tabla('provider', datos_json)
+
     def mapear_datos_direccion_fiscal(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea dirección fiscal desde JSON a tabla direccion_fiscal - CREADO."""
-        provider_data = self.extraer_valor_seguro(datos_json, 'provider', {})
-        direccion_data = self.extraer_valor_seguro(provider_data, 'direccion_fiscal', {})
-        
-        return {
-            'provider_id': None,  # Se asociará posteriormente
-            'codigo_postal': direccion_data.get('codigo_postal'),
-            'comunidad_autonoma': direccion_data.get('comunidad_autonoma'),
-            'municipio': direccion_data.get('municipio'),
-            'nombre_via': direccion_data.get('nombre_via'),
-            'numero': direccion_data.get('numero'),
-            'pais': direccion_data.get('pais'),
-            'planta': direccion_data.get('planta'),
-            'poblacion': direccion_data.get('poblacion'),
-            'provincia': direccion_data.get('provincia'),
-            'puerta': direccion_data.get('puerta'),
-            'tipo_via': direccion_data.get('tipo_via')
-        }
-    
+        return self.programa.mapear_tabla('direccion_fiscal', datos_json)
+
     def mapear_datos_supply_point(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos del punto de suministro - CORREGIDO para esquema BD real."""
-        supply_point_data = self.extraer_valor_seguro(datos_json, 'supply_point', {})
-        contract_data = self.extraer_valor_seguro(datos_json, 'contract', {})
-        
-        return {
-            'cups': supply_point_data.get('cups') or 
-                   contract_data.get('cups_electricidad') or
-                   self.extraer_valor_seguro(datos_json, 'cups'),
-            # Campo aplanado por flattener desde datos_suministro
-            'numero_contrato_poliza': supply_point_data.get('numero_contrato_poliza') or
-                                    supply_point_data.get('poliza') or
-                                    self.extraer_valor_seguro(datos_json, 'numero_poliza')
-            # NOTA: direccion_suministro_* NO existe en esquema BD real - datos van a tabla supply_address
-        }
-    
+        return self.programa.mapear_tabla('supply_point', datos_json)
+
     def mapear_datos_supply_address(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea dirección de suministro desde JSON a estructura BD - MAPEO EXPANDIDO."""
-        # Buscar datos de dirección en múltiples ubicaciones
-        address_paths = [
-            'supply_point.datos_suministro.direccion_suministro',
-            'supply_address',
-            'direccion_suministro', 
-            'address',
-            'supply_point.address'
-        ]
-        
-        address_data = {}
-        for path in address_paths:
-            data = self.extraer_valor_seguro(datos_json, path, {})
-            if data:
-                address_data = data
-                break
-        
-        return {
-            'codigo_postal': self.extraer_valor_seguro(address_data, 'codigo_postal') or
-                           self.extraer_valor_seguro(address_data, 'cp') or
-                           self.extraer_valor_seguro(address_data, 'postal_code'),
-            'comunidad_autonoma': self.extraer_valor_seguro(address_data, 'comunidad_autonoma') or
-                                self.extraer_valor_seguro(address_data, 'ca') or
-                                self.extraer_valor_seguro(address_data, 'autonomous_community'),
-            'municipio': self.extraer_valor_seguro(address_data, 'municipio') or
-                        self.extraer_valor_seguro(address_data, 'municipality'),
-            'nombre_via': self.extraer_valor_seguro(address_data, 'nombre_via') or
-                         self.extraer_valor_seguro(address_data, 'calle') or
-                         self.extraer_valor_seguro(address_data, 'street_name'),
-            'numero': self.extraer_valor_seguro(address_data, 'numero') or
-                     self.extraer_valor_seguro(address_data, 'number'),
-            'pais': self.extraer_valor_seguro(address_data, 'pais') or
-                   self.extraer_valor_seguro(address_data, 'country'),
-            'planta': self.extraer_valor_seguro(address_data, 'planta') or
-                     self.extraer_valor_seguro(address_data, 'floor'),
-            'poblacion': self.extraer_valor_seguro(address_data, 'poblacion') or
-                        self.extraer_valor_seguro(address_data, 'city') or
-                        self.extraer_valor_seguro(address_data, 'town'),
-            'provincia': self.extraer_valor_seguro(address_data, 'provincia') or
-                        self.extraer_valor_seguro(address_data, 'province'),
-            'puerta': self.extraer_valor_seguro(address_data, 'puerta') or
-                     self.extraer_valor_seguro(address_data, 'door'),
-            'tipo_via': self.extraer_valor_seguro(address_data, 'tipo_via') or
-                       self.extraer_valor_seguro(address_data, 'street_type')
-        }
-    
+        return self.programa.mapear_tabla('supply_address', datos_json)
+
     def mapear_datos_contract(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos del contrato desde JSON a estructura BD.
         NOTA: Busca datos con sufijos XxX pero los inserta en tabla 'contract' sin sufijo."""
-        # Buscar contract con cualquier sufijo numérico (NxM)
-        clave_encontrada, datos_contract = self._buscar_clave_con_sufijo(datos_json, 'contract')
-        
-        return {
-            'comercializadora': self.extraer_valor_seguro(datos_contract, 'comercializadora') or
-                              self.extraer_valor_seguro(datos_json, 'comercializadora'),
-            'numero_contrato_comercializadora': self.extraer_valor_seguro(datos_contract, 'numero_contrato_comercializadora') or
-                                               self.extraer_valor_seguro(datos_contract, 'numero_contrato'),
-            'fecha_inicio_contrato': self._convertir_fecha(self.extraer_valor_seguro(datos_contract, 'fecha_inicio_contrato')),
-            'fecha_fin_contrato': self._convertir_fecha(self.extraer_valor_seguro(datos_contract, 'fecha_fin_contrato')),
-            'distribuidora': self.extraer_valor_seguro(datos_contract, 'distribuidora') or
-                           self.extraer_valor_seguro(datos_json, 'distribuidora'),
-            'numero_contrato_distribuidora': self.extraer_valor_seguro(datos_contract, 'numero_contrato_distribuidora'),
-            'cups_electricidad': self.extraer_valor_seguro(datos_contract, 'cups_electricidad') or 
-                               self.extraer_valor_seguro(datos_contract, 'cups') or
-                               self.extraer_valor_seguro(datos_json, 'cups'),
-            'nombre_producto': self.extraer_valor_seguro(datos_contract, 'nombre_producto') or
-                             self.extraer_valor_seguro(datos_contract, 'producto'),
-            'mercado': self.extraer_valor_seguro(datos_contract, 'mercado') or
-                      self.extraer_valor_seguro(datos_contract, 'tipo_mercado'),
-            'tarifa_acceso': self.extraer_valor_seguro(datos_contract, 'tarifa_acceso') or
-                           self.extraer_valor_seguro(datos_contract, 'tarifa'),
-            # Potencias contratadas P1-P6
-            'potencia_contratada_p1': self.extraer_valor_seguro(datos_contract, 'potencia_contratada_p1') or
-                                    self.extraer_valor_seguro(datos_contract, 'potencia_p1'),
-            'potencia_contratada_p2': self.extraer_valor_seguro(datos_contract, 'potencia_contratada_p2') or
-                                    self.extraer_valor_seguro(datos_contract, 'potencia_p2'),
-            'potencia_contratada_p3': self.extraer_valor_seguro(datos_contract, 'potencia_contratada_p3') or
-                                    self.extraer_valor_seguro(datos_contract, 'potencia_p3'),
-            'potencia_contratada_p4': self.extraer_valor_seguro(datos_contract, 'potencia_contratada_p4') or
-                                    self.extraer_valor_seguro(datos_contract, 'potencia_p4'),
-            'potencia_contratada_p5': self.extraer_valor_seguro(datos_contract, 'potencia_contratada_p5') or
-                                    self.extraer_valor_seguro(datos_contract, 'potencia_p5'),
-            'potencia_contratada_p6': self.extraer_valor_seguro(datos_contract, 'potencia_contratada_p6') or
-                                    self.extraer_valor_seguro(datos_contract, 'potencia_p6'),
-            # Precios unitarios de potencia P1-P6
-            'precio_unitario_potencia_p1': self.extraer_valor_seguro(datos_contract, 'precio_unitario_potencia_p1') or
-                                         self.extraer_valor_seguro(datos_contract, 'precio_potencia_p1'),
-            'precio_unitario_potencia_p2': self.extraer_valor_seguro(datos_contract, 'precio_unitario_potencia_p2') or
-                                         self.extraer_valor_seguro(datos_contract, 'precio_potencia_p2'),
-            'precio_unitario_potencia_p3': self.extraer_valor_seguro(datos_contract, 'precio_unitario_potencia_p3') or
-                                         self.extraer_valor_seguro(datos_contract, 'precio_potencia_p3'),
-            'precio_unitario_potencia_p4': self.extraer_valor_seguro(datos_contract, 'precio_unitario_potencia_p4') or
-                                         self.extraer_valor_seguro(datos_contract, 'precio_potencia_p4'),
-            'precio_unitario_potencia_p5': self.extraer_valor_seguro(datos_contract, 'precio_unitario_potencia_p5') or
-                                         self.extraer_valor_seguro(datos_contract, 'precio_potencia_p5'),
-            'precio_unitario_potencia_p6': self.extraer_valor_seguro(datos_contract, 'precio_unitario_potencia_p6') or
-                                         self.extraer_valor_seguro(datos_contract, 'precio_potencia_p6'),
-        }
-    
+        return self.programa.mapear_tabla('contract', datos_json)
+
     def mapear_datos_energy_consumption(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos de consumo energético desde JSON a estructura BD - MAPEO EXPANDIDO."""
-        # Buscar datos de consumo en múltiples ubicaciones
-        consumo_paths = ['energy_consumption', 'consumo_energia', 'consumption']
-        consumo_data = {}
-        
-        for path in consumo_paths:
-            if path in datos_json:
-                consumo_data = datos_json[path]
-                break
-        
-        return {
-            'inicio_periodo': self._convertir_fecha(self.extraer_valor_seguro(consumo_data, 'inicio_periodo') or
-                                                   self.extraer_valor_seguro(consumo_data, 'fecha_inicio')),
-            'fin_periodo': self._convertir_fecha(self.extraer_valor_seguro(consumo_data, 'fin_periodo') or
-                                                self.extraer_valor_seguro(consumo_data, 'fecha_fin')),
-            'consumo_medido_kwh': self.extraer_valor_seguro(consumo_data, 'consumo_medido_kwh') or
-                                 self.extraer_valor_seguro(consumo_data, 'consumo_real_kwh'),
-            'consumo_facturado_kwh': self.extraer_valor_seguro(consumo_data, 'consumo_facturado_kwh') or
-                                    self.extraer_valor_seguro(consumo_data, 'consumo_kwh'),
-            'consumo_kwh': self.extraer_valor_seguro(consumo_data, 'consumo_kwh') or
-                          self.extraer_valor_seguro(consumo_data, 'consumo_facturado_kwh') or
-                          self.extraer_valor_seguro(consumo_data, 'consumo_medido_kwh'),
-            # Precios por componente
-            'precio_peaje_eur_kwh': self.extraer_valor_seguro(consumo_data, 'precio_peaje_eur_kwh') or
-                                   self.extraer_valor_seguro(consumo_data, 'precio_peaje'),
-            'precio_energia_eur_kwh': self.extraer_valor_seguro(consumo_data, 'precio_energia_eur_kwh') or
-                                     self.extraer_valor_seguro(consumo_data, 'precio_energia'),
-            'precio_cargos_eur_kwh': self.extraer_valor_seguro(consumo_data, 'precio_cargos_eur_kwh') or
-                                    self.extraer_valor_seguro(consumo_data, 'precio_cargos'),
-            'margen_comercializadora_eur_kwh': self.extraer_valor_seguro(consumo_data, 'margen_comercializadora_eur_kwh') or
-                                              self.extraer_valor_seguro(consumo_data, 'margen_comercializadora'),
-            'precio_total_energia_eur_kwh': self.extraer_valor_seguro(consumo_data, 'precio_total_energia_eur_kwh') or
-                                           self.extraer_valor_seguro(consumo_data, 'precio_total'),
-            # Costes por componente
-            'coste_peaje_eur': self.extraer_valor_seguro(consumo_data, 'coste_peaje_eur') or
-                              self.extraer_valor_seguro(consumo_data, 'coste_peaje'),
-            'coste_energia_eur': self.extraer_valor_seguro(consumo_data, 'coste_energia_eur') or
-                                self.extraer_valor_seguro(consumo_data, 'coste_energia'),
-            'coste_cargos_eur': self.extraer_valor_seguro(consumo_data, 'coste_cargos_eur') or
-                               self.extraer_valor_seguro(consumo_data, 'coste_cargos'),
-            'coste_margen_comercializadora_eur': self.extraer_valor_seguro(consumo_data, 'coste_margen_comercializadora_eur') or
-                                                self.extraer_valor_seguro(consumo_data, 'coste_margen_comercializadora'),
-            'coste_total_energia_eur': self.extraer_valor_seguro(consumo_data, 'coste_total_energia_eur') or
-                                      self.extraer_valor_seguro(consumo_data, 'coste_total')
-        }
-    
+        return self.programa.mapear_tabla('energy_consumption', datos_json)
+
     def mapear_datos_power_term(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos del término de potencia desde JSON a estructura BD."""
-        potencia_data = self.extraer_valor_seguro(datos_json, 'termino_potencia', {})
-        
-        return {
-            'periodo': self.extraer_valor_seguro(potencia_data, 'periodo', 'P1'),
-            'potencia_contratada_kw': self.extraer_valor_seguro(potencia_data, 'potencia_contratada_kw'),
-            'dias_facturacion': self.extraer_valor_seguro(potencia_data, 'dias_facturacion'),
-            'precio_potencia_eur_kw_dia': self.extraer_valor_seguro(potencia_data, 'precio_potencia_eur_kw_dia'),
-            'coste_potencia_eur': self.extraer_valor_seguro(potencia_data, 'coste_potencia_eur')
-        }
-    
+        return self.programa.mapear_tabla('power_term', datos_json)
+
     def mapear_datos_invoice(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos de factura desde JSON a estructura BD - MAPEO COMPLETO.
         NOTA: Busca datos con sufijos XxX pero los inserta en tabla 'invoice' sin sufijo."""
-        # Buscar invoice con cualquier sufijo numérico (NxM)
-        clave_encontrada, invoice_data = self._buscar_clave_con_sufijo(datos_json, 'invoice')
-        
-        # Si no encuentra invoice, buscar 'factura'
-        if not invoice_data and 'factura' in datos_json:
-            invoice_data = datos_json['factura']
-
-        return {
-            'año': self.extraer_valor_seguro(invoice_data, 'año') or self.extraer_valor_seguro(invoice_data, 'ano'),
-            'fecha_inicio_periodo': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'fecha_inicio_periodo')),
-            'fecha_fin_periodo': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'fecha_fin_periodo')),
-            'dias_periodo_facturado': self.extraer_valor_seguro(invoice_data, 'dias_periodo_facturado'),
-            'numero_factura_rectificada': self.extraer_valor_seguro(invoice_data, 'numero_factura_rectificada'),
-            'fecha_cargo': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'fecha_cargo')),
-            'total_a_pagar': self.extraer_valor_seguro(invoice_data, 'total_a_pagar'),
-            'tipo_iva': self.extraer_valor_seguro(invoice_data, 'tipo_iva'),
-            'importe_iva': self.extraer_valor_seguro(invoice_data, 'importe_iva'),
-            'porcentaje_impuesto_electricidad': self.extraer_valor_seguro(invoice_data, 'porcentaje_impuesto_electricidad'),
-            'importe_impuesto_electricidad': self.extraer_valor_seguro(invoice_data, 'importe_impuesto_electricidad'),
-            'bono_social': self.extraer_valor_seguro(invoice_data, 'bono_social'),
-            'coste_energia_total': self.extraer_valor_seguro(invoice_data, 'coste_energia_total'),
-            'coste_potencia_total': self.extraer_valor_seguro(invoice_data, 'coste_potencia_total'),
-            'coste_otro_concepto': self.extraer_valor_seguro(invoice_data, 'coste_otro_concepto'),
-            'coste_otro_servicio': self.extraer_valor_seguro(invoice_data, 'coste_otro_servicio'),
-            'coste_promedio_diario_eur': self.extraer_valor_seguro(invoice_data, 'coste_promedio_diario_eur'),
-            'alquiler_contador': self.extraer_valor_seguro(invoice_data, 'alquiler_contador'),
-            'ajuste_mecanismo_iberico': self.extraer_valor_seguro(invoice_data, 'ajuste_mecanismo_iberico'),
-            'descuento_energia': self.extraer_valor_seguro(invoice_data, 'descuento_energia'),
-            'descuento_potencia': self.extraer_valor_seguro(invoice_data, 'descuento_potencia'),
-            'descuento_servicio': self.extraer_valor_seguro(invoice_data, 'descuento_servicio'),
-            'descuento_otro_concepto': self.extraer_valor_seguro(invoice_data, 'descuento_otro_concepto'),
-            # Consumos P1-P6 - mapeo expandido
-            'consumo_kwh_p1': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_kwh_p1') or self.extraer_valor_seguro(invoice_data, 'consumo_medido_kwh_p1'),
-            'consumo_kwh_p2': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_kwh_p2') or self.extraer_valor_seguro(invoice_data, 'consumo_medido_kwh_p2'),
-            'consumo_kwh_p3': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_kwh_p3') or self.extraer_valor_seguro(invoice_data, 'consumo_medido_kwh_p3'),
-            'consumo_kwh_p4': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_kwh_p4') or self.extraer_valor_seguro(invoice_data, 'consumo_medido_kwh_p4'),
-            'consumo_kwh_p5': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_kwh_p5') or self.extraer_valor_seguro(invoice_data, 'consumo_medido_kwh_p5'),
-            'consumo_kwh_p6': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_kwh_p6') or self.extraer_valor_seguro(invoice_data, 'consumo_medido_kwh_p6'),
-            # Precios P1-P6 - EXPANDIDO COMPLETO
-            'precio_peaje_p1': self.extraer_valor_seguro(invoice_data, 'precio_peaje_p1'),
-            'precio_peaje_p2': self.extraer_valor_seguro(invoice_data, 'precio_peaje_p2'),
-            'precio_peaje_p3': self.extraer_valor_seguro(invoice_data, 'precio_peaje_p3'),
-            'precio_peaje_p4': self.extraer_valor_seguro(invoice_data, 'precio_peaje_p4'),
-            'precio_peaje_p5': self.extraer_valor_seguro(invoice_data, 'precio_peaje_p5'),
-            'precio_peaje_p6': self.extraer_valor_seguro(invoice_data, 'precio_peaje_p6'),
-            'precio_energia_p1': self.extraer_valor_seguro(invoice_data, 'precio_energia_p1'),
-            'precio_energia_p2': self.extraer_valor_seguro(invoice_data, 'precio_energia_p2'),
-            'precio_energia_p3': self.extraer_valor_seguro(invoice_data, 'precio_energia_p3'),
-            'precio_energia_p4': self.extraer_valor_seguro(invoice_data, 'precio_energia_p4'),
-            'precio_energia_p5': self.extraer_valor_seguro(invoice_data, 'precio_energia_p5'),
-            'precio_energia_p6': self.extraer_valor_seguro(invoice_data, 'precio_energia_p6'),
-            'precio_cargos_energia_p1': self.extraer_valor_seguro(invoice_data, 'precio_cargos_energia_p1'),
-            'precio_cargos_energia_p2': self.extraer_valor_seguro(invoice_data, 'precio_cargos_energia_p2'),
-            'precio_cargos_energia_p3': self.extraer_valor_seguro(invoice_data, 'precio_cargos_energia_p3'),
-            'precio_cargos_energia_p4': self.extraer_valor_seguro(invoice_data, 'precio_cargos_energia_p4'),
-            'precio_cargos_energia_p5': self.extraer_valor_seguro(invoice_data, 'precio_cargos_energia_p5'),
-            'precio_cargos_energia_p6': self.extraer_valor_seguro(invoice_data, 'precio_cargos_energia_p6'),
-            'margen_comercializadora_p1': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_p1'),
-            'margen_comercializadora_p2': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_p2'),
-            'margen_comercializadora_p3': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_p3'),
-            'margen_comercializadora_p4': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_p4'),
-            'margen_comercializadora_p5': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_p5'),
-            'margen_comercializadora_p6': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_p6'),
-            # Costes P1-P6 EXPANDIDO
-            'coste_peaje_p1': self.extraer_valor_seguro(invoice_data, 'coste_peaje_p1'),
-            'coste_peaje_p2': self.extraer_valor_seguro(invoice_data, 'coste_peaje_p2'),
-            'coste_peaje_p3': self.extraer_valor_seguro(invoice_data, 'coste_peaje_p3'),
-            'coste_peaje_p4': self.extraer_valor_seguro(invoice_data, 'coste_peaje_p4'),
-            'coste_peaje_p5': self.extraer_valor_seguro(invoice_data, 'coste_peaje_p5'),
-            'coste_peaje_p6': self.extraer_valor_seguro(invoice_data, 'coste_peaje_p6'),
-            'coste_energia_p1': self.extraer_valor_seguro(invoice_data, 'coste_energia_p1'),
-            'coste_energia_p2': self.extraer_valor_seguro(invoice_data, 'coste_energia_p2'),
-            'coste_energia_p3': self.extraer_valor_seguro(invoice_data, 'coste_energia_p3'),
-            'coste_energia_p4': self.extraer_valor_seguro(invoice_data, 'coste_energia_p4'),
-            'coste_energia_p5': self.extraer_valor_seguro(invoice_data, 'coste_energia_p5'),
-            'coste_energia_p6': self.extraer_valor_seguro(invoice_data, 'coste_energia_p6'),
-            'coste_cargos_energia_p1': self.extraer_valor_seguro(invoice_data, 'coste_cargos_energia_p1'),
-            'coste_cargos_energia_p2': self.extraer_valor_seguro(invoice_data, 'coste_cargos_energia_p2'),
-            'coste_cargos_energia_p3': self.extraer_valor_seguro(invoice_data, 'coste_cargos_energia_p3'),
-            'coste_cargos_energia_p4': self.extraer_valor_seguro(invoice_data, 'coste_cargos_energia_p4'),
-            'coste_cargos_energia_p5': self.extraer_valor_seguro(invoice_data, 'coste_cargos_energia_p5'),
-            'coste_cargos_energia_p6': self.extraer_valor_seguro(invoice_data, 'coste_cargos_energia_p6'),
-            'coste_margen_comercializadora_p1': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_p1'),
-            'coste_margen_comercializadora_p2': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_p2'),
-            'coste_margen_comercializadora_p3': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_p3'),
-            'coste_margen_comercializadora_p4': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_p4'),
-            'coste_margen_comercializadora_p5': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_p5'),
-            'coste_margen_comercializadora_p6': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_p6'),
-            'coste_total_energia_p1': self.extraer_valor_seguro(invoice_data, 'coste_total_energia_p1'),
-            'coste_total_energia_p2': self.extraer_valor_seguro(invoice_data, 'coste_total_energia_p2'),
-            'coste_total_energia_p3': self.extraer_valor_seguro(invoice_data, 'coste_total_energia_p3'),
-            'coste_total_energia_p4': self.extraer_valor_seguro(invoice_data, 'coste_total_energia_p4'),
-            'coste_total_energia_p5': self.extraer_valor_seguro(invoice_data, 'coste_total_energia_p5'),
-            'coste_total_energia_p6': self.extraer_valor_seguro(invoice_data, 'coste_total_energia_p6'),
-            # Potencia y Reactiva/Capacitiva EXPANDIDO
-            'consumo_promedio_diario_kwh': self.extraer_valor_seguro(invoice_data, 'consumo_promedio_diario_kwh'),
-            'potencia_facturada_p1': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p1'),
-            'potencia_facturada_p2': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p2'),
-            'potencia_facturada_p3': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p3'),
-            'potencia_facturada_p4': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p4'),
-            'potencia_facturada_p5': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p5'),
-            'potencia_facturada_p6': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p6'),
-            'potencia_maxima_demandada_factura_p1': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_factura_p1'),
-            'potencia_maxima_demandada_factura_p2': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_factura_p2'),
-            'potencia_maxima_demandada_factura_p3': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_factura_p3'),
-            'potencia_maxima_demandada_factura_p4': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_factura_p4'),
-            'potencia_maxima_demandada_factura_p5': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_factura_p5'),
-            'potencia_maxima_demandada_factura_p6': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_factura_p6'),
-            'potencia_maxima_demandada_año_kw_p1': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_año_kw_p1'),
-            'potencia_maxima_demandada_año_kw_p2': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_año_kw_p2'),
-            'potencia_maxima_demandada_año_kw_p3': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_año_kw_p3'),
-            'potencia_maxima_demandada_año_kw_p4': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_año_kw_p4'),
-            'potencia_maxima_demandada_año_kw_p5': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_año_kw_p5'),
-            'potencia_maxima_demandada_año_kw_p6': self.extraer_valor_seguro(invoice_data, 'potencia_maxima_demandada_año_kw_p6'),
-            # Consumos reactiva y capacitiva P1-P6
-            'consumo_medido_reactiva_p1': self.extraer_valor_seguro(invoice_data, 'consumo_medido_reactiva_p1'),
-            'consumo_medido_reactiva_p2': self.extraer_valor_seguro(invoice_data, 'consumo_medido_reactiva_p2'),
-            'consumo_medido_reactiva_p3': self.extraer_valor_seguro(invoice_data, 'consumo_medido_reactiva_p3'),
-            'consumo_medido_reactiva_p4': self.extraer_valor_seguro(invoice_data, 'consumo_medido_reactiva_p4'),
-            'consumo_medido_reactiva_p5': self.extraer_valor_seguro(invoice_data, 'consumo_medido_reactiva_p5'),
-            'consumo_medido_reactiva_p6': self.extraer_valor_seguro(invoice_data, 'consumo_medido_reactiva_p6'),
-            'consumo_facturado_reactiva_p1': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_reactiva_p1'),
-            'consumo_facturado_reactiva_p2': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_reactiva_p2'),
-            'consumo_facturado_reactiva_p3': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_reactiva_p3'),
-            'consumo_facturado_reactiva_p4': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_reactiva_p4'),
-            'consumo_facturado_reactiva_p5': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_reactiva_p5'),
-            'consumo_facturado_reactiva_p6': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_reactiva_p6'),
-            'consumo_medido_capacitiva_p1': self.extraer_valor_seguro(invoice_data, 'consumo_medido_capacitiva_p1'),
-            'consumo_medido_capacitiva_p2': self.extraer_valor_seguro(invoice_data, 'consumo_medido_capacitiva_p2'),
-            'consumo_medido_capacitiva_p3': self.extraer_valor_seguro(invoice_data, 'consumo_medido_capacitiva_p3'),
-            'consumo_medido_capacitiva_p4': self.extraer_valor_seguro(invoice_data, 'consumo_medido_capacitiva_p4'),
-            'consumo_medido_capacitiva_p5': self.extraer_valor_seguro(invoice_data, 'consumo_medido_capacitiva_p5'),
-            'consumo_medido_capacitiva_p6': self.extraer_valor_seguro(invoice_data, 'consumo_medido_capacitiva_p6'),
-            'consumo_facturado_capacitiva_p1': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_capacitiva_p1'),
-            'consumo_facturado_capacitiva_p2': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_capacitiva_p2'),
-            'consumo_facturado_capacitiva_p3': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_capacitiva_p3'),
-            'consumo_facturado_capacitiva_p4': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_capacitiva_p4'),
-            'consumo_facturado_capacitiva_p5': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_capacitiva_p5'),
-            'consumo_facturado_capacitiva_p6': self.extraer_valor_seguro(invoice_data, 'consumo_facturado_capacitiva_p6'),
-            # Reactiva
-            'energia_reactiva_facturar_p1': self.extraer_valor_seguro(invoice_data, 'energia_reactiva_facturar_p1'),
-            'penalizacion_reactiva_p1': self.extraer_valor_seguro(invoice_data, 'penalizacion_reactiva_p1'),
-            'energia_reactiva_facturar_p2': self.extraer_valor_seguro(invoice_data, 'energia_reactiva_facturar_p2'),
-            'penalizacion_reactiva_p2': self.extraer_valor_seguro(invoice_data, 'penalizacion_reactiva_p2'),
-            'energia_reactiva_facturar_p3': self.extraer_valor_seguro(invoice_data, 'energia_reactiva_facturar_p3'),
-            'penalizacion_reactiva_p3': self.extraer_valor_seguro(invoice_data, 'penalizacion_reactiva_p3'),
-            'energia_reactiva_facturar_p4': self.extraer_valor_seguro(invoice_data, 'energia_reactiva_facturar_p4'),
-            'penalizacion_reactiva_p4': self.extraer_valor_seguro(invoice_data, 'penalizacion_reactiva_p4'),
-            'energia_reactiva_facturar_p5': self.extraer_valor_seguro(invoice_data, 'energia_reactiva_facturar_p5'),
-            'penalizacion_reactiva_p5': self.extraer_valor_seguro(invoice_data, 'penalizacion_reactiva_p5'),
-            'energia_reactiva_facturar_p6': self.extraer_valor_seguro(invoice_data, 'energia_reactiva_facturar_p6'),
-            'penalizacion_reactiva_p6': self.extraer_valor_seguro(invoice_data, 'penalizacion_reactiva_p6'),
-            # Autoconsumo y otros - CORREGIDO: campo real es 'autoconsumo'
-            'autoconsumo': self.extraer_valor_seguro(invoice_data, 'autoconsumo') or
-                          self.extraer_valor_seguro(invoice_data, 'self_consumption'),
-            'energia_vertida_kwh': self.extraer_valor_seguro(invoice_data, 'energia_vertida_kwh'),
-            'importe_compensacion_excedentes': self.extraer_valor_seguro(invoice_data, 'importe_compensacion_excedentes'),
-            'url_qr_comparador_cnmc': self.extraer_valor_seguro(invoice_data, 'url_qr_comparador_cnmc'),
-            # Potencia por período P1-P6 - precios y costes
-            'precio_peaje_potencia_p1': self.extraer_valor_seguro(invoice_data, 'precio_peaje_potencia_p1'),
-            'precio_peaje_potencia_p2': self.extraer_valor_seguro(invoice_data, 'precio_peaje_potencia_p2'),
-            'precio_peaje_potencia_p3': self.extraer_valor_seguro(invoice_data, 'precio_peaje_potencia_p3'),
-            'precio_peaje_potencia_p4': self.extraer_valor_seguro(invoice_data, 'precio_peaje_potencia_p4'),
-            'precio_peaje_potencia_p5': self.extraer_valor_seguro(invoice_data, 'precio_peaje_potencia_p5'),
-            'precio_peaje_potencia_p6': self.extraer_valor_seguro(invoice_data, 'precio_peaje_potencia_p6'),
-            'precio_potencia_p1': self.extraer_valor_seguro(invoice_data, 'precio_potencia_p1'),
-            'precio_potencia_p2': self.extraer_valor_seguro(invoice_data, 'precio_potencia_p2'),
-            'precio_potencia_p3': self.extraer_valor_seguro(invoice_data, 'precio_potencia_p3'),
-            'precio_potencia_p4': self.extraer_valor_seguro(invoice_data, 'precio_potencia_p4'),
-            'precio_potencia_p5': self.extraer_valor_seguro(invoice_data, 'precio_potencia_p5'),
-            'precio_potencia_p6': self.extraer_valor_seguro(invoice_data, 'precio_potencia_p6'),
-            'precio_cargos_potencia_p1': self.extraer_valor_seguro(invoice_data, 'precio_cargos_potencia_p1'),
-            'precio_cargos_potencia_p2': self.extraer_valor_seguro(invoice_data, 'precio_cargos_potencia_p2'),
-            'precio_cargos_potencia_p3': self.extraer_valor_seguro(invoice_data, 'precio_cargos_potencia_p3'),
-            'precio_cargos_potencia_p4': self.extraer_valor_seguro(invoice_data, 'precio_cargos_potencia_p4'),
-            'precio_cargos_potencia_p5': self.extraer_valor_seguro(invoice_data, 'precio_cargos_potencia_p5'),
-            'precio_cargos_potencia_p6': self.extraer_valor_seguro(invoice_data, 'precio_cargos_potencia_p6'),
-            'margen_comercializadora_potencia_p1': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_potencia_p1'),
-            'margen_comercializadora_potencia_p2': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_potencia_p2'),
-            'margen_comercializadora_potencia_p3': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_potencia_p3'),
-            'margen_comercializadora_potencia_p4': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_potencia_p4'),
-            'margen_comercializadora_potencia_p5': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_potencia_p5'),
-            'margen_comercializadora_potencia_p6': self.extraer_valor_seguro(invoice_data, 'margen_comercializadora_potencia_p6'),
-            'precio_total_potencia_p1': self.extraer_valor_seguro(invoice_data, 'precio_total_potencia_p1'),
-            'precio_total_potencia_p2': self.extraer_valor_seguro(invoice_data, 'precio_total_potencia_p2'),
-            'precio_total_potencia_p3': self.extraer_valor_seguro(invoice_data, 'precio_total_potencia_p3'),
-            'precio_total_potencia_p4': self.extraer_valor_seguro(invoice_data, 'precio_total_potencia_p4'),
-            'precio_total_potencia_p5': self.extraer_valor_seguro(invoice_data, 'precio_total_potencia_p5'),
-            'precio_total_potencia_p6': self.extraer_valor_seguro(invoice_data, 'precio_total_potencia_p6'),
-            'coste_peaje_potencia_p1': self.extraer_valor_seguro(invoice_data, 'coste_peaje_potencia_p1'),
-            'coste_peaje_potencia_p2': self.extraer_valor_seguro(invoice_data, 'coste_peaje_potencia_p2'),
-            'coste_peaje_potencia_p3': self.extraer_valor_seguro(invoice_data, 'coste_peaje_potencia_p3'),
-            'coste_peaje_potencia_p4': self.extraer_valor_seguro(invoice_data, 'coste_peaje_potencia_p4'),
-            'coste_peaje_potencia_p5': self.extraer_valor_seguro(invoice_data, 'coste_peaje_potencia_p5'),
-            'coste_peaje_potencia_p6': self.extraer_valor_seguro(invoice_data, 'coste_peaje_potencia_p6'),
-            'coste_potencia_p1': self.extraer_valor_seguro(invoice_data, 'coste_potencia_p1'),
-            'coste_potencia_p2': self.extraer_valor_seguro(invoice_data, 'coste_potencia_p2'),
-            'coste_potencia_p3': self.extraer_valor_seguro(invoice_data, 'coste_potencia_p3'),
-            'coste_potencia_p4': self.extraer_valor_seguro(invoice_data, 'coste_potencia_p4'),
-            'coste_potencia_p5': self.extraer_valor_seguro(invoice_data, 'coste_potencia_p5'),
-            'coste_potencia_p6': self.extraer_valor_seguro(invoice_data, 'coste_potencia_p6'),
-            'coste_cargos_potencia_p1': self.extraer_valor_seguro(invoice_data, 'coste_cargos_potencia_p1'),
-            'coste_cargos_potencia_p2': self.extraer_valor_seguro(invoice_data, 'coste_cargos_potencia_p2'),
-            'coste_cargos_potencia_p3': self.extraer_valor_seguro(invoice_data, 'coste_cargos_potencia_p3'),
-            'coste_cargos_potencia_p4': self.extraer_valor_seguro(invoice_data, 'coste_cargos_potencia_p4'),
-            'coste_cargos_potencia_p5': self.extraer_valor_seguro(invoice_data, 'coste_cargos_potencia_p5'),
-            'coste_cargos_potencia_p6': self.extraer_valor_seguro(invoice_data, 'coste_cargos_potencia_p6'),
-            'coste_margen_comercializadora_potencia_p1': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_potencia_p1'),
-            'coste_margen_comercializadora_potencia_p2': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_potencia_p2'),
-            'coste_margen_comercializadora_potencia_p3': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_potencia_p3'),
-            'coste_margen_comercializadora_potencia_p4': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_potencia_p4'),
-            'coste_margen_comercializadora_potencia_p5': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_potencia_p5'),
-            'coste_margen_comercializadora_potencia_p6': self.extraer_valor_seguro(invoice_data, 'coste_margen_comercializadora_potencia_p6'),
-            'coste_total_potencia_p1': self.extraer_valor_seguro(invoice_data, 'coste_total_potencia_p1'),
-            'coste_total_potencia_p2': self.extraer_valor_seguro(invoice_data, 'coste_total_potencia_p2'),
-            'coste_total_potencia_p3': self.extraer_valor_seguro(invoice_data, 'coste_total_potencia_p3'),
-            'coste_total_potencia_p4': self.extraer_valor_seguro(invoice_data, 'coste_total_potencia_p4'),
-            'coste_total_potencia_p5': self.extraer_valor_seguro(invoice_data, 'coste_total_potencia_p5'),
-            'coste_total_potencia_p6': self.extraer_valor_seguro(invoice_data, 'coste_total_potencia_p6'),
-            # Otros campos adicionales
-            'fecha_emision': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'fecha_emision')),
-            # Número factura
-            'numero_factura': self.extraer_valor_seguro(datos_json, 'numero_factura') or self.extraer_valor_seguro(invoice_data, 'numero_factura'),
-        }
-    
+        return self.programa.mapear_tabla('invoice', datos_json)
+
     def mapear_datos_metadata(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea metadatos desde JSON a estructura BD - MAPEO EXPANDIDO."""
-        metadata_data = self.extraer_valor_seguro(datos_json, 'metadata', {})
-        
-        return {
-            'extraction_timestamp': self.extraer_valor_seguro(metadata_data, 'extraction_timestamp') or
-                                  self.extraer_valor_seguro(metadata_data, 'timestamp') or
-                                  self.extraer_valor_seguro(datos_json, 'timestamp'),
-            'extraction_method': self.extraer_valor_seguro(metadata_data, 'extraction_method') or
-                               self.extraer_valor_seguro(metadata_data, 'method') or
-                               'N0_pipeline',
-            'migration_applied': self.extraer_valor_seguro(metadata_data, 'migration_applied', False),
-            'ai_fields_in_automejora': self.extraer_valor_seguro(metadata_data, 'ai_fields_in_automejora', False),
-            'detectors_available': self.extraer_valor_seguro(metadata_data, 'detectors_available', True),
-            'tables_processed': self.extraer_valor_seguro(metadata_data, 'tables_processed') or
-                              self.extraer_valor_seguro(metadata_data, 'processed_tables'),
-            'text_length': self.extraer_valor_seguro(metadata_data, 'text_length') or
-                         self.extraer_valor_seguro(metadata_data, 'total_text_length'),
-            'duration_ms': self.extraer_valor_seguro(metadata_data, 'duration_ms') or
-                         self.extraer_valor_seguro(metadata_data, 'processing_time_ms'),
-            'total_time': self.extraer_valor_seguro(metadata_data, 'total_time') or
-                        self.extraer_valor_seguro(metadata_data, 'total_processing_time'),
-            'reading_time': self.extraer_valor_seguro(metadata_data, 'reading_time') or
-                          self.extraer_valor_seguro(metadata_data, 'file_reading_time'),
-            'classification_time': self.extraer_valor_seguro(metadata_data, 'classification_time') or
-                                 self.extraer_valor_seguro(metadata_data, 'document_classification_time'),
-            'metadata_extraction_time': self.extraer_valor_seguro(metadata_data, 'metadata_extraction_time') or
-                                      self.extraer_valor_seguro(metadata_data, 'meta_extraction_time'),
-            'schema_loading_time': self.extraer_valor_seguro(metadata_data, 'schema_loading_time') or
-                                 self.extraer_valor_seguro(metadata_data, 'schema_load_time'),
-            'data_extraction_time': self.extraer_valor_seguro(metadata_data, 'data_extraction_time') or
-                                  self.extraer_valor_seguro(metadata_data, 'extraction_time'),
-            'data_normalization_time': self.extraer_valor_seguro(metadata_data, 'data_normalization_time') or
-                                     self.extraer_valor_seguro(metadata_data, 'normalization_time'),
-            'data_transformation_time': self.extraer_valor_seguro(metadata_data, 'data_transformation_time') or
-                                      self.extraer_valor_seguro(metadata_data, 'transformation_time'),
-            'json_construction_time': self.extraer_valor_seguro(metadata_data, 'json_construction_time') or
-                                    self.extraer_valor_seguro(metadata_data, 'json_build_time'),
-            'extraction_confidence': self.extraer_valor_seguro(metadata_data, 'extraction_confidence') or
-                                   self.extraer_valor_seguro(metadata_data, 'confidence_score'),
-            'llm_provider': self.extraer_valor_seguro(metadata_data, 'llm_provider') or
-                          self.extraer_valor_seguro(metadata_data, 'ai_provider') or
-                          'N0_system',
-            'llm_model': self.extraer_valor_seguro(metadata_data, 'llm_model') or
-                       self.extraer_valor_seguro(metadata_data, 'ai_model') or
-                       'N0_model'
-        }
-    
+        return self.programa.mapear_tabla('metadata', datos_json)
+
     def mapear_datos_documents(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos del documento principal desde JSON a estructura BD - MAPEO EXPANDIDO."""
-        # Los IDs de foreign keys se asignarán después de las inserciones
-        return {
-            'id_cups': self.extraer_valor_seguro(datos_json, 'cups') or
-                     self.extraer_valor_seguro(datos_json, 'contract.cups_electricidad') or  
-                     self.extraer_valor_seguro(datos_json, 'contract_3x3.cups_electricidad') or
-                     self.extraer_valor_seguro(datos_json, 'contract_2x3.cups_electricidad'),
-            'id_cups_confianza': self.extraer_valor_seguro(datos_json, 'cups_confidence') or
-                               self.extraer_valor_seguro(datos_json, 'contract.cups_confidence') or
-                               0.95,  # Valor por defecto alto para N0
-            'id_cups_pais': self.extraer_valor_seguro(datos_json, 'cups_country') or
-                          self.extraer_valor_seguro(datos_json, 'country') or
-                          'ES'  # España por defecto
-        }
+        return self.programa.mapear_tabla('documents', datos_json)
 
     def mapear_datos_metering(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos de medición de contadores desde JSON a estructura BD.
         NOTA: Busca datos con sufijos XxX pero los inserta en tabla 'metering' sin sufijo."""
-        # Buscar metering con cualquier sufijo numérico (NxM)
-        clave_encontrada, metering_data = self._buscar_clave_con_sufijo(datos_json, 'metering')
-        
-        # Si no encuentra metering, buscar 'medicion'
-        if not metering_data and 'medicion' in datos_json:
-            metering_data = datos_json['medicion']
-        
-        return {
-            'fecha_lectura_inicio_contador': self._convertir_fecha(self.extraer_valor_seguro(metering_data, 'fecha_lectura_inicio_contador')),
-            'fecha_lectura_fin_contador': self._convertir_fecha(self.extraer_valor_seguro(metering_data, 'fecha_lectura_fin_contador')),
-            'numero_contador': self.extraer_valor_seguro(metering_data, 'numero_contador'),
-            'tipo_lectura_contador': self.extraer_valor_seguro(metering_data, 'tipo_lectura_contador'),
-            'lectura_anterior_contador_p1': self.extraer_valor_seguro(metering_data, 'lectura_anterior_contador_p1'),
-            'lectura_anterior_contador_p2': self.extraer_valor_seguro(metering_data, 'lectura_anterior_contador_p2'),
-            'lectura_anterior_contador_p3': self.extraer_valor_seguro(metering_data, 'lectura_anterior_contador_p3'),
-            'lectura_actual_contador_p1': self.extraer_valor_seguro(metering_data, 'lectura_actual_contador_p1'),
-            'lectura_actual_contador_p2': self.extraer_valor_seguro(metering_data, 'lectura_actual_contador_p2'),
-            'lectura_actual_contador_p3': self.extraer_valor_seguro(metering_data, 'lectura_actual_contador_p3'),
-        }
+        return self.programa.mapear_tabla('metering', datos_json)
 
     def mapear_datos_sustainability(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos de sostenibilidad desde JSON a estructura BD."""
-        sustainability_data = self.extraer_valor_seguro(datos_json, 'sustainability', {})
-        
-        return {
-            'emisiones_co2_equivalente': self.extraer_valor_seguro(sustainability_data, 'emisiones_co2_equivalente'),
-            'letra_escala_medioambiental': self.extraer_valor_seguro(sustainability_data, 'letra_escala_medioambiental'),
-            'energia_origen_renovable': self.extraer_valor_seguro(sustainability_data, 'energia_origen_renovable'),
-            'energia_origen_nuclear': self.extraer_valor_seguro(sustainability_data, 'energia_origen_nuclear'),
-            'energia_origen_carbon': self.extraer_valor_seguro(sustainability_data, 'energia_origen_carbon'),
-            'energia_origen_cc_gas_natural': self.extraer_valor_seguro(sustainability_data, 'energia_origen_cc_gas_natural'),
-            'energia_origen_cogeneracion_alta_eficiencia': self.extraer_valor_seguro(sustainability_data, 'energia_origen_cogeneracion_alta_eficiencia'),
-            'energia_origen_fuel_gas': self.extraer_valor_seguro(sustainability_data, 'energia_origen_fuel_gas'),
-            'energia_origen_otras_no_renovables': self.extraer_valor_seguro(sustainability_data, 'energia_origen_otras_no_renovables'),
-        }
+        return self.programa.mapear_tabla('sustainability', datos_json)
 
     def mapear_datos_invoice_summary(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos de resumen de factura desde JSON a estructura BD."""
-        summary_data = self.extraer_valor_seguro(datos_json, 'invoice_summary', {})
-        impuestos = self.extraer_valor_seguro(summary_data, 'impuestos', [])
-        
-        # Extraer datos de impuestos (hasta 2 elementos)
-        impuesto_1 = impuestos[0] if len(impuestos) > 0 else {}
-        impuesto_2 = impuestos[1] if len(impuestos) > 1 else {}
-        
-        return {
-            'subtotal_factura': self.extraer_valor_seguro(summary_data, 'subtotal_factura'),
-            'total_factura': self.extraer_valor_seguro(summary_data, 'total_factura'),
-            # Mapeo castellano → inglés para campos específicos BD
-            'importe_total_potencia': self.extraer_valor_seguro(summary_data, 'importe_total_potencia'),
-            'importe_total_energia': self.extraer_valor_seguro(summary_data, 'importe_total_energia'),
-            'importe_total_reactiva': self.extraer_valor_seguro(summary_data, 'importe_total_reactiva'),
-            'importe_total_excesos_potencia': self.extraer_valor_seguro(summary_data, 'importe_total_excesos_potencia'),
-            'importe_total_autoconsumo': self.extraer_valor_seguro(summary_data, 'importe_total_autoconsumo'),
-            'importe_impuesto_electrico': self.extraer_valor_seguro(summary_data, 'importe_impuesto_electrico'),
-            'importe_alquiler_equipos': self.extraer_valor_seguro(summary_data, 'importe_alquiler_equipos'),
-            'importe_otros_conceptos': self.extraer_valor_seguro(summary_data, 'importe_otros_conceptos'),
-            'importe_total_iva': self.extraer_valor_seguro(summary_data, 'importe_total_iva'),
-            # Impuesto 1
-            'impuesto_1_base_imponible': self.extraer_valor_seguro(impuesto_1, 'base_imponible'),
-            'impuesto_1_porcentaje': self.extraer_valor_seguro(impuesto_1, 'porcentaje'),
-            'impuesto_1_importe': self.extraer_valor_seguro(impuesto_1, 'importe'),
-            # Impuesto 2
-            'impuesto_2_base_imponible': self.extraer_valor_seguro(impuesto_2, 'base_imponible'),
-            'impuesto_2_porcentaje': self.extraer_valor_seguro(impuesto_2, 'porcentaje'),
-            'impuesto_2_importe': self.extraer_valor_seguro(impuesto_2, 'importe'),
-        }
-
-    
\ No newline at end of file
+        return self.programa.mapear_tabla('invoice_summary', datos_json)
@@ -35,6 +35,8 @@ except ImportError as e:
         return None
 
 from field_mappings import add_enrichment_fields
+from geocoding import obtener_servicio_geocoding, celda_espacial
+from agregados_mercado import obtener_precios_omie_mensuales
 
 logger = logging.getLogger(__name__)
 
@@ -50,8 +52,15 @@ class EnrichmentEngine:
         self.cache_hits = 0
         self.api_calls = 0
         
+        # Geocodificación compartida (memoria del proceso + caché persistente en BD)
+        # get_lat_lon (motor_mejora) gestiona su propio ritmo: sin el intervalo de Nominatim
+        self.geocoder = obtener_servicio_geocoding(get_lat_lon, nombre_proveedor='motor_mejora',
+                                                   intervalo_proveedor=0.0)
+        
+        # Medias mensuales OMIE precalculadas en db_Ncore (core_precios_omie_mensual)
+        self.precios_omie = obtener_precios_omie_mensuales()
+        
         # Cache temporal en memoria para sesión actual
-        self._geo_cache = {}
         self._clima_cache = {}
         self._omie_cache = {}
     
@@ -71,7 +80,7 @@ class EnrichmentEngine:
             enrichment_data = {}
             
             # 1. Geolocalización
-            lat, lon = self._get_coordinates(n1_base.get('direccion', ''))
+            lat, lon = self._get_coordinates(n1_base.get('direccion', ''), n1_base.get('codigo_postal'))
             if lat and lon:
                 enrichment_data['latitud'] = lat
                 enrichment_data['longitud'] = lon
@@ -115,12 +124,13 @@ class EnrichmentEngine:
             # Retornar datos base sin enriquecimiento en caso de error
             return add_enrichment_fields(n1_base, {})
     
-    def _get_coordinates(self, direccion: str) -> Tuple[Optional[float], Optional[float]]:
+    def _get_coordinates(self, direccion: str, codigo_postal: Optional[str] = None) -> Tuple[Optional[float], Optional[float]]:
         """
         Obtiene coordenadas geográficas de una dirección
         
         Args:
             direccion: Dirección postal
+            codigo_postal: Código postal (si no se indica se extrae de la dirección)
             
         Returns:
             Tupla (latitud, longitud) o (None, None)
@@ -128,19 +138,15 @@ class EnrichmentEngine:
         if not direccion:
             return None, None
         
-        # Verificar cache
-        if direccion in self._geo_cache:
-            self.cache_hits += 1
-            return self._geo_cache[direccion]
-        
         try:
-            self.api_calls += 1
-            lat, lon = get_lat_lon(direccion)
+            resultado = self.geocoder.geocodificar(direccion, codigo_postal)
             
-            # Guardar en cache
-            self._geo_cache[direccion] = (lat, lon)
+            if resultado.origen in ('memoria', 'bd'):
+                self.cache_hits += 1
+            elif resultado.origen == 'proveedor':
+                self.api_calls += 1
             
-            return lat, lon
+            return resultado.latitud, resultado.longitud
             
         except Exception as e:
             logger.error(f"Error obteniendo coordenadas: {e}")
@@ -171,8 +177,8 @@ class EnrichmentEngine:
             else:
                 fecha = fecha_str
             
-            # Crear clave de cache
-            cache_key = f"{lat:.4f}_{lon:.4f}_{fecha.strftime('%Y-%m')}"
+            # Clave por celda espacial (~1 km): direcciones cercanas comparten datos climáticos
+            cache_key = f"{celda_espacial(lat, lon)}_{fecha.strftime('%Y-%m')}"
             
             if cache_key in self._clima_cache:
                 self.cache_hits += 1
@@ -219,8 +225,11 @@ class EnrichmentEngine:
                 self.cache_hits += 1
                 precio_kwh = self._omie_cache[cache_key]
             else:
-                self.api_calls += 1
-                precio_kwh = obtener_precio_medio(fecha)
+                # Lectura por clave del agregado mensual; el cálculo externo solo si falta el mes
+                precio_kwh = self.precios_omie.precio_medio_kwh(fecha)
+                if precio_kwh is None:
+                    self.api_calls += 1
+                    precio_kwh = obtener_precio_medio(fecha)
                 self._omie_cache[cache_key] = precio_kwh
             
             if precio_kwh:
@@ -39,6 +39,11 @@ except ImportError as e:
 # Añadir directorio shared al path
 sys.path.append(str(Path(__file__).parent.parent / 'shared'))
 from field_mappings import N1_DB_CONFIG, N1_TABLES
+from mapping_compiler import parsear_fecha
+
+# Mapeos declarativos N1 (mismo directorio)
+sys.path.append(str(Path(__file__).parent))
+from mapeos_N1 import MapeosN1, ORDEN_TABLAS_N1
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -60,6 +65,7 @@ class N1Inserter:
     def __init__(self, modo_prueba: bool = True):
         self.modo_prueba = modo_prueba
         self.resultados = []
+        self.mapeos = MapeosN1()
         
         if not modo_prueba:
             logger.warning("⚠️ MODO PRODUCCIÓN ACTIVADO - Se insertará en BD N1 real")
@@ -106,231 +112,52 @@ class N1Inserter:
     
     def _convertir_fecha(self, fecha_str: str) -> str:
         """Convierte string de fecha a formato PostgreSQL (YYYY-MM-DD)."""
-        if not fecha_str:
-            return None
-        try:
-            # Si ya está en formato YYYY-MM-DD, devolverla
-            if isinstance(fecha_str, str) and len(fecha_str) >= 8:
-                if '/' in fecha_str:
-                    # Convertir DD/MM/YYYY a YYYY-MM-DD
-                    partes = fecha_str.split('/')
-                    if len(partes) == 3:
-                        dia, mes, año = partes
-                        return f"{año}-{mes.zfill(2)}-{dia.zfill(2)}"
-                elif '-' in fecha_str and fecha_str.count('-') == 2:
-                    # Ya está en formato correcto
-                    return fecha_str
-            return None
-        except Exception:
-            return None
+        return parsear_fecha(fecha_str)
     
     def mapear_datos_documents(self, datos_json: dict, archivo_nombre: str = None) -> Dict[str, Any]:
         """Mapea datos para tabla documents (maestra)."""
-        # Extraer CUPS desde múltiples ubicaciones posibles
-        cups = (self.extraer_valor_seguro(datos_json, 'contract.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'contract_2x3.cups_electricidad') or  
-               self.extraer_valor_seguro(datos_json, 'cups'))
-        
-        cliente = self.extraer_valor_seguro(datos_json, 'client.nombre_cliente')
-        nif = (self.extraer_valor_seguro(datos_json, 'client.nif_titular.value') or
-              self.extraer_valor_seguro(datos_json, 'client.nif_titular_value'))
-        
-        # Construir dirección completa a partir de campos aplanados
-        sp_data = self.extraer_valor_seguro(datos_json, 'supply_point', {})
-        direccion_parts = [
-            sp_data.get('direccion_suministro_tipo_via', ''),
-            sp_data.get('direccion_suministro_nombre_via', ''),
-            sp_data.get('direccion_suministro_numero', ''),
-            sp_data.get('direccion_suministro_planta', ''),
-            sp_data.get('direccion_suministro_puerta', '')
-        ]
-        direccion = ' '.join(filter(None, direccion_parts)).strip()
-        
-        return {
-            'cups': cups,
-            'filename': archivo_nombre or 'unknown',
-            'cliente': cliente,
-            'direccion': direccion,
-            'nif': nif,
-            'processed_date': datetime.now(),
-            # 'version_pipeline': '2.0' # Campo para futura implementación
-        }
-    
+        datos = self.mapeos.mapear_tabla('documents', datos_json)
+        return self._completar_documents(datos, archivo_nombre)
+
+    def _completar_documents(self, datos: Dict[str, Any], archivo_nombre: str = None) -> Dict[str, Any]:
+        """Añade los campos de documents que no salen del JSON (archivo y fecha de proceso)."""
+        datos['filename'] = archivo_nombre or 'unknown'
+        datos['processed_date'] = datetime.now()
+        # 'version_pipeline': '2.0' # Campo para futura implementación
+        return datos
+
     def mapear_datos_metadata(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos para tabla metadata (control)."""
-        cups = (self.extraer_valor_seguro(datos_json, 'contract.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'contract_2x3.cups_electricidad') or  
-               self.extraer_valor_seguro(datos_json, 'cups'))
-        metadata_json = self.extraer_valor_seguro(datos_json, 'metadata', {})
-        
-        return {
-            'cups': cups,
-            'extraction_date': self.extraer_valor_seguro(metadata_json, 'extraction_timestamp'),
-            'extraction_method': self.extraer_valor_seguro(metadata_json, 'extraction_method'), 
-            'confidence_score': self.extraer_valor_seguro(metadata_json, 'processing_metrics.extraction_confidence'),
-            'file_size_bytes': self.extraer_valor_seguro(metadata_json, 'text_length')
-        }
-    
+        return self.mapeos.mapear_tabla('metadata', datos_json)
+
     def mapear_datos_client(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos del cliente desde JSON a estructura BD."""
-        cups = (self.extraer_valor_seguro(datos_json, 'contract.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'contract_2x3.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'cups'))
-        
-        client_data = self.extraer_valor_seguro(datos_json, 'client', {})
-        nif_data = self.extraer_valor_seguro(client_data, 'nif_titular', {})
-        
-        return {
-            'cups': cups,
-            'nombre_cliente': self.extraer_valor_seguro(client_data, 'nombre_cliente'),
-            'nif_titular_value': (self.extraer_valor_seguro(nif_data, 'value') or 
-                                self.extraer_valor_seguro(client_data, 'nif_titular_value')),
-            'nif_titular_confidence': (self.extraer_valor_seguro(nif_data, 'confidence') or
-                                     self.extraer_valor_seguro(client_data, 'nif_titular_confidence')),
-            'nif_titular_pattern': (self.extraer_valor_seguro(nif_data, 'pattern') or
-                                  self.extraer_valor_seguro(client_data, 'nif_titular_pattern')),
-            'nif_titular_source': (self.extraer_valor_seguro(nif_data, 'source') or
-                                 self.extraer_valor_seguro(client_data, 'nif_titular_source'))
-        }
-    
+        return self.mapeos.mapear_tabla('client', datos_json)
+
     def mapear_datos_contract(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos del contrato desde JSON a estructura BD."""
-        cups = (self.extraer_valor_seguro(datos_json, 'contract.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'contract_2x3.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'cups'))
-        
-        # Probar múltiples ubicaciones para contract
-        contract_data = (self.extraer_valor_seguro(datos_json, 'contract', {}) or 
-                        self.extraer_valor_seguro(datos_json, 'contract_2x3', {}))
-        return {
-            'cups': cups,
-            'comercializadora': self.extraer_valor_seguro(contract_data, 'comercializadora'),
-            'numero_contrato_comercializadora': self.extraer_valor_seguro(contract_data, 'numero_contrato_comercializadora'),
-            'fecha_inicio_contrato': self._convertir_fecha(self.extraer_valor_seguro(contract_data, 'fecha_inicio_contrato')),
-            'fecha_fin_contrato': self._convertir_fecha(self.extraer_valor_seguro(contract_data, 'fecha_fin_contrato')),
-            'distribuidora': self.extraer_valor_seguro(contract_data, 'distribuidora'),
-            'numero_contrato_distribuidora': self.extraer_valor_seguro(contract_data, 'numero_contrato_distribuidora'),
-            'cups_electricidad': self.extraer_valor_seguro(contract_data, 'cups_electricidad'),
-            'nombre_producto': self.extraer_valor_seguro(contract_data, 'nombre_producto'),
-            'mercado': self.extraer_valor_seguro(contract_data, 'mercado'),
-            'potencia_contratada_p1': self.extraer_valor_seguro(contract_data, 'potencia_contratada_p1'),
-            'potencia_contratada_p2': self.extraer_valor_seguro(contract_data, 'potencia_contratada_p2'),
-            'potencia_contratada_p3': self.extraer_valor_seguro(contract_data, 'potencia_contratada_p3'),
-            'potencia_contratada_p4': self.extraer_valor_seguro(contract_data, 'potencia_contratada_p4'),
-            'potencia_contratada_p5': self.extraer_valor_seguro(contract_data, 'potencia_contratada_p5'),
-            'potencia_contratada_p6': self.extraer_valor_seguro(contract_data, 'potencia_contratada_p6'),
-            'precio_unitario_potencia_p1': self.extraer_valor_seguro(contract_data, 'precio_unitario_potencia_p1'),
-            'precio_unitario_potencia_p2': self.extraer_valor_seguro(contract_data, 'precio_unitario_potencia_p2'),
-            'precio_unitario_potencia_p3': self.extraer_valor_seguro(contract_data, 'precio_unitario_potencia_p3'),
-            'precio_unitario_potencia_p4': self.extraer_valor_seguro(contract_data, 'precio_unitario_potencia_p4'),
-            'precio_unitario_potencia_p5': self.extraer_valor_seguro(contract_data, 'precio_unitario_potencia_p5'),
-            'precio_unitario_potencia_p6': self.extraer_valor_seguro(contract_data, 'precio_unitario_potencia_p6'),
-            'tarifa_acceso': self.extraer_valor_seguro(contract_data, 'tarifa_acceso')
-        }
-    
+        return self.mapeos.mapear_tabla('contract', datos_json)
+
     def mapear_datos_energy_consumption(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos para la tabla normalizada energy_consumption."""
-        cups = (self.extraer_valor_seguro(datos_json, 'contract.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'contract_2x3.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'cups'))
-        invoice_data = self.extraer_valor_seguro(datos_json, 'invoice', {})
-        
-        # Calcular consumo total sumando todos los períodos
-        consumo_total = 0
-        for periodo in range(1, 7):
-            campo_consumo = f'consumo_facturado_kwh_p{periodo}'
-            consumo_periodo = self.extraer_valor_seguro(invoice_data, campo_consumo, 0)
-            if consumo_periodo:
-                consumo_total += float(consumo_periodo)
-
-        return {
-            'cups': cups,
-            'consumo_total_kwh': consumo_total if consumo_total > 0 else None
-        }
+        return self.mapeos.mapear_tabla('energy_consumption', datos_json)
 
     def mapear_datos_invoice(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos completos para tabla invoice."""
-        cups = (self.extraer_valor_seguro(datos_json, 'contract.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'contract_2x3.cups_electricidad') or
-               self.extraer_valor_seguro(datos_json, 'cups'))
-        invoice_data = self.extraer_valor_seguro(datos_json, 'invoice', {})
-        
-        return {
-            'cups': cups,
-            'numero_factura': self.extraer_valor_seguro(invoice_data, 'numero_factura'),
-            'fecha_emision': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'fecha_emision')),
-            'fecha_factura': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'fecha_factura')),
-            'fecha_inicio_periodo': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'fecha_inicio_periodo')),
-            'fecha_fin_periodo': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'fecha_fin_periodo')),
-            'periodo_facturacion_inicio': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'periodo_facturacion_inicio')),
-            'periodo_facturacion_fin': self._convertir_fecha(self.extraer_valor_seguro(invoice_data, 'periodo_facturacion_fin')),
-            'total_a_pagar': self.extraer_valor_seguro(invoice_data, 'total_a_pagar'),
-            'dias_periodo_facturado': self.extraer_valor_seguro(invoice_data, 'dias_periodo_facturado'),
-            'año': self.extraer_valor_seguro(invoice_data, 'año'),
-            # Consumos por periodo
-            'consumo_kwh_p1': self.extraer_valor_seguro(invoice_data, 'consumo_kwh_p1'),
-            'consumo_kwh_p2': self.extraer_valor_seguro(invoice_data, 'consumo_kwh_p2'),
-            'consumo_kwh_p3': self.extraer_valor_seguro(invoice_data, 'consumo_kwh_p3'),
-            'consumo_kwh_p4': self.extraer_valor_seguro(invoice_data, 'consumo_kwh_p4'),
-            'consumo_kwh_p5': self.extraer_valor_seguro(invoice_data, 'consumo_kwh_p5'),
-            'consumo_kwh_p6': self.extraer_valor_seguro(invoice_data, 'consumo_kwh_p6'),
-            # Costes por periodo
-            'coste_energia_p1': self.extraer_valor_seguro(invoice_data, 'coste_energia_p1'),
-            'coste_energia_p2': self.extraer_valor_seguro(invoice_data, 'coste_energia_p2'),
-            'coste_energia_p3': self.extraer_valor_seguro(invoice_data, 'coste_energia_p3'),
-            'coste_energia_p4': self.extraer_valor_seguro(invoice_data, 'coste_energia_p4'),
-            'coste_energia_p5': self.extraer_valor_seguro(invoice_data, 'coste_energia_p5'),
-            'coste_energia_p6': self.extraer_valor_seguro(invoice_data, 'coste_energia_p6'),
-            'coste_energia_total': self.extraer_valor_seguro(invoice_data, 'coste_energia_total'),
-            'coste_potencia_total': self.extraer_valor_seguro(invoice_data, 'coste_potencia_total'),
-            # Potencias facturadas
-            'potencia_facturada_p1': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p1'),
-            'potencia_facturada_p2': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p2'),
-            'potencia_facturada_p3': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p3'),
-            'potencia_facturada_p4': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p4'),
-            'potencia_facturada_p5': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p5'),
-            'potencia_facturada_p6': self.extraer_valor_seguro(invoice_data, 'potencia_facturada_p6'),
-            # Precios energia
-            'precio_energia_p1': self.extraer_valor_seguro(invoice_data, 'precio_energia_p1'),
-            'precio_energia_p2': self.extraer_valor_seguro(invoice_data, 'precio_energia_p2'),
-            'precio_energia_p3': self.extraer_valor_seguro(invoice_data, 'precio_energia_p3'),
-            'precio_energia_p4': self.extraer_valor_seguro(invoice_data, 'precio_energia_p4'),
-            'precio_energia_p5': self.extraer_valor_seguro(invoice_data, 'precio_energia_p5'),
-            'precio_energia_p6': self.extraer_valor_seguro(invoice_data, 'precio_energia_p6'),
-            # Otros campos importantes
-            'consumo_promedio_diario_kwh': self.extraer_valor_seguro(invoice_data, 'consumo_promedio_diario_kwh'),
-            'coste_promedio_diario_eur': self.extraer_valor_seguro(invoice_data, 'coste_promedio_diario_eur'),
-            'importe_impuesto_electricidad': self.extraer_valor_seguro(invoice_data, 'importe_impuesto_electricidad'),
-            'porcentaje_impuesto_electricidad': self.extraer_valor_seguro(invoice_data, 'porcentaje_impuesto_electricidad')
-        }
-    
+        return self.mapeos.mapear_tabla('invoice', datos_json)
+
     def mapear_datos_consumption_px(self, datos_json: dict, periodo: int) -> Dict[str, Any]:
         """Mapea datos para tablas consumption_p1 a consumption_p6."""
-        campo_consumo = f'consumo_facturado_kwh_p{periodo}'
-        return {
-            'cups': self.extraer_valor_seguro(datos_json, 'cups'),
-            'periodo': f'P{periodo}',
-            'consumo_kwh': self.extraer_valor_seguro(datos_json, campo_consumo)
-        }
-    
+        return self.mapeos.mapear_tabla(f'consumption_p{periodo}', datos_json)
+
     def mapear_datos_cost_px(self, datos_json: dict, periodo: int) -> Dict[str, Any]:
         """Mapea datos para tablas cost_p1 a cost_p6."""
-        campo_coste = f'coste_energia_p{periodo}'
-        return {
-            'cups': self.extraer_valor_seguro(datos_json, 'cups'),
-            'periodo': f'P{periodo}',
-            'coste_energia': self.extraer_valor_seguro(datos_json, campo_coste)
-        }
-    
+        return self.mapeos.mapear_tabla(f'cost_p{periodo}', datos_json)
+
     def mapear_datos_power_px(self, datos_json: dict, periodo: int) -> Dict[str, Any]:
         """Mapea datos para tablas power_p1 a power_p6."""
-        campo_potencia = f'potencia_contratada_p{periodo}'
-        return {
-            'cups': self.extraer_valor_seguro(datos_json, 'cups'),
-            'periodo': f'P{periodo}',
-            'potencia_contratada': self.extraer_valor_seguro(datos_json, campo_potencia)
-        }
-    
+        return self.mapeos.mapear_tabla(f'power_p{periodo}', datos_json)
+
     def mapear_datos_sustainability_base(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos para tabla sustainability_base (datos directos de factura).
         
@@ -338,47 +165,15 @@ class N1Inserter:
         Los campos se mapean desde el módulo 'sostenibilidad' extraído por LLM
         y validado/enriquecido por automejora_sostenibilidad.py
         """
-        # Buscar datos en el módulo 'sostenibilidad' (arquitectura híbrida)
-        sustainability_data = self.extraer_valor_seguro(datos_json, 'sostenibilidad', {})
-        
-        return {
-            'cups': self.extraer_valor_seguro(datos_json, 'cups'),
-            # Mapeo unificado con campos estándar de sostenibilidad
-            'energia_origen_renovable': self.extraer_valor_seguro(sustainability_data, 'energia_origen_renovable'),
-            'energia_origen_nuclear': self.extraer_valor_seguro(sustainability_data, 'energia_origen_nuclear'),
-            'energia_origen_carbon': self.extraer_valor_seguro(sustainability_data, 'energia_origen_carbon'),
-            'energia_origen_cc_gas_natural': self.extraer_valor_seguro(sustainability_data, 'energia_origen_cc_gas_natural'),
-            'energia_origen_cogeneracion_alta_eficiencia': self.extraer_valor_seguro(sustainability_data, 'energia_origen_cogeneracion_alta_eficiencia'),
-            'energia_origen_fuel_gas': self.extraer_valor_seguro(sustainability_data, 'energia_origen_fuel_gas'),
-            'energia_origen_otras_no_renovables': self.extraer_valor_seguro(sustainability_data, 'energia_origen_otras_no_renovables'),
-            'emisiones_co2_equivalente': self.extraer_valor_seguro(sustainability_data, 'emisiones_co2_equivalente'),
-            'letra_escala_medioambiental': self.extraer_valor_seguro(sustainability_data, 'letra_escala_medioambiental')
-        }
-    
+        return self.mapeos.mapear_tabla('sustainability_base', datos_json)
+
     def mapear_datos_sustainability_metrics(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos para tabla sustainability_metrics (datos calculados)."""
-        return {
-            'cups': self.extraer_valor_seguro(datos_json, 'cups'),
-            'huella_carbono_kg': self.extraer_valor_seguro(datos_json, 'huella_carbono_kg'),
-            'rating_sostenibilidad': self.extraer_valor_seguro(datos_json, 'rating_sostenibilidad'),
-            'ahorro_potencial_eur': self.extraer_valor_seguro(datos_json, 'ahorro_potencial_eur'),
-            'recomendacion_mejora': self.extraer_valor_seguro(datos_json, 'recomendacion_mejora')
-        }
-    
+        return self.mapeos.mapear_tabla('sustainability_metrics', datos_json)
+
     def mapear_datos_analytics(self, datos_json: dict) -> Dict[str, Any]:
         """Mapea datos para tabla analytics (KPIs y enriquecimiento)."""
-        return {
-            'cups': self.extraer_valor_seguro(datos_json, 'cups'),
-            'latitud': self.extraer_valor_seguro(datos_json, 'latitud'),
-            'longitud': self.extraer_valor_seguro(datos_json, 'longitud'),
-            'precipitacion_mm': self.extraer_valor_seguro(datos_json, 'precipitacion_mm'),
-            'temperatura_media_c': self.extraer_valor_seguro(datos_json, 'temperatura_media_c'),
-            'precio_omie_kwh': self.extraer_valor_seguro(datos_json, 'precio_omie_kwh'),
-            'precio_omie_mwh': self.extraer_valor_seguro(datos_json, 'precio_omie_mwh'),
-            'ratio_precio_mercado': self.extraer_valor_seguro(datos_json, 'ratio_precio_mercado'),
-            'eficiencia_energetica': self.extraer_valor_seguro(datos_json, 'eficiencia_energetica'),
-            'coste_kwh_promedio': self.extraer_valor_seguro(datos_json, 'coste_kwh_promedio')
-        }
+        return self.mapeos.mapear_tabla('analytics', datos_json)
     
     def simular_insercion_tabla(self, tabla: str, datos: Dict[str, Any]) -> bool:
         """Simula inserción en tabla (modo prueba)."""
@@ -446,21 +241,9 @@ class N1Inserter:
             if '_metadata_n1' not in datos_json:
                 logger.warning(f"Archivo no parece ser JSON N1: {archivo_path.name}")
             
-            # Mapear datos para todas las tablas N1
-            tablas_datos = {}
-            
-            # Tablas principales
-            tablas_datos['documents'] = self.mapear_datos_documents(datos_json, archivo_path.name)
-            tablas_datos['metadata'] = self.mapear_datos_metadata(datos_json)
-            tablas_datos['client'] = self.mapear_datos_client(datos_json)
-            tablas_datos['contract'] = self.mapear_datos_contract(datos_json)
-            tablas_datos['invoice'] = self.mapear_datos_invoice(datos_json)
-            
-            
-            # Tablas de sostenibilidad y analytics
-            tablas_datos['sustainability_base'] = self.mapear_datos_sustainability_base(datos_json)
-            tablas_datos['sustainability_metrics'] = self.mapear_datos_sustainability_metrics(datos_json)
-            tablas_datos['analytics'] = self.mapear_datos_analytics(datos_json)
+            # Mapear datos para todas las tablas N1 en una sola pasada
+            tablas_datos = self.mapeos.mapear_documento(datos_json, ORDEN_TABLAS_N1)
+            self._completar_documents(tablas_datos['documents'], archivo_path.name)
             
             # Insertar en cada tabla
             for tabla, datos in tablas_datos.items():
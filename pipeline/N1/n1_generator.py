@@ -262,6 +262,10 @@ class N1Generator:
             
             logger.info(f"Procesando {len(json_files)} archivos JSON N0...")
             
+            # Cuestionarios de toda la ejecución en un único lote (uno por CUPS)
+            if self.validator:
+                self.validator.batch_questionnaires = True
+            
             for json_file in json_files:
                 try:
                     # Determinar ruta de salida
@@ -299,6 +303,10 @@ class N1Generator:
             
         except Exception as e:
             logger.error(f"Error procesando directorio: {e}", exc_info=True)
+        finally:
+            if self.validator and self.validator.batch_questionnaires:
+                results['questionnaire_sessions'] = self.validator.flush_questionnaires()
+                self.validator.batch_questionnaires = False
         
         return results
     
@@ -12,11 +12,102 @@ import os
 import psycopg2
 from pathlib import Path
 from typing import Dict, Any, Optional, List, Tuple
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent))
+from perfiles_consumo_store import obtener_store, VentanaPerfiles
+
 logger = logging.getLogger(__name__)
 
+# Franjas para clasificar el tipo de consumidor
+HORAS_LABORALES = list(range(8, 18))  # 8:00 - 17:59
+HORAS_NOCTURNAS = list(range(22, 24)) + list(range(0, 7))  # 22:00 - 06:59
+HORAS_RESIDENCIALES = list(range(18, 22))  # 18:00 - 21:59
+
+# Períodos tarifarios típicos
+HORAS_PUNTA = list(range(10, 14)) + list(range(18, 22))  # 10-14h y 18-22h
+HORAS_VALLE = list(range(0, 8)) + list(range(22, 24))    # 0-8h y 22-24h
+HORAS_LLANO = [h for h in range(24) if h not in HORAS_PUNTA and h not in HORAS_VALLE]
+
+
+@dataclass
+class AgregadosVentanas:
+    """Agregados de R ventanas de facturación (eje 0 = ventana)."""
+    registros_tipo: np.ndarray     # (R, tipos) nº de valores > 0
+    suma_tipo: np.ndarray          # (R, tipos) suma de valores > 0
+    maximo_tipo: np.ndarray        # (R, tipos) máximo de valores > 0
+    minimo_tipo: np.ndarray        # (R, tipos) mínimo de valores > 0
+    registros_periodo: np.ndarray  # (R, periodos) nº de registros (todos los tipos)
+    suma_periodo: np.ndarray       # (R, periodos) suma de valores (todos los tipos)
+    dias: np.ndarray               # (R,) días con algún registro
+
+    @property
+    def promedios_periodo(self) -> np.ndarray:
+        """Consumo promedio por periodo (NaN donde la ventana no tiene registros)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.registros_periodo > 0, self.suma_periodo / self.registros_periodo, np.nan)
+
+
+def _acumulado(por_dia: np.ndarray) -> np.ndarray:
+    """Suma acumulada por días con una fila inicial de ceros (acumulado[d] = suma de días < d)."""
+    return np.concatenate([np.zeros((1,) + por_dia.shape[1:], dtype=por_dia.dtype), np.cumsum(por_dia, axis=0)])
+
+
+def agregar_ventanas(matriz: np.ndarray, inicios: np.ndarray, fines: np.ndarray) -> AgregadosVentanas:
+    """
+    Agrega una matriz de perfiles (días × periodos × tipos) sobre R ventanas de días.
+
+    Los agregados se calculan una vez por día y cada ventana [inicio, fin) se
+    resuelve con diferencias de sumas acumuladas (máximos/mínimos con reduceat),
+    así el coste por ventana no depende de su longitud.
+
+    Args:
+        matriz: Perfiles (NaN = sin registro)
+        inicios: Día inicial de cada ventana (incluido)
+        fines: Día final de cada ventana (excluido)
+
+    Returns:
+        AgregadosVentanas
+    """
+    hay_dato = ~np.isnan(matriz)
+    positivo = np.nan_to_num(matriz) > 0
+
+    # Agregados por día
+    registros_tipo = positivo.sum(axis=1)
+    suma_tipo = np.where(positivo, matriz, 0.0).sum(axis=1)
+    maximo_tipo = np.where(positivo, matriz, -np.inf).max(axis=1, initial=-np.inf)
+    minimo_tipo = np.where(positivo, matriz, np.inf).min(axis=1, initial=np.inf)
+    registros_periodo = hay_dato.sum(axis=2)
+    suma_periodo = np.where(hay_dato, matriz, 0.0).sum(axis=2)
+    dias = hay_dato.any(axis=(1, 2)).astype(np.int64)
+
+    def ventanas(por_dia):
+        acumulado = _acumulado(por_dia)
+        return acumulado[fines] - acumulado[inicios]
+
+    def extremo(por_dia, ufunc, neutro):
+        # Fila centinela para que `fines` (excluido) sea siempre un índice válido
+        relleno = np.concatenate([por_dia, np.full((1,) + por_dia.shape[1:], neutro)])
+        indices = np.empty(2 * len(inicios), dtype=np.intp)
+        indices[0::2] = inicios
+        indices[1::2] = fines
+        return np.where((fines > inicios)[:, None], ufunc.reduceat(relleno, indices, axis=0)[0::2], neutro)
+
+    return AgregadosVentanas(
+        registros_tipo=ventanas(registros_tipo),
+        suma_tipo=ventanas(suma_tipo),
+        maximo_tipo=extremo(maximo_tipo, np.maximum, -np.inf),
+        minimo_tipo=extremo(minimo_tipo, np.minimum, np.inf),
+        registros_periodo=ventanas(registros_periodo),
+        suma_periodo=ventanas(suma_periodo),
+        dias=ventanas(dias)
+    )
+
+
 class PerfilesConsumoEnrichment:
     """
     Enriquecedor de perfiles de consumo horario
@@ -25,7 +116,8 @@ class PerfilesConsumoEnrichment:
     
     def __init__(self, db_url_sistema_electrico: str):
         self.db_url = db_url_sistema_electrico
-        self._perfil_cache = {}
+        # Almacén de perfiles por meses compartido por todo el proceso
+        self.store = obtener_store(db_url_sistema_electrico)
         
         # Mapeo de tipos de perfil a descripciones
         self.tipos_perfil = {
@@ -70,11 +162,11 @@ class PerfilesConsumoEnrichment:
                 fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
             
             # Obtener perfiles de consumo para el período
-            perfiles_data = self._get_consumption_profiles_for_period(fecha_inicio, fecha_fin)
+            ventana = self._get_consumption_profiles_for_period(fecha_inicio, fecha_fin)
             
-            if perfiles_data:
+            if ventana:
                 # Calcular métricas de perfiles
-                perfil_metrics = self._calculate_profile_metrics(perfiles_data, n1_data)
+                perfil_metrics = self._calculate_profile_metrics(ventana, n1_data)
                 
                 # Añadir datos de perfiles al N1
                 n1_data.update(perfil_metrics)
@@ -89,7 +181,70 @@ class PerfilesConsumoEnrichment:
             logger.error(f"Error en enriquecimiento con perfiles: {e}", exc_info=True)
             return n1_data
     
-    def _get_consumption_profiles_for_period(self, fecha_inicio, fecha_fin) -> List[Dict[str, Any]]:
+    def enrich_batch_with_consumption_profiles(self, registros_n1: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Enriquece en bloque muchos registros N1 (análisis de cartera).
+        
+        Se carga una única matriz de perfiles que cubre todos los periodos de
+        facturación y las métricas de todos los registros se calculan a la vez
+        con sumas acumuladas por día, sin recorrer perfiles por factura.
+        
+        Args:
+            registros_n1: Lista de datos N1 base (se actualizan in situ)
+            
+        Returns:
+            La misma lista de registros, enriquecidos
+        """
+        try:
+            periodos = [self._periodo_facturacion(registro) for registro in registros_n1]
+            validos = [i for i, periodo in enumerate(periodos) if periodo and periodo[0] <= periodo[1]]
+            if not validos:
+                logger.warning("No hay registros con fechas de facturación válidas")
+                return registros_n1
+            
+            origen = min(periodos[i][0] for i in validos)
+            final = max(periodos[i][1] for i in validos)
+            ventana = self.store.ventana(origen, final)
+            
+            inicios = np.array([(periodos[i][0] - origen).days for i in validos], dtype=np.intp)
+            fines = np.array([(periodos[i][1] - origen).days + 1 for i in validos], dtype=np.intp)
+            agregados = agregar_ventanas(ventana.matriz(), inicios, fines)
+            
+            consumos = [registros_n1[i].get('consumo_facturado_kwh', 0) for i in validos]
+            metricas = self._metrics_from_aggregates(agregados, ventana.tipos, consumos)
+            
+            enriquecidos = 0
+            for i, perfil_metrics in zip(validos, metricas):
+                if perfil_metrics:
+                    registros_n1[i].update(perfil_metrics)
+                    enriquecidos += 1
+            
+            logger.info(f"Enriquecimiento en bloque con perfiles completado: {enriquecidos}/{len(registros_n1)} registros")
+            return registros_n1
+            
+        except Exception as e:
+            logger.error(f"Error en enriquecimiento en bloque con perfiles: {e}", exc_info=True)
+            return registros_n1
+    
+    @staticmethod
+    def _periodo_facturacion(n1_data: Dict[str, Any]) -> Optional[Tuple[date, date]]:
+        """(fecha_inicio, fecha_fin) del registro como date, o None si faltan o son inválidas."""
+        fechas = []
+        for clave in ('fecha_inicio', 'fecha_fin'):
+            valor = n1_data.get(clave)
+            if not valor:
+                return None
+            if isinstance(valor, datetime):
+                valor = valor.date()
+            elif isinstance(valor, str):
+                try:
+                    valor = datetime.strptime(valor, '%Y-%m-%d').date()
+                except ValueError:
+                    return None
+            fechas.append(valor)
+        return fechas[0], fechas[1]
+    
+    def _get_consumption_profiles_for_period(self, fecha_inicio, fecha_fin) -> VentanaPerfiles:
         """
         Obtiene perfiles de consumo para un período específico
         
@@ -98,314 +253,217 @@ class PerfilesConsumoEnrichment:
             fecha_fin: Fecha de fin del período
             
         Returns:
-            Lista de registros de perfiles de consumo
+            Ventana de perfiles (vistas sin copia de las matrices mensuales del almacén)
         """
-        try:
-            with self.get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    query = """
-                        SELECT 
-                            fecha,
-                            hora,
-                            periodo,
-                            indicador_id,
-                            tipo_perfil,
-                            valor_perfil,
-                            unidad
-                        FROM perfiles_consumo
-                        WHERE fecha BETWEEN %s AND %s
-                        ORDER BY fecha, periodo, indicador_id
-                    """
-                    
-                    cur.execute(query, (fecha_inicio, fecha_fin))
-                    rows = cur.fetchall()
-                    
-                    perfiles = []
-                    for row in rows:
-                        perfiles.append({
-                            'fecha': row[0],
-                            'hora': row[1],
-                            'periodo': row[2],
-                            'indicador_id': row[3],
-                            'tipo_perfil': row[4],
-                            'valor_perfil': float(row[5]) if row[5] else 0,
-                            'unidad': row[6]
-                        })
-                    
-                    logger.info(f"Obtenidos {len(perfiles)} registros de perfiles para período {fecha_inicio} - {fecha_fin}")
-                    return perfiles
-                    
-        except Exception as e:
-            logger.error(f"Error obteniendo perfiles de consumo: {e}")
-            return []
+        ventana = self.store.ventana(fecha_inicio, fecha_fin)
+        logger.info(f"Obtenidos {len(ventana)} registros de perfiles para período {fecha_inicio} - {fecha_fin}")
+        return ventana
     
-    def _calculate_profile_metrics(self, perfiles_data: List[Dict[str, Any]], n1_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _calculate_profile_metrics(self, ventana: VentanaPerfiles, n1_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Calcula métricas basadas en perfiles de consumo
         
         Args:
-            perfiles_data: Datos de perfiles de consumo
+            ventana: Perfiles de consumo del período de facturación
             n1_data: Datos N1 base
             
         Returns:
             Diccionario con métricas calculadas
         """
-        metrics = {}
-        
         try:
-            if not perfiles_data:
-                return metrics
-            
-            # Agrupar por tipo de perfil
-            perfiles_por_tipo = {}
-            for perfil in perfiles_data:
-                tipo = perfil['tipo_perfil']
-                if tipo not in perfiles_por_tipo:
-                    perfiles_por_tipo[tipo] = []
-                perfiles_por_tipo[tipo].append(perfil)
-            
-            # Calcular métricas por tipo de perfil
-            for tipo_perfil, datos in perfiles_por_tipo.items():
-                prefix = f"perfil_{tipo_perfil.lower()}"
-                
-                # Estadísticas básicas
-                valores = [d['valor_perfil'] for d in datos if d['valor_perfil'] > 0]
-                if valores:
-                    metrics[f"{prefix}_promedio"] = round(sum(valores) / len(valores), 4)
-                    metrics[f"{prefix}_maximo"] = round(max(valores), 4)
-                    metrics[f"{prefix}_minimo"] = round(min(valores), 4)
-                    metrics[f"{prefix}_total"] = round(sum(valores), 4)
-                    metrics[f"{prefix}_registros"] = len(valores)
-            
-            # Análisis de patrones horarios
-            patrones_horarios = self._analyze_hourly_patterns(perfiles_data)
-            metrics.update(patrones_horarios)
-            
-            # Comparación con consumo facturado
-            consumo_facturado = n1_data.get('consumo_facturado_kwh', 0)
-            if consumo_facturado > 0:
-                comparacion = self._compare_with_billed_consumption(perfiles_data, consumo_facturado)
-                metrics.update(comparacion)
-            
-            # Recomendaciones de tarifa
-            recomendacion = self._recommend_tariff(perfiles_data, n1_data)
-            if recomendacion:
-                metrics['recomendacion_tarifa'] = recomendacion
-            
+            matriz = ventana.matriz()
+            agregados = agregar_ventanas(matriz, np.array([0]), np.array([matriz.shape[0]]))
+            return self._metrics_from_aggregates(agregados, ventana.tipos, [n1_data.get('consumo_facturado_kwh', 0)])[0]
         except Exception as e:
             logger.error(f"Error calculando métricas de perfiles: {e}")
-        
-        return metrics
+            return {}
     
-    def _analyze_hourly_patterns(self, perfiles_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _metrics_from_aggregates(self, agregados: AgregadosVentanas, tipos: Tuple[str, ...],
+                                 consumos_facturados: List[Any]) -> List[Dict[str, Any]]:
         """
-        Analiza patrones de consumo por horas
+        Calcula las métricas de R ventanas a la vez a partir de sus agregados
         
         Args:
-            perfiles_data: Datos de perfiles
+            agregados: Agregados de las R ventanas
+            tipos: Nombres de los tipos de perfil (eje de tipos)
+            consumos_facturados: Consumo facturado (kWh) de cada ventana
             
         Returns:
-            Métricas de patrones horarios
+            Lista de R diccionarios de métricas (vacío si la ventana no tiene perfiles)
         """
-        patterns = {}
+        # Estadísticas por tipo de perfil (solo valores > 0)
+        registros_tipo = agregados.registros_tipo
+        con_valores = registros_tipo > 0
+        divisor = np.where(con_valores, registros_tipo, 1)
+        promedio_tipo = np.round(agregados.suma_tipo / divisor, 4).tolist()
+        maximo_tipo = np.round(agregados.maximo_tipo, 4).tolist()
+        minimo_tipo = np.round(agregados.minimo_tipo, 4).tolist()
+        total_tipo = np.round(agregados.suma_tipo, 4).tolist()
+        prefijos = [f"perfil_{tipo.lower()}" for tipo in tipos]
         
-        try:
-            # Agrupar por período (hora)
-            consumo_por_hora = {}
-            for perfil in perfiles_data:
-                periodo = perfil['periodo']
-                valor = perfil['valor_perfil']
-                
-                if periodo not in consumo_por_hora:
-                    consumo_por_hora[periodo] = []
-                consumo_por_hora[periodo].append(valor)
-            
-            # Calcular promedios por hora
-            promedios_horarios = {}
-            for periodo, valores in consumo_por_hora.items():
-                if valores:
-                    promedios_horarios[periodo] = sum(valores) / len(valores)
+        patrones = self._analyze_hourly_patterns(agregados)
+        comparaciones = self._compare_with_billed_consumption(agregados, consumos_facturados)
+        recomendaciones = self._recommend_tariff(agregados)
+        
+        tiene_datos = (agregados.registros_periodo.sum(axis=1) > 0).tolist()
+        con_valores = con_valores.tolist()
+        registros_tipo = registros_tipo.tolist()
+        
+        resultados = []
+        for r in range(len(tiene_datos)):
+            metrics = {}
+            if tiene_datos[r]:
+                for t, prefix in enumerate(prefijos):
+                    if con_valores[r][t]:
+                        metrics[f"{prefix}_promedio"] = promedio_tipo[r][t]
+                        metrics[f"{prefix}_maximo"] = maximo_tipo[r][t]
+                        metrics[f"{prefix}_minimo"] = minimo_tipo[r][t]
+                        metrics[f"{prefix}_total"] = total_tipo[r][t]
+                        metrics[f"{prefix}_registros"] = registros_tipo[r][t]
+                metrics.update(patrones[r])
+                metrics.update(comparaciones[r])
+                if recomendaciones[r]:
+                    metrics['recomendacion_tarifa'] = recomendaciones[r]
+            resultados.append(metrics)
+        return resultados
+    
+    def _analyze_hourly_patterns(self, agregados: AgregadosVentanas) -> List[Dict[str, Any]]:
+        """
+        Analiza patrones de consumo por horas
+        
+        Args:
+            agregados: Agregados de las ventanas
             
-            if promedios_horarios:
-                # Identificar picos y valles
-                max_consumo = max(promedios_horarios.values())
-                min_consumo = min(promedios_horarios.values())
-                
-                hora_pico = max(promedios_horarios, key=promedios_horarios.get)
-                hora_valle = min(promedios_horarios, key=promedios_horarios.get)
-                
-                patterns['patron_hora_pico'] = hora_pico
-                patterns['patron_hora_valle'] = hora_valle
-                patterns['patron_consumo_pico'] = round(max_consumo, 4)
-                patterns['patron_consumo_valle'] = round(min_consumo, 4)
-                patterns['patron_ratio_pico_valle'] = round(max_consumo / min_consumo, 2) if min_consumo > 0 else 0
-                
-                # Clasificar tipo de consumidor
-                tipo_consumidor = self._classify_consumer_type(promedios_horarios)
-                patterns['tipo_consumidor'] = tipo_consumidor
+        Returns:
+            Métricas de patrones horarios de cada ventana
+        """
+        promedios = agregados.promedios_periodo
+        hay_periodos = ~np.isnan(promedios).all(axis=1)
         
-        except Exception as e:
-            logger.error(f"Error analizando patrones horarios: {e}")
+        # Picos y valles sobre los periodos con datos
+        hora_pico = np.argmax(np.where(np.isnan(promedios), -np.inf, promedios), axis=1)
+        hora_valle = np.argmin(np.where(np.isnan(promedios), np.inf, promedios), axis=1)
+        filas = np.arange(promedios.shape[0])
+        max_consumo = promedios[filas, hora_pico]
+        min_consumo = promedios[filas, hora_valle]
+        ratio = np.round(np.divide(max_consumo, min_consumo, out=np.zeros_like(max_consumo),
+                                   where=min_consumo > 0), 2)
+        tipos_consumidor = self._classify_consumer_type(promedios)
         
+        patterns = []
+        for r, hay in enumerate(hay_periodos.tolist()):
+            if not hay:
+                patterns.append({})
+                continue
+            patterns.append({
+                'patron_hora_pico': int(hora_pico[r]),
+                'patron_hora_valle': int(hora_valle[r]),
+                'patron_consumo_pico': round(float(max_consumo[r]), 4),
+                'patron_consumo_valle': round(float(min_consumo[r]), 4),
+                'patron_ratio_pico_valle': float(ratio[r]) if min_consumo[r] > 0 else 0,
+                'tipo_consumidor': tipos_consumidor[r]
+            })
         return patterns
     
-    def _classify_consumer_type(self, promedios_horarios: Dict[int, float]) -> str:
+    def _classify_consumer_type(self, promedios_horarios: np.ndarray) -> List[str]:
         """
         Clasifica el tipo de consumidor basado en patrones horarios
         
         Args:
-            promedios_horarios: Consumo promedio por hora
+            promedios_horarios: Consumo promedio por periodo (R × PERIODOS_DIA, NaN = sin dato)
             
         Returns:
-            Tipo de consumidor
+            Tipo de consumidor de cada ventana
         """
-        try:
-            # Definir períodos
-            horas_laborales = list(range(8, 18))  # 8:00 - 17:59
-            horas_nocturnas = list(range(22, 24)) + list(range(0, 7))  # 22:00 - 06:59
-            horas_residenciales = list(range(18, 22))  # 18:00 - 21:59
-            
-            # Calcular consumo por período
-            consumo_laboral = sum(promedios_horarios.get(h, 0) for h in horas_laborales)
-            consumo_nocturno = sum(promedios_horarios.get(h, 0) for h in horas_nocturnas)
-            consumo_residencial = sum(promedios_horarios.get(h, 0) for h in horas_residenciales)
-            
-            total_consumo = consumo_laboral + consumo_nocturno + consumo_residencial
-            
-            if total_consumo == 0:
-                return "INDETERMINADO"
-            
-            # Calcular porcentajes
-            pct_laboral = (consumo_laboral / total_consumo) * 100
-            pct_nocturno = (consumo_nocturno / total_consumo) * 100
-            pct_residencial = (consumo_residencial / total_consumo) * 100
-            
-            # Clasificar
-            if pct_laboral > 50:
-                return "COMERCIAL_INDUSTRIAL"
-            elif pct_residencial > 40:
-                return "RESIDENCIAL"
-            elif pct_nocturno > 30:
-                return "NOCTURNO_INTENSIVO"
-            else:
-                return "MIXTO"
-                
-        except Exception as e:
-            logger.error(f"Error clasificando tipo de consumidor: {e}")
-            return "INDETERMINADO"
+        promedios = np.nan_to_num(promedios_horarios)
+        consumo_laboral = promedios[:, HORAS_LABORALES].sum(axis=1)
+        consumo_nocturno = promedios[:, HORAS_NOCTURNAS].sum(axis=1)
+        consumo_residencial = promedios[:, HORAS_RESIDENCIALES].sum(axis=1)
+        total_consumo = consumo_laboral + consumo_nocturno + consumo_residencial
+        
+        divisor = np.where(total_consumo == 0, 1, total_consumo)
+        pct_laboral = consumo_laboral / divisor * 100
+        pct_nocturno = consumo_nocturno / divisor * 100
+        pct_residencial = consumo_residencial / divisor * 100
+        
+        return np.select(
+            [total_consumo == 0, pct_laboral > 50, pct_residencial > 40, pct_nocturno > 30],
+            ["INDETERMINADO", "COMERCIAL_INDUSTRIAL", "RESIDENCIAL", "NOCTURNO_INTENSIVO"],
+            default="MIXTO"
+        ).tolist()
     
-    def _compare_with_billed_consumption(self, perfiles_data: List[Dict[str, Any]], consumo_facturado: float) -> Dict[str, Any]:
+    def _compare_with_billed_consumption(self, agregados: AgregadosVentanas,
+                                         consumos_facturados: List[Any]) -> List[Dict[str, Any]]:
         """
         Compara perfiles con consumo facturado
         
         Args:
-            perfiles_data: Datos de perfiles
-            consumo_facturado: Consumo facturado en kWh
+            agregados: Agregados de las ventanas
+            consumos_facturados: Consumo facturado en kWh de cada ventana
             
         Returns:
-            Métricas de comparación
+            Métricas de comparación de cada ventana
         """
-        comparison = {}
+        consumo = np.array([float(c) if c else 0.0 for c in consumos_facturados])
         
-        try:
-            # Sumar todos los perfiles (promedio de todos los tipos)
-            total_perfiles = sum(p['valor_perfil'] for p in perfiles_data if p['valor_perfil'] > 0)
-            num_registros = len([p for p in perfiles_data if p['valor_perfil'] > 0])
-            
-            if num_registros > 0 and total_perfiles > 0:
-                promedio_perfiles = total_perfiles / num_registros
-                
-                # Estimar consumo total basado en perfiles (simplificado)
-                # Asumiendo que tenemos datos horarios para el período
-                dias_periodo = len(set(p['fecha'] for p in perfiles_data))
-                if dias_periodo > 0:
-                    estimado_total = promedio_perfiles * 24 * dias_periodo
-                    
-                    comparison['consumo_estimado_perfiles'] = round(estimado_total, 2)
-                    comparison['diferencia_vs_facturado'] = round(abs(estimado_total - consumo_facturado), 2)
-                    comparison['ratio_estimado_facturado'] = round(estimado_total / consumo_facturado, 4) if consumo_facturado > 0 else 0
-                    
-                    # Evaluación de precisión
-                    diferencia_pct = abs(estimado_total - consumo_facturado) / consumo_facturado * 100 if consumo_facturado > 0 else 100
-                    
-                    if diferencia_pct < 5:
-                        precision = "ALTA"
-                    elif diferencia_pct < 15:
-                        precision = "MEDIA"
-                    else:
-                        precision = "BAJA"
-                    
-                    comparison['precision_estimacion'] = precision
-                    comparison['diferencia_porcentual'] = round(diferencia_pct, 2)
+        # Sumar todos los perfiles (promedio de todos los tipos)
+        total_perfiles = agregados.suma_tipo.sum(axis=1)
+        num_registros = agregados.registros_tipo.sum(axis=1)
+        aplicable = (consumo > 0) & (num_registros > 0) & (total_perfiles > 0) & (agregados.dias > 0)
         
-        except Exception as e:
-            logger.error(f"Error comparando con consumo facturado: {e}")
+        # Estimar consumo total basado en perfiles (simplificado, datos horarios del período)
+        promedio_perfiles = total_perfiles / np.where(num_registros > 0, num_registros, 1)
+        estimado_total = promedio_perfiles * 24 * agregados.dias
+        divisor = np.where(consumo > 0, consumo, 1)
+        diferencia = np.abs(estimado_total - consumo)
+        diferencia_pct = diferencia / divisor * 100
+        precision = np.select([diferencia_pct < 5, diferencia_pct < 15], ["ALTA", "MEDIA"], default="BAJA")
         
-        return comparison
+        comparisons = []
+        for r, aplica in enumerate(aplicable.tolist()):
+            if not aplica:
+                comparisons.append({})
+                continue
+            comparisons.append({
+                'consumo_estimado_perfiles': round(float(estimado_total[r]), 2),
+                'diferencia_vs_facturado': round(float(diferencia[r]), 2),
+                'ratio_estimado_facturado': round(float(estimado_total[r] / consumo[r]), 4),
+                'precision_estimacion': str(precision[r]),
+                'diferencia_porcentual': round(float(diferencia_pct[r]), 2)
+            })
+        return comparisons
     
-    def _recommend_tariff(self, perfiles_data: List[Dict[str, Any]], n1_data: Dict[str, Any]) -> Optional[str]:
+    def _recommend_tariff(self, agregados: AgregadosVentanas) -> List[Optional[str]]:
         """
         Recomienda tarifa óptima basada en perfiles de consumo
         
         Args:
-            perfiles_data: Datos de perfiles
-            n1_data: Datos N1 base
+            agregados: Agregados de las ventanas
             
         Returns:
-            Recomendación de tarifa
+            Recomendación de tarifa de cada ventana (None si no hay datos)
         """
-        try:
-            if not perfiles_data:
-                return None
-            
-            # Analizar distribución horaria
-            consumo_por_hora = {}
-            for perfil in perfiles_data:
-                periodo = perfil['periodo']
-                valor = perfil['valor_perfil']
-                
-                if periodo not in consumo_por_hora:
-                    consumo_por_hora[periodo] = []
-                consumo_por_hora[periodo].append(valor)
-            
-            # Calcular promedios
-            promedios = {h: sum(v)/len(v) for h, v in consumo_por_hora.items() if v}
-            
-            if not promedios:
-                return None
-            
-            # Definir períodos tarifarios típicos
-            horas_punta = list(range(10, 14)) + list(range(18, 22))  # 10-14h y 18-22h
-            horas_valle = list(range(0, 8)) + list(range(22, 24))    # 0-8h y 22-24h
-            horas_llano = [h for h in range(24) if h not in horas_punta and h not in horas_valle]
-            
-            # Calcular consumo por período
-            consumo_punta = sum(promedios.get(h, 0) for h in horas_punta)
-            consumo_valle = sum(promedios.get(h, 0) for h in horas_valle)
-            consumo_llano = sum(promedios.get(h, 0) for h in horas_llano)
-            
-            total = consumo_punta + consumo_valle + consumo_llano
-            
-            if total == 0:
-                return None
-            
-            # Calcular porcentajes
-            pct_punta = (consumo_punta / total) * 100
-            pct_valle = (consumo_valle / total) * 100
-            
-            # Recomendar tarifa
-            if pct_valle > 40:
-                return "Tarifa con discriminación horaria - Alto consumo nocturno"
-            elif pct_punta > 60:
-                return "Revisar horarios de consumo - Alto consumo en horas punta"
-            elif pct_valle > 25 and pct_punta < 40:
-                return "Tarifa 2.0 DHA recomendada - Buen perfil nocturno"
-            else:
-                return "Tarifa actual adecuada - Perfil de consumo equilibrado"
-                
-        except Exception as e:
-            logger.error(f"Error recomendando tarifa: {e}")
-            return None
+        promedios = np.nan_to_num(agregados.promedios_periodo)
+        
+        # Consumo por período tarifario típico
+        consumo_punta = promedios[:, HORAS_PUNTA].sum(axis=1)
+        consumo_valle = promedios[:, HORAS_VALLE].sum(axis=1)
+        consumo_llano = promedios[:, HORAS_LLANO].sum(axis=1)
+        total = consumo_punta + consumo_valle + consumo_llano
+        
+        divisor = np.where(total == 0, 1, total)
+        pct_punta = consumo_punta / divisor * 100
+        pct_valle = consumo_valle / divisor * 100
+        
+        recomendaciones = np.select(
+            [total == 0, pct_valle > 40, pct_punta > 60, (pct_valle > 25) & (pct_punta < 40)],
+            ["",
+             "Tarifa con discriminación horaria - Alto consumo nocturno",
+             "Revisar horarios de consumo - Alto consumo en horas punta",
+             "Tarifa 2.0 DHA recomendada - Buen perfil nocturno"],
+            default="Tarifa actual adecuada - Perfil de consumo equilibrado"
+        ).tolist()
+        return [recomendacion or None for recomendacion in recomendaciones]
 
 if __name__ == "__main__":
     # Test básico del módulo
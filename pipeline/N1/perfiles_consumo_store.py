@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Almacén columnar de perfiles de consumo horario (tabla perfiles_consumo)
+Carga la tabla por meses en matrices NumPy (día × periodo × tipo de perfil) una
+sola vez por proceso y las mantiene en un LRU de meses. La ventana de facturación
+de cada factura es una vista (slice sin copia) sobre las matrices de sus meses.
+"""
+
+import calendar
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Tipos de perfil ESIOS conocidos (indicadores 526-532); fijan el orden del eje de tipos
+TIPOS_PERFIL_CONOCIDOS = (
+    'PVPC_2.0A_PEAJE',
+    'PVPC_2.0DHA_EFICIENCIA',
+    'PVPC_2.0DHS_VEHICULO',
+    'PERFIL_FINAL_A',
+    'PERFIL_FINAL_B',
+    'PERFIL_FINAL_C',
+    'PERFIL_FINAL_D',
+)
+
+# Periodos por día: 0-24 cubre horas 0-23, periodos 1-24 y días de 25 horas (cambio horario)
+PERIODOS_DIA = 25
+
+# Meses en memoria por defecto (≈ 31 × 25 × 7 × 8 bytes ≈ 43 KB por mes)
+MAX_MESES_DEFECTO = 24
+
+# Segundos tras los que se recarga un mes aún abierto (puede recibir datos nuevos)
+TTL_MES_ABIERTO = 3600
+
+
+def _a_fecha(valor) -> date:
+    """Normaliza str 'YYYY-MM-DD', datetime o date a date."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(str(valor), '%Y-%m-%d').date()
+
+
+def _meses_entre(inicio: date, fin: date) -> List[Tuple[int, int]]:
+    """Lista de (año, mes) que cubre el intervalo [inicio, fin]."""
+    meses = []
+    anio, mes = inicio.year, inicio.month
+    while (anio, mes) <= (fin.year, fin.month):
+        meses.append((anio, mes))
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+    return meses
+
+
+class MesPerfiles:
+    """Matriz de un mes: valores[día - 1, periodo, tipo] (NaN = sin registro)."""
+
+    __slots__ = ('anio', 'mes', 'valores', 'num_tipos', 'cargado_en', 'abierto')
+
+    def __init__(self, anio: int, mes: int, valores: np.ndarray, num_tipos: int, abierto: bool):
+        self.anio = anio
+        self.mes = mes
+        self.valores = valores
+        self.num_tipos = num_tipos
+        self.cargado_en = time.monotonic()
+        self.abierto = abierto
+
+    @property
+    def primer_dia(self) -> date:
+        return date(self.anio, self.mes, 1)
+
+
+class VentanaPerfiles:
+    """
+    Perfiles de una ventana de facturación.
+
+    `bloques` son vistas (sin copia) de las matrices mensuales, una por mes
+    tocado, con forma (días, PERIODOS_DIA, tipos_del_mes). El eje de tipos solo
+    crece, así que la columna i de cualquier bloque corresponde a `tipos[i]`.
+    """
+
+    def __init__(self, tipos: Tuple[str, ...], bloques: List[np.ndarray], fechas_inicio: List[date]):
+        self.tipos = tipos
+        self.bloques = bloques
+        self.fechas_inicio = fechas_inicio
+
+    def __bool__(self) -> bool:
+        return any(not np.isnan(bloque).all() for bloque in self.bloques)
+
+    def __len__(self) -> int:
+        """Número de registros (celdas con dato) de la ventana."""
+        return int(sum(np.count_nonzero(~np.isnan(bloque)) for bloque in self.bloques))
+
+    def matriz(self) -> np.ndarray:
+        """
+        Ventana como una única matriz (días, PERIODOS_DIA, len(tipos)).
+        Sin copia si la ventana cae en un solo mes con todos los tipos; si abarca
+        varios meses se concatenan los bloques (rellenando tipos nuevos con NaN).
+        """
+        num_tipos = len(self.tipos)
+        bloques = [
+            bloque if bloque.shape[2] == num_tipos else
+            np.pad(bloque, ((0, 0), (0, 0), (0, num_tipos - bloque.shape[2])), constant_values=np.nan)
+            for bloque in self.bloques
+        ]
+        if not bloques:
+            return np.empty((0, PERIODOS_DIA, num_tipos))
+        if len(bloques) == 1:
+            return bloques[0]
+        return np.concatenate(bloques)
+
+    def registros(self) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre la ventana como registros fila a fila (fecha, periodo, tipo_perfil,
+        valor_perfil) en orden fecha, periodo, tipo. Útil para depuración.
+        """
+        for inicio, bloque in zip(self.fechas_inicio, self.bloques):
+            for dia, periodo, tipo in zip(*np.nonzero(~np.isnan(bloque))):
+                yield {
+                    'fecha': inicio + timedelta(days=int(dia)),
+                    'periodo': int(periodo),
+                    'tipo_perfil': self.tipos[tipo],
+                    'valor_perfil': float(bloque[dia, periodo, tipo])
+                }
+
+
+class PerfilesConsumoStore:
+    """
+    Almacén de perfiles por mes con LRU.
+
+    Cada mes se consulta una única vez (una conexión, una query) y se guarda como
+    matriz float64 NaN-inicializada; las facturas del mismo mes reutilizan la matriz.
+    """
+
+    def __init__(self, db_url: str, max_meses: int = MAX_MESES_DEFECTO,
+                 ttl_mes_abierto: float = TTL_MES_ABIERTO):
+        self.db_url = db_url
+        self.max_meses = max_meses
+        self.ttl_mes_abierto = ttl_mes_abierto
+        self.tipos: List[str] = list(TIPOS_PERFIL_CONOCIDOS)
+        self._indice_tipos: Dict[str, int] = {t: i for i, t in enumerate(self.tipos)}
+        self._meses: 'OrderedDict[Tuple[int, int], MesPerfiles]' = OrderedDict()
+        self._lock = threading.RLock()
+        self.estadisticas = {'aciertos': 0, 'cargas': 0, 'expulsiones': 0, 'errores': 0}
+
+    def get_db_connection(self):
+        """Crear conexión a base de datos sistema_electrico"""
+        return psycopg2.connect(self.db_url)
+
+    def ventana(self, fecha_inicio, fecha_fin) -> VentanaPerfiles:
+        """
+        Perfiles del intervalo [fecha_inicio, fecha_fin] como vistas de las matrices mensuales.
+
+        Args:
+            fecha_inicio: Fecha de inicio (date, datetime o 'YYYY-MM-DD')
+            fecha_fin: Fecha de fin (incluida)
+
+        Returns:
+            VentanaPerfiles (vacía si el intervalo es inválido)
+        """
+        inicio, fin = _a_fecha(fecha_inicio), _a_fecha(fecha_fin)
+        bloques, fechas_inicio = [], []
+        if inicio > fin:
+            return VentanaPerfiles(tuple(self.tipos), bloques, fechas_inicio)
+
+        for anio, mes in _meses_entre(inicio, fin):
+            datos_mes = self.obtener_mes(anio, mes)
+            dia_desde = inicio.day - 1 if (anio, mes) == (inicio.year, inicio.month) else 0
+            dia_hasta = fin.day if (anio, mes) == (fin.year, fin.month) else datos_mes.valores.shape[0]
+            bloques.append(datos_mes.valores[dia_desde:dia_hasta])
+            fechas_inicio.append(datos_mes.primer_dia + timedelta(days=dia_desde))
+
+        with self._lock:
+            tipos = tuple(self.tipos)
+        return VentanaPerfiles(tipos, bloques, fechas_inicio)
+
+    def obtener_mes(self, anio: int, mes: int) -> MesPerfiles:
+        """Matriz del mes desde el LRU, cargándola de BD si falta o está caducada."""
+        clave = (anio, mes)
+        with self._lock:
+            datos_mes = self._meses.get(clave)
+            if datos_mes is not None and not self._caducado(datos_mes):
+                self._meses.move_to_end(clave)
+                self.estadisticas['aciertos'] += 1
+                return datos_mes
+
+            try:
+                datos_mes = self._cargar_mes(anio, mes)
+            except Exception as e:
+                logger.error(f"Error obteniendo perfiles de consumo {anio}-{mes:02d}: {e}")
+                self.estadisticas['errores'] += 1
+                # Mes vacío sin memorizar: la siguiente ventana que lo toque vuelve a consultar
+                return self._mes_vacio(anio, mes)
+            self._meses[clave] = datos_mes
+            self._meses.move_to_end(clave)
+            self.estadisticas['cargas'] += 1
+            while len(self._meses) > self.max_meses:
+                self._meses.popitem(last=False)
+                self.estadisticas['expulsiones'] += 1
+            return datos_mes
+
+    def invalidar(self, anio: Optional[int] = None, mes: Optional[int] = None):
+        """Descarta un mes concreto o, sin argumentos, todo el almacén."""
+        with self._lock:
+            if anio is None:
+                self._meses.clear()
+            else:
+                self._meses.pop((anio, mes), None)
+
+    def _caducado(self, datos_mes: MesPerfiles) -> bool:
+        return datos_mes.abierto and time.monotonic() - datos_mes.cargado_en > self.ttl_mes_abierto
+
+    def _mes_vacio(self, anio: int, mes: int) -> MesPerfiles:
+        """Matriz NaN del mes (sin registros) para cuando la consulta falla."""
+        dias_mes = calendar.monthrange(anio, mes)[1]
+        num_tipos = len(self.tipos)
+        return MesPerfiles(anio, mes, np.full((dias_mes, PERIODOS_DIA, num_tipos), np.nan), num_tipos, True)
+
+    def _cargar_mes(self, anio: int, mes: int) -> MesPerfiles:
+        """Consulta el mes completo y lo vuelca a una matriz (día × periodo × tipo)."""
+        dias_mes = calendar.monthrange(anio, mes)[1]
+        desde = date(anio, mes, 1)
+        hasta = desde + timedelta(days=dias_mes)
+        abierto = hasta > date.today()
+
+        # Los errores de BD se propagan: obtener_mes no memoriza un mes que no se pudo leer
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT fecha, periodo, tipo_perfil, valor_perfil
+                    FROM perfiles_consumo
+                    WHERE fecha >= %s AND fecha < %s
+                """, (desde, hasta))
+                filas = cur.fetchall()
+
+        for tipo in {fila[2] for fila in filas} - self._indice_tipos.keys():
+            self._indice_tipos[tipo] = len(self.tipos)
+            self.tipos.append(tipo)
+        num_tipos = len(self.tipos)
+
+        valores = np.full((dias_mes, PERIODOS_DIA, num_tipos), np.nan)
+        if filas:
+            dias = np.fromiter((_a_fecha(f[0]).day - 1 for f in filas), dtype=np.intp, count=len(filas))
+            periodos = np.fromiter((f[1] if f[1] is not None else -1 for f in filas), dtype=np.intp, count=len(filas))
+            tipos = np.fromiter((self._indice_tipos[f[2]] for f in filas), dtype=np.intp, count=len(filas))
+            # valor_perfil nulo o 0 se guarda como 0 (igual que el cálculo fila a fila)
+            datos = np.fromiter((float(f[3]) if f[3] else 0.0 for f in filas), dtype=np.float64, count=len(filas))
+
+            validos = (periodos >= 0) & (periodos < PERIODOS_DIA)
+            if not validos.all():
+                logger.warning(f"Perfiles {anio}-{mes:02d}: {int((~validos).sum())} registros con periodo fuera de rango")
+            valores[dias[validos], periodos[validos], tipos[validos]] = datos[validos]
+
+        logger.info(f"Perfiles {anio}-{mes:02d} cargados: {len(filas)} registros")
+        return MesPerfiles(anio, mes, valores, num_tipos, abierto)
+
+
+# Almacenes compartidos por proceso, uno por base de datos
+_stores: Dict[str, PerfilesConsumoStore] = {}
+_stores_lock = threading.Lock()
+
+
+def obtener_store(db_url: str, **kwargs) -> PerfilesConsumoStore:
+    """Almacén de perfiles compartido en el proceso para `db_url`."""
+    with _stores_lock:
+        store = _stores.get(db_url)
+        if store is None:
+            store = _stores[db_url] = PerfilesConsumoStore(db_url, **kwargs)
+        return store
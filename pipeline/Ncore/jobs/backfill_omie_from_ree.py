@@ -6,9 +6,14 @@ Backfill de precios OMIE horarios en db_sistema_electrico.omie_precios usando AP
 - Evita duplicados: si el día ya tiene >= 20 registros (23/24/25 según DST), se salta.
 - Inserta vía psql \copy para no depender de librerías de BD.
 
+- Archiva las respuestas crudas de REE (fuente 'ree_precios', clave '<inicio>/<fin>') para
+  reprocesar el histórico sin red con --replay.
+
 Uso:
   python3 backfill_omie_from_ree.py --start 2025-04-01 --end 2025-09-08
+  python3 backfill_omie_from_ree.py --replay --start 2024-01-01 --end 2024-12-31 [--workers N]
 Si no se pasan fechas, calculará start = (MAX(fecha) en omie_precios) + 1 día, end = hoy.
+En --replay los días del rango con respuesta archivada se reemplazan (DELETE + \copy en una transacción).
 """
 import argparse
 import csv
@@ -18,10 +23,12 @@ import subprocess
 import sys
 import tempfile
 from datetime import datetime, date, timedelta, UTC
-from typing import Optional, List, Dict
-import time
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
 
-import requests
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from http_fetch import obtener_fetcher, PoliticaReintentos
+from raw_archive import obtener_archivo, reprocesar
 
 REE_URL = "https://apidatos.ree.es/es/datos/mercados/precios-mercados"
 # Endpoint alternativo (tiempo real) por si el principal devuelve 5xx
@@ -35,16 +42,25 @@ REE_PARAMS_BASE = {
 
 PSQL_BIN = os.getenv("PSQL_BIN", "psql")
 DB_NAME = os.getenv("DB_SISTEMA_ELECTRICO", "db_sistema_electrico")
+# Agregados diarios/mensuales OMIE (recalcular_omie_agregados, pipeline/Ncore/sql/agregados_incrementales.sql)
+DB_NCORE = "db_Ncore"
 DB_USER = os.getenv("DB_USER", "postgres")
 ZONA = "ES"
 FUENTE_ID = 1
 
+# Reintentos por endpoint: 3 intentos con esperas crecientes (~2-4 s, ~5-10 s)
+POLITICA_REE = PoliticaReintentos(intentos=3, base=4.0, factor=2.5)
+
+fetcher = obtener_fetcher()
+
+FUENTE_ARCHIVO = "ree_precios"
 
-def run_psql_scalar(sql: str) -> Optional[str]:
+
+def run_psql_scalar(sql: str, db_name: str = DB_NAME) -> Optional[str]:
     """Ejecuta psql y devuelve la salida en una sola línea (strip)."""
     try:
         res = subprocess.run(
-            [PSQL_BIN, "-U", DB_USER, "-d", DB_NAME, "-tAc", sql],
+            [PSQL_BIN, "-U", DB_USER, "-d", db_name, "-tAc", sql],
             check=True,
             capture_output=True,
             text=True,
@@ -76,6 +92,33 @@ def get_max_fecha() -> Optional[date]:
         return None
 
 
+def ensure_partitions(start_d: date, end_d: date) -> None:
+    """Crea los meses que falten si omie_precios está particionada (sql/particionado); si no, nada."""
+    particionada = run_psql_scalar(
+        "SELECT to_regprocedure('columna_particion_mensual(text)') IS NOT NULL "
+        "AND EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('omie_precios'));"
+    )
+    if particionada != "t":
+        return
+    out = run_psql_scalar(
+        f"SELECT crear_particiones_mensuales('omie_precios', DATE '{start_d.isoformat()}', DATE '{end_d.isoformat()}');"
+    )
+    if out and out != "0":
+        print(f"[INFO] omie_precios: {out} particiones mensuales creadas")
+
+
+def refresh_ncore_aggregates(days: List[date]) -> None:
+    """Recalcula en db_Ncore solo los agregados OMIE de `days` (y de sus meses)."""
+    if not days:
+        return
+    fechas = ", ".join(f"DATE '{d.isoformat()}'" for d in sorted(set(days)))
+    out = run_psql_scalar(f"SELECT recalcular_omie_agregados(ARRAY[{fechas}]);", db_name=DB_NCORE)
+    if out is None:
+        print("[WARN] No se pudieron recalcular los agregados OMIE en Ncore", file=sys.stderr)
+    else:
+        print(f"[OK] Agregados OMIE recalculados en Ncore: {out} días")
+
+
 def _extract_values_from_response(j: Dict) -> List[Dict]:
     """Extrae la lista de values horarios de la respuesta REE."""
     values: List[Dict] = []
@@ -106,58 +149,62 @@ def fetch_ree_day(d: date) -> List[Dict]:
         "start_date": start_dt,
         "end_date": end_dt,
     }
-    headers = {"Accept": "application/json"}
+    return _fetch_ree_values(params, timeout=60)
 
-    urls = [REE_URL, REE_URL_ALT]
+
+def _fetch_ree_values(params: Dict, timeout: float) -> List[Dict]:
+    """Consulta REE_URL y, si falla o viene vacío, REE_URL_ALT (cada uno con sus reintentos)."""
+    headers = {"Accept": "application/json"}
     last_err: Optional[Exception] = None
-    for url in urls:
-        # Reintentos con backoff: 3 intentos: 2s, 5s, 10s
-        for attempt, delay in [(1, 2), (2, 5), (3, 10)]:
-            try:
-                r = requests.get(url, params=params, headers=headers, timeout=60)
-                r.raise_for_status()
-                j = r.json()
-                vals = _extract_values_from_response(j)
-                if vals:
-                    return vals
-                # Si la respuesta es válida pero sin valores, probamos siguiente URL o intentos
-                last_err = None
-            except Exception as e:
-                last_err = e
-                time.sleep(delay)
-        # probar siguiente URL
+    # Clave ordenable por fecha de inicio: '2025-04-01T00:00/2025-04-08T00:00'
+    clave = f"{params['start_date']}/{params['end_date']}"
+    for url in [REE_URL, REE_URL_ALT]:
+        try:
+            j = fetcher.get_json(url, params=params, headers=headers, timeout=timeout, politica=POLITICA_REE,
+                                 archivar=(FUENTE_ARCHIVO, clave))
+        except Exception as e:
+            last_err = e
+            continue
+        vals = _extract_values_from_response(j)
+        if vals:
+            return vals
+        # Si la respuesta es válida pero sin valores, probamos la siguiente URL
+        last_err = None
     if last_err:
         raise last_err
     return []
 
 
 def write_csv_for_day(d: date, values: List[Dict], csv_path: str) -> int:
+    with open(csv_path, "w", newline="") as f:
+        return write_rows_for_day(csv.writer(f), d, values)
+
+
+def write_rows_for_day(w, d: date, values: List[Dict]) -> int:
     # Columnas: fecha, hora (HH:MM:SS), periodo(int 1..24 aprox), precio_energia(€/kWh), zona, fuente_id, created_at
     rows = 0
-    with open(csv_path, "w", newline="") as f:
-        w = csv.writer(f)
-        for idx, v in enumerate(values):
-            val_mwh = v.get("value")
-            ts = v.get("datetime")  # ej: 2025-04-01T01:00:00.000+01:00
-            if val_mwh is None or ts is None:
-                continue
-            # Convertir a €/kWh
-            try:
-                precio_kwh = float(val_mwh) / 1000.0
-            except Exception:
-                continue
-            # Normalizar hora HH:MM:SS
-            try:
-                # Cortar sólo la parte de hora en formato HH:MM:SS
-                hh = ts.split("T")[1].split("+")[0].split("-")[0]
-                if len(hh) == 5:
-                    hh = hh + ":00"
-            except Exception:
-                hh = "00:00:00"
-            periodo = idx + 1  # índice 1..24 aprox (puede ser 23/25 DST)
-            created_at = datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S")
-            w.writerow([d.isoformat(), hh, periodo, f"{precio_kwh:.6f}", ZONA, FUENTE_ID, created_at])
-            rows += 1
+    for idx, v in enumerate(values):
+        val_mwh = v.get("value")
+        ts = v.get("datetime")  # ej: 2025-04-01T01:00:00.000+01:00
+        if val_mwh is None or ts is None:
+            continue
+        # Convertir a €/kWh
+        try:
+            precio_kwh = float(val_mwh) / 1000.0
+        except Exception:
+            continue
+        # Normalizar hora HH:MM:SS
+        try:
+            # Cortar sólo la parte de hora en formato HH:MM:SS
+            hh = ts.split("T")[1].split("+")[0].split("-")[0]
+            if len(hh) == 5:
+                hh = hh + ":00"
+        except Exception:
+            hh = "00:00:00"
+        periodo = idx + 1  # índice 1..24 aprox (puede ser 23/25 DST)
+        created_at = datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S")
+        w.writerow([d.isoformat(), hh, periodo, f"{precio_kwh:.6f}", ZONA, FUENTE_ID, created_at])
+        rows += 1
     return rows
 
 
@@ -168,6 +215,66 @@ def copy_csv_into_db(csv_path: str):
     subprocess.run([PSQL_BIN, "-U", DB_USER, "-d", DB_NAME, "-c", sql], check=True)
 
 
+def replace_days_in_db(csv_path: str, days: List[date]):
+    """Sustituye en una transacción las filas de `days` por las del CSV (modo --replay)."""
+    fechas = ", ".join(f"DATE '{d.isoformat()}'" for d in days)
+    script = (
+        "BEGIN;\n"
+        f"DELETE FROM omie_precios WHERE zona = '{ZONA}' AND fuente_id = {FUENTE_ID} AND fecha IN ({fechas});\n"
+        "\\copy omie_precios (fecha, hora, periodo, precio_energia, zona, fuente_id, created_at) "
+        f"FROM '{csv_path}' WITH (FORMAT csv)\n"
+        "COMMIT;\n"
+    )
+    with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".sql") as tmp:
+        tmp.write(script)
+        script_path = tmp.name
+    try:
+        subprocess.run([PSQL_BIN, "-U", DB_USER, "-d", DB_NAME, "-v", "ON_ERROR_STOP=1", "-f", script_path],
+                       check=True)
+    finally:
+        os.unlink(script_path)
+
+
+def _parsear_entrada(entrada, j: Dict) -> Dict[date, List[Dict]]:
+    """Worker de --replay: valores horarios por día de una respuesta archivada."""
+    return group_values_by_day(_extract_values_from_response(j))
+
+
+def replay(start_d: date, end_d: date, workers: Optional[int] = None) -> int:
+    """
+    Reconstruye omie_precios para [start_d, end_d] solo desde el archivo de respuestas.
+    El parseo va en paralelo; si varias respuestas cubren un día gana la recibida más tarde.
+    """
+    archivo = obtener_archivo()
+    # Las claves empiezan por la fecha de inicio; un paquete semanal puede empezar hasta 6 días antes
+    entradas = archivo.entradas(FUENTE_ARCHIVO, desde=(start_d - timedelta(days=7)).isoformat(),
+                                hasta=f"{end_d.isoformat()}~")
+    print(f"[INFO] Replay {start_d}..{end_d}: {len(entradas)} respuestas archivadas")
+
+    por_dia: Dict[date, Tuple[float, List[Dict]]] = {}
+    for entrada, by_day in reprocesar(archivo, entradas, _parsear_entrada, workers=workers):
+        for d, vals in (by_day or {}).items():
+            if start_d <= d <= end_d and vals and (d not in por_dia or entrada.ultima_recepcion >= por_dia[d][0]):
+                por_dia[d] = (entrada.ultima_recepcion, vals)
+
+    if not por_dia:
+        print("[WARN] Sin respuestas archivadas para el rango")
+        return 0
+    ensure_partitions(min(por_dia), max(por_dia))
+
+    with tempfile.NamedTemporaryFile(mode="w", delete=False, newline="", suffix=".csv") as tmp:
+        w = csv.writer(tmp)
+        nrows = sum(write_rows_for_day(w, d, vals) for d, (_, vals) in sorted(por_dia.items()))
+        csv_path = tmp.name
+    try:
+        replace_days_in_db(csv_path, sorted(por_dia))
+    finally:
+        os.unlink(csv_path)
+    print(f"[OK] Replay: {len(por_dia)} días, {nrows} filas en omie_precios")
+    refresh_ncore_aggregates(list(por_dia))
+    return nrows
+
+
 def daterange(start: date, end: date):
     cur = start
     while cur <= end:
@@ -193,26 +300,7 @@ def fetch_ree_range(start_d: date, end_d_exclusive: date) -> List[Dict]:
         "start_date": start_d.strftime("%Y-%m-%dT00:00"),
         "end_date": end_d_exclusive.strftime("%Y-%m-%dT00:00"),
     }
-    headers = {"Accept": "application/json"}
-
-    urls = [REE_URL, REE_URL_ALT]
-    last_err: Optional[Exception] = None
-    for url in urls:
-        for attempt, delay in [(1, 2), (2, 5), (3, 10)]:
-            try:
-                r = requests.get(url, params=params, headers=headers, timeout=90)
-                r.raise_for_status()
-                j = r.json()
-                vals = _extract_values_from_response(j)
-                if vals:
-                    return vals
-                last_err = None
-            except Exception as e:
-                last_err = e
-                time.sleep(delay)
-    if last_err:
-        raise last_err
-    return []
+    return _fetch_ree_values(params, timeout=90)
 
 
 def group_values_by_day(values: List[Dict]) -> Dict[date, List[Dict]]:
@@ -234,6 +322,9 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--start", type=str, default=None)
     parser.add_argument("--end", type=str, default=None)
+    parser.add_argument("--replay", action="store_true",
+                        help="reconstruir omie_precios desde el archivo de respuestas (sin red)")
+    parser.add_argument("--workers", type=int, default=None, help="procesos de parseo en --replay")
     args = parser.parse_args()
 
     today = date.today()
@@ -249,7 +340,15 @@ def main():
         print(f"[INFO] Nada que backfillear. start={start_d} > end={end_d}")
         return
 
+    if args.replay:
+        if not args.start:
+            parser.error("--replay requiere --start")
+        replay(start_d, end_d, args.workers)
+        return
+
     print(f"[INFO] Backfill OMIE desde {start_d} hasta {end_d} (ambos inclusive)")
+    ensure_partitions(start_d, end_d)
+    loaded_days: List[date] = []
 
     # Proceso por paquetes semanales con fallback a diario
     for week_s, week_e_excl in week_chunks(start_d, end_d):
@@ -285,6 +384,7 @@ def main():
                     continue
                 copy_csv_into_db(tmp_path)
                 os.unlink(tmp_path)
+                loaded_days.append(d)
                 print(f"[OK] {d}: insertadas {nrows} filas en omie_precios")
         except Exception as e:
             print(f"[ERROR] Paquete semanal {label}: {e}. Fallback a procesamiento diario.", file=sys.stderr)
@@ -309,11 +409,15 @@ def main():
                         continue
                     copy_csv_into_db(tmp_path)
                     os.unlink(tmp_path)
+                    loaded_days.append(d)
                     print(f"[OK] {d}: insertadas {nrows} filas en omie_precios")
                 except Exception as e2:
                     print(f"[ERROR] {d}: {e2}", file=sys.stderr)
                     continue
 
+    # Solo los días cargados (y sus meses) en core_precios_omie_diario / _mensual
+    refresh_ncore_aggregates(loaded_days)
+
 
 if __name__ == "__main__":
     main()
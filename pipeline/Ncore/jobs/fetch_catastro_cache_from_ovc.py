@@ -15,26 +15,44 @@ Flujo por CUPS (desde db_N2.coordenadas_geograficas_enriquecidas):
 
 Notas:
 - Este script falla (exit 1) si no se puede obtener RC o atributos críticos (uso/superficie) para algún CUPS procesado.
-- Respetar límites del servicio OVC con --sleep entre peticiones.
+- Selección de objetivos en SQL: con la foreign table f_catastro_inmuebles en db_N2
+  (pipeline/Ncore/sql/catastro_fdw_n2.sql) se filtra por recencia con un NOT EXISTS; sin FDW,
+  los CUPS con cache reciente se vuelcan por COPY a una tabla temporal de db_N2.
+- Peticiones OVC concurrentes (--workers) con un limitador compartido (--rps) que respeta
+  los límites del servicio. CUPS con las mismas coordenadas o la misma parcela (pc1+pc2)
+  reutilizan la respuesta OVC.
+- Upserts en lote (--batch) con un commit por lote.
+- Las respuestas OVC se archivan crudas (fuentes 'ovc_rc' por coordenadas y 'ovc_dnp' por RC).
+  Con --replay se reconstruye la cache desde el archivo, sin red y sin filtro de recencia
+  (fecha_consulta pasa a ser la del replay); los CUPS sin respuesta archivada cuentan como fallo.
 
 CRON one-liner sugerido (ejemplo):
   20 2 * * * DB_HOST=localhost DB_PORT=5432 DB_USER=postgres DB_PASSWORD=admin \
-  python3 /Users/vagalumeenergiamovil/PROYECTOS/Entorno/motores/db_watioverse/pipeline/Ncore/jobs/fetch_catastro_cache_from_ovc.py --max 50 --sleep 0.8
+  python3 /Users/vagalumeenergiamovil/PROYECTOS/Entorno/motores/db_watioverse/pipeline/Ncore/jobs/fetch_catastro_cache_from_ovc.py --max 5000 --workers 4 --rps 2.5
 """
+import io
 import os
 import sys
-import time
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-import requests
+from pathlib import Path
 import xml.etree.ElementTree as ET
 import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from http_fetch import obtener_fetcher, RespuestaFetch
+from raw_archive import obtener_archivo
+from memo_concurrente import MemoConcurrente
 
 DB_HOST = os.getenv('DB_HOST', 'localhost')
 DB_PORT = int(os.getenv('DB_PORT', '5432'))
 DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'admin')
 
+OVC_HOST = 'ovc.catastro.meh.es'
 URL_RC_BY_COORD = (
     "https://ovc.catastro.meh.es/OVCServWeb/OVCWcfCallejero/COVCCoordenadas.svc/json/Consulta_RCCOOR_Distancia"
 )
@@ -47,49 +65,106 @@ HEADERS = {
     'Accept': 'text/xml,application/xml,*/*;q=0.9'
 }
 
+# Días tras los que una entrada de cache se considera caducada
+DIAS_RECENCIA = 180
+
+
+# Cliente HTTP compartido por los hilos del proceso (sesión, reintentos y límite por host)
+fetcher = obtener_fetcher()
+fetcher.configurar_host(OVC_HOST, intervalo=1.0 / 2.5)
+
+# --replay: las respuestas salen del archivo en lugar de la red
+_replay = False
+
+
+def ovc_get(url: str, params: dict, fuente: str, clave: str):
+    """
+    GET a OVC pasando por el limitador compartido del host (sin caché en disco).
+    La respuesta se archiva como (fuente, clave); en --replay se lee de ahí.
+    Solo se archivan respuestas 200: en --replay una clave sin archivar se devuelve
+    como 404 para que los llamantes sigan el mismo camino que con el fallo original
+    (p. ej. el reintento con rc[:14] de fetch_details_by_rc).
+    """
+    if _replay:
+        archivo = obtener_archivo()
+        entrada = archivo.ultima(fuente, clave)
+        if entrada is None:
+            return RespuestaFetch(404, b'', {}, url, desde_cache=True)
+        return RespuestaFetch(200, archivo.leer(entrada.sha256), {}, entrada.url, desde_cache=True)
+    return fetcher.get(url, params=params, headers=HEADERS, timeout=20, cache=False, archivar=(fuente, clave))
+
 
 def get_conn(dbname: str):
     return psycopg2.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, database=dbname)
 
 
-def select_targets(conn_n2, conn_enr, max_rows: int):
-    """Selecciona CUPS con coordenadas (N2) y sin cache reciente (enriquecimiento), sin cross-DB."""
-    # 1) CUPS con coordenadas en N2
+def select_targets(conn_n2, conn_enr, max_rows: int, cutoff: datetime = None):
+    """
+    Selecciona CUPS con coordenadas (N2) y sin cache reciente (enriquecimiento).
+    El filtro de recencia se resuelve en SQL en db_N2: vía FDW si existe
+    f_catastro_inmuebles; si no, con una tabla temporal de CUPS recientes.
+    """
+    cutoff = cutoff or datetime.now() - timedelta(days=DIAS_RECENCIA)
+    with conn_n2.cursor() as c:
+        c.execute("SELECT to_regclass('public.f_catastro_inmuebles') IS NOT NULL")
+        usar_fdw = c.fetchone()[0]
+    tabla_recientes = 'public.f_catastro_inmuebles' if usar_fdw else _stage_recent_cups(conn_n2, conn_enr, cutoff)
+
+    with conn_n2.cursor() as c:
+        c.execute(
+            f"""
+            SELECT cups, latitud, longitud
+            FROM (
+                SELECT DISTINCT ON (cups) cups, latitud, longitud
+                FROM public.coordenadas_geograficas_enriquecidas
+                WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+                ORDER BY cups
+            ) t
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {tabla_recientes} r
+                WHERE r.cups = t.cups AND r.fecha_consulta >= %s
+            )
+            LIMIT %s
+            """,
+            (cutoff, max_rows)
+        )
+        return c.fetchall()  # list of (cups, lat, lon)
+
+
+def _stage_recent_cups(conn_n2, conn_enr, cutoff: datetime) -> str:
+    """Vuelca por COPY los CUPS con cache reciente a una tabla temporal de db_N2."""
     with conn_n2.cursor() as c:
         c.execute(
             """
-            SELECT DISTINCT cups, latitud, longitud
-            FROM public.coordenadas_geograficas_enriquecidas
-            WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+            CREATE TEMP TABLE IF NOT EXISTS tmp_catastro_recientes (
+                cups TEXT PRIMARY KEY, fecha_consulta TIMESTAMP
+            ) ON COMMIT PRESERVE ROWS
             """
         )
-        coords = c.fetchall()  # list of (cups, lat, lon)
-    if not coords:
-        return []
-    # 2) Recencia en cache de enriquecimiento
+        c.execute("TRUNCATE tmp_catastro_recientes")
+
+    buffer = io.StringIO()
     with conn_enr.cursor() as c2:
-        c2.execute(
+        consulta = c2.mogrify(
             """
-            SELECT cups, MAX(fecha_consulta) AS max_fecha
+            SELECT cups, MAX(fecha_consulta)
             FROM public.catastro_inmuebles
             GROUP BY cups
-            """
-        )
-        recency = {row[0]: row[1] for row in c2.fetchall()}
-    cutoff = datetime.now() - timedelta(days=180)
-    pending = []
-    for cups, lat, lon in coords:
-        last = recency.get(cups)
-        if last is None or last < cutoff:
-            pending.append((cups, lat, lon))
-            if len(pending) >= max_rows:
-                break
-    return pending
+            HAVING MAX(fecha_consulta) >= %s
+            """,
+            (cutoff,)
+        ).decode()
+        c2.copy_expert(f"COPY ({consulta}) TO STDOUT", buffer)
+    buffer.seek(0)
+    with conn_n2.cursor() as c:
+        c.copy_expert("COPY tmp_catastro_recientes (cups, fecha_consulta) FROM STDIN", buffer)
+        c.execute("ANALYZE tmp_catastro_recientes")
+    return 'tmp_catastro_recientes'
 
 
 def fetch_rc_by_coord(lat: float, lon: float):
     params = {'SRS': 'EPSG:4326', 'CoorX': str(lon), 'CoorY': str(lat)}
-    r = requests.get(URL_RC_BY_COORD, params=params, headers=HEADERS, timeout=20)
+    r = ovc_get(URL_RC_BY_COORD, params, 'ovc_rc', f"{params['CoorY']},{params['CoorX']}")
     if r.status_code != 200:
         raise RuntimeError(f"OVC RC error HTTP {r.status_code}")
     try:
@@ -115,7 +190,7 @@ def fetch_details_by_rc(rc: str):
     # Intentar primero con RC completa, si falla intentar solo con pc1+pc2
     for attempt_rc in [rc, rc[:14] if len(rc) > 14 else rc]:
         params = {'RefCat': attempt_rc}
-        r = requests.get(URL_DNP_BY_RC, params=params, headers=HEADERS, timeout=20)
+        r = ovc_get(URL_DNP_BY_RC, params, 'ovc_dnp', attempt_rc)
         if r.status_code != 200:
             continue
         try:
@@ -160,16 +235,17 @@ def fetch_details_by_rc(rc: str):
     }
 
 
-def upsert_cache(conn_enr, cups: str, pc1: str, pc2: str, detalles: dict):
-    now = 'NOW()'
+def upsert_cache(conn_enr, filas: list):
+    """Upsert en lote de (cups, pc1, pc2, detalles) en catastro_inmuebles."""
     with conn_enr.cursor() as c:
-        c.execute(
+        execute_values(
+            c,
             """
             INSERT INTO public.catastro_inmuebles (
                 cups, referencia_catastral, referencia_catastral_1, referencia_catastral_2,
                 uso_principal, superficie_construida_m2, fecha_consulta, fuente_datos, updated_at, created_at
             )
-            VALUES (%s, %s, %s, %s, %s, %s, NOW(), 'OVC', NOW(), NOW())
+            VALUES %s
             ON CONFLICT (cups)
             DO UPDATE SET
                 referencia_catastral = EXCLUDED.referencia_catastral,
@@ -181,55 +257,105 @@ def upsert_cache(conn_enr, cups: str, pc1: str, pc2: str, detalles: dict):
                 fuente_datos = 'OVC',
                 updated_at = NOW()
             """,
-            (
-                cups,
-                f"{pc1}{pc2}", pc1, pc2,
-                detalles.get('uso_principal'),
-                detalles.get('superficie_construida_m2')
-            )
+            [
+                (cups, f"{pc1}{pc2}", pc1, pc2,
+                 detalles.get('uso_principal'), detalles.get('superficie_construida_m2'))
+                for cups, pc1, pc2, detalles in filas
+            ],
+            template="(%s, %s, %s, %s, %s, %s, NOW(), 'OVC', NOW(), NOW())"
         )
 
 
+def resolve_cups(lat: float, lon: float, memo_rc: MemoConcurrente, memo_dnp: MemoConcurrente):
+    """RC por coordenadas y detalles por parcela, reutilizando respuestas ya obtenidas."""
+    rc_base, rc_control = memo_rc.obtener((round(lat, 6), round(lon, 6)), lambda: fetch_rc_by_coord(lat, lon))
+    pc1 = rc_base[:7]
+    pc2 = rc_base[7:14]
+    detalles = memo_dnp.obtener(rc_base, lambda: fetch_details_by_rc(f"{rc_base}{rc_control}"))
+    # Validación: solo fallar si no hay respuesta del servicio
+    if not detalles:
+        raise RuntimeError('Sin respuesta del servicio DNP')
+    return pc1, pc2, detalles
+
+
 def main():
+    global _replay
     parser = argparse.ArgumentParser()
-    parser.add_argument('--max', type=int, default=50, help='máximo de CUPS a procesar')
-    parser.add_argument('--sleep', type=float, default=0.8, help='segundos entre peticiones OVC')
+    parser.add_argument('--max', type=int, default=5000, help='máximo de CUPS a procesar')
+    parser.add_argument('--workers', type=int, default=4, help='peticiones OVC concurrentes')
+    parser.add_argument('--rps', type=float, default=2.5, help='peticiones OVC por segundo (todas las hebras)')
+    parser.add_argument('--sleep', type=float, default=None,
+                        help='segundos mínimos entre peticiones OVC (alternativa a --rps)')
+    parser.add_argument('--batch', type=int, default=200, help='filas por upsert/commit')
+    parser.add_argument('--replay', action='store_true',
+                        help='reconstruir la cache desde las respuestas OVC archivadas (sin red)')
     args = parser.parse_args()
+    _replay = args.replay
+
+    rps = 1.0 / args.sleep if args.sleep else args.rps
+    limitador = fetcher.configurar_host(OVC_HOST, max_concurrencia=args.workers,
+                                        intervalo=1.0 / rps if rps > 0 else 0.0)
 
     n2 = get_conn('db_N2')
     enr = get_conn('db_enriquecimiento')
 
     failures = []
+    procesados = 0
     try:
-        targets = select_targets(n2, enr, args.max)
+        # En replay se reprocesan todos los CUPS con coordenadas (ningún corte de recencia los excluye)
+        targets = select_targets(n2, enr, args.max, cutoff=datetime.max if _replay else None)
         if not targets:
             print('✅ No hay objetivos para cache de Catastro (ya actualizados)')
             return
-        for cups, lat, lon in targets:
-            try:
-                rc_base, rc_control = fetch_rc_by_coord(float(lat), float(lon))
-                pc1 = rc_base[:7]
-                pc2 = rc_base[7:14]
-                detalles = fetch_details_by_rc(f"{rc_base}{rc_control}")
-                # Validación: solo fallar si no hay respuesta del servicio
-                if not detalles:
-                    raise RuntimeError('Sin respuesta del servicio DNP')
-                print(f"DEBUG - cups: {cups}, pc1: {pc1}, pc2: {pc2}, detalles: {detalles}")
-                upsert_cache(enr, cups, pc1, pc2, detalles)
-                enr.commit()
-                time.sleep(args.sleep)
-            except Exception as e:
-                enr.rollback()
-                failures.append((cups, str(e)))
+        if _replay:
+            print(f"🔁 Replay desde archivo: {len(targets)} CUPS (workers={args.workers})")
+        else:
+            print(f"🔍 {len(targets)} CUPS objetivo (workers={args.workers}, rps={1.0 / limitador.intervalo if limitador.intervalo else 'sin límite'})")
+
+        memo_rc = MemoConcurrente()
+        memo_dnp = MemoConcurrente()
+        pendientes = []
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futuros = {
+                executor.submit(resolve_cups, float(lat), float(lon), memo_rc, memo_dnp): cups
+                for cups, lat, lon in targets
+            }
+            for futuro in as_completed(futuros):
+                cups = futuros[futuro]
+                try:
+                    pc1, pc2, detalles = futuro.result()
+                    pendientes.append((cups, pc1, pc2, detalles))
+                except Exception as e:
+                    failures.append((cups, str(e)))
+                if len(pendientes) >= args.batch:
+                    procesados += _flush(enr, pendientes, failures)
+                    pendientes = []
+        procesados += _flush(enr, pendientes, failures)
+
+        print(f"♻️ Respuestas OVC reutilizadas: {memo_rc.reutilizados} por coordenadas, {memo_dnp.reutilizados} por parcela")
         if failures:
             print('❌ Fallos OVC/cache Catastro:', file=sys.stderr)
             for cups, cause in failures:
                 print(f' - {cups}: {cause}', file=sys.stderr)
             sys.exit(1)
-        print(f"✅ Cache Catastro actualizada. CUPS procesados: {len(targets)}")
+        print(f"✅ Cache Catastro actualizada. CUPS procesados: {procesados}")
     finally:
         n2.close(); enr.close()
 
 
+def _flush(conn_enr, filas: list, failures: list) -> int:
+    """Upsert y commit de un lote; si falla el lote, todos sus CUPS cuentan como fallo."""
+    if not filas:
+        return 0
+    try:
+        upsert_cache(conn_enr, filas)
+        conn_enr.commit()
+        return len(filas)
+    except Exception as e:
+        conn_enr.rollback()
+        failures.extend((cups, f"upsert: {e}") for cups, _, _, _ in filas)
+        return 0
+
+
 if __name__ == '__main__':
     main()
@@ -7,6 +7,9 @@ para CUPS pendientes o desactualizados.
 - Sin fallbacks: si un CUPS no tiene fila en cache o carece de campos mínimos, se registra y el proceso devuelve exit 1
 - Conexiones por nombres reales: db_enriquecimiento y db_N2
 - Política de actualización: UPSERT por CUPS con updated_at = NOW()
+- Promoción por conjuntos: la última fila de cache por CUPS se lee en streaming (DISTINCT ON +
+  cursor de servidor), se vuelca por COPY a una tabla temporal de db_N2 y la validación y el
+  UPSERT se hacen en SQL dentro de una única transacción (sin límite de CUPS por ejecución)
 
 Campos mínimos requeridos de cache:
 - cups (TEXT no nulo)
@@ -16,10 +19,11 @@ Campos mínimos requeridos de cache:
 
 CRON one-liner sugerido (ejemplo):
   25 2 * * * DB_HOST=localhost DB_PORT=5432 DB_USER=postgres DB_PASSWORD=admin \
-  python3 /Users/vagalumeenergiamovil/PROYECTOS/Entorno/motores/db_watioverse/pipeline/Ncore/jobs/fetch_catastro_for_n2.py --max 200
+  python3 /Users/vagalumeenergiamovil/PROYECTOS/Entorno/motores/db_watioverse/pipeline/Ncore/jobs/fetch_catastro_for_n2.py
 """
 import os
 import sys
+import io
 import argparse
 import psycopg2
 
@@ -33,72 +37,123 @@ def get_conn(dbname: str):
     return psycopg2.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, database=dbname)
 
 
-def find_pending_cups(conn_enr, conn_n2, max_rows: int):
-    # 1. Obtener CUPS con datos en cache (db_enriquecimiento)
-    with conn_enr.cursor() as c:
+# Filas leídas del cursor de servidor por cada COPY a db_N2
+TAMANO_BLOQUE = 5000
+
+COLUMNAS_STAGING = (
+    'cups', 'referencia_catastral', 'uso_principal',
+    'superficie_construida_m2', 'superficie_parcela_m2', 'fecha_consulta'
+)
+
+
+def _copy_text(valor) -> str:
+    """Valor en formato texto de COPY (NULL = \\N, escapes de tab/saltos/backslash)."""
+    if valor is None:
+        return '\\N'
+    return (str(valor).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def stream_latest_cache_rows(conn_enr, tamano_bloque: int = TAMANO_BLOQUE):
+    """Última fila de cache por CUPS, en bloques, con un cursor de servidor."""
+    with conn_enr.cursor(name='catastro_promocion_n2') as c:
+        c.itersize = tamano_bloque
         c.execute(
             """
-            SELECT DISTINCT cups
+            SELECT DISTINCT ON (cups)
+                   cups, referencia_catastral, uso_principal,
+                   superficie_construida_m2, superficie_parcela_m2,
+                   fecha_consulta
             FROM public.catastro_inmuebles
             WHERE cups IS NOT NULL AND TRIM(cups) <> ''
+            ORDER BY cups, fecha_consulta DESC
             """
         )
-        cached_cups = {r[0] for r in c.fetchall()}
-    
-    if not cached_cups:
-        return []
-    
-    # 2. Ver cuáles ya están en N2 y son recientes
+        while True:
+            filas = c.fetchmany(tamano_bloque)
+            if not filas:
+                break
+            yield filas
+
+
+def stage_cache_rows(conn_n2, bloques) -> int:
+    """Carga por COPY los bloques en la tabla temporal tmp_catastro_promocion (ON COMMIT DROP)."""
     with conn_n2.cursor() as c:
         c.execute(
             """
-            SELECT cups
-            FROM public.n2_catastro_inmueble
-            WHERE cups = ANY(%s)
-              AND updated_at >= NOW() - INTERVAL '180 days'
-            """,
-            (list(cached_cups),)
+            CREATE TEMP TABLE tmp_catastro_promocion (
+                cups TEXT PRIMARY KEY,
+                referencia_catastral TEXT,
+                uso_principal TEXT,
+                superficie_construida_m2 NUMERIC,
+                superficie_parcela_m2 NUMERIC,
+                fecha_consulta TIMESTAMP
+            ) ON COMMIT DROP
+            """
         )
-        recent_n2 = {r[0] for r in c.fetchall()}
-    
-    # 3. Filtrar pendientes
-    pending = list(cached_cups - recent_n2)
-    return pending[:max_rows]
-
+        total = 0
+        for filas in bloques:
+            buffer = io.StringIO()
+            for fila in filas:
+                buffer.write('\t'.join(_copy_text(v) for v in fila))
+                buffer.write('\n')
+            buffer.seek(0)
+            c.copy_expert(f"COPY tmp_catastro_promocion ({', '.join(COLUMNAS_STAGING)}) FROM STDIN", buffer)
+            total += len(filas)
+        c.execute("ANALYZE tmp_catastro_promocion")
+    return total
+
+
+def promote_staged(conn_n2, max_rows: int = None):
+    """
+    Valida en bloque los CUPS pendientes (sin fila reciente en N2) y los promociona.
+
+    Returns:
+        (filas promocionadas, lista de (cups, causa) inválidos)
+    """
+    limite = "LIMIT %(max_rows)s" if max_rows else ""
+    pendientes = f"""
+        WITH pendientes AS (
+            SELECT s.*
+            FROM tmp_catastro_promocion s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM public.n2_catastro_inmueble n
+                WHERE n.cups = s.cups
+                  AND n.updated_at >= NOW() - INTERVAL '180 days'
+            )
+            ORDER BY s.cups
+            {limite}
+        )
+    """
+    invalida = "(uso_principal IS NULL OR uso_principal = '' OR superficie_construida_m2 IS NULL OR superficie_construida_m2 < 0)"
+    params = {'max_rows': max_rows}
 
-def fetch_cache_row(conn_enr, cups: str):
-    with conn_enr.cursor() as c:
+    with conn_n2.cursor() as c:
         c.execute(
-            """
-            SELECT cups, referencia_catastral, uso_principal,
-                   superficie_construida_m2, superficie_parcela_m2,
-                   fecha_consulta
-            FROM public.catastro_inmuebles
-            WHERE cups = %s
-            ORDER BY fecha_consulta DESC
-            LIMIT 1
+            pendientes + f"""
+            SELECT cups, uso_principal, superficie_construida_m2
+            FROM pendientes
+            WHERE {invalida}
             """,
-            (cups,)
+            params
         )
-        row = c.fetchone()
-        return row
-
-
-def upsert_n2(conn_n2, row):
-    cups, rc, uso, sup_const, sup_parc, fecha = row
-    # Validaciones mínimas
-    if not cups or not uso or sup_const is None or (sup_const is not None and sup_const < 0):
-        raise ValueError(f"Datos insuficientes para CUPS {cups}: uso='{uso}', superficie_construida_m2='{sup_const}'")
+        failures = [
+            (cups, f"Datos insuficientes para CUPS {cups}: uso='{uso}', superficie_construida_m2='{sup}'")
+            for cups, uso, sup in c.fetchall()
+        ]
 
-    with conn_n2.cursor() as c:
         c.execute(
-            """
+            pendientes + f"""
             INSERT INTO public.n2_catastro_inmueble (
                 cups, referencia_catastral, uso_principal,
                 superficie_construida_total_m2, superficie_parcela_m2,
                 fuente, fecha_extraccion, updated_at
             )
-            VALUES (%s,%s,%s,%s,%s,'catastro_cache', COALESCE(%s, NOW()), NOW())
+            SELECT cups, referencia_catastral, uso_principal,
+                   superficie_construida_m2, superficie_parcela_m2,
+                   'catastro_cache', COALESCE(fecha_consulta, NOW()), NOW()
+            FROM pendientes
+            WHERE NOT {invalida}
             ON CONFLICT (cups)
             DO UPDATE SET
                 referencia_catastral = EXCLUDED.referencia_catastral,
@@ -108,39 +163,41 @@ def upsert_n2(conn_n2, row):
                 fecha_extraccion = EXCLUDED.fecha_extraccion,
                 updated_at = NOW()
             """,
-            (cups, rc, uso, sup_const, sup_parc, fecha)
+            params
         )
+        return c.rowcount, failures
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--max', type=int, default=200, help='máximo de CUPS a procesar')
+    parser.add_argument('--max', type=int, default=None,
+                        help='máximo de CUPS a promocionar (por defecto, todos los pendientes)')
     args = parser.parse_args()
 
     enr = get_conn('db_enriquecimiento')
     n2 = get_conn('db_N2')
     try:
-        pending = find_pending_cups(enr, n2, args.max)
-        if not pending:
+        staged = stage_cache_rows(n2, stream_latest_cache_rows(enr))
+        enr.commit()
+        if not staged:
+            n2.rollback()
             print('✅ No hay CUPS pendientes o desactualizados para Catastro (N2)')
             return
-        failures = []
-        for cups in pending:
-            row = fetch_cache_row(enr, cups)
-            if not row:
-                failures.append((cups, 'sin_cache'))
-                continue
-            try:
-                upsert_n2(n2, row)
-            except Exception as e:
-                failures.append((cups, str(e)))
+
+        promoted, failures = promote_staged(n2, args.max)
         n2.commit()
+        if not promoted and not failures:
+            print('✅ No hay CUPS pendientes o desactualizados para Catastro (N2)')
+            return
         if failures:
             print('❌ Fallos en promoción a N2:')
             for cups, cause in failures:
                 print(f' - {cups}: {cause}', file=sys.stderr)
             sys.exit(1)
-        print(f"✅ Promoción a N2 completada. CUPS procesados: {len(pending)}")
+        print(f"✅ Promoción a N2 completada. CUPS procesados: {promoted} (cache leída: {staged})")
+    except Exception:
+        n2.rollback()
+        raise
     finally:
         enr.close(); n2.close()
 
@@ -15,6 +15,12 @@ Uso:
   --ean EAN           Buscar por código EAN
   --limit N           Máximo de productos a procesar (default: 100)
   --input CSV         Archivo CSV con columna 'model' o 'ean'
+  --workers N         Búsquedas concurrentes (default: 8)
+  --rps R             Peticiones por segundo a la API, todas las hebras (default: 4)
+  --batch N           Productos por upsert/commit (default: 500)
+  --ttl-dias N        No se vuelven a pedir detalles de productos cargados hace menos de N días (default: 30)
+
+Las entradas repetidas del CSV (mismo modelo/EAN normalizado) se consultan una sola vez.
 """
 import os
 import sys
@@ -22,11 +28,19 @@ import json
 import csv
 import time
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Optional
+from pathlib import Path
+from typing import List, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
 
-import requests
 import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from http_fetch import obtener_fetcher
+from memo_concurrente import MemoConcurrente
 
 DB = {
     'host': 'localhost',
@@ -46,11 +60,28 @@ if not CLIENT_ID or not CLIENT_SECRET:
     raise RuntimeError('EPREL_CLIENT_ID y EPREL_CLIENT_SECRET son obligatorios')
 
 
+# Segundos que un detalle de producto se reutiliza en memoria
+TTL_DETALLES = 24 * 3600
+
+
 class EPRELClient:
-    def __init__(self):
-        self.session = requests.Session()
+    """
+    Cliente EPREL seguro entre hebras: un único token OAuth2 compartido (renovado
+    una sola vez al caducar o ante un 401) y detalles cacheados por product_id
+    (una sola petición por producto aunque varias hebras lo pidan a la vez).
+    """
+
+    def __init__(self, workers: int = 1, rps: float = 2.0, ttl_detalles: float = TTL_DETALLES):
+        # Sesión compartida con reintentos; presupuesto de tasa común a todas las hebras
+        self.http = obtener_fetcher()
+        self.http.configurar_host(urlsplit(API_BASE).hostname, max_concurrencia=workers,
+                                  intervalo=1.0 / rps if rps > 0 else 0.0)
         self.token = None
         self.token_expires = 0
+        self.ttl_detalles = ttl_detalles
+        # Los fallos no se memorizan: la siguiente búsqueda que llegue al producto reintenta
+        self._detalles = MemoConcurrente(ttl=ttl_detalles, memorizar_errores=False)
+        self._lock_token = threading.Lock()
     
     def authenticate(self):
         """Obtener token OAuth2"""
@@ -59,22 +90,31 @@ class EPRELClient:
             'client_id': CLIENT_ID,
             'client_secret': CLIENT_SECRET,
         }
-        r = self.session.post(TOKEN_URL, data=data, timeout=30)
+        r = self.http.post(TOKEN_URL, data=data, timeout=30)
         r.raise_for_status()
         token_data = r.json()
         self.token = token_data['access_token']
         self.token_expires = time.time() + token_data.get('expires_in', 3600) - 60
     
-    def ensure_auth(self):
-        """Renovar token si expira"""
-        if not self.token or time.time() >= self.token_expires:
-            self.authenticate()
+    def ensure_auth(self, token_rechazado: str = None) -> str:
+        """Renovar token si expira (o si la API rechazó `token_rechazado`); devuelve el vigente"""
+        with self._lock_token:
+            if (not self.token or time.time() >= self.token_expires
+                    or (token_rechazado is not None and token_rechazado == self.token)):
+                self.authenticate()
+            return self.token
+    
+    def _get(self, url: str, params: Dict = None):
+        """GET autenticado; ante un 401 renueva el token una vez y reintenta."""
+        token = self.ensure_auth()
+        r = self.http.get(url, params=params, headers={'Authorization': f'Bearer {token}'}, timeout=30)
+        if r.status_code == 401:
+            token = self.ensure_auth(token_rechazado=token)
+            r = self.http.get(url, params=params, headers={'Authorization': f'Bearer {token}'}, timeout=30)
+        return r
     
     def search_product(self, model: str = None, ean: str = None) -> Optional[Dict]:
         """Buscar producto por modelo o EAN"""
-        self.ensure_auth()
-        
-        headers = {'Authorization': f'Bearer {self.token}'}
         params = {}
         
         if model:
@@ -84,7 +124,7 @@ class EPRELClient:
         else:
             raise ValueError('Debe especificar model o ean')
         
-        r = self.session.get(f'{API_BASE}/search', params=params, headers=headers, timeout=30)
+        r = self._get(f'{API_BASE}/search', params=params)
         
         if r.status_code == 404:
             return None
@@ -93,13 +133,12 @@ class EPRELClient:
         return r.json()
     
     def get_product_details(self, product_id: str) -> Dict:
-        """Obtener detalles completos del producto"""
-        self.ensure_auth()
-        
-        headers = {'Authorization': f'Bearer {self.token}'}
-        r = self.session.get(f'{API_BASE}/products/{product_id}', headers=headers, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        """Obtener detalles completos del producto (cacheados por product_id durante ttl_detalles)"""
+        def pedir():
+            r = self._get(f'{API_BASE}/products/{product_id}')
+            r.raise_for_status()
+            return r.json()
+        return self._detalles.obtener(str(product_id), pedir)
 
 
 def create_tables(conn):
@@ -127,10 +166,8 @@ def create_tables(conn):
     cursor.close()
 
 
-def upsert_product(conn, data: Dict):
-    """Guardar producto en BD"""
-    cursor = conn.cursor()
-    
+def _product_row(data: Dict) -> tuple:
+    """Fila de core_eprel_products a partir del payload"""
     # Extraer campos principales del payload
     product_id = data.get('productId') or data.get('id')
     if not product_id:
@@ -144,28 +181,94 @@ def upsert_product(conn, data: Dict):
     energy_consumption = data.get('energyConsumptionAnnual') or data.get('annualEnergyConsumption')
     efficiency_index = data.get('efficiencyIndex') or data.get('eei')
     
-    cursor.execute("""
-        INSERT INTO core_eprel_products (
-            product_id, model, ean, brand, product_group,
-            energy_class, energy_consumption_annual, efficiency_index, payload
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (product_id) DO UPDATE SET
-            model = EXCLUDED.model,
-            ean = EXCLUDED.ean,
-            brand = EXCLUDED.brand,
-            product_group = EXCLUDED.product_group,
-            energy_class = EXCLUDED.energy_class,
-            energy_consumption_annual = EXCLUDED.energy_consumption_annual,
-            efficiency_index = EXCLUDED.efficiency_index,
-            payload = EXCLUDED.payload,
-            fecha_carga = CURRENT_TIMESTAMP
-    """, (
-        product_id, model, ean, brand, product_group,
+    return (
+        str(product_id), model, ean, brand, product_group,
         energy_class, energy_consumption, efficiency_index,
         json.dumps(data)
-    ))
+    )
+
+
+def upsert_products(conn, productos: List[Dict]) -> int:
+    """Guardar productos en BD en una sola sentencia (un product_id repetido: gana el último)"""
+    filas = {}
+    for data in productos:
+        fila = _product_row(data)
+        filas[fila[0]] = fila
+    if not filas:
+        return 0
     
-    cursor.close()
+    with conn.cursor() as cursor:
+        execute_values(cursor, """
+            INSERT INTO core_eprel_products (
+                product_id, model, ean, brand, product_group,
+                energy_class, energy_consumption_annual, efficiency_index, payload
+            ) VALUES %s
+            ON CONFLICT (product_id) DO UPDATE SET
+                model = EXCLUDED.model,
+                ean = EXCLUDED.ean,
+                brand = EXCLUDED.brand,
+                product_group = EXCLUDED.product_group,
+                energy_class = EXCLUDED.energy_class,
+                energy_consumption_annual = EXCLUDED.energy_consumption_annual,
+                efficiency_index = EXCLUDED.efficiency_index,
+                payload = EXCLUDED.payload,
+                fecha_carga = CURRENT_TIMESTAMP
+        """, list(filas.values()))
+    return len(filas)
+
+
+def upsert_product(conn, data: Dict):
+    """Guardar producto en BD"""
+    upsert_products(conn, [data])
+
+
+def save_batch(conn, productos: List[Dict]) -> Tuple[int, int]:
+    """
+    Guarda y confirma un lote. Si un producto rompe la sentencia (p. ej. un
+    energyConsumptionAnnual no numérico), se deshace el lote y se repite producto a
+    producto con un SAVEPOINT cada uno, apartando solo los que fallan.
+    Los errores de conexión se propagan (no tiene sentido reintentar fila a fila).
+
+    Returns:
+        (productos guardados, productos rechazados)
+    """
+    if not productos:
+        return 0, 0
+    try:
+        guardados = upsert_products(conn, productos)
+        conn.commit()
+        return guardados, 0
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        conn.rollback()
+        print(f"⚠️ Lote de {len(productos)} productos rechazado ({e.__class__.__name__}); reintentando uno a uno")
+
+    guardados = rechazados = 0
+    with conn.cursor() as cursor:
+        for data in productos:
+            cursor.execute("SAVEPOINT producto")
+            try:
+                guardados += upsert_products(conn, [data])
+            except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT producto")
+                rechazados += 1
+                product_id = data.get('productId') or data.get('id')
+                print(f"❌ Producto {product_id} no guardado: {str(e).strip()}")
+            else:
+                cursor.execute("RELEASE SAVEPOINT producto")
+    conn.commit()
+    return guardados, rechazados
+
+
+def fresh_product_ids(conn, ttl_dias: int) -> Set[str]:
+    """product_id cargados hace menos de `ttl_dias` días (no se vuelven a pedir sus detalles)"""
+    if ttl_dias <= 0:
+        return set()
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT product_id FROM core_eprel_products
+            WHERE fecha_carga >= CURRENT_TIMESTAMP - make_interval(days => %s)
+        """, (ttl_dias,))
+        return {row[0] for row in cursor.fetchall()}
 
 
 def load_from_csv(filepath: str, column: str) -> List[str]:
@@ -179,12 +282,63 @@ def load_from_csv(filepath: str, column: str) -> List[str]:
     return items
 
 
+def normalize_search(search_type: str, value: str) -> str:
+    """Clave de deduplicación: EAN solo dígitos; modelo sin espacios repetidos y en mayúsculas"""
+    if search_type == 'ean':
+        return ''.join(ch for ch in value if ch.isdigit())
+    return ' '.join(value.split()).upper()
+
+
+def dedupe_searches(searches: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Elimina búsquedas repetidas conservando el orden (y el primer valor original)"""
+    unicas = {}
+    for search_type, value in searches:
+        clave = (search_type, normalize_search(search_type, value))
+        if clave[1] and clave not in unicas:
+            unicas[clave] = (search_type, value)
+    return list(unicas.values())
+
+
+def resolve_search(client: EPRELClient, search_type: str, search_value: str,
+                   fresh_ids: Set[str]) -> Tuple[Optional[str], Optional[Dict]]:
+    """
+    Busca un modelo/EAN y devuelve (product_id, payload a guardar).
+    payload es None si el producto no existe o ya está en BD dentro del TTL.
+    """
+    if search_type == 'model':
+        result = client.search_product(model=search_value)
+    else:
+        result = client.search_product(ean=search_value)
+    
+    if not result:
+        return None, None
+    
+    # Si hay múltiples resultados, tomar el primero
+    products = result.get('products', [result])
+    if not products:
+        return None, None
+    product = products[0]
+    
+    # Obtener detalles completos si hay ID
+    product_id = product.get('productId') or product.get('id')
+    if not product_id:
+        return None, product
+    if str(product_id) in fresh_ids:
+        return str(product_id), None
+    return str(product_id), client.get_product_details(product_id)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--model', help='Buscar por modelo específico')
     parser.add_argument('--ean', help='Buscar por código EAN')
     parser.add_argument('--limit', type=int, default=100, help='Máximo de productos')
     parser.add_argument('--input', help='Archivo CSV con modelos/EANs')
+    parser.add_argument('--workers', type=int, default=8, help='Búsquedas concurrentes')
+    parser.add_argument('--rps', type=float, default=4.0, help='Peticiones por segundo a la API (todas las hebras)')
+    parser.add_argument('--batch', type=int, default=500, help='Productos por upsert/commit')
+    parser.add_argument('--ttl-dias', type=int, default=30,
+                        help='Días durante los que un producto ya cargado no se vuelve a pedir')
     args = parser.parse_args()
     
     # Conectar BD
@@ -192,7 +346,7 @@ def main():
     create_tables(conn)
     
     # Cliente EPREL
-    client = EPRELClient()
+    client = EPRELClient(workers=args.workers, rps=args.rps)
     
     # Determinar lista de búsqueda
     searches = []
@@ -200,11 +354,9 @@ def main():
     if args.input:
         # Detectar columna (model o ean)
         if 'model' in args.input.lower():
-            models = load_from_csv(args.input, 'model')
-            searches = [('model', m) for m in models[:args.limit]]
+            searches = [('model', m) for m in load_from_csv(args.input, 'model')]
         elif 'ean' in args.input.lower():
-            eans = load_from_csv(args.input, 'ean')
-            searches = [('ean', e) for e in eans[:args.limit]]
+            searches = [('ean', e) for e in load_from_csv(args.input, 'ean')]
         else:
             raise ValueError('CSV debe tener columna "model" o "ean"')
     elif args.model:
@@ -214,48 +366,66 @@ def main():
     else:
         raise ValueError('Especifique --model, --ean o --input')
     
+    total_entradas = len(searches)
+    searches = dedupe_searches(searches)[:args.limit]
+    fresh_ids = fresh_product_ids(conn, args.ttl_dias)
+    print(f"🔍 {len(searches)} búsquedas únicas ({total_entradas} entradas), "
+          f"{len(fresh_ids)} productos al día en BD (workers={args.workers}, rps={args.rps})")
+    
     # Procesar búsquedas
     found = 0
     errors = 0
+    saved = 0
+    pendientes: List[Dict] = []
     
-    for search_type, search_value in searches:
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futuros = {
+            executor.submit(resolve_search, client, search_type, search_value, fresh_ids): (search_type, search_value)
+            for search_type, search_value in searches
+        }
         try:
-            # Buscar producto
-            if search_type == 'model':
-                result = client.search_product(model=search_value)
-            else:
-                result = client.search_product(ean=search_value)
-            
-            if not result:
-                print(f"⚠️ No encontrado: {search_type}={search_value}")
-                continue
-            
-            # Si hay múltiples resultados, tomar el primero
-            products = result.get('products', [result])
-            
-            for product in products[:1]:  # Solo primer resultado
-                # Obtener detalles completos si hay ID
-                product_id = product.get('productId') or product.get('id')
-                if product_id:
-                    details = client.get_product_details(product_id)
-                    upsert_product(conn, details)
-                else:
-                    upsert_product(conn, product)
+            for futuro in as_completed(futuros):
+                search_type, search_value = futuros[futuro]
+                try:
+                    product_id, payload = futuro.result()
+                    if payload is not None:
+                        _product_row(payload)  # valida productId antes de entrar al lote
+                except Exception as e:
+                    print(f"❌ Error con {search_type}={search_value}: {e}")
+                    errors += 1
+                    continue
+                
+                if product_id is None and payload is None:
+                    print(f"⚠️ No encontrado: {search_type}={search_value}")
+                    continue
                 
                 found += 1
+                if payload is None:
+                    print(f"♻️ {search_type}={search_value} → {product_id} (al día)")
+                    continue
+                pendientes.append(payload)
                 print(f"✅ {search_type}={search_value} → {product_id}")
-            
-            # Respetar rate limits
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"❌ Error con {search_type}={search_value}: {e}")
-            errors += 1
+                
+                if len(pendientes) >= args.batch:
+                    guardados, rechazados = save_batch(conn, pendientes)
+                    saved += guardados
+                    errors += rechazados
+                    pendientes = []
+        except BaseException:
+            # Error fatal (BD caída, Ctrl-C...): no esperar a las búsquedas en cola
+            executor.shutdown(wait=False, cancel_futures=True)
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+            raise
     
-    conn.commit()
+    guardados, rechazados = save_batch(conn, pendientes)
+    saved += guardados
+    errors += rechazados
     conn.close()
     
-    print(f"\n📊 Resumen: {found} productos encontrados, {errors} errores")
+    print(f"\n📊 Resumen: {found} productos encontrados ({saved} guardados), {errors} errores")
 
 
 if __name__ == '__main__':
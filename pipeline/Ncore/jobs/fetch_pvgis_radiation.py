@@ -11,18 +11,21 @@ Uso:
   --limit N           Número máximo de coordenadas a procesar (default: 100)
   --source zonas      Fuente de coordenadas: 'zonas' (core_zonas_climaticas) [default]
   --lat LAT --lon LON Procesa solo una coordenada (ignora source/limit)
+  --replay            Renormaliza core_pvgis_radiacion desde core_pvgis_raw (sin red)
 """
 import os
 import sys
 import json
 import argparse
-import time
+from pathlib import Path
 from typing import Iterable, Tuple
 
-import requests
 from datetime import datetime
 import psycopg2
 
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from http_fetch import obtener_fetcher
+
 DB = {
     'host': 'localhost',
     'port': 5432,
@@ -33,6 +36,12 @@ DB = {
 
 PVGIS_URL = 'https://re.jrc.ec.europa.eu/api/v5_2/MRcalc'
 HEADERS = {'User-Agent': 'VagalumeEnergia/1.0 (pvgis-ingest)'}
+# La irradiancia mensual de PVGIS es climatológica: la copia en disco vale 30 días
+TTL_CACHE_PVGIS = 30 * 86400
+
+fetcher = obtener_fetcher()
+# Respetar un poco al endpoint
+fetcher.configurar_host('re.jrc.ec.europa.eu', max_concurrencia=2, intervalo=0.2)
 
 
 def get_coords(conn, limit: int) -> Iterable[Tuple[float, float]]:
@@ -59,21 +68,13 @@ def fetch_pvgis(lat: float, lon: float) -> dict:
         'outputformat': 'json',
         'horirrad': 1,
     }
-    delay = 1.0
-    last_err = None
-    for _ in range(4):
-        try:
-            r = requests.get(PVGIS_URL, params=params, headers=HEADERS, timeout=30)
-            r.raise_for_status()
-            data = r.json()
-            if 'outputs' not in data or 'monthly' not in data['outputs']:
-                raise RuntimeError('PVGIS sin outputs.monthly')
-            return data
-        except Exception as e:
-            last_err = e
-            time.sleep(delay)
-            delay *= 2
-    raise last_err
+    return fetcher.get_json(PVGIS_URL, params=params, headers=HEADERS, timeout=30,
+                            ttl=TTL_CACHE_PVGIS, validar=_validar_pvgis)
+
+
+def _validar_pvgis(data: dict):
+    if 'outputs' not in data or 'monthly' not in data['outputs']:
+        raise RuntimeError('PVGIS sin outputs.monthly')
 
 
 def upsert_raw(conn, lat: float, lon: float, payload: dict):
@@ -137,16 +138,41 @@ def normalize_monthly(conn, lat: float, lon: float, payload: dict) -> int:
     return len(rows)
 
 
+def replay_from_raw(conn, lat: float = None, lon: float = None) -> Tuple[int, int]:
+    """Renormaliza desde los payloads RAW ya almacenados. Devuelve (coords, filas)."""
+    filtro, params = '', ()
+    if lat is not None and lon is not None:
+        filtro, params = 'WHERE latitud = %s AND longitud = %s', (lat, lon)
+    coords = total = 0
+    with conn.cursor(name='pvgis_replay') as cur:
+        cur.itersize = 500
+        cur.execute(f"SELECT latitud, longitud, payload FROM core_pvgis_raw {filtro}", params)
+        for lat_raw, lon_raw, payload in cur:
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            total += normalize_monthly(conn, float(lat_raw), float(lon_raw), payload)
+            coords += 1
+    return coords, total
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--limit', type=int, default=100)
     parser.add_argument('--source', choices=['zonas'], default='zonas')
     parser.add_argument('--lat', type=float)
     parser.add_argument('--lon', type=float)
+    parser.add_argument('--replay', action='store_true', help='renormalizar desde core_pvgis_raw (sin red)')
     args = parser.parse_args()
 
     conn = psycopg2.connect(**DB)
 
+    if args.replay:
+        n_coords, total_norm = replay_from_raw(conn, args.lat, args.lon)
+        conn.commit()
+        conn.close()
+        print(f"✅ PVGIS replay coords={n_coords} filas_norm={total_norm}")
+        return
+
     coords = []
     if args.lat is not None and args.lon is not None:
         coords = [(args.lat, args.lon)]
@@ -159,8 +185,6 @@ def main():
         upsert_raw(conn, lat, lon, data)
         n = normalize_monthly(conn, lat, lon, data)
         total_norm += n
-        # Respetar un poco al endpoint
-        time.sleep(0.2)
 
     conn.commit()
     conn.close()
@@ -6,19 +6,31 @@ Job de ingesta ESIOS (migrado desde REE por bloqueos Incapsula):
 - Idempotente: upsert por claves primarias
 - Estricto: nombres reales de BD/tablas; si falla la consulta remota, no se inventan datos
 
+- Archiva las respuestas crudas (fuente 'esios', clave '<start_date>/<indicador>') para
+  poder reconstruir las tablas sin red cuando cambie el parseo
+
 Uso:
   --date YYYY-MM-DD   Fecha de referencia (por defecto: ayer)
+  --replay            Reconstruye las tablas desde el archivo de respuestas (sin red)
+  --desde/--hasta     Rango de fechas para --replay (por defecto: --date)
+  --workers N         Procesos de parseo en --replay (por defecto: CPUs)
 """
 import os
 import sys
 import json
-import time
-import random
 import argparse
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
-import requests
 import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from http_fetch import obtener_fetcher, PoliticaReintentos
+from raw_archive import obtener_archivo, reprocesar
+from particiones import asegurar_particiones
+
+FUENTE_ARCHIVO = 'esios'
 
 DB = {
     'host': 'localhost',
@@ -29,9 +41,8 @@ DB = {
 }
 
 # Migrado a ESIOS API - más confiable que REE
+# Obligatorio salvo en --replay (se comprueba en main)
 ESIOS_API_TOKEN = os.getenv("ESIOS_API_TOKEN")
-if not ESIOS_API_TOKEN:
-    raise ValueError("El token ESIOS_API_TOKEN no está configurado.")
 
 ESIOS_BASE = "https://api.esios.ree.es"
 
@@ -50,6 +61,11 @@ HEADERS = {
     'x-api-key': ESIOS_API_TOKEN
 }
 
+# 3 intentos con espera inicial de 1-2 s; las respuestas sin cambios (304) salen de la caché en disco
+POLITICA_ESIOS = PoliticaReintentos(intentos=3, base=2.0, factor=1.75)
+
+fetcher = obtener_fetcher()
+
 
 def iso_day_bounds(day: datetime):
     start = day.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
@@ -60,35 +76,18 @@ def iso_day_bounds(day: datetime):
 
 def fetch_esios_indicator(indicator_id: int, start_date: str, end_date: str) -> dict:
     """Obtiene datos de un indicador ESIOS con reintentos."""
-    delay = random.uniform(1.0, 2.0)  # Delay inicial aleatorio
-    last_err = None
-    
     url = f"{ESIOS_BASE}/indicators/{indicator_id}"
     params = {
         'start_date': start_date,
         'end_date': end_date,
         'geo_ids[]': 8741  # Península
     }
-    
-    for attempt in range(3):
-        try:
-            # Delay aleatorio antes de cada intento (excepto el primero)
-            if attempt > 0:
-                time.sleep(delay)
-            
-            session = requests.Session()
-            session.headers.update(HEADERS)
-            
-            r = session.get(url, params=params, timeout=30)
-            r.raise_for_status()
-            return r.json()
-            
-        except Exception as e:
-            last_err = e
-            print(f"❌ Intento {attempt + 1}/3 falló para indicador {indicator_id}: {e}")
-            delay = random.uniform(delay * 1.5, delay * 2.0)  # Backoff aleatorio
-            
-    raise last_err
+    try:
+        return fetcher.get_json(url, params=params, headers=HEADERS, timeout=30, politica=POLITICA_ESIOS,
+                                archivar=(FUENTE_ARCHIVO, f"{start_date}/{indicator_id}"))
+    except Exception as e:
+        print(f"❌ Indicador {indicator_id} falló: {e}")
+        raise
 
 
 # Función eliminada - ya no necesitamos almacenar JSON raw
@@ -100,38 +99,83 @@ def fetch_esios_indicator(indicator_id: int, start_date: str, end_date: str) ->
 # Función eliminada - reemplazada por fetch_co2_data que usa ESIOS directamente
 
 
+def parse_indicator_values(payload: dict) -> list:
+    """Lista de (timestamp UTC naive, valor) de un payload de indicador ESIOS (None si estructura inesperada)."""
+    if 'indicator' not in payload or 'values' not in payload['indicator']:
+        return None
+    filas = {}
+    for val in payload['indicator']['values']:
+        dt_str = val.get('datetime')
+        valor = val.get('value')
+        if dt_str and valor is not None:
+            try:
+                ts = datetime.fromisoformat(dt_str.replace('Z','+00:00')).replace(tzinfo=None)
+                filas[ts] = float(valor)
+            except Exception:
+                continue
+    # Una fila por hora (la última gana, como el upsert fila a fila)
+    return list(filas.items())
+
+
+def upsert_pvpc(conn, filas: list) -> int:
+    if not filas:
+        return 0
+    # core_precios_omie está particionada por mes (sql/particionado): crear los meses que falten
+    horas = [ts for ts, _ in filas]
+    asegurar_particiones(conn, 'core_precios_omie', min(horas), max(horas))
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO core_precios_omie (timestamp_hora, precio_spot, fuente)
+            VALUES %s
+            ON CONFLICT (timestamp_hora) DO UPDATE SET
+              precio_spot = EXCLUDED.precio_spot,
+              fecha_publicacion = CURRENT_TIMESTAMP
+        """, [(ts, precio / 1000, 'ESIOS') for ts, precio in filas])  # Convertir a EUR/kWh
+    return len(filas)
+
+
+def upsert_mix(conn, tecnologia: str, filas: list) -> int:
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO core_ree_mix_horario (fecha_hora, tecnologia, mwh, porcentaje, fuente)
+            VALUES %s
+            ON CONFLICT (fecha_hora, tecnologia) DO UPDATE SET
+              mwh = EXCLUDED.mwh,
+              fecha_carga = CURRENT_TIMESTAMP
+        """, [(ts, tecnologia, mwh, None, 'ESIOS') for ts, mwh in filas])
+    return len(filas)
+
+
+def upsert_co2(conn, filas: list) -> int:
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO core_ree_emisiones_horario (fecha_hora, gco2_kwh, fuente)
+            VALUES %s
+            ON CONFLICT (fecha_hora) DO UPDATE SET
+              gco2_kwh = EXCLUDED.gco2_kwh,
+              fecha_carga = CURRENT_TIMESTAMP
+        """, [(ts, gco2_kwh, 'ESIOS') for ts, gco2_kwh in filas])
+    return len(filas)
+
+
+# Destino de cada indicador: (tabla lógica para el resumen, función de upsert)
+DESTINOS = {
+    INDICADORES['pvpc']: ('PVPC', upsert_pvpc),
+    INDICADORES['generacion_renovable']: ('Mix', lambda conn, filas: upsert_mix(conn, 'Renovable', filas)),
+    INDICADORES['generacion_no_renovable']: ('Mix', lambda conn, filas: upsert_mix(conn, 'No Renovable', filas)),
+    INDICADORES['emisiones_co2']: ('CO2', upsert_co2),
+}
+
+
 def fetch_pvpc_data(conn, day, start_iso, end_iso):
     """Obtiene datos PVPC desde ESIOS."""
     try:
         payload = fetch_esios_indicator(INDICADORES['pvpc'], start_iso, end_iso)
-        
-        if 'indicator' not in payload or 'values' not in payload['indicator']:
+        filas = parse_indicator_values(payload)
+        if filas is None:
             print(f"⚠️ Estructura inesperada en PVPC: {list(payload.keys())}")
             return 0
-        
-        values = payload['indicator']['values']
-        pvpc_rows = 0
-        
-        cur = conn.cursor()
-        for val in values:
-            dt_str = val.get('datetime')
-            price = val.get('value')
-            if dt_str and price is not None:
-                try:
-                    ts = datetime.fromisoformat(dt_str.replace('Z','+00:00')).replace(tzinfo=None)
-                    cur.execute("""
-                        INSERT INTO core_precios_omie (timestamp_hora, precio_spot, fuente)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (timestamp_hora) DO UPDATE SET
-                          precio_spot = EXCLUDED.precio_spot,
-                          fecha_publicacion = CURRENT_TIMESTAMP
-                    """, (ts, price/1000, 'ESIOS'))  # Convertir a EUR/kWh
-                    pvpc_rows += 1
-                except Exception as e:
-                    continue
-        cur.close()
-        
-        return pvpc_rows
+        return upsert_pvpc(conn, filas)
         
     except Exception as e:
         print(f"❌ ESIOS PVPC error: {e}")
@@ -145,47 +189,10 @@ def fetch_mix_data(conn, day, start_iso, end_iso):
         no_renovable_payload = fetch_esios_indicator(INDICADORES['generacion_no_renovable'], start_iso, end_iso)
         
         mix_rows = 0
-        cur = conn.cursor()
-        
-        # Procesar datos renovables
-        if 'indicator' in renovable_payload and 'values' in renovable_payload['indicator']:
-            for val in renovable_payload['indicator']['values']:
-                dt_str = val.get('datetime')
-                mwh = val.get('value')
-                if dt_str and mwh is not None:
-                    try:
-                        ts = datetime.fromisoformat(dt_str.replace('Z','+00:00')).replace(tzinfo=None)
-                        cur.execute("""
-                            INSERT INTO core_ree_mix_horario (fecha_hora, tecnologia, mwh, porcentaje, fuente)
-                            VALUES (%s, %s, %s, %s, %s)
-                            ON CONFLICT (fecha_hora, tecnologia) DO UPDATE SET
-                              mwh = EXCLUDED.mwh,
-                              fecha_carga = CURRENT_TIMESTAMP
-                        """, (ts, 'Renovable', mwh, None, 'ESIOS'))
-                        mix_rows += 1
-                    except Exception:
-                        continue
-        
-        # Procesar datos no renovables
-        if 'indicator' in no_renovable_payload and 'values' in no_renovable_payload['indicator']:
-            for val in no_renovable_payload['indicator']['values']:
-                dt_str = val.get('datetime')
-                mwh = val.get('value')
-                if dt_str and mwh is not None:
-                    try:
-                        ts = datetime.fromisoformat(dt_str.replace('Z','+00:00')).replace(tzinfo=None)
-                        cur.execute("""
-                            INSERT INTO core_ree_mix_horario (fecha_hora, tecnologia, mwh, porcentaje, fuente)
-                            VALUES (%s, %s, %s, %s, %s)
-                            ON CONFLICT (fecha_hora, tecnologia) DO UPDATE SET
-                              mwh = EXCLUDED.mwh,
-                              fecha_carga = CURRENT_TIMESTAMP
-                        """, (ts, 'No Renovable', mwh, None, 'ESIOS'))
-                        mix_rows += 1
-                    except Exception:
-                        continue
-        
-        cur.close()
+        for tecnologia, payload in (('Renovable', renovable_payload), ('No Renovable', no_renovable_payload)):
+            filas = parse_indicator_values(payload)
+            if filas:
+                mix_rows += upsert_mix(conn, tecnologia, filas)
         return mix_rows
         
     except Exception as e:
@@ -196,48 +203,66 @@ def fetch_co2_data(conn, day, start_iso, end_iso):
     """Obtiene datos de emisiones CO2 desde ESIOS."""
     try:
         payload = fetch_esios_indicator(INDICADORES['emisiones_co2'], start_iso, end_iso)
-        
-        if 'indicator' not in payload or 'values' not in payload['indicator']:
+        filas = parse_indicator_values(payload)
+        if filas is None:
             print(f"⚠️ Estructura inesperada en CO2: {list(payload.keys())}")
             return 0
-        
-        values = payload['indicator']['values']
-        co2_rows = 0
-        
-        cur = conn.cursor()
-        for val in values:
-            dt_str = val.get('datetime')
-            gco2_kwh = val.get('value')
-            if dt_str and gco2_kwh is not None:
-                try:
-                    ts = datetime.fromisoformat(dt_str.replace('Z','+00:00')).replace(tzinfo=None)
-                    cur.execute("""
-                        INSERT INTO core_ree_emisiones_horario (fecha_hora, gco2_kwh, fuente)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (fecha_hora) DO UPDATE SET
-                          gco2_kwh = EXCLUDED.gco2_kwh,
-                          fecha_carga = CURRENT_TIMESTAMP
-                    """, (ts, gco2_kwh, 'ESIOS'))
-                    co2_rows += 1
-                except Exception:
-                    continue
-        cur.close()
-        
-        return co2_rows
+        return upsert_co2(conn, filas)
         
     except Exception as e:
         print(f"❌ ESIOS CO2 error: {e}")
         return 0
 
+
+def _parsear_entrada(entrada, payload):
+    """Worker de --replay: (indicador, filas) de una respuesta archivada."""
+    return int(entrada.clave.rsplit('/', 1)[1]), parse_indicator_values(payload)
+
+
+def replay(conn, desde, hasta, workers=None) -> dict:
+    """Reconstruye las tablas normalizadas de [desde, hasta] desde el archivo de respuestas."""
+    archivo = obtener_archivo()
+    # Claves '<YYYY-MM-DDT00:00:00Z>/<indicador>': '~' ordena tras cualquier sufijo del día
+    entradas = archivo.entradas(FUENTE_ARCHIVO, desde=desde.isoformat(), hasta=f"{hasta.isoformat()}~")
+    totales = {'PVPC': 0, 'Mix': 0, 'CO2': 0, 'respuestas': len(entradas)}
+    for entrada, resultado in reprocesar(archivo, entradas, _parsear_entrada, workers=workers):
+        if not resultado:
+            continue
+        indicador, filas = resultado
+        if indicador not in DESTINOS or not filas:
+            continue
+        tabla, upsert = DESTINOS[indicador]
+        totales[tabla] += upsert(conn, filas)
+    return totales
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--date', help='YYYY-MM-DD (por defecto: ayer)')
+    parser.add_argument('--replay', action='store_true', help='reconstruir desde el archivo de respuestas (sin red)')
+    parser.add_argument('--desde', help='YYYY-MM-DD inicio del --replay (por defecto: --date)')
+    parser.add_argument('--hasta', help='YYYY-MM-DD fin del --replay, incluido (por defecto: --desde)')
+    parser.add_argument('--workers', type=int, default=None, help='procesos de parseo en --replay')
     args = parser.parse_args()
 
     if args.date:
         day = datetime.strptime(args.date, '%Y-%m-%d').date()
     else:
         day = (datetime.utcnow() - timedelta(days=1)).date()
+
+    if args.replay:
+        desde = datetime.strptime(args.desde, '%Y-%m-%d').date() if args.desde else day
+        hasta = datetime.strptime(args.hasta, '%Y-%m-%d').date() if args.hasta else desde
+        conn = psycopg2.connect(**DB)
+        totales = replay(conn, desde, hasta, args.workers)
+        conn.commit()
+        conn.close()
+        print(f"✅ Replay ESIOS {desde}..{hasta}: {totales['respuestas']} respuestas archivadas → "
+              f"PVPC={totales['PVPC']}, Mix={totales['Mix']}, CO2={totales['CO2']} filas")
+        return
+
+    if not ESIOS_API_TOKEN:
+        raise ValueError("El token ESIOS_API_TOKEN no está configurado.")
     start_iso, end_iso = iso_day_bounds(datetime.combine(day, datetime.min.time()))
 
     # Conexión BD
@@ -11,14 +11,26 @@ Cargador resiliente de zonas climáticas con HDD/CDD:
 import csv
 import argparse
 import psycopg2
-import requests
+from dataclasses import replace
 from datetime import datetime, timedelta
-import time
 import sys
 import json
-import random
+from pathlib import Path
 from typing import Optional, Tuple
 
+# Geocodificación compartida (caché persistente en db_enriquecimiento)
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from geocoding import obtener_servicio_geocoding, PRECISION_MUNICIPIO
+from http_fetch import obtener_fetcher, PoliticaReintentos
+
+# Open-Meteo penaliza ráfagas: una petición cada 3 s y, ante 429, al menos 60 s de pausa
+OPEN_METEO_URL = "https://archive-api.open-meteo.com/v1/archive"
+POLITICA_OPEN_METEO = PoliticaReintentos(intentos=5, base=5.0, espera_maxima=120.0,
+                                         espera_minima_429=60.0)
+
+fetcher = obtener_fetcher()
+fetcher.configurar_host('archive-api.open-meteo.com', max_concurrencia=1, intervalo=3.0)
+
 # Configuración BD
 DB_CONFIG = {
     'host': 'localhost',
@@ -104,40 +116,13 @@ def get_zona_cte(conn, provincia: str, altitud: float) -> str:
 def get_coordinates_with_fallbacks(municipio: str, provincia: str) -> Optional[Tuple[float, float]]:
     """Obtener coordenadas con múltiples fallbacks."""
     
-    # Fallback 1: Nominatim con query completa
-    try:
-        time.sleep(1.2)  # Rate limit Nominatim
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            'q': f"{municipio}, {provincia}, España",
-            'format': 'json',
-            'limit': 1
-        }
-        headers = {'User-Agent': 'VagalumeEnergia/1.0'}
-        
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if data:
-            return float(data[0]['lat']), float(data[0]['lon'])
-    except Exception as e:
-        print(f"  Fallback 1 (Nominatim completo) falló: {e}")
-    
-    # Fallback 2: Nominatim solo municipio
-    try:
-        time.sleep(1.2)
-        params = {
-            'q': f"{municipio}, España",
-            'format': 'json',
-            'limit': 1
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if data:
-            return float(data[0]['lat']), float(data[0]['lon'])
-    except Exception as e:
-        print(f"  Fallback 2 (Nominatim solo municipio) falló: {e}")
+    # Fallbacks 1 y 2: Nominatim con query completa y solo municipio.
+    # El servicio cachea en BD y respeta el ritmo de Nominatim, así que los
+    # municipios repetidos (varios CP) o ya resueltos en otra ejecución no esperan.
+    resultado = obtener_servicio_geocoding().geocodificar_municipio(municipio, provincia)
+    if resultado.encontrado and resultado.precision == PRECISION_MUNICIPIO:
+        return resultado.latitud, resultado.longitud
+    print(f"  Geocodificación de {municipio} sin resultado ({resultado.precision})")
     
     # Fallback 3: Coordenadas aproximadas por provincia (centro geográfico)
     coords_provincia = {
@@ -160,72 +145,42 @@ def get_coordinates_with_fallbacks(municipio: str, provincia: str) -> Optional[T
 def get_hdd_cdd_open_meteo_resilient(lat: float, lon: float, max_retries: int = 5):
     """Obtener HDD/CDD con reintentos y backoff exponencial."""
     
-    for attempt in range(max_retries):
-        try:
-            # Delay mucho más conservador para evitar rate limiting
-            base_delay = 3.0  # Mínimo 3 segundos
-            delay = base_delay + (attempt * 5.0) + random.uniform(0, 2)
-            time.sleep(delay)
-            
-            # Fechas del último año
-            end_date = datetime.now().date()
-            start_date = end_date - timedelta(days=365)
-            
-            url = "https://archive-api.open-meteo.com/v1/archive"
-            params = {
-                'latitude': lat,
-                'longitude': lon,
-                'start_date': start_date.isoformat(),
-                'end_date': end_date.isoformat(),
-                'daily': 'temperature_2m_mean',
-                'timezone': 'Europe/Madrid'
-            }
-            
-            response = requests.get(url, params=params, timeout=30)
-            
-            # Si es 429 (rate limit), esperar mucho más tiempo
-            if response.status_code == 429:
-                wait_time = 120 + (attempt * 60)  # Mínimo 2 minutos, hasta 5 minutos
-                print(f"  Rate limit detectado, esperando {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-                
-            response.raise_for_status()
-            data = response.json()
-            
-            temps = data.get('daily', {}).get('temperature_2m_mean')
-            if not temps or not isinstance(temps, list):
-                raise RuntimeError("Open-Meteo sin temperatura_media diaria")
-                
-            valid = [t for t in temps if t is not None]
-            if not valid:
-                raise RuntimeError("Open-Meteo sin valores válidos")
-                
-            hdd_18 = sum(max(0, 18 - t) for t in valid)
-            cdd_18 = sum(max(0, t - 18) for t in valid)
-            temp_media = sum(valid) / len(valid)
-            
-            elev = data.get('elevation')
-            if elev is None:
-                raise RuntimeError("Open-Meteo sin elevation")
-                
-            return hdd_18, cdd_18, temp_media, float(elev)
-            
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:
-                wait_time = 60 + (attempt * 30)
-                print(f"  Rate limit (intento {attempt + 1}/{max_retries}), esperando {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-            else:
-                raise RuntimeError(f"Open-Meteo HTTP error: {e}")
-        except Exception as e:
-            if attempt == max_retries - 1:
-                raise RuntimeError(f"Open-Meteo fallo tras {max_retries} intentos: {e}")
-            print(f"  Intento {attempt + 1} falló: {e}")
-            time.sleep(5 + attempt * 5)
+    # Fechas del último año
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=365)
+    
+    params = {
+        'latitude': lat,
+        'longitude': lon,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'daily': 'temperature_2m_mean',
+        'timezone': 'Europe/Madrid'
+    }
+    
+    try:
+        data = fetcher.get_json(OPEN_METEO_URL, params=params, timeout=30,
+                                politica=replace(POLITICA_OPEN_METEO, intentos=max_retries),
+                                validar=_validar_open_meteo)
+    except Exception as e:
+        raise RuntimeError(f"Open-Meteo fallo tras {max_retries} intentos: {e}")
+    
+    valid = [t for t in data['daily']['temperature_2m_mean'] if t is not None]
+    hdd_18 = sum(max(0, 18 - t) for t in valid)
+    cdd_18 = sum(max(0, t - 18) for t in valid)
+    temp_media = sum(valid) / len(valid)
     
-    raise RuntimeError(f"Open-Meteo fallo tras {max_retries} intentos")
+    return hdd_18, cdd_18, temp_media, float(data['elevation'])
+
+def _validar_open_meteo(data: dict):
+    """Lanza si la respuesta no trae temperaturas válidas o elevación."""
+    temps = data.get('daily', {}).get('temperature_2m_mean')
+    if not temps or not isinstance(temps, list):
+        raise RuntimeError("Open-Meteo sin temperatura_media diaria")
+    if not any(t is not None for t in temps):
+        raise RuntimeError("Open-Meteo sin valores válidos")
+    if data.get('elevation') is None:
+        raise RuntimeError("Open-Meteo sin elevation")
 
 def get_last_processed_cp(conn) -> str:
     """Obtener el último CP procesado para continuar desde ahí."""
@@ -16,10 +16,18 @@ Parámetros:
 import csv
 import argparse
 import psycopg2
-import requests
 from datetime import datetime, timedelta
-import time
 import sys
+from pathlib import Path
+
+# Geocodificación compartida (caché persistente en db_enriquecimiento)
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from geocoding import obtener_servicio_geocoding
+from http_fetch import obtener_fetcher
+
+# Open-Meteo: 500 ms entre peticiones para evitar rate limiting
+fetcher = obtener_fetcher()
+fetcher.configurar_host('archive-api.open-meteo.com', max_concurrencia=1, intervalo=0.5)
 
 # Configuración BD
 DB_CONFIG = {
@@ -88,27 +96,11 @@ def get_zona_cte(conn, provincia: str, altitud: float) -> str:
     return result[0]
 
 def get_coordinates_nominatim(municipio: str, provincia: str):
-    """Obtener coordenadas aproximadas del municipio usando Nominatim"""
-    try:
-        # Esperar para respetar límites de Nominatim
-        time.sleep(1)
-        
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            'q': f"{municipio}, {provincia}, España",
-            'format': 'json',
-            'limit': 1
-        }
-        headers = {'User-Agent': 'VagalumeEnergia/1.0'}
-        
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if not data:
-            raise RuntimeError("Nominatim sin resultados")
-        return float(data[0]['lat']), float(data[0]['lon'])
-    except Exception as e:
-        raise RuntimeError(f"Nominatim fallo: {e}")
+    """Obtener coordenadas aproximadas del municipio usando Nominatim (vía servicio de geocodificación cacheado)"""
+    resultado = obtener_servicio_geocoding().geocodificar_municipio(municipio, provincia)
+    if not resultado.encontrado:
+        raise RuntimeError("Nominatim fallo: sin resultados")
+    return resultado.latitud, resultado.longitud
 
 def get_hdd_cdd_open_meteo(lat: float, lon: float):
     """Obtener HDD/CDD anuales (últimos 365 días) y altitud real desde Open-Meteo."""
@@ -127,12 +119,7 @@ def get_hdd_cdd_open_meteo(lat: float, lon: float):
             'timezone': 'Europe/Madrid'
         }
         
-        # Delay para evitar rate limiting
-        time.sleep(0.5)  # 500ms entre peticiones
-        
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        data = fetcher.get_json(url, params=params, timeout=30)
         temps = data.get('daily', {}).get('temperature_2m_mean')
         if not temps or not isinstance(temps, list):
             raise RuntimeError("Open-Meteo sin temperatura_media diaria")
@@ -231,9 +218,6 @@ def main():
                     print(f"✅ Procesados {processed} registros...")
                     batch_data = []
                     
-                    # Pausa pequeña por respeto a servicios
-                    time.sleep(0.3)
-                    
             except Exception as e:
                 print(f"❌ Error procesando {municipio} ({codigo_postal}): {e}")
                 errors += 1
@@ -7,8 +7,12 @@ Migrado para usar datos de ESIOS API en lugar de REE.
 
 import psycopg2
 from datetime import date
+from pathlib import Path
 import sys
 
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from particiones import asegurar_particiones
+
 DB = {
     'host': 'localhost',
     'port': 5432,
@@ -69,6 +73,8 @@ def main():
         
         # 3. Insertar datos combinados
         print("📝 Insertando datos PVPC...")
+        # Meses del rango en precios_horarios_pvpc si está particionada (sql/particionado)
+        asegurar_particiones(conn, 'precios_horarios_pvpc', FECHA_INICIO, FECHA_FIN)
         
         # Query simplificada que combina todo
         cur.execute("""
@@ -10,9 +10,13 @@ Basado en motor_mejora/src/utils/rellenar_precios_horarios_pvpc.py pero adaptado
 import psycopg2
 import psycopg2.extras
 from datetime import datetime, date
+from pathlib import Path
 from tqdm import tqdm
 import sys
 
+sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+from particiones import asegurar_particiones
+
 DB_SISTEMA_ELECTRICO = {
     'host': 'localhost',
     'port': 5432,
@@ -156,6 +160,8 @@ def main():
             sys.exit(1)
         
         print(f"📝 Insertando {len(rows)} registros en precios_horarios_pvpc...")
+        # Meses del rango en precios_horarios_pvpc si está particionada (sql/particionado)
+        asegurar_particiones(conn, 'precios_horarios_pvpc', FECHA_INICIO, FECHA_FIN)
         
         # Insertar/actualizar los datos
         inserted = 0
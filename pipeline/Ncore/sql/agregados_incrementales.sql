@@ -0,0 +1,110 @@
+-- Agregados incrementales de mercado en db_Ncore
+-- - Diarios: solo se recalculan los días cuyos valores horarios se han tocado
+-- - Mensuales: se recalculan desde los diarios del mes (≤ 31 filas), nunca desde el horario
+-- Requiere FDW y foreign table: f_omie_precios (ver sync_omie_daily.sql)
+-- Unidades OMIE origen: €/kWh; destino: €/MWh (×1000)
+--
+-- Uso desde los jobs (backfill_omie_from_ree.py, sync_omie_daily.sql):
+--   SELECT recalcular_omie_agregados(ARRAY[DATE '2025-09-08', DATE '2025-09-09']);
+
+-- =====================================================
+-- OMIE diario / mensual
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS core_precios_omie_diario (
+  fecha date PRIMARY KEY,
+  precio_medio_mwh numeric,
+  precio_max_mwh numeric,
+  precio_min_mwh numeric,
+  volatilidad_mwh numeric
+);
+-- Horas del día (23/24/25 por DST): peso del día en la media mensual
+ALTER TABLE core_precios_omie_diario ADD COLUMN IF NOT EXISTS n_horas integer;
+ALTER TABLE core_precios_omie_diario ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now();
+
+CREATE TABLE IF NOT EXISTS core_precios_omie_mensual (
+  mes date PRIMARY KEY,            -- primer día del mes
+  precio_medio_mwh numeric,        -- media horaria del mes
+  precio_max_mwh numeric,
+  precio_min_mwh numeric,
+  n_horas integer,
+  n_dias integer,
+  updated_at timestamptz DEFAULT now()
+);
+
+COMMENT ON TABLE core_precios_omie_diario IS 'Agregados diarios OMIE (zona ES), mantenidos por recalcular_omie_agregados';
+COMMENT ON TABLE core_precios_omie_mensual IS 'Agregados mensuales OMIE (zona ES) desde core_precios_omie_diario';
+
+
+CREATE OR REPLACE FUNCTION recalcular_omie_agregados(p_dias date[])
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_dias integer;
+BEGIN
+  -- Días tocados: upsert desde el horario (el filtro por fecha se envía al servidor remoto)
+  WITH daily AS (
+    SELECT
+      fecha,
+      (AVG(precio_energia)*1000)::numeric       AS precio_medio_mwh,
+      (MAX(precio_energia)*1000)::numeric       AS precio_max_mwh,
+      (MIN(precio_energia)*1000)::numeric       AS precio_min_mwh,
+      (STDDEV(precio_energia*1000))::numeric    AS volatilidad_mwh,
+      COUNT(*)::integer                         AS n_horas
+    FROM f_omie_precios
+    WHERE zona = 'ES'
+      AND fecha = ANY (p_dias)
+    GROUP BY fecha
+  )
+  INSERT INTO core_precios_omie_diario (fecha, precio_medio_mwh, precio_max_mwh, precio_min_mwh,
+                                        volatilidad_mwh, n_horas, updated_at)
+  SELECT fecha, precio_medio_mwh, precio_max_mwh, precio_min_mwh, volatilidad_mwh, n_horas, now()
+  FROM daily
+  ON CONFLICT (fecha) DO UPDATE
+  SET precio_medio_mwh = EXCLUDED.precio_medio_mwh,
+      precio_max_mwh   = EXCLUDED.precio_max_mwh,
+      precio_min_mwh   = EXCLUDED.precio_min_mwh,
+      volatilidad_mwh  = EXCLUDED.volatilidad_mwh,
+      n_horas          = EXCLUDED.n_horas,
+      updated_at       = now();
+  GET DIAGNOSTICS v_dias = ROW_COUNT;
+
+  -- Meses de esos días: media ponderada por horas de los diarios del mes
+  -- (filas antiguas sin n_horas cuentan como 24 horas)
+  WITH meses AS (
+    SELECT DISTINCT date_trunc('month', d)::date AS mes FROM unnest(p_dias) AS d
+  ),
+  mensual AS (
+    SELECT m.mes,
+           SUM(d.precio_medio_mwh * COALESCE(d.n_horas, 24)) / NULLIF(SUM(COALESCE(d.n_horas, 24)), 0) AS precio_medio_mwh,
+           MAX(d.precio_max_mwh) AS precio_max_mwh,
+           MIN(d.precio_min_mwh) AS precio_min_mwh,
+           SUM(COALESCE(d.n_horas, 24))::integer AS n_horas,
+           COUNT(*)::integer AS n_dias
+    FROM meses m
+    JOIN core_precios_omie_diario d
+      ON d.fecha >= m.mes AND d.fecha < (m.mes + interval '1 month')::date
+    WHERE d.precio_medio_mwh IS NOT NULL
+    GROUP BY m.mes
+  )
+  INSERT INTO core_precios_omie_mensual (mes, precio_medio_mwh, precio_max_mwh, precio_min_mwh,
+                                         n_horas, n_dias, updated_at)
+  SELECT mes, precio_medio_mwh, precio_max_mwh, precio_min_mwh, n_horas, n_dias, now()
+  FROM mensual
+  ON CONFLICT (mes) DO UPDATE
+  SET precio_medio_mwh = EXCLUDED.precio_medio_mwh,
+      precio_max_mwh   = EXCLUDED.precio_max_mwh,
+      precio_min_mwh   = EXCLUDED.precio_min_mwh,
+      n_horas          = EXCLUDED.n_horas,
+      n_dias           = EXCLUDED.n_dias,
+      updated_at       = now();
+
+  RETURN v_dias;
+END;
+$$;
+
+
+-- Versiones anteriores de este script definían recalcular_esios_agregados, pero ningún
+-- job de este repositorio carga core_esios_valor_horario: se retira para no dejar una
+-- función que nadie llama
+DROP FUNCTION IF EXISTS recalcular_esios_agregados(date[]);
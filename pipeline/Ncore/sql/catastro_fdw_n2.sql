@@ -0,0 +1,21 @@
+-- Foreign table de recencia de cache Catastro en db_N2
+-- Permite a fetch_catastro_cache_from_ovc.py filtrar objetivos en una sola query
+-- (sin FDW el job usa una tabla temporal cargada por COPY).
+-- Ejecutar en db_N2. Ajustar credenciales del USER MAPPING.
+
+CREATE EXTENSION IF NOT EXISTS postgres_fdw;
+
+CREATE SERVER IF NOT EXISTS srv_enriquecimiento
+  FOREIGN DATA WRAPPER postgres_fdw
+  OPTIONS (host 'localhost', port '5432', dbname 'db_enriquecimiento');
+
+CREATE USER MAPPING IF NOT EXISTS FOR CURRENT_USER
+  SERVER srv_enriquecimiento
+  OPTIONS (user 'postgres', password 'admin');
+
+CREATE FOREIGN TABLE IF NOT EXISTS f_catastro_inmuebles (
+  cups            TEXT,
+  fecha_consulta  TIMESTAMP
+)
+SERVER srv_enriquecimiento
+OPTIONS (schema_name 'public', table_name 'catastro_inmuebles');
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Agregados de mercado en db_Ncore (pipeline/Ncore/sql/agregados_incrementales.sql)
+- Consultar la media mensual OMIE con una lectura por clave primaria
+
+El recálculo incremental lo lanzan los propios cargadores OMIE tras el upsert
+(backfill_omie_from_ree.py y sync_omie_daily.sql llaman a recalcular_omie_agregados).
+"""
+
+import logging
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, Optional, Union
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+Fecha = Union[date, datetime]
+
+
+def _config_ncore() -> Dict[str, str]:
+    """Conexión a db_Ncore con las mismas variables que core/db_connections."""
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': os.getenv('DB_PORT', '5432'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', 'admin'),
+        'database': f"db_{os.getenv('DB_NCORE', 'Ncore')}"
+    }
+
+
+class PreciosOmieMensuales:
+    """Media mensual OMIE (€/kWh) desde core_precios_omie_mensual, con memoria por mes."""
+
+    def __init__(self, db_config: Optional[Dict[str, str]] = None):
+        self.db_config = db_config or _config_ncore()
+        self._memoria: Dict[date, Optional[float]] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def precio_medio_kwh(self, fecha: Fecha) -> Optional[float]:
+        """Media horaria del mes de `fecha` en €/kWh; None si el mes no está agregado."""
+        mes = (fecha.date() if isinstance(fecha, datetime) else fecha).replace(day=1)
+        with self._lock:
+            if mes in self._memoria:
+                return self._memoria[mes]
+            precio = self._leer(mes)
+            # Los meses sin agregado no se memorizan: pueden completarse durante el proceso
+            if precio is not None:
+                self._memoria[mes] = precio
+            return precio
+
+    def _leer(self, mes: date) -> Optional[float]:
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = psycopg2.connect(**self.db_config)
+            with self._conn.cursor() as cur:
+                cur.execute("SELECT precio_medio_mwh FROM core_precios_omie_mensual WHERE mes = %s", (mes,))
+                fila = cur.fetchone()
+            self._conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Agregado mensual OMIE no disponible: {e}")
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+            self._conn = None
+            return None
+        if not fila or fila[0] is None:
+            return None
+        return float(fila[0]) / 1000
+
+
+# Consulta compartida por proceso
+_precios: Optional[PreciosOmieMensuales] = None
+_precios_lock = threading.Lock()
+
+
+def obtener_precios_omie_mensuales() -> PreciosOmieMensuales:
+    """Consulta de medias mensuales OMIE compartida en el proceso."""
+    global _precios
+    with _precios_lock:
+        if _precios is None:
+            _precios = PreciosOmieMensuales()
+        return _precios
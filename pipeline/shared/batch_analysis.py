@@ -8,9 +8,12 @@ Análisis masivo de archivos N0 para detectar patrones y generar cuestionarios i
 import json
 import sys
 import os
+import argparse
 from pathlib import Path
-from typing import Dict, List, Any, Set
+from typing import Dict, List, Any, Set, Optional, Tuple
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from datetime import datetime
 import logging
 
@@ -22,6 +25,122 @@ from field_mappings import get_nested_field
 
 logger = logging.getLogger(__name__)
 
+# Campos críticos y rutas donde pueden aparecer en un N0
+CRITICAL_FIELDS = {
+    'cliente_nombre': ['client.nombre_cliente', 'cliente.nombre_cliente', 'titular.nombre'],
+    'cliente_nif': ['client.nif_titular.value', 'client.nif_titular', 'cliente.nif', 'titular.nif'],
+    'cups': ['contract_2x3.cups_electricidad', 'id_cups', 'supply_point.cups', 'punto_suministro.cups'],
+    'proveedor': ['contract_2x3.comercializadora', 'provider', 'provider.nombre_comercial', 'proveedor.nombre_comercial'],
+    'fecha_inicio': ['consumo_energia.inicio_periodo', 'invoice_2x3.fecha_inicio_periodo', 'facturacion.fecha_inicio'],
+    'fecha_fin': ['consumo_energia.fin_periodo', 'invoice_2x3.fecha_fin_periodo', 'facturacion.fecha_fin'],
+    'importe_total': ['resumen_factura.total_factura', 'invoice_2x3.total_a_pagar', 'facturacion.importe_total'],
+    'consumo_kwh': ['consumo_energia.consumo_medido_kwh', 'consumo.energia_activa_kwh', 'lecturas.consumo_kwh']
+}
+
+# Nombre del fichero de estado del modo incremental (dentro del directorio N0)
+INCREMENTAL_STATE_FILE = '.batch_analysis_state.json'
+
+
+@dataclass
+class PartialAggregate:
+    """
+    Agregado parcial compacto de un lote de archivos N0.
+    Los workers emiten uno por lote y el proceso principal los fusiona
+    a medida que llegan, sin guardar los conjuntos unique_fields por archivo.
+    """
+    total_files: int = 0
+    quality_sum: float = 0.0
+    field_count_sum: int = 0
+    field_frequency: Counter = field(default_factory=Counter)
+    missing_critical_fields: Counter = field(default_factory=Counter)
+    # proveedor -> {'total_files', 'quality_sum', 'missing_fields': Counter}
+    providers: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # Filas compactas por archivo (sin unique_fields)
+    detailed_results: List[Dict[str, Any]] = field(default_factory=list)
+    max_fields: Optional[int] = None
+
+    def add_analysis(self, analysis: Dict[str, Any]) -> None:
+        """Incorpora el análisis de un archivo y descarta su detalle voluminoso."""
+        self.total_files += 1
+        self.quality_sum += analysis['data_quality_score']
+        self.field_count_sum += analysis['field_count']
+        self.field_frequency.update(analysis['unique_fields'])
+        self.missing_critical_fields.update(analysis['missing_critical_fields'])
+
+        provider = self.providers.setdefault(analysis['provider'], {
+            'total_files': 0, 'quality_sum': 0.0, 'missing_fields': Counter()
+        })
+        provider['total_files'] += 1
+        provider['quality_sum'] += analysis['data_quality_score']
+        provider['missing_fields'].update(analysis['missing_critical_fields'])
+
+        self.detailed_results.append({k: v for k, v in analysis.items() if k != 'unique_fields'})
+        self._trim_fields()
+
+    def merge(self, other: 'PartialAggregate') -> 'PartialAggregate':
+        """Fusiona otro agregado parcial en este (operación reduce)."""
+        self.total_files += other.total_files
+        self.quality_sum += other.quality_sum
+        self.field_count_sum += other.field_count_sum
+        self.field_frequency.update(other.field_frequency)
+        self.missing_critical_fields.update(other.missing_critical_fields)
+
+        for name, data in other.providers.items():
+            provider = self.providers.setdefault(name, {
+                'total_files': 0, 'quality_sum': 0.0, 'missing_fields': Counter()
+            })
+            provider['total_files'] += data['total_files']
+            provider['quality_sum'] += data['quality_sum']
+            provider['missing_fields'].update(data['missing_fields'])
+
+        self.detailed_results.extend(other.detailed_results)
+        self._trim_fields()
+        return self
+
+    def _trim_fields(self) -> None:
+        """Si hay límite, conserva solo los campos más frecuentes (sketch acotado)."""
+        if self.max_fields and len(self.field_frequency) > 2 * self.max_fields:
+            self.field_frequency = Counter(dict(self.field_frequency.most_common(self.max_fields)))
+
+
+# Analizador por proceso worker (se crea una vez en el inicializador del pool)
+_worker_analyzer = None
+
+
+def _init_worker() -> None:
+    """Inicializa el analizador del proceso worker."""
+    global _worker_analyzer
+    _worker_analyzer = BatchAnalyzer()
+
+
+def _analyze_chunk(n0_paths: List[str], max_fields: Optional[int] = None) -> PartialAggregate:
+    """Analiza un lote de archivos en un worker y devuelve su agregado parcial."""
+    analyzer = _worker_analyzer or BatchAnalyzer()
+    partial = PartialAggregate(max_fields=max_fields)
+    for n0_path in n0_paths:
+        analysis = analyzer._analyze_single_file(n0_path)
+        if analysis:
+            partial.add_analysis(analysis)
+    return partial
+
+
+def _analyze_chunk_records(n0_paths: List[str]) -> List[Dict[str, Any]]:
+    """Analiza un lote y devuelve los análisis por archivo (modo incremental)."""
+    analyzer = _worker_analyzer or BatchAnalyzer()
+    records = []
+    for n0_path in n0_paths:
+        analysis = analyzer._analyze_single_file(n0_path)
+        if analysis:
+            analysis['unique_fields'] = sorted(analysis['unique_fields'])
+            records.append(analysis)
+    return records
+
+
+def _chunks(items: List[Any], size: int) -> List[List[Any]]:
+    """Divide una lista en lotes de tamaño fijo."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
 class BatchAnalyzer:
     """
     Analizador masivo de archivos N0 para detectar patrones y generar cuestionarios
@@ -65,6 +184,148 @@ class BatchAnalyzer:
                 
         return self._generate_consolidated_report()
     
+    def analyze_all_n0_files_parallel(self, n0_directory: str, workers: Optional[int] = None,
+                                      chunk_size: int = 50, max_fields: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Analiza todos los archivos N0 en modo map-reduce con un pool de procesos.
+        Cada worker devuelve un PartialAggregate por lote que se fusiona en cuanto llega.
+        
+        Args:
+            n0_directory: Directorio con archivos N0
+            workers: Número de procesos (por defecto, núcleos disponibles)
+            chunk_size: Archivos por lote enviado a cada worker
+            max_fields: Límite opcional de campos distintos en field_frequency
+            
+        Returns:
+            Diccionario con análisis consolidado
+        """
+        n0_files = sorted(str(p) for p in Path(n0_directory).glob("N0_*.json"))
+        
+        if not n0_files:
+            logger.warning(f"No se encontraron archivos N0 en: {n0_directory}")
+            return {}
+        
+        logger.info(f"🔍 Analizando {len(n0_files)} archivos N0 en paralelo (lotes de {chunk_size})...")
+        
+        aggregate = PartialAggregate(max_fields=max_fields)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(_analyze_chunk, chunk, max_fields)
+                       for chunk in _chunks(n0_files, chunk_size)]
+            for future in as_completed(futures):
+                try:
+                    aggregate.merge(future.result())
+                except Exception as e:
+                    logger.error(f"Error en lote de análisis: {e}")
+        
+        aggregate.detailed_results.sort(key=lambda r: r['file_path'])
+        return self._generate_report_from_aggregate(aggregate)
+    
+    def analyze_changed_n0_files(self, n0_directory: str, state_path: Optional[str] = None,
+                                 workers: Optional[int] = None, chunk_size: int = 50) -> Dict[str, Any]:
+        """
+        Modo incremental: re-analiza solo los archivos nuevos o modificados
+        (por tamaño y mtime) desde el último reporte y reutiliza el resto.
+        
+        Args:
+            n0_directory: Directorio con archivos N0
+            state_path: Fichero de estado (por defecto .batch_analysis_state.json en el directorio)
+            workers: Número de procesos para los archivos modificados
+            chunk_size: Archivos por lote enviado a cada worker
+            
+        Returns:
+            Diccionario con análisis consolidado
+        """
+        state_file = Path(state_path) if state_path else Path(n0_directory) / INCREMENTAL_STATE_FILE
+        state = self._load_incremental_state(state_file)
+        
+        current = {}
+        for n0_file in Path(n0_directory).glob("N0_*.json"):
+            stat = n0_file.stat()
+            current[str(n0_file)] = (stat.st_size, stat.st_mtime_ns)
+        
+        if not current:
+            logger.warning(f"No se encontraron archivos N0 en: {n0_directory}")
+            return {}
+        
+        changed = sorted(path for path, signature in current.items()
+                         if state['files'].get(path, {}).get('signature') != list(signature))
+        removed = [path for path in state['files'] if path not in current]
+        for path in removed:
+            del state['files'][path]
+        
+        logger.info(f"🔁 Incremental: {len(changed)} archivos nuevos/modificados, "
+                    f"{len(current) - len(changed)} sin cambios, {len(removed)} eliminados")
+        
+        if changed:
+            if len(changed) <= chunk_size:
+                records = _analyze_chunk_records(changed)
+            else:
+                records = []
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                    for chunk_records in executor.map(_analyze_chunk_records, _chunks(changed, chunk_size)):
+                        records.extend(chunk_records)
+            
+            analyzed = {record['file_path'] for record in records}
+            for record in records:
+                state['files'][record['file_path']] = {
+                    'signature': list(current[record['file_path']]),
+                    'analysis': self._compact_record(record, state['fields'])
+                }
+            # Archivos que fallaron: se eliminan para reintentarlos en la próxima ejecución
+            for path in changed:
+                if path not in analyzed:
+                    state['files'].pop(path, None)
+        
+        aggregate = PartialAggregate()
+        for path in sorted(state['files']):
+            aggregate.add_analysis(self._expand_record(state['files'][path]['analysis'], state['fields']))
+        
+        self._save_incremental_state(state_file, state)
+        return self._generate_report_from_aggregate(aggregate)
+    
+    def _load_incremental_state(self, state_file: Path) -> Dict[str, Any]:
+        """Carga el estado del modo incremental (vacío si no existe o es inválido)."""
+        if state_file.exists():
+            try:
+                with open(state_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get('version') == 1:
+                    return state
+            except Exception as e:
+                logger.warning(f"⚠️ Estado incremental ilegible, se re-analiza todo: {e}")
+        return {'version': 1, 'fields': [], 'files': {}}
+    
+    def _save_incremental_state(self, state_file: Path, state: Dict[str, Any]) -> None:
+        """Guarda el estado incremental de forma atómica."""
+        try:
+            tmp_file = state_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, default=str)
+            os.replace(tmp_file, state_file)
+        except Exception as e:
+            logger.error(f"Error guardando estado incremental: {e}")
+    
+    @staticmethod
+    def _compact_record(analysis: Dict[str, Any], vocabulary: List[str]) -> Dict[str, Any]:
+        """Sustituye unique_fields por índices en el vocabulario compartido de campos."""
+        index = {name: i for i, name in enumerate(vocabulary)}
+        field_ids = []
+        for name in analysis['unique_fields']:
+            if name not in index:
+                index[name] = len(vocabulary)
+                vocabulary.append(name)
+            field_ids.append(index[name])
+        record = {k: v for k, v in analysis.items() if k != 'unique_fields'}
+        record['unique_field_ids'] = field_ids
+        return record
+    
+    @staticmethod
+    def _expand_record(record: Dict[str, Any], vocabulary: List[str]) -> Dict[str, Any]:
+        """Reconstruye un análisis a partir de su forma compacta."""
+        analysis = {k: v for k, v in record.items() if k != 'unique_field_ids'}
+        analysis['unique_fields'] = [vocabulary[i] for i in record['unique_field_ids']]
+        return analysis
+    
     def _analyze_single_file(self, n0_path: str) -> Dict[str, Any]:
         """
         Analiza un archivo N0 individual
@@ -94,8 +355,11 @@ class BatchAnalyzer:
                 'data_quality_score': 0
             }
             
-            # Calcular campos críticos faltantes
-            analysis['missing_critical_fields'] = self._find_missing_critical_fields(n0_data)
+            # Calcular campos críticos faltantes (a partir de los ya detectados)
+            analysis['missing_critical_fields'] = [
+                field_name for field_name in CRITICAL_FIELDS
+                if field_name not in analysis['critical_fields_present']
+            ]
             
             # Calcular puntuación de calidad
             analysis['data_quality_score'] = self._calculate_quality_score(analysis)
@@ -199,19 +463,8 @@ class BatchAnalyzer:
     
     def _check_critical_fields(self, n0_data: Dict[str, Any]) -> List[str]:
         """Verifica qué campos críticos están presentes"""
-        critical_fields = {
-            'cliente_nombre': ['client.nombre_cliente', 'cliente.nombre_cliente', 'titular.nombre'],
-            'cliente_nif': ['client.nif_titular.value', 'client.nif_titular', 'cliente.nif', 'titular.nif'],
-            'cups': ['contract_2x3.cups_electricidad', 'id_cups', 'supply_point.cups', 'punto_suministro.cups'],
-            'proveedor': ['contract_2x3.comercializadora', 'provider', 'provider.nombre_comercial', 'proveedor.nombre_comercial'],
-            'fecha_inicio': ['consumo_energia.inicio_periodo', 'invoice_2x3.fecha_inicio_periodo', 'facturacion.fecha_inicio'],
-            'fecha_fin': ['consumo_energia.fin_periodo', 'invoice_2x3.fecha_fin_periodo', 'facturacion.fecha_fin'],
-            'importe_total': ['resumen_factura.total_factura', 'invoice_2x3.total_a_pagar', 'facturacion.importe_total'],
-            'consumo_kwh': ['consumo_energia.consumo_medido_kwh', 'consumo.energia_activa_kwh', 'lecturas.consumo_kwh']
-        }
-        
         present_fields = []
-        for field_name, paths in critical_fields.items():
+        for field_name, paths in CRITICAL_FIELDS.items():
             for path in paths:
                 if get_nested_field(n0_data, path) is not None:
                     present_fields.append(field_name)
@@ -221,28 +474,8 @@ class BatchAnalyzer:
     
     def _find_missing_critical_fields(self, n0_data: Dict[str, Any]) -> List[str]:
         """Encuentra campos críticos faltantes"""
-        critical_fields = {
-            'cliente_nombre': ['client.nombre_cliente', 'cliente.nombre_cliente', 'titular.nombre'],
-            'cliente_nif': ['client.nif_titular.value', 'client.nif_titular', 'cliente.nif', 'titular.nif'],
-            'cups': ['contract_2x3.cups_electricidad', 'id_cups', 'supply_point.cups', 'punto_suministro.cups'],
-            'proveedor': ['contract_2x3.comercializadora', 'provider', 'provider.nombre_comercial', 'proveedor.nombre_comercial'],
-            'fecha_inicio': ['consumo_energia.inicio_periodo', 'invoice_2x3.fecha_inicio_periodo', 'facturacion.fecha_inicio'],
-            'fecha_fin': ['consumo_energia.fin_periodo', 'invoice_2x3.fecha_fin_periodo', 'facturacion.fecha_fin'],
-            'importe_total': ['resumen_factura.total_factura', 'invoice_2x3.total_a_pagar', 'facturacion.importe_total'],
-            'consumo_kwh': ['consumo_energia.consumo_medido_kwh', 'consumo.energia_activa_kwh', 'lecturas.consumo_kwh']
-        }
-        
-        missing_fields = []
-        for field_name, paths in critical_fields.items():
-            found = False
-            for path in paths:
-                if get_nested_field(n0_data, path) is not None:
-                    found = True
-                    break
-            if not found:
-                missing_fields.append(field_name)
-                
-        return missing_fields
+        present_fields = set(self._check_critical_fields(n0_data))
+        return [field_name for field_name in CRITICAL_FIELDS if field_name not in present_fields]
     
     def _extract_unique_fields(self, data: Any, prefix: str = "", max_depth: int = 4) -> Set[str]:
         """Extrae todos los campos únicos del JSON con profundidad limitada"""
@@ -342,9 +575,52 @@ class BatchAnalyzer:
             'detailed_results': self.results
         }
     
-    def _generate_questionnaire_suggestions(self, critical_missing: Dict[str, int]) -> List[Dict[str, Any]]:
+    def _generate_report_from_aggregate(self, aggregate: PartialAggregate) -> Dict[str, Any]:
+        """Genera el reporte consolidado a partir de un agregado map-reduce"""
+        total_files = aggregate.total_files
+        
+        if total_files == 0:
+            return {}
+        
+        critical_missing = dict(aggregate.missing_critical_fields.most_common())
+        
+        provider_summary = {}
+        for provider, data in aggregate.providers.items():
+            provider_summary[provider] = {
+                'total_files': data['total_files'],
+                'avg_quality': round(data['quality_sum'] / data['total_files'], 1),
+                'common_missing_fields': [f for f, count in data['missing_fields'].items() if count > 0]
+            }
+        
+        return {
+            'summary': {
+                'total_files_analyzed': total_files,
+                'average_quality_score': round(aggregate.quality_sum / total_files, 1),
+                'total_unique_fields': len(aggregate.field_frequency),
+                'total_field_instances': aggregate.field_count_sum,
+                'analysis_timestamp': datetime.now().isoformat()
+            },
+            'field_analysis': {
+                'most_common_fields': dict(aggregate.field_frequency.most_common(20)),
+                'critical_missing_fields': critical_missing,
+                'field_coverage': {field_name: (count / total_files) * 100
+                                   for field_name, count in aggregate.field_frequency.items()}
+            },
+            'provider_patterns': provider_summary,
+            'questionnaire_suggestions': self._generate_questionnaire_suggestions(
+                critical_missing, total_files, list(aggregate.providers.keys())
+            ),
+            'detailed_results': aggregate.detailed_results
+        }
+    
+    def _generate_questionnaire_suggestions(self, critical_missing: Dict[str, int],
+                                            total_files: Optional[int] = None,
+                                            providers: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Genera sugerencias para cuestionario basado en campos faltantes"""
-        total_files = len(self.results)
+        if total_files is None:
+            total_files = len(self.results)
+        if providers is None:
+            providers = list(self.provider_patterns.keys())
         
         suggestions = []
         
@@ -375,7 +651,7 @@ class BatchAnalyzer:
                 'type': 'select',
                 'required': True,
                 'category': 'contrato',
-                'options': list(self.provider_patterns.keys())
+                'options': providers
             },
             'fecha_inicio': {
                 'question': '¿Desde qué fecha tiene el contrato actual?',
@@ -468,12 +744,27 @@ def main():
     """Función principal para ejecutar análisis masivo"""
     logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
     
+    parser = argparse.ArgumentParser(description='Análisis masivo de archivos N0')
+    parser.add_argument('--dir', default="/Users/vagalumeenergiamovil/PROYECTOS/Entorno/Data_out",
+                        help='Directorio con archivos N0')
+    parser.add_argument('--modo', choices=['secuencial', 'paralelo', 'incremental'], default='secuencial',
+                        help='secuencial (original), paralelo (map-reduce) o incremental (solo cambios)')
+    parser.add_argument('--workers', type=int, default=None, help='Procesos del pool (por defecto, núcleos)')
+    parser.add_argument('--chunk-size', type=int, default=50, help='Archivos por lote de worker')
+    parser.add_argument('--estado', default=None, help='Fichero de estado del modo incremental')
+    args = parser.parse_args()
+    
     # Directorio con archivos N0
-    n0_directory = "/Users/vagalumeenergiamovil/PROYECTOS/Entorno/Data_out"
+    n0_directory = args.dir
     
     # Crear analizador y ejecutar
     analyzer = BatchAnalyzer()
-    report = analyzer.analyze_all_n0_files(n0_directory)
+    if args.modo == 'paralelo':
+        report = analyzer.analyze_all_n0_files_parallel(n0_directory, args.workers, args.chunk_size)
+    elif args.modo == 'incremental':
+        report = analyzer.analyze_changed_n0_files(n0_directory, args.estado, args.workers, args.chunk_size)
+    else:
+        report = analyzer.analyze_all_n0_files(n0_directory)
     
     if report:
         # Mostrar resumen por consola
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice de campos de una factura N0
+Aplana la factura en UNA sola pasada a un índice clave → [(ruta, valor)] con
+la posición de cada nodo, de modo que las búsquedas flexibles (nombre exacto,
+similitud, patrones) pasan a ser consultas de diccionario sobre las claves
+distintas en lugar de recorridos completos del árbol por cada campo objetivo.
+
+Las posiciones conservan el orden de recorrido original, así que el resultado
+coincide con el de las búsquedas recursivas que sustituye, incluida su regla para
+coincidencias con valor None: el nivel donde aparecen no da resultado y la búsqueda
+sigue por el siguiente hermano del nivel padre.
+"""
+
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Callable, NamedTuple, Set
+
+logger = logging.getLogger(__name__)
+
+
+class EntradaCampo(NamedTuple):
+    """Nodo del árbol de la factura."""
+    ruta: str
+    clave: str
+    valor: Any
+    posicion: Tuple[int, ...]  # Índices de hijo desde la raíz (orden de recorrido)
+
+    @property
+    def es_valor(self) -> bool:
+        """True si el nodo es una hoja o un dict con 'value' (campo extraído)."""
+        return not isinstance(self.valor, dict) or 'value' in self.valor
+
+    @property
+    def valor_plano(self) -> Any:
+        """Valor del nodo, desenvolviendo dicts {'value': ...}."""
+        if isinstance(self.valor, dict) and 'value' in self.valor:
+            return self.valor['value']
+        return self.valor
+
+
+def tokens_clave(clave: str) -> Set[str]:
+    """Conjunto de palabras de una clave snake_case en minúsculas."""
+    return set(clave.lower().split('_'))
+
+
+def normalizar_clave(clave: str) -> str:
+    """Clave en minúsculas sin separadores '_' ni '-'."""
+    return clave.lower().replace('_', '').replace('-', '')
+
+
+class IndiceCampos:
+    """Índice de una factura construido en una única pasada."""
+
+    def __init__(self, datos: Any):
+        """
+        Construye el índice recorriendo los dicts anidados de la factura.
+
+        Args:
+            datos: Factura N0 (dict); las listas no se recorren
+        """
+        self.entradas: List[EntradaCampo] = []
+        self.por_clave: Dict[str, List[EntradaCampo]] = {}
+
+        pila = [(datos, '', ())] if isinstance(datos, dict) else []
+        while pila:
+            nodo, prefijo, posicion = pila.pop()
+            hijos = []
+            for i, (clave, valor) in enumerate(nodo.items()):
+                ruta = f"{prefijo}.{clave}" if prefijo else clave
+                entrada = EntradaCampo(ruta, clave, valor, posicion + (i,))
+                hijos.append(entrada)
+                if isinstance(valor, dict):
+                    pila.append((valor, ruta, entrada.posicion))
+            self.entradas.extend(hijos)
+
+        # Orden de recorrido en profundidad: cada lista por clave queda ordenada
+        self.entradas.sort(key=lambda e: e.posicion)
+        for entrada in self.entradas:
+            self.por_clave.setdefault(entrada.clave, []).append(entrada)
+
+    def __len__(self) -> int:
+        return len(self.entradas)
+
+    def primera_exacta(self, clave: str, solo_valores: bool = True) -> Optional[EntradaCampo]:
+        """
+        Primer nodo (en profundidad) cuya clave coincide exactamente.
+
+        Args:
+            clave: Nombre de clave buscado
+            solo_valores: Ignorar dicts sin 'value'
+
+        Returns:
+            EntradaCampo o None
+        """
+        for entrada in self.por_clave.get(clave, ()):
+            if not solo_valores or entrada.es_valor:
+                return entrada
+        return None
+
+    def primera_que_cumple(self, predicado: Callable[[str], bool],
+                           omitir_nulos: bool = False) -> Optional[EntradaCampo]:
+        """
+        Primer nodo-valor (en profundidad) cuya clave cumple el predicado.
+        El predicado se evalúa una vez por clave distinta, no por nodo.
+
+        Args:
+            predicado: Función clave → bool (idealmente memoizada)
+            omitir_nulos: Una coincidencia con valor None descarta el resto de su nivel
+                (hermanos posteriores y sus hijos) y la búsqueda continúa fuera de él
+
+        Returns:
+            EntradaCampo o None
+        """
+        if omitir_nulos:
+            return self._primera_no_nula(predicado)
+
+        mejor = None
+        for clave, entradas in self.por_clave.items():
+            if not predicado(clave):
+                continue
+            for entrada in entradas:
+                if entrada.es_valor:
+                    if mejor is None or entrada.posicion < mejor.posicion:
+                        mejor = entrada
+                    break
+        return mejor
+
+    def _primera_no_nula(self, predicado: Callable[[str], bool]) -> Optional[EntradaCampo]:
+        """Recorrido en profundidad de primera_que_cumple(omitir_nulos=True)."""
+        cumple: Dict[str, bool] = {}
+        nivel_descartado = None
+        for entrada in self.entradas:
+            if nivel_descartado is not None and entrada.posicion[:len(nivel_descartado)] == nivel_descartado:
+                continue
+            if not entrada.es_valor:
+                continue
+            if entrada.clave not in cumple:
+                cumple[entrada.clave] = predicado(entrada.clave)
+            if not cumple[entrada.clave]:
+                continue
+            if entrada.valor_plano is not None:
+                return entrada
+            nivel_descartado = entrada.posicion[:-1]
+        return None
+
+    def mejor_por_nivel(self, clave_exacta: str, predicado_similar: Callable[[str], bool]) -> Optional[EntradaCampo]:
+        """
+        Búsqueda por niveles: en cada dict se prefiere la clave exacta, después
+        la primera clave similar y, si no hay, se desciende a los hijos en orden.
+        Si el candidato elegido en un nivel vale None, ese nivel (y sus hijos) no
+        da resultado y se sigue con el siguiente hermano del nivel padre.
+
+        Args:
+            clave_exacta: Nombre exacto buscado (acepta cualquier valor)
+            predicado_similar: Función clave → bool para similitud (solo nodos-valor)
+
+        Returns:
+            EntradaCampo o None
+        """
+        candidatos = [(e, 0) for e in self.por_clave.get(clave_exacta, ())]
+        for clave, entradas in self.por_clave.items():
+            if clave != clave_exacta and predicado_similar(clave):
+                candidatos.extend((e, 1) for e in entradas if e.es_valor)
+        if not candidatos:
+            return None
+
+        def prioridad(candidato):
+            entrada, tipo = candidato
+            descenso = tuple((1, i) for i in entrada.posicion[:-1])
+            return descenso + ((0, tipo, entrada.posicion[-1]),)
+
+        # Los candidatos de un nivel se ordenan antes que los de sus hijos
+        candidatos.sort(key=prioridad)
+        niveles_decididos: Set[Tuple[int, ...]] = set()
+        for entrada, _ in candidatos:
+            nivel = entrada.posicion[:-1]
+            if any(nivel[:i] in niveles_decididos for i in range(len(nivel) + 1)):
+                continue
+            if entrada.valor_plano is not None:
+                return entrada
+            niveles_decididos.add(nivel)
+        return None
+
+
+class CacheIndice:
+    """Reutiliza el índice mientras se consulta la misma factura (por identidad)."""
+
+    def __init__(self):
+        self._datos = None
+        self._indice: Optional[IndiceCampos] = None
+
+    def obtener(self, datos: Any) -> IndiceCampos:
+        """Índice de `datos`, reconstruido solo si cambia el objeto factura."""
+        if self._indice is None or self._datos is not datos:
+            self._indice = IndiceCampos(datos)
+            self._datos = datos
+        return self._indice
+
+    def invalidar(self):
+        """Descarta el índice actual (usar si la factura se modifica in situ)."""
+        self._datos = None
+        self._indice = None
@@ -7,8 +7,13 @@ Centraliza la transformación de datos entre capas del sistema watioverse
 """
 
 import logging
+import sys
+from pathlib import Path
 from typing import Dict, Any, Optional, List
 
+sys.path.append(str(Path(__file__).parent))
+from path_accessors import compile_path, get_path
+
 logger = logging.getLogger(__name__)
 
 # =============================================================================
@@ -168,17 +173,58 @@ def get_nested_field(data: Dict[str, Any], field_path: str) -> Any:
     Returns:
         Valor del campo o None si no existe
     """
-    try:
-        keys = field_path.split('.')
-        value = data
-        for key in keys:
-            if isinstance(value, dict) and key in value:
-                value = value[key]
-            else:
-                return None
-        return value
-    except (KeyError, TypeError):
-        return None
+    return get_path(data, field_path)
+
+# Mapeo N0 → N1 base: (grupo N1, campo N1, ruta N0). Se compila una vez al importar.
+N1_BASE_FIELD_MAPPING = [
+    ('client', 'nombre', 'client.nombre_cliente'),
+    ('client', 'nif', 'client.nif_titular.value'),
+    ('contract', 'cups', 'contract_2x3.cups_electricidad'),
+    ('contract', 'comercializadora', 'contract_2x3.comercializadora'),
+    ('contract', 'tarifa_acceso', 'contract_2x3.tarifa_acceso'),
+    ('contract', 'distribuidora', 'contract_2x3.distribuidora'),
+    ('contract', 'numero_contrato_comercializadora', 'contract_2x3.numero_contrato_comercializadora'),
+    ('contract', 'potencia_contratada_p1', 'contract_2x3.potencia_contratada_p1'),
+    ('contract', 'potencia_contratada_p2', 'contract_2x3.potencia_contratada_p2'),
+    ('invoice', 'numero_factura', 'invoice_2x3.numero_factura'),
+    ('invoice', 'total_a_pagar', 'invoice_2x3.total_a_pagar'),
+    ('invoice', 'fecha_inicio_periodo', 'invoice_2x3.fecha_inicio_periodo'),
+    ('invoice', 'fecha_fin_periodo', 'invoice_2x3.fecha_fin_periodo'),
+    ('invoice', 'fecha_emision', 'invoice_2x3.fecha_emision'),
+    ('invoice', 'fecha_cargo', 'invoice_2x3.fecha_cargo'),
+    ('invoice', 'dias_periodo_facturado', 'invoice_2x3.dias_periodo_facturado'),
+    ('invoice', 'coste_promedio_diario_eur', 'invoice_2x3.coste_promedio_diario_eur'),
+    ('invoice', 'bono_social', 'invoice_2x3.bono_social'),
+    ('invoice', 'alquiler_contador', 'invoice_2x3.alquiler_contador'),
+    ('consumption', 'consumo_medido_kwh', 'consumo_energia.consumo_medido_kwh'),
+    ('consumption', 'consumo_facturado_kwh', 'consumo_energia.consumo_facturado_kwh'),
+    ('consumption', 'inicio_periodo', 'consumo_energia.inicio_periodo'),
+    ('consumption', 'fin_periodo', 'consumo_energia.fin_periodo'),
+    ('consumption', 'precio_energia_eur_kwh', 'consumo_energia.precio_energia_eur_kwh'),
+    ('consumption', 'precio_peaje_eur_kwh', 'consumo_energia.precio_peaje_eur_kwh'),
+    ('consumption', 'coste_energia_eur', 'consumo_energia.coste_energia_eur'),
+    ('consumption', 'coste_peaje_eur', 'consumo_energia.coste_peaje_eur'),
+    ('consumption', 'coste_total_energia_eur', 'consumo_energia.coste_total_energia_eur'),
+    ('consumption', 'potencia_contratada_kw', 'termino_potencia.potencia_contratada_kw'),
+    ('consumption', 'dias_facturacion', 'termino_potencia.dias_facturacion'),
+    ('consumption', 'precio_potencia_eur_kw_dia', 'termino_potencia.precio_potencia_eur_kw_dia'),
+    ('consumption', 'coste_potencia_eur', 'termino_potencia.coste_potencia_eur'),
+    ('consumption', 'coste_total_potencia_eur', 'termino_potencia.coste_total_potencia_eur'),
+    ('consumption', 'numero_contador', 'metering_2x3.numero_contador'),
+    ('consumption', 'fecha_lectura_fin_contador', 'metering_2x3.fecha_lectura_fin_contador'),
+    ('consumption', 'tipo_lectura_contador', 'metering_2x3.tipo_lectura_contador'),
+    ('consumption', 'lectura_actual_contador_p1', 'metering_2x3.lectura_actual_contador_p1'),
+    ('consumption', 'lectura_anterior_contador_p1', 'metering_2x3.lectura_anterior_contador_p1'),
+    ('consumption', 'lectura_actual_contador_p2', 'metering_2x3.lectura_actual_contador_p2'),
+    ('consumption', 'lectura_anterior_contador_p2', 'metering_2x3.lectura_anterior_contador_p2'),
+    ('consumption', 'lectura_actual_contador_p3', 'metering_2x3.lectura_actual_contador_p3'),
+    ('consumption', 'lectura_anterior_contador_p3', 'metering_2x3.lectura_anterior_contador_p3'),
+]
+
+_N1_BASE_ACCESSORS = [
+    (group, field, compile_path(path)) for group, field, path in N1_BASE_FIELD_MAPPING
+]
+_DIRECCION_SUMINISTRO = compile_path('supply_point.datos_suministro.direccion_suministro')
 
 def map_n0_to_n1_base(cleaned_n0_data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -200,12 +246,12 @@ def map_n0_to_n1_base(cleaned_n0_data: Dict[str, Any]) -> Dict[str, Any]:
         'metadata': {}
     }
     
-    # === DATOS DEL CLIENTE ===
-    n1_base['client']['nombre'] = get_nested_field(cleaned_n0_data, 'client.nombre_cliente')
-    n1_base['client']['nif'] = get_nested_field(cleaned_n0_data, 'client.nif_titular.value')
+    # Campos directos (accesores precompilados, sin split por llamada)
+    for group, field, getter in _N1_BASE_ACCESSORS:
+        n1_base[group][field] = getter(cleaned_n0_data)
     
     # Dirección como string concatenada
-    direccion_obj = get_nested_field(cleaned_n0_data, 'supply_point.datos_suministro.direccion_suministro')
+    direccion_obj = _DIRECCION_SUMINISTRO(cleaned_n0_data)
     if direccion_obj and isinstance(direccion_obj, dict):
         direccion_parts = []
         if direccion_obj.get('tipo_via'): direccion_parts.append(direccion_obj['tipo_via'])
@@ -217,56 +263,6 @@ def map_n0_to_n1_base(cleaned_n0_data: Dict[str, Any]) -> Dict[str, Any]:
         if direccion_obj.get('codigo_postal'): direccion_parts.append(direccion_obj['codigo_postal'])
         n1_base['client']['direccion'] = ', '.join(filter(None, direccion_parts))
     
-    # === DATOS DEL CONTRATO ===
-    n1_base['contract']['cups'] = get_nested_field(cleaned_n0_data, 'contract_2x3.cups_electricidad')
-    n1_base['contract']['comercializadora'] = get_nested_field(cleaned_n0_data, 'contract_2x3.comercializadora')
-    n1_base['contract']['tarifa_acceso'] = get_nested_field(cleaned_n0_data, 'contract_2x3.tarifa_acceso')
-    n1_base['contract']['distribuidora'] = get_nested_field(cleaned_n0_data, 'contract_2x3.distribuidora')
-    n1_base['contract']['numero_contrato_comercializadora'] = get_nested_field(cleaned_n0_data, 'contract_2x3.numero_contrato_comercializadora')
-    n1_base['contract']['potencia_contratada_p1'] = get_nested_field(cleaned_n0_data, 'contract_2x3.potencia_contratada_p1')
-    n1_base['contract']['potencia_contratada_p2'] = get_nested_field(cleaned_n0_data, 'contract_2x3.potencia_contratada_p2')
-    
-    # === DATOS DE FACTURACIÓN ===
-    n1_base['invoice']['numero_factura'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.numero_factura')
-    n1_base['invoice']['total_a_pagar'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.total_a_pagar')
-    n1_base['invoice']['fecha_inicio_periodo'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.fecha_inicio_periodo')
-    n1_base['invoice']['fecha_fin_periodo'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.fecha_fin_periodo')
-    n1_base['invoice']['fecha_emision'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.fecha_emision')
-    n1_base['invoice']['fecha_cargo'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.fecha_cargo')
-    n1_base['invoice']['dias_periodo_facturado'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.dias_periodo_facturado')
-    n1_base['invoice']['coste_promedio_diario_eur'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.coste_promedio_diario_eur')
-    n1_base['invoice']['bono_social'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.bono_social')
-    n1_base['invoice']['alquiler_contador'] = get_nested_field(cleaned_n0_data, 'invoice_2x3.alquiler_contador')
-    
-    # === DATOS DE CONSUMO ===
-    n1_base['consumption']['consumo_medido_kwh'] = get_nested_field(cleaned_n0_data, 'consumo_energia.consumo_medido_kwh')
-    n1_base['consumption']['consumo_facturado_kwh'] = get_nested_field(cleaned_n0_data, 'consumo_energia.consumo_facturado_kwh')
-    n1_base['consumption']['inicio_periodo'] = get_nested_field(cleaned_n0_data, 'consumo_energia.inicio_periodo')
-    n1_base['consumption']['fin_periodo'] = get_nested_field(cleaned_n0_data, 'consumo_energia.fin_periodo')
-    n1_base['consumption']['precio_energia_eur_kwh'] = get_nested_field(cleaned_n0_data, 'consumo_energia.precio_energia_eur_kwh')
-    n1_base['consumption']['precio_peaje_eur_kwh'] = get_nested_field(cleaned_n0_data, 'consumo_energia.precio_peaje_eur_kwh')
-    n1_base['consumption']['coste_energia_eur'] = get_nested_field(cleaned_n0_data, 'consumo_energia.coste_energia_eur')
-    n1_base['consumption']['coste_peaje_eur'] = get_nested_field(cleaned_n0_data, 'consumo_energia.coste_peaje_eur')
-    n1_base['consumption']['coste_total_energia_eur'] = get_nested_field(cleaned_n0_data, 'consumo_energia.coste_total_energia_eur')
-    
-    # === DATOS DE POTENCIA ===
-    n1_base['consumption']['potencia_contratada_kw'] = get_nested_field(cleaned_n0_data, 'termino_potencia.potencia_contratada_kw')
-    n1_base['consumption']['dias_facturacion'] = get_nested_field(cleaned_n0_data, 'termino_potencia.dias_facturacion')
-    n1_base['consumption']['precio_potencia_eur_kw_dia'] = get_nested_field(cleaned_n0_data, 'termino_potencia.precio_potencia_eur_kw_dia')
-    n1_base['consumption']['coste_potencia_eur'] = get_nested_field(cleaned_n0_data, 'termino_potencia.coste_potencia_eur')
-    n1_base['consumption']['coste_total_potencia_eur'] = get_nested_field(cleaned_n0_data, 'termino_potencia.coste_total_potencia_eur')
-    
-    # === LECTURAS DE CONTADOR ===
-    n1_base['consumption']['numero_contador'] = get_nested_field(cleaned_n0_data, 'metering_2x3.numero_contador')
-    n1_base['consumption']['fecha_lectura_fin_contador'] = get_nested_field(cleaned_n0_data, 'metering_2x3.fecha_lectura_fin_contador')
-    n1_base['consumption']['tipo_lectura_contador'] = get_nested_field(cleaned_n0_data, 'metering_2x3.tipo_lectura_contador')
-    n1_base['consumption']['lectura_actual_contador_p1'] = get_nested_field(cleaned_n0_data, 'metering_2x3.lectura_actual_contador_p1')
-    n1_base['consumption']['lectura_anterior_contador_p1'] = get_nested_field(cleaned_n0_data, 'metering_2x3.lectura_anterior_contador_p1')
-    n1_base['consumption']['lectura_actual_contador_p2'] = get_nested_field(cleaned_n0_data, 'metering_2x3.lectura_actual_contador_p2')
-    n1_base['consumption']['lectura_anterior_contador_p2'] = get_nested_field(cleaned_n0_data, 'metering_2x3.lectura_anterior_contador_p2')
-    n1_base['consumption']['lectura_actual_contador_p3'] = get_nested_field(cleaned_n0_data, 'metering_2x3.lectura_actual_contador_p3')
-    n1_base['consumption']['lectura_anterior_contador_p3'] = get_nested_field(cleaned_n0_data, 'metering_2x3.lectura_anterior_contador_p3')
-    
     # === SOSTENIBILIDAD BASE ===
     # (Se añadirán datos si existen en el archivo N0)
     
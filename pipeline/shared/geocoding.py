@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Servicio de geocodificación compartido (enriquecimiento N1 y jobs Ncore)
+
+- Normaliza direcciones para que diferencias triviales de formato compartan clave
+- Caché en memoria del proceso + caché persistente en db_enriquecimiento (geocoding_cache)
+- Cascada de precisión: dirección (proveedor remoto) → centroide de código postal →
+  centroide de municipio, ambos desde la tabla local core_zonas_climaticas (db_Ncore)
+- Los fallos se resuelven en lote: se deduplican, se consulta la BD una vez y solo
+  se llama al proveedor remoto dentro de la cuota y del ritmo permitido
+
+Una consulta repetida nunca sale del proceso (memoria) o de la BD (persistente).
+Tabla: sql/setup_geocoding_cache.sql
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+import requests
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+# Niveles de precisión (de más a menos preciso)
+PRECISION_DIRECCION = 'direccion'
+PRECISION_CODIGO_POSTAL = 'codigo_postal'
+PRECISION_MUNICIPIO = 'municipio'
+PRECISION_SIN_RESULTADO = 'sin_resultado'
+
+# Días de validez de resultados aproximados o vacíos (después se reintenta la dirección)
+DIAS_VALIDEZ_APROXIMADO = 30
+
+# Segundos entre reintentos de carga de centroides locales si db_Ncore no responde
+REINTENTO_CENTROIDES = 30.0
+
+# Nominatim exige como máximo 1 petición por segundo
+INTERVALO_NOMINATIM = 1.0
+URL_NOMINATIM = "https://nominatim.openstreetmap.org/search"
+
+# Abreviaturas de vía habituales en facturas
+ABREVIATURAS_VIA = {
+    'c': 'calle', 'cl': 'calle', 'cll': 'calle', 'clle': 'calle',
+    'av': 'avenida', 'avd': 'avenida', 'avda': 'avenida', 'avnda': 'avenida',
+    'pl': 'plaza', 'pza': 'plaza', 'plz': 'plaza', 'pz': 'plaza',
+    'ps': 'paseo', 'po': 'paseo', 'pso': 'paseo',
+    'ctra': 'carretera', 'cr': 'carretera', 'crta': 'carretera',
+    'ronda': 'ronda', 'rda': 'ronda',
+    'urb': 'urbanizacion', 'bo': 'barrio',
+    'tr': 'travesia', 'trv': 'travesia', 'trva': 'travesia',
+    'cm': 'camino', 'cno': 'camino', 'gta': 'glorieta',
+}
+
+# Tokens sin valor para la localización
+TOKENS_IGNORADOS = {'n', 'no', 'num', 'nº', 'numero', 'espana', 'spain', 'es'}
+
+_RE_NO_ALFANUMERICO = re.compile(r'[^a-z0-9ñ]+')
+_RE_CODIGO_POSTAL = re.compile(r'\b(?:0[1-9]|[1-4]\d|5[0-2])\d{3}\b')
+
+
+def _sin_acentos(texto: str) -> str:
+    """Elimina diacríticos conservando la ñ."""
+    texto = texto.replace('ñ', '\0')
+    texto = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return texto.replace('\0', 'ñ')
+
+
+def normalizar_texto(texto: Optional[str]) -> str:
+    """Minúsculas, sin acentos ni puntuación y con espacios colapsados."""
+    if not texto:
+        return ''
+    texto = _sin_acentos(str(texto).lower().replace('º', ' ').replace('ª', ' '))
+    return ' '.join(_RE_NO_ALFANUMERICO.sub(' ', texto).split())
+
+
+def normalizar_direccion(direccion: Optional[str]) -> str:
+    """
+    Forma canónica de una dirección (base: normalización de DataHasher.hash_direccion).
+
+    Además de minúsculas y recorte, elimina acentos y puntuación, expande
+    abreviaturas de vía y descarta tokens irrelevantes ('nº', 'España'...).
+    """
+    tokens = []
+    for token in normalizar_texto(direccion).split():
+        if token in TOKENS_IGNORADOS:
+            continue
+        tokens.append(ABREVIATURAS_VIA.get(token, token) if not tokens else token)
+    return ' '.join(tokens)
+
+
+def extraer_codigo_postal(texto: Optional[str]) -> Optional[str]:
+    """Último código postal español presente en el texto."""
+    encontrados = _RE_CODIGO_POSTAL.findall(str(texto or ''))
+    return encontrados[-1] if encontrados else None
+
+
+def clave_geocoding(tipo: str, texto_normalizado: str, codigo_postal: Optional[str]) -> str:
+    """Hash estable de la consulta (la BD no guarda la dirección en claro)."""
+    salt = os.getenv('HASH_SALT_DIRECCION', '')
+    data = f"{tipo}|{texto_normalizado}|{codigo_postal or ''}|{salt}"
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def celda_espacial(lat: float, lon: float, decimales: int = 2) -> str:
+    """Celda de rejilla (≈1 km con 2 decimales) para deduplicar consultas por ubicación."""
+    return f"{round(lat, decimales):.{decimales}f}_{round(lon, decimales):.{decimales}f}"
+
+
+def geocodificar_nominatim(consulta: str) -> Tuple[Optional[float], Optional[float]]:
+    """Proveedor por defecto: Nominatim (OpenStreetMap)."""
+    params = {'q': consulta, 'format': 'json', 'limit': 1, 'countrycodes': 'es'}
+    headers = {'User-Agent': 'VagalumeEnergia/1.0'}
+    response = requests.get(URL_NOMINATIM, params=params, headers=headers, timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    if not data:
+        return None, None
+    return float(data[0]['lat']), float(data[0]['lon'])
+
+
+@dataclass
+class ResultadoGeocoding:
+    """Coordenadas resueltas y su procedencia."""
+    latitud: Optional[float]
+    longitud: Optional[float]
+    precision: str
+    fuente: str
+    origen: str = 'proveedor'  # 'memoria', 'bd', 'proveedor' o 'local'
+
+    @property
+    def encontrado(self) -> bool:
+        return self.latitud is not None and self.longitud is not None
+
+    @property
+    def celda(self) -> Optional[str]:
+        return celda_espacial(self.latitud, self.longitud) if self.encontrado else None
+
+
+@dataclass
+class _Consulta:
+    """Consulta pendiente de resolver (deduplicada por clave)."""
+    clave: str
+    tipo: str
+    texto: str
+    codigo_postal: Optional[str]
+    municipio: Optional[str]
+    provincia: Optional[str]
+    consultas_remotas: Tuple[str, ...]
+    partes: Tuple[str, ...] = ()  # Partes normalizadas de la dirección (separadas por comas)
+
+
+def _config_bd(nombre_env: str, defecto: str) -> Dict[str, str]:
+    """Configuración de conexión con las mismas variables que core/db_connections."""
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': os.getenv('DB_PORT', '5432'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', 'admin'),
+        'database': f"db_{os.getenv(nombre_env, defecto)}"
+    }
+
+
+class GeocodingService:
+    """Geocodificación con caché en memoria, caché persistente y fallback local."""
+
+    def __init__(self,
+                 proveedor: Callable[[str], Tuple[Optional[float], Optional[float]]] = geocodificar_nominatim,
+                 nombre_proveedor: str = 'nominatim',
+                 intervalo_proveedor: float = INTERVALO_NOMINATIM,
+                 cuota_por_lote: int = 100,
+                 db_config_cache: Optional[Dict[str, str]] = None,
+                 db_config_local: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            proveedor: Función consulta → (lat, lon) del geocodificador remoto
+            nombre_proveedor: Nombre guardado como fuente del resultado
+            intervalo_proveedor: Segundos mínimos entre llamadas remotas
+            cuota_por_lote: Máximo de llamadas remotas por lote (el resto usa fallback local)
+            db_config_cache: Conexión a db_enriquecimiento (caché persistente)
+            db_config_local: Conexión a db_Ncore (core_zonas_climaticas)
+        """
+        self.proveedor = proveedor
+        self.nombre_proveedor = nombre_proveedor
+        self.intervalo_proveedor = intervalo_proveedor
+        self.cuota_por_lote = cuota_por_lote
+        self.db_config_cache = db_config_cache or _config_bd('DB_ENRIQUECIMIENTO', 'enriquecimiento')
+        self.db_config_local = db_config_local or _config_bd('DB_NCORE', 'Ncore')
+
+        self._memoria: Dict[str, ResultadoGeocoding] = {}
+        # Protege memoria, conexión de caché y estadísticas; no se retiene durante llamadas remotas
+        self._lock = threading.RLock()
+        self._conn_cache = None
+        # Turno de la siguiente llamada remota (se reserva con el lock y se espera fuera de él)
+        self._siguiente_llamada = 0.0
+
+        # Centroides locales (se cargan una vez; si falla, se reintenta pasado REINTENTO_CENTROIDES)
+        self._centroides_lock = threading.Lock()
+        self._centroides_cp: Optional[Dict[str, Tuple[float, float]]] = None
+        self._centroides_reintento = 0.0
+        self._centroides_municipio: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._centroides_municipio_nombre: Dict[str, Tuple[float, float]] = {}
+
+        self.estadisticas = {'memoria': 0, 'bd': 0, 'proveedor': 0, 'local': 0, 'sin_resultado': 0}
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def geocodificar(self, direccion: str, codigo_postal: Optional[str] = None,
+                     municipio: Optional[str] = None, provincia: Optional[str] = None) -> ResultadoGeocoding:
+        """Coordenadas de una dirección (ver geocodificar_lote)."""
+        return self.geocodificar_lote([{
+            'direccion': direccion, 'codigo_postal': codigo_postal,
+            'municipio': municipio, 'provincia': provincia
+        }])[0]
+
+    def geocodificar_municipio(self, municipio: str, provincia: Optional[str] = None) -> ResultadoGeocoding:
+        """Coordenadas de un municipio ('municipio, provincia, España' y luego 'municipio, España')."""
+        return self.geocodificar_lote([{'municipio': municipio, 'provincia': provincia}])[0]
+
+    def geocodificar_lote(self, peticiones: Iterable[Dict[str, Any]]) -> List[ResultadoGeocoding]:
+        """
+        Resuelve un lote de peticiones en orden.
+
+        Cada petición es un dict con 'direccion' (opcional), 'codigo_postal',
+        'municipio' y 'provincia'. Sin dirección se geocodifica el municipio.
+
+        Returns:
+            Lista de ResultadoGeocoding (precision 'sin_resultado' si no se encontró)
+        """
+        consultas = [self._preparar_consulta(p) for p in peticiones]
+        resultados: Dict[str, ResultadoGeocoding] = {}
+        origenes: Dict[str, str] = {}
+
+        # 1-2. Memoria y caché persistente (con lock: conexión compartida)
+        with self._lock:
+            # 1. Memoria del proceso
+            pendientes = {}
+            for consulta in consultas:
+                if consulta.clave in resultados or consulta.clave in pendientes:
+                    continue
+                en_memoria = self._memoria.get(consulta.clave)
+                if en_memoria is not None:
+                    resultados[consulta.clave] = en_memoria
+                    origenes[consulta.clave] = 'memoria'
+                    self.estadisticas['memoria'] += 1
+                else:
+                    pendientes[consulta.clave] = consulta
+
+            # 2. Caché persistente (una sola query para todo el lote)
+            if pendientes:
+                for clave, resultado in self._leer_cache_bd(list(pendientes)).items():
+                    resultados[clave] = self._memoria[clave] = resultado
+                    origenes[clave] = 'bd'
+                    self.estadisticas['bd'] += 1
+                    del pendientes[clave]
+
+        # 3. Proveedor remoto dentro de cuota y 4. fallback local, sin retener el lock
+        # (otras llamadas resueltas en memoria o BD no esperan al proveedor)
+        if pendientes:
+            nuevos, transitorios = self._resolver_pendientes(list(pendientes.values()))
+            resultados.update(nuevos)
+            # Los resultados de un fallo transitorio se devuelven pero no se cachean
+            cacheables = {clave: r for clave, r in nuevos.items() if clave not in transitorios}
+            with self._lock:
+                self._guardar_cache_bd(cacheables)
+                self._memoria.update(cacheables)
+
+        # Las repeticiones dentro del lote o ya cacheadas se marcan con su origen real
+        salida = []
+        vistas = set()
+        for consulta in consultas:
+            resultado = resultados[consulta.clave]
+            origen = origenes.get(consulta.clave, resultado.origen)
+            if consulta.clave in vistas:
+                origen = 'memoria'
+            vistas.add(consulta.clave)
+            salida.append(resultado if origen == resultado.origen else replace(resultado, origen=origen))
+        return salida
+
+    # ------------------------------------------------------------------
+    # Resolución
+    # ------------------------------------------------------------------
+
+    def _preparar_consulta(self, peticion: Dict[str, Any]) -> _Consulta:
+        direccion = peticion.get('direccion')
+        municipio = peticion.get('municipio')
+        provincia = peticion.get('provincia')
+        codigo_postal = peticion.get('codigo_postal') or extraer_codigo_postal(direccion)
+
+        if direccion:
+            texto = normalizar_direccion(direccion)
+            remotas = (f"{direccion}, España",)
+            partes = tuple(normalizar_texto(parte) for parte in re.split(r'[,;]', str(direccion)))
+            return _Consulta(clave_geocoding('direccion', texto, codigo_postal), 'direccion', texto,
+                             codigo_postal, municipio, provincia, remotas, partes)
+
+        texto = normalizar_texto(f"{municipio or ''} {provincia or ''}")
+        remotas = tuple(q for q in (
+            f"{municipio}, {provincia}, España" if provincia else None,
+            f"{municipio}, España" if municipio else None) if q)
+        return _Consulta(clave_geocoding('municipio', texto, codigo_postal), 'municipio', texto,
+                         codigo_postal, municipio, provincia, remotas)
+
+    def _resolver_pendientes(self, pendientes: List[_Consulta]) -> Tuple[Dict[str, ResultadoGeocoding], set]:
+        """
+        Proveedor remoto hasta agotar la cuota del lote; el resto, fallback local.
+
+        Returns:
+            (resultados por clave, claves resueltas tras un fallo transitorio: no cacheables)
+        """
+        nuevos = {}
+        transitorios = set()
+        llamadas = 0
+        proveedor_disponible = True
+        for consulta in pendientes:
+            resultado = None
+            fallo_remoto = False
+            if proveedor_disponible and llamadas < self.cuota_por_lote:
+                for texto_remoto in consulta.consultas_remotas:
+                    if llamadas >= self.cuota_por_lote:
+                        break
+                    llamadas += 1
+                    try:
+                        lat, lon = self._llamar_proveedor(texto_remoto)
+                    except Exception as e:
+                        # Red, timeout, 429/5xx: no es un "sin resultado" y no debe cachearse
+                        logger.warning(f"⚠️ Geocodificación remota fallida, resto del lote en local: {e}")
+                        fallo_remoto = True
+                        proveedor_disponible = False
+                        break
+                    if lat is not None and lon is not None:
+                        precision = PRECISION_DIRECCION if consulta.tipo == 'direccion' else PRECISION_MUNICIPIO
+                        resultado = ResultadoGeocoding(lat, lon, precision, self.nombre_proveedor, 'proveedor')
+                        self._contar('proveedor')
+                        break
+            if resultado is None:
+                resultado = self._fallback_local(consulta)
+                # Sin consulta remota o sin centroides cargados el resultado local es provisional
+                if fallo_remoto or not proveedor_disponible or self._centroides_cp is None:
+                    transitorios.add(consulta.clave)
+            nuevos[consulta.clave] = resultado
+
+        if llamadas >= self.cuota_por_lote and len(pendientes) > llamadas:
+            logger.warning(f"⚠️ Cuota de geocodificación agotada ({self.cuota_por_lote} llamadas); "
+                           f"resto del lote resuelto con centroides locales")
+        return nuevos, transitorios
+
+    def _llamar_proveedor(self, consulta: str) -> Tuple[Optional[float], Optional[float]]:
+        """
+        Llamada remota respetando el intervalo mínimo entre peticiones.
+        El turno se reserva con el lock; la espera y la llamada se hacen fuera de él.
+        Las excepciones del proveedor se propagan (fallo transitorio).
+        """
+        with self._lock:
+            turno = max(time.monotonic(), self._siguiente_llamada)
+            self._siguiente_llamada = turno + self.intervalo_proveedor
+        espera = turno - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+        return self.proveedor(consulta)
+
+    def _contar(self, origen: str):
+        with self._lock:
+            self.estadisticas[origen] += 1
+
+    def _fallback_local(self, consulta: _Consulta) -> ResultadoGeocoding:
+        """Centroide de código postal y, si no hay, de municipio (core_zonas_climaticas)."""
+        self._cargar_centroides()
+
+        if consulta.codigo_postal and consulta.codigo_postal in (self._centroides_cp or {}):
+            lat, lon = self._centroides_cp[consulta.codigo_postal]
+            self._contar('local')
+            return ResultadoGeocoding(lat, lon, PRECISION_CODIGO_POSTAL, 'core_zonas_climaticas', 'local')
+
+        centroide = self._centroide_municipio(consulta)
+        if centroide:
+            self._contar('local')
+            return ResultadoGeocoding(centroide[0], centroide[1], PRECISION_MUNICIPIO, 'core_zonas_climaticas', 'local')
+
+        self._contar('sin_resultado')
+        return ResultadoGeocoding(None, None, PRECISION_SIN_RESULTADO, self.nombre_proveedor, 'local')
+
+    def _centroide_municipio(self, consulta: _Consulta) -> Optional[Tuple[float, float]]:
+        municipio = normalizar_texto(consulta.municipio)
+        provincia = normalizar_texto(consulta.provincia)
+        if municipio:
+            return (self._centroides_municipio.get((municipio, provincia))
+                    or self._centroides_municipio_nombre.get(municipio))
+        # Sin municipio explícito: partes de la dirección, de derecha a izquierda
+        for parte in reversed(consulta.partes):
+            if parte in self._centroides_municipio_nombre:
+                return self._centroides_municipio_nombre[parte]
+        return None
+
+    def _cargar_centroides(self):
+        """
+        Carga una vez los centroides por código postal y municipio desde db_Ncore.
+        Si la carga falla se deja sin marcar y se reintenta (como mucho cada REINTENTO_CENTROIDES s).
+        """
+        if self._centroides_cp is not None or time.monotonic() < self._centroides_reintento:
+            return
+        with self._centroides_lock:
+            if self._centroides_cp is None and time.monotonic() >= self._centroides_reintento:
+                self._cargar_centroides_bd()
+
+    def _cargar_centroides_bd(self):
+        try:
+            with psycopg2.connect(**self.db_config_local) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT codigo_postal, municipio, provincia, latitud, longitud
+                        FROM core_zonas_climaticas
+                        WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+                    """)
+                    filas = cur.fetchall()
+            conn.close()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudieron cargar centroides locales (se reintentará): {e}")
+            self._centroides_reintento = time.monotonic() + REINTENTO_CENTROIDES
+            return
+
+        centroides_cp = {}
+        acumulado_mun: Dict[Tuple[str, str], List[float]] = {}
+        acumulado_nombre: Dict[str, List[float]] = {}
+        for codigo_postal, municipio, provincia, lat, lon in filas:
+            lat, lon = float(lat), float(lon)
+            centroides_cp[codigo_postal] = (lat, lon)
+            for clave, destino in (((normalizar_texto(municipio), normalizar_texto(provincia)), acumulado_mun),
+                                   (normalizar_texto(municipio), acumulado_nombre)):
+                suma = destino.setdefault(clave, [0.0, 0.0, 0])
+                suma[0] += lat
+                suma[1] += lon
+                suma[2] += 1
+        self._centroides_municipio = {k: (v[0] / v[2], v[1] / v[2]) for k, v in acumulado_mun.items()}
+        self._centroides_municipio_nombre = {k: (v[0] / v[2], v[1] / v[2]) for k, v in acumulado_nombre.items()}
+        # Se publica al final: otros hilos no ven los centroides a medio cargar
+        self._centroides_cp = centroides_cp
+        logger.info(f"📍 Centroides locales cargados: {len(self._centroides_cp)} códigos postales")
+
+    # ------------------------------------------------------------------
+    # Caché persistente (db_enriquecimiento.geocoding_cache)
+    # ------------------------------------------------------------------
+
+    def _conexion_cache(self):
+        """Conexión perezosa y reutilizada a db_enriquecimiento (se reabre si se cerró)."""
+        if self._conn_cache is None or self._conn_cache.closed:
+            self._conn_cache = psycopg2.connect(**self.db_config_cache)
+        return self._conn_cache
+
+    def _leer_cache_bd(self, claves: List[str]) -> Dict[str, ResultadoGeocoding]:
+        """Resultados vigentes de la caché persistente para las claves dadas."""
+        try:
+            conn = self._conexion_cache()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT clave_hash, latitud, longitud, precision, fuente
+                    FROM geocoding_cache
+                    WHERE clave_hash = ANY(%s)
+                      AND (expires_at IS NULL OR expires_at > NOW())
+                """, (claves,))
+                filas = cur.fetchall()
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Caché de geocodificación no disponible: {e}")
+            self._descartar_conexion()
+            return {}
+
+        return {
+            clave: ResultadoGeocoding(
+                float(lat) if lat is not None else None,
+                float(lon) if lon is not None else None,
+                precision, fuente, 'bd')
+            for clave, lat, lon, precision, fuente in filas
+        }
+
+    def _guardar_cache_bd(self, resultados: Dict[str, ResultadoGeocoding]):
+        """Upsert en bloque; los resultados aproximados o vacíos caducan para reintentarse."""
+        if not resultados:
+            return
+        filas = [
+            (clave, r.latitud, r.longitud, r.precision, r.fuente,
+             None if r.precision == PRECISION_DIRECCION or (r.origen == 'proveedor' and r.encontrado)
+             else DIAS_VALIDEZ_APROXIMADO)
+            for clave, r in resultados.items()
+        ]
+        try:
+            conn = self._conexion_cache()
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO geocoding_cache (clave_hash, latitud, longitud, precision, fuente, expires_at)
+                    SELECT v.clave_hash, v.latitud, v.longitud, v.precision, v.fuente,
+                           NOW() + make_interval(days => v.dias)
+                    FROM (VALUES %s) AS v(clave_hash, latitud, longitud, precision, fuente, dias)
+                    ON CONFLICT (clave_hash) DO UPDATE SET
+                        latitud = EXCLUDED.latitud,
+                        longitud = EXCLUDED.longitud,
+                        precision = EXCLUDED.precision,
+                        fuente = EXCLUDED.fuente,
+                        expires_at = EXCLUDED.expires_at,
+                        created_at = NOW()
+                """, filas, template="(%s, %s::numeric, %s::numeric, %s, %s, %s::int)")
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo guardar la caché de geocodificación: {e}")
+            self._descartar_conexion()
+
+    def _descartar_conexion(self):
+        if self._conn_cache is not None:
+            try:
+                self._conn_cache.close()
+            except Exception:
+                pass
+        self._conn_cache = None
+
+
+# Servicios compartidos por proceso, uno por proveedor
+_servicios: Dict[Any, GeocodingService] = {}
+_servicios_lock = threading.Lock()
+
+
+def obtener_servicio_geocoding(proveedor: Callable = geocodificar_nominatim, **kwargs) -> GeocodingService:
+    """Servicio de geocodificación compartido en el proceso para `proveedor`."""
+    with _servicios_lock:
+        servicio = _servicios.get(proveedor)
+        if servicio is None:
+            servicio = _servicios[proveedor] = GeocodingService(proveedor, **kwargs)
+        return servicio
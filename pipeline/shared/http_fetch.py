@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Descarga HTTP compartida para los jobs de Ncore
+- Sesión requests reutilizada (pool de conexiones por host)
+- Reintentos con backoff exponencial con jitter; respeta Retry-After en 429/503
+- Peticiones condicionales (ETag / Last-Modified) con caché de respuestas en disco:
+  un 304 se sirve desde disco sin volver a descargar el cuerpo; la caché se
+  limita por antigüedad y tamaño (HTTP_FETCH_CACHE_MAX_DIAS / HTTP_FETCH_CACHE_MAX_MB)
+- Límite de concurrencia y de intervalo mínimo entre peticiones por host
+- Archivo opcional de respuestas crudas (raw_archive) para reprocesar sin red
+
+Uso típico desde un job:
+
+    sys.path.append(str(Path(__file__).parent.parent.parent / 'shared'))
+    from http_fetch import obtener_fetcher
+
+    fetcher = obtener_fetcher()
+    fetcher.configurar_host('re.jrc.ec.europa.eu', intervalo=0.2)
+    datos = fetcher.get_json(URL, params=params, headers=HEADERS)
+"""
+
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from raw_archive import obtener_archivo
+
+logger = logging.getLogger(__name__)
+
+# Directorio por defecto de la caché de respuestas (sobrescribible con HTTP_FETCH_CACHE_DIR)
+DIRECTORIO_CACHE_HTTP = Path(os.getenv('HTTP_FETCH_CACHE_DIR', Path(__file__).parent / '.http_cache'))
+
+# Versión del formato de las entradas de caché; al cambiarla se ignoran las anteriores
+VERSION_CACHE_HTTP = 1
+
+# Límites de la caché en disco: se retiran las entradas sin uso desde hace más de
+# HTTP_FETCH_CACHE_MAX_DIAS y, si aún se supera HTTP_FETCH_CACHE_MAX_MB, las más antiguas
+MAX_DIAS_CACHE_HTTP = float(os.getenv('HTTP_FETCH_CACHE_MAX_DIAS', '30'))
+MAX_MB_CACHE_HTTP = float(os.getenv('HTTP_FETCH_CACHE_MAX_MB', '2048'))
+
+# Escrituras entre dos purgas de la caché (además de una al crearla)
+PURGA_CADA_ESCRITURAS = 500
+
+# Estados que se reintentan (límite de tasa y errores transitorios del servidor)
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+# Cabeceras de la petición que forman parte de la clave de caché
+CABECERAS_CLAVE = ('Accept', 'Accept-Language')
+
+
+@dataclass
+class PoliticaReintentos:
+    """Reintentos con backoff exponencial: espera ~ base × factor^intento (jitter 50-100%)."""
+    intentos: int = 4
+    base: float = 1.0
+    factor: float = 2.0
+    espera_maxima: float = 60.0
+    # Tope para Retry-After (un servidor puede pedir esperas de horas)
+    retry_after_maximo: float = 300.0
+    # Espera mínima tras un 429 sin Retry-After (APIs que penalizan reintentar pronto)
+    espera_minima_429: float = 0.0
+    estados: Tuple[int, ...] = ESTADOS_REINTENTABLES
+
+    def espera(self, intento: int) -> float:
+        """Segundos a esperar tras el intento `intento` (0 = primer fallo)."""
+        techo = min(self.espera_maxima, self.base * self.factor ** intento)
+        return random.uniform(techo / 2, techo)
+
+
+@dataclass
+class RespuestaFetch:
+    """Respuesta HTTP (de red o de caché) con la interfaz mínima de requests.Response."""
+    status_code: int
+    content: bytes
+    headers: Dict[str, str]
+    url: str
+    desde_cache: bool = False
+    revalidada: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"HTTP {self.status_code} en {self.url}", response=self)
+
+
+class LimitadorHost:
+    """Concurrencia máxima y turno mínimo entre peticiones a un mismo host (compartido entre hilos)."""
+
+    def __init__(self, max_concurrencia: int, intervalo: float = 0.0):
+        self.max_concurrencia = max_concurrencia
+        self.intervalo = intervalo
+        self._semaforo = threading.BoundedSemaphore(max_concurrencia)
+        self._siguiente = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._semaforo.acquire()
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+        return self
+
+    def __exit__(self, *exc):
+        self._semaforo.release()
+
+    def aplazar(self, segundos: float):
+        """Retrasa el siguiente turno de todo el host (p. ej. tras un 429 con Retry-After)."""
+        with self._lock:
+            self._siguiente = max(self._siguiente, time.monotonic() + segundos)
+
+
+def _retry_after(valor: Optional[str]) -> Optional[float]:
+    """Segundos indicados por Retry-After (delta en segundos o fecha HTTP)."""
+    if not valor:
+        return None
+    valor = valor.strip()
+    if valor.isdigit():
+        return float(valor)
+    try:
+        fecha = email.utils.parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, fecha.timestamp() - time.time())
+
+
+class CacheRespuestas:
+    """
+    Caché de respuestas en disco: por clave, <clave>.json (metadatos y validadores)
+    y <clave>.body (cuerpo). Escrituras atómicas con os.replace.
+
+    La caché se purga al crearla y cada PURGA_CADA_ESCRITURAS escrituras: primero
+    las entradas que no se han guardado ni revalidado en `max_dias`, después las
+    más antiguas hasta quedar por debajo de `max_mb`.
+    """
+
+    def __init__(self, directorio: Path = DIRECTORIO_CACHE_HTTP,
+                 max_dias: float = MAX_DIAS_CACHE_HTTP, max_mb: float = MAX_MB_CACHE_HTTP):
+        self.directorio = Path(directorio)
+        self.max_dias = max_dias
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._escrituras = 0
+        self._lock = threading.Lock()
+        self.purgar()
+
+    @staticmethod
+    def clave(url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None) -> str:
+        partes = [f"v{VERSION_CACHE_HTTP}", url]
+        for nombre, valor in sorted((params or {}).items()):
+            valores = valor if isinstance(valor, (list, tuple)) else [valor]
+            partes.extend(f"{nombre}={v}" for v in valores)
+        cabeceras = {k.lower(): v for k, v in (headers or {}).items()}
+        partes.extend(f"{c}:{cabeceras[c.lower()]}" for c in CABECERAS_CLAVE if c.lower() in cabeceras)
+        return hashlib.sha256('\n'.join(partes).encode('utf-8')).hexdigest()
+
+    def _rutas(self, clave: str) -> Tuple[Path, Path]:
+        base = self.directorio / clave[:2] / clave
+        return base.with_suffix('.json'), base.with_suffix('.body')
+
+    def leer(self, clave: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        ruta_meta, ruta_cuerpo = self._rutas(clave)
+        try:
+            meta = json.loads(ruta_meta.read_text(encoding='utf-8'))
+            cuerpo = ruta_cuerpo.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != VERSION_CACHE_HTTP or meta.get('tamano') != len(cuerpo):
+            return None
+        return meta, cuerpo
+
+    def guardar(self, clave: str, respuesta: RespuestaFetch):
+        ruta_meta, ruta_cuerpo = self._rutas(clave)
+        meta = {
+            'version': VERSION_CACHE_HTTP,
+            'url': respuesta.url,
+            'status_code': respuesta.status_code,
+            'etag': respuesta.headers.get('ETag'),
+            'last_modified': respuesta.headers.get('Last-Modified'),
+            'content_type': respuesta.headers.get('Content-Type'),
+            'guardado_en': time.time(),
+            'tamano': len(respuesta.content),
+        }
+        try:
+            ruta_meta.parent.mkdir(parents=True, exist_ok=True)
+            # Primero el cuerpo: un metadato sin cuerpo coherente se descarta al leer
+            for ruta, datos in ((ruta_cuerpo, respuesta.content),
+                                (ruta_meta, json.dumps(meta).encode('utf-8'))):
+                temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                temporal.write_bytes(datos)
+                os.replace(temporal, ruta)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la respuesta en caché ({respuesta.url}): {e}")
+            return
+        with self._lock:
+            self._escrituras += 1
+            purgar = self._escrituras % PURGA_CADA_ESCRITURAS == 0
+        if purgar:
+            self.purgar()
+
+    def tocar(self, clave: str):
+        """Renueva la marca de guardado tras una revalidación 304."""
+        entrada = self.leer(clave)
+        if entrada is None:
+            return
+        meta, _ = entrada
+        meta['guardado_en'] = time.time()
+        ruta_meta, _ = self._rutas(clave)
+        try:
+            temporal = ruta_meta.with_name(f"{ruta_meta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            temporal.write_text(json.dumps(meta), encoding='utf-8')
+            os.replace(temporal, ruta_meta)
+        except OSError:
+            pass
+
+    def eliminar(self, clave: str):
+        for ruta in self._rutas(clave):
+            try:
+                ruta.unlink()
+            except OSError:
+                pass
+
+    def purgar(self) -> int:
+        """
+        Aplica los límites de edad y tamaño. La antigüedad de una entrada es la
+        de su .json, que se reescribe al guardar y al revalidar (tocar).
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        if not self.directorio.is_dir():
+            return 0
+        limite_edad = time.time() - self.max_dias * 86400
+        entradas = []
+        eliminadas = 0
+        for ruta_meta in self.directorio.glob('*/*.json'):
+            ruta_cuerpo = ruta_meta.with_suffix('.body')
+            try:
+                mtime = ruta_meta.stat().st_mtime
+                tamano = ruta_meta.stat().st_size + (ruta_cuerpo.stat().st_size if ruta_cuerpo.exists() else 0)
+            except OSError:
+                continue
+            if mtime < limite_edad:
+                self.eliminar(ruta_meta.stem)
+                eliminadas += 1
+            else:
+                entradas.append((mtime, tamano, ruta_meta.stem))
+
+        # Restos de escrituras interrumpidas: temporales y cuerpos sin metadatos
+        huerfanos = [r for r in self.directorio.glob('*/*.body') if not r.with_suffix('.json').exists()]
+        for ruta in huerfanos + list(self.directorio.glob('*/*.tmp')):
+            try:
+                if ruta.stat().st_mtime < time.time() - 3600:
+                    ruta.unlink()
+            except OSError:
+                pass
+
+        total = sum(tamano for _, tamano, _ in entradas)
+        if total > self.max_bytes:
+            for _, tamano, clave in sorted(entradas):
+                if total <= self.max_bytes:
+                    break
+                self.eliminar(clave)
+                total -= tamano
+                eliminadas += 1
+
+        if eliminadas:
+            logger.info(f"🧹 Caché HTTP: {eliminadas} entradas retiradas ({total / 1024 / 1024:.1f} MB en uso)")
+        return eliminadas
+
+
+@dataclass
+class EstadisticasFetch:
+    peticiones: int = 0
+    reintentos: int = 0
+    aciertos_cache: int = 0
+    revalidadas: int = 0
+    descargas: int = 0
+    bytes_descargados: int = 0
+    esperas_s: float = 0.0
+
+
+class HttpFetcher:
+    """
+    Cliente HTTP compartido por los jobs.
+
+    Args:
+        politica: Reintentos por defecto (cada llamada puede pasar la suya)
+        directorio_cache: Directorio de la caché en disco (None = sin caché)
+        max_por_host: Peticiones simultáneas por host por defecto
+        user_agent: User-Agent si la petición no trae uno
+    """
+
+    def __init__(self, politica: Optional[PoliticaReintentos] = None,
+                 directorio_cache: Optional[Path] = DIRECTORIO_CACHE_HTTP,
+                 max_por_host: int = 4,
+                 user_agent: str = 'VagalumeEnergia/1.0 (ncore-jobs)'):
+        self.politica = politica or PoliticaReintentos()
+        self.cache = CacheRespuestas(directorio_cache) if directorio_cache else None
+        self.max_por_host = max_por_host
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=16, pool_maxsize=max(max_por_host, 10))
+        self.sesion.mount('https://', adaptador)
+        self.sesion.mount('http://', adaptador)
+        self.sesion.headers['User-Agent'] = user_agent
+        self._limitadores: Dict[str, LimitadorHost] = {}
+        self._lock = threading.Lock()
+        self.estadisticas = EstadisticasFetch()
+
+    def configurar_host(self, host: str, max_concurrencia: Optional[int] = None,
+                        intervalo: Optional[float] = None) -> LimitadorHost:
+        """Fija concurrencia máxima y/o intervalo mínimo (s) entre peticiones a `host`."""
+        with self._lock:
+            actual = self._limitadores.get(host)
+            limitador = LimitadorHost(
+                max_concurrencia or (actual.max_concurrencia if actual else self.max_por_host),
+                intervalo if intervalo is not None else (actual.intervalo if actual else 0.0),
+            )
+            self._limitadores[host] = limitador
+            return limitador
+
+    def limitador(self, url: str) -> LimitadorHost:
+        host = urlsplit(url).hostname or ''
+        with self._lock:
+            limitador = self._limitadores.get(host)
+            if limitador is None:
+                limitador = self._limitadores[host] = LimitadorHost(self.max_por_host)
+            return limitador
+
+    def get(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+            timeout: float = 30, cache: bool = True, ttl: Optional[float] = None,
+            politica: Optional[PoliticaReintentos] = None,
+            archivar: Optional[Tuple[str, str]] = None,
+            validar: Optional[Callable[[RespuestaFetch], None]] = None) -> RespuestaFetch:
+        """
+        GET con reintentos, límites por host y caché condicional.
+
+        Args:
+            cache: Usar la caché en disco (validadores ETag/Last-Modified)
+            ttl: Segundos durante los que la copia en disco se sirve sin consultar al
+                servidor (None = revalidar siempre; solo útil con datos inmutables)
+            archivar: (fuente, clave) para guardar el cuerpo de las respuestas 200
+                en el archivo de respuestas crudas
+            validar: Comprobación de una respuesta 200 que lanza excepción si el
+                contenido no es utilizable. Una copia en caché inválida se descarta
+                antes de pedir; una descarga inválida cuenta como un intento fallido
+                más dentro de la misma política de reintentos.
+
+        Returns:
+            RespuestaFetch. Los estados no reintentables (p. ej. 404) se devuelven
+            tal cual; el llamante decide con raise_for_status().
+        """
+        usar_cache = cache and self.cache is not None
+        clave = CacheRespuestas.clave(url, params, headers) if usar_cache else None
+        entrada = self.cache.leer(clave) if usar_cache else None
+
+        if entrada is not None and validar is not None:
+            try:
+                validar(self._desde_cache(entrada, revalidada=False))
+            except Exception as e:
+                logger.warning(f"⚠️ Copia en caché no válida para {url}, se descarta: {e}")
+                self.cache.eliminar(clave)
+                entrada = None
+
+        if entrada is not None and ttl is not None and time.time() - entrada[0]['guardado_en'] < ttl:
+            self.estadisticas.aciertos_cache += 1
+            return self._archivar(archivar, self._desde_cache(entrada, revalidada=False))
+
+        cabeceras = dict(headers or {})
+        if entrada is not None:
+            meta = entrada[0]
+            if meta.get('etag'):
+                cabeceras['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                cabeceras['If-Modified-Since'] = meta['last_modified']
+
+        respuesta = self._pedir('GET', url, politica, validar=validar,
+                                params=params, headers=cabeceras, timeout=timeout)
+
+        if respuesta.status_code == 304 and entrada is not None:
+            self.estadisticas.revalidadas += 1
+            self.cache.tocar(clave)
+            return self._archivar(archivar, self._desde_cache(entrada, revalidada=True))
+
+        if usar_cache and respuesta.status_code == 200 and (
+                ttl is not None or 'ETag' in respuesta.headers or 'Last-Modified' in respuesta.headers):
+            self.cache.guardar(clave, respuesta)
+        return self._archivar(archivar, respuesta)
+
+    def get_json(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+                 timeout: float = 30, cache: bool = True, ttl: Optional[float] = None,
+                 politica: Optional[PoliticaReintentos] = None,
+                 validar: Optional[Callable[[Any], None]] = None,
+                 archivar: Optional[Tuple[str, str]] = None) -> Any:
+        """
+        GET que devuelve el JSON decodificado. `validar(datos)` puede lanzar una
+        excepción si el contenido no es utilizable: se descarta la copia en caché
+        y se reintenta dentro de la misma política que los errores de red (los
+        intentos no se multiplican). Solo se archiva (`archivar`) la respuesta
+        que supera la validación.
+        """
+        decodificado: Dict[str, Any] = {}
+
+        def decodificar(respuesta: RespuestaFetch):
+            datos = respuesta.json()
+            if validar:
+                validar(datos)
+            decodificado['datos'] = datos
+
+        respuesta = self.get(url, params=params, headers=headers, timeout=timeout, cache=cache,
+                             ttl=ttl, politica=politica, archivar=archivar, validar=decodificar)
+        respuesta.raise_for_status()
+        return decodificado['datos']
+
+    def post(self, url: str, timeout: float = 30, politica: Optional[PoliticaReintentos] = None,
+             **kwargs) -> RespuestaFetch:
+        """POST con reintentos y límites por host (nunca se cachea)."""
+        return self._pedir('POST', url, politica, timeout=timeout, **kwargs)
+
+    def _pedir(self, metodo: str, url: str, politica: Optional[PoliticaReintentos],
+               validar: Optional[Callable[[RespuestaFetch], None]] = None, **kwargs) -> RespuestaFetch:
+        """Única capa de reintentos: red, estados reintentables y respuestas 200 que no pasan `validar`."""
+        politica = politica or self.politica
+        limitador = self.limitador(url)
+        ultimo_error: Optional[Exception] = None
+
+        for intento in range(politica.intentos):
+            if intento:
+                self.estadisticas.reintentos += 1
+            espera = None
+            try:
+                with limitador:
+                    self.estadisticas.peticiones += 1
+                    r = self.sesion.request(metodo, url, **kwargs)
+                respuesta = RespuestaFetch(r.status_code, r.content, dict(r.headers), r.url)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                ultimo_error = e
+                logger.warning(f"⚠️ {metodo} {url} intento {intento + 1}/{politica.intentos}: {e}")
+            else:
+                if respuesta.status_code == 200:
+                    self.estadisticas.descargas += 1
+                    self.estadisticas.bytes_descargados += len(respuesta.content)
+                    try:
+                        if validar:
+                            validar(respuesta)
+                        return respuesta
+                    except Exception as e:
+                        ultimo_error = e
+                        logger.warning(f"⚠️ {metodo} {url} contenido no válido "
+                                       f"(intento {intento + 1}/{politica.intentos}): {e}")
+                        if intento < politica.intentos - 1:
+                            self._esperar(politica.espera(intento))
+                        continue
+                if respuesta.status_code not in politica.estados or intento == politica.intentos - 1:
+                    return respuesta
+                logger.warning(f"⚠️ {metodo} {url} HTTP {respuesta.status_code} "
+                               f"(intento {intento + 1}/{politica.intentos})")
+                retry_after = _retry_after(respuesta.headers.get('Retry-After'))
+                if retry_after is None and respuesta.status_code == 429 and politica.espera_minima_429:
+                    retry_after = max(politica.espera(intento), politica.espera_minima_429)
+                if retry_after is not None:
+                    espera = min(retry_after, politica.retry_after_maximo)
+                    # El servidor pide pausa: aplica a todas las hebras que usan el host
+                    limitador.aplazar(espera)
+
+            if intento < politica.intentos - 1:
+                self._esperar(espera if espera is not None else politica.espera(intento))
+        raise ultimo_error
+
+    def _archivar(self, archivar: Optional[Tuple[str, str]], respuesta: RespuestaFetch) -> RespuestaFetch:
+        if archivar and respuesta.status_code == 200:
+            fuente, clave = archivar
+            try:
+                obtener_archivo().guardar(fuente, clave, respuesta.content, respuesta.url)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"⚠️ No se pudo archivar {fuente}/{clave}: {e}")
+        return respuesta
+
+    def _esperar(self, segundos: float):
+        self.estadisticas.esperas_s += segundos
+        time.sleep(segundos)
+
+    @staticmethod
+    def _desde_cache(entrada: Tuple[Dict[str, Any], bytes], revalidada: bool) -> RespuestaFetch:
+        meta, cuerpo = entrada
+        cabeceras = {k: v for k, v in (('ETag', meta.get('etag')),
+                                       ('Last-Modified', meta.get('last_modified')),
+                                       ('Content-Type', meta.get('content_type'))) if v}
+        return RespuestaFetch(meta.get('status_code', 200), cuerpo, cabeceras, meta.get('url', ''),
+                              desde_cache=True, revalidada=revalidada)
+
+
+# Cliente compartido por proceso (una sesión y un juego de límites por host)
+_fetcher: Optional[HttpFetcher] = None
+_fetcher_lock = threading.Lock()
+
+
+def obtener_fetcher(**kwargs) -> HttpFetcher:
+    """Cliente HTTP compartido en el proceso; los kwargs solo aplican en la primera llamada."""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = HttpFetcher(**kwargs)
+        return _fetcher
@@ -32,9 +32,13 @@ class IntegrityValidator:
     Validador de integridad para conversiones N0→N1
     """
     
-    def __init__(self):
+    def __init__(self, batch_questionnaires: bool = False):
         """
         Inicializa el validador con campos críticos definidos
+        
+        Args:
+            batch_questionnaires: Si True, los cuestionarios de los fallos se acumulan y se
+                crean todos juntos con flush_questionnaires() al final de la ejecución
         """
         # Campos críticos que DEBEN estar presentes en N1
         self.critical_fields = {
@@ -81,6 +85,11 @@ class IntegrityValidator:
         self.validation_count = 0
         self.error_count = 0
         self.warning_count = 0
+        
+        # Cuestionarios: gestor compartido (se crea al primer fallo) y reportes pendientes en modo lote
+        self.batch_questionnaires = batch_questionnaires
+        self._questionnaire_manager = None
+        self._pending_questionnaires: List[Dict[str, Any]] = []
     
     def validate_conversion(self, n0_file_path: str, n1_file_path: str) -> Dict[str, Any]:
         """
@@ -118,6 +127,9 @@ class IntegrityValidator:
             # 1. Validar campos críticos
             critical_issues = self._validate_critical_fields(n1_data)
             result['critical_issues'] = critical_issues
+            result['missing_critical_fields'] = self._missing_critical_field_names(n1_data)
+            contract = n1_data.get('contract') if isinstance(n1_data.get('contract'), dict) else {}
+            result['cups'] = contract.get('cups')
             
             # 2. Validar campos importantes
             warnings = self._validate_important_fields(n1_data)
@@ -143,16 +155,11 @@ class IntegrityValidator:
                 logger.info("✅ Validación exitosa: integridad completa")
             
             # Generar cuestionario automáticamente si hay campos críticos faltantes
-            if critical_issues:
-                try:
-                    from .questionnaire_manager import QuestionnaireManager
-                    questionnaire_manager = QuestionnaireManager()
-                    session_token = questionnaire_manager.generate_questionnaire_from_validation(result)
-                    if session_token:
-                        result['questionnaire_session'] = session_token
-                        logger.info(f"🎯 Cuestionario generado automáticamente: {session_token}")
-                except Exception as qe:
-                    logger.warning(f"No se pudo generar cuestionario automático: {qe}")
+            if critical_issues and result['missing_critical_fields']:
+                if self.batch_questionnaires:
+                    self._pending_questionnaires.append(result)
+                else:
+                    self._create_questionnaires([result])
             
             return result
             
@@ -194,6 +201,51 @@ class IntegrityValidator:
         
         return issues
     
+    def _missing_critical_field_names(self, n1_data: Dict[str, Any]) -> List[str]:
+        """Nombres de los campos críticos ausentes (todos los del grupo si falta el grupo)."""
+        missing = []
+        for group, fields in self.critical_fields.items():
+            group_data = n1_data.get(group)
+            if not isinstance(group_data, dict):
+                missing.extend(fields)
+                continue
+            missing.extend(field for field in fields if group_data.get(field) is None)
+        return missing
+    
+    def _get_questionnaire_manager(self):
+        """Gestor de cuestionarios compartido por todas las validaciones del validador."""
+        if self._questionnaire_manager is None:
+            from questionnaire_manager import QuestionnaireManager
+            self._questionnaire_manager = QuestionnaireManager()
+        return self._questionnaire_manager
+    
+    def _create_questionnaires(self, results: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Crea las sesiones de `results` en bloque y anota el token en cada resultado."""
+        try:
+            tokens = self._get_questionnaire_manager().generate_questionnaires_from_validations(results)
+        except Exception as qe:
+            logger.warning(f"No se pudo generar cuestionario automático: {qe}")
+            return {}
+        for result in results:
+            session_token = tokens.get((result.get('cups') or '').strip().upper())
+            if session_token:
+                result['questionnaire_session'] = session_token
+        return tokens
+    
+    def flush_questionnaires(self) -> Dict[str, str]:
+        """
+        Crea de una vez los cuestionarios acumulados en modo lote (uno por CUPS)
+        
+        Returns:
+            Diccionario CUPS → token de sesión
+        """
+        pending, self._pending_questionnaires = self._pending_questionnaires, []
+        if not pending:
+            return {}
+        tokens = self._create_questionnaires(pending)
+        logger.info(f"🎯 Cuestionarios del lote: {len(tokens)} CUPS ({len(pending)} validaciones fallidas)")
+        return tokens
+    
     def _validate_important_fields(self, n1_data: Dict[str, Any]) -> List[str]:
         """
         Valida campos importantes (no críticos) en N1
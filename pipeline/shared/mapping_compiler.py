@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compilador de mapeos declarativos JSON → tablas BD
+Cada tabla se describe como una lista de campos (columna destino, rutas fuente,
+transformación) y se compila UNA vez al arrancar en extractores con accesores,
+regex y parsers de fecha precompilados. Todas las tablas de un documento se
+mapean en una sola pasada, resolviendo cada sección del JSON una única vez.
+
+Sintaxis de rutas fuente:
+    'client:nombre_cliente'       → ruta relativa a la sección 'client'
+    'contract.cups_electricidad'  → ruta absoluta desde la raíz del documento
+
+Sintaxis de candidatos de sección:
+    'contract_NxM'                → primera clave raíz con sufijo numérico (contract_2x3...)
+    'supply_point.address'        → ruta absoluta con notación punto
+    callable(datos)               → resolución a medida (ej: elementos de una lista)
+"""
+
+import logging
+import re
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple, Callable, Union, Iterable
+
+sys.path.append(str(Path(__file__).parent))
+from path_accessors import compile_path
+
+logger = logging.getLogger(__name__)
+
+SUFIJO_NXM = '_NxM'
+
+_FECHA_DMY = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{2}|\d{4})$')
+
+
+@dataclass(frozen=True)
+class Campo:
+    """
+    Columna destino y rutas fuente candidatas (la primera con valor gana, como
+    `a or b`: los valores falsos pasan a la siguiente). Con `crudo` el valor se
+    toma tal cual, sin normalizar (equivale a un .get() directo: 0/False se conservan).
+    """
+    columna: str
+    fuentes: Tuple[str, ...] = ()
+    transformacion: Optional[Union[str, Callable[[Any], Any]]] = None
+    default: Any = None
+    combinar: Optional[Callable[[List[Any]], Any]] = None
+    crudo: bool = False
+
+
+def campo(columna: str, *fuentes: str, transformacion=None, default=None, combinar=None,
+          crudo: bool = False) -> Campo:
+    """Atajo para declarar un Campo con rutas fuente posicionales."""
+    return Campo(columna, tuple(fuentes), transformacion, default, combinar, crudo)
+
+
+def _sin_limpiar(valor: Any, es_cups: bool) -> Any:
+    return valor
+
+
+def parsear_fecha(fecha_str: Any) -> Optional[str]:
+    """Convierte fecha DD/MM/YYYY (o DD/MM/YY) a YYYY-MM-DD (las fechas ISO se devuelven tal cual)."""
+    if not fecha_str:
+        return None
+    return _parsear_fecha_texto(str(fecha_str).strip())
+
+
+@lru_cache(maxsize=4096)
+def _parsear_fecha_texto(fecha: str) -> Optional[str]:
+    # Cacheado: las mismas fechas de periodo se repiten en miles de facturas
+    coincidencia = _FECHA_DMY.match(fecha)
+    if coincidencia:
+        dia, mes, año = coincidencia.groups()
+        if len(año) == 2:
+            # Año de 2 dígitos con el pivote de strptime('%y'): 00-68 → 20xx, 69-99 → 19xx
+            año = f"{'20' if int(año) < 69 else '19'}{año}"
+        return f"{año}-{mes.zfill(2)}-{dia.zfill(2)}"
+    if '/' not in fecha and fecha.count('-') == 2:
+        return fecha
+    return None
+
+
+TRANSFORMACIONES: Dict[str, Callable[[Any], Any]] = {
+    'fecha': parsear_fecha,
+}
+
+
+@lru_cache(maxsize=None)
+def patron_sufijo(nombre_base: str) -> 're.Pattern':
+    """Regex precompilada para claves '<nombre_base>_<N>x<M>'."""
+    return re.compile(rf'^{re.escape(nombre_base)}_\d+x\d+$')
+
+
+def buscar_clave_con_sufijo(datos: dict, nombre_base: str) -> Tuple[Optional[str], Any]:
+    """
+    Busca una clave con sufijo numérico (NxM) y, si no existe, la clave sin sufijo.
+
+    Returns:
+        tuple: (clave_encontrada, datos) o (None, {})
+    """
+    patron = patron_sufijo(nombre_base)
+    for clave in datos:
+        if patron.match(clave):
+            return clave, datos[clave]
+    if nombre_base in datos:
+        return nombre_base, datos[nombre_base]
+    return None, {}
+
+
+class ProgramaMapeo:
+    """
+    Conjunto de extractores compilados para todas las tablas de una capa.
+    Se construye una vez (nivel de módulo) y se reutiliza para cada documento.
+    """
+
+    def __init__(self,
+                 secciones: Dict[str, Iterable[Union[str, Callable[[dict], Any]]]],
+                 tablas: Dict[str, List[Campo]],
+                 limpiar: Callable[[Any, bool], Any]):
+        """
+        Compila secciones y tablas.
+
+        Args:
+            secciones: nombre de sección → candidatos (el primero con datos gana)
+            tablas: nombre de tabla → lista de Campo
+            limpiar: función (valor, es_ruta_cups) → valor normalizado de la capa
+        """
+        self._limpiar = limpiar
+        self._nombres_secciones = list(secciones.keys())
+        self._indice_secciones = {nombre: i for i, nombre in enumerate(self._nombres_secciones)}
+        self._resolutores = [self._compilar_seccion(candidatos) for candidatos in secciones.values()]
+        self._extractores = {tabla: self._compilar_tabla(campos) for tabla, campos in tablas.items()}
+        logger.debug(f"Programa de mapeo compilado: {len(self._extractores)} tablas, {len(self._resolutores)} secciones")
+
+    @property
+    def tablas(self) -> List[str]:
+        """Tablas disponibles en el programa, en orden de declaración."""
+        return list(self._extractores.keys())
+
+    # ------------------------------------------------------------------
+    # Compilación
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _compilar_seccion(candidatos) -> Tuple[Tuple[str, Any], ...]:
+        compilados = []
+        for candidato in candidatos:
+            if callable(candidato):
+                compilados.append(('funcion', candidato))
+            elif candidato.endswith(SUFIJO_NXM):
+                compilados.append(('sufijo', patron_sufijo(candidato[:-len(SUFIJO_NXM)])))
+            else:
+                compilados.append(('ruta', compile_path(candidato)))
+        return tuple(compilados)
+
+    def _compilar_fuente(self, fuente: str) -> Tuple[Optional[int], Callable[..., Any], bool]:
+        if ':' in fuente:
+            seccion, ruta = fuente.split(':', 1)
+            if seccion not in self._indice_secciones:
+                raise ValueError(f"Sección desconocida en mapeo: '{seccion}' ({fuente})")
+            indice = self._indice_secciones[seccion]
+        else:
+            indice, ruta = None, fuente
+        return indice, compile_path(ruta), 'cups' in ruta.lower()
+
+    def _compilar_tabla(self, campos: List[Campo]) -> Callable[[dict, list], Dict[str, Any]]:
+        plan = []
+        for c in campos:
+            if c.crudo and len(c.fuentes) > 1:
+                raise ValueError(f"Campo crudo con varias fuentes: '{c.columna}'")
+            transformar = c.transformacion
+            if isinstance(transformar, str):
+                transformar = TRANSFORMACIONES[transformar]
+            fuentes = tuple(self._compilar_fuente(f) for f in c.fuentes)
+            limpiar = _sin_limpiar if c.crudo else self._limpiar
+            plan.append((c.columna, fuentes, transformar, c.default, c.combinar, limpiar))
+        plan = tuple(plan)
+
+        def extractor(datos: dict, secciones: list) -> Dict[str, Any]:
+            fila = {}
+            for columna, fuentes, transformar, default, combinar, limpiar in plan:
+                if combinar is not None:
+                    valor = combinar([
+                        limpiar(getter(datos if indice is None else secciones[indice]), es_cups)
+                        for indice, getter, es_cups in fuentes
+                    ])
+                else:
+                    valor = None
+                    for indice, getter, es_cups in fuentes:
+                        valor = limpiar(getter(datos if indice is None else secciones[indice]), es_cups)
+                        if valor:
+                            break
+                if valor is None:
+                    valor = default
+                if transformar is not None and valor is not None:
+                    valor = transformar(valor)
+                fila[columna] = valor
+            return fila
+
+        return extractor
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    def resolver_secciones(self, datos: dict) -> list:
+        """Resuelve cada sección del documento una sola vez."""
+        resueltas = []
+        for candidatos in self._resolutores:
+            valor = {}
+            for tipo, resolutor in candidatos:
+                if tipo == 'ruta':
+                    encontrado = resolutor(datos)
+                elif tipo == 'sufijo':
+                    encontrado = next((datos[k] for k in datos if resolutor.match(k)), None)
+                else:
+                    encontrado = resolutor(datos)
+                if encontrado:
+                    valor = encontrado
+                    break
+            resueltas.append(valor)
+        return resueltas
+
+    def mapear_tabla(self, tabla: str, datos: dict) -> Dict[str, Any]:
+        """Mapea una única tabla (resuelve secciones para este documento)."""
+        if not isinstance(datos, dict):
+            datos = {}
+        return self._extractores[tabla](datos, self.resolver_secciones(datos))
+
+    def mapear_documento(self, datos: dict, tablas: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Mapea todas las tablas (o las indicadas, en ese orden) en una sola pasada.
+
+        Args:
+            datos: Documento JSON (N0 semi-aplanado o N1)
+            tablas: Orden de tablas a mapear; por defecto todas
+
+        Returns:
+            Diccionario tabla → fila mapeada
+        """
+        if not isinstance(datos, dict):
+            datos = {}
+        secciones = self.resolver_secciones(datos)
+        extractores = self._extractores
+        orden = tablas if tablas is not None else extractores.keys()
+        return {tabla: extractores[tabla](datos, secciones) for tabla in orden if tabla in extractores}
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Memoización concurrente por clave para los jobs con ThreadPoolExecutor
+Los hilos que piden una clave en curso esperan al Future del primero en lugar de
+repetir la llamada remota (p. ej. dos CUPS en la misma parcela o dos modelos del
+CSV que resuelven al mismo producto).
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class MemoConcurrente:
+    """
+    Memoiza resultados por clave; los hilos que piden una clave en curso esperan al primero.
+
+    Args:
+        ttl: Segundos durante los que se reutiliza un resultado (None = todo el proceso)
+        memorizar_errores: Si False, una llamada fallida se entrega a los hilos que ya
+            esperaban pero no se memoriza: la siguiente petición de la clave reintenta
+    """
+
+    def __init__(self, ttl: Optional[float] = None, memorizar_errores: bool = True):
+        self.ttl = ttl
+        self.memorizar_errores = memorizar_errores
+        self._futuros: Dict[Hashable, Tuple[float, Future]] = {}
+        self._lock = threading.Lock()
+        self.reutilizados = 0
+
+    def obtener(self, clave: Hashable, funcion: Callable[[], Any]) -> Any:
+        with self._lock:
+            entrada = self._futuros.get(clave)
+            if entrada is not None and self.ttl is not None and entrada[1].done() \
+                    and time.monotonic() - entrada[0] >= self.ttl:
+                entrada = None
+            propietario = entrada is None
+            if propietario:
+                futuro = Future()
+                self._futuros[clave] = (time.monotonic(), futuro)
+            else:
+                futuro = entrada[1]
+                self.reutilizados += 1
+        if propietario:
+            try:
+                futuro.set_result(funcion())
+            except Exception as e:
+                futuro.set_exception(e)
+                if not self.memorizar_errores:
+                    with self._lock:
+                        if self._futuros.get(clave, (None, None))[1] is futuro:
+                            del self._futuros[clave]
+        return futuro.result()
@@ -8,9 +8,13 @@ Permite inserción directa en BD N0 y procesamiento para N1
 """
 
 import logging
+import sys
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parent))
+from path_accessors import get_path
+
 logger = logging.getLogger(__name__)
 
 class N0SemiFlattener:
@@ -254,17 +258,7 @@ class N0SemiFlattener:
             Valor del campo o default
         """
         try:
-            keys = field_path.split('.')
-            value = data
-            
-            for key in keys:
-                if isinstance(value, dict) and key in value:
-                    value = value[key]
-                else:
-                    return default
-                    
-            return value
-            
+            return get_path(data, field_path, default)
         except Exception:
             return default
     
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Particiones mensuales de las tablas horarias (sql/particionado)
+- Los jobs de ingesta llaman a `asegurar_particiones` antes de insertar para que cada mes
+  tenga su partición y no se acumulen filas en <tabla>_default
+- En tablas sin particionar (o sin las funciones SQL instaladas) no hace nada: los jobs
+  funcionan igual antes y después de la migración
+"""
+
+import logging
+from datetime import date, datetime
+from typing import List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Fecha = Union[date, datetime]
+
+
+def esta_particionada(conn, tabla: str) -> bool:
+    """True si `tabla` está particionada por mes y las funciones de particionado existen."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT to_regprocedure('columna_particion_mensual(text)') IS NOT NULL
+               AND EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))
+        """, (tabla,))
+        return bool(cur.fetchone()[0])
+
+
+def asegurar_particiones(conn, tabla: str, desde: Optional[Fecha] = None,
+                         hasta: Optional[Fecha] = None, meses_futuros: int = 2) -> int:
+    """
+    Crea las particiones mensuales que falten en `tabla` para [desde, hasta] o, sin rango,
+    desde el mes actual hasta `meses_futuros` meses por delante.
+
+    Returns:
+        Número de particiones creadas (0 si la tabla no está particionada)
+    """
+    if not esta_particionada(conn, tabla):
+        return 0
+    with conn.cursor() as cur:
+        if desde is None:
+            cur.execute("SELECT asegurar_particiones_mensuales(%s, %s)", (tabla, meses_futuros))
+        else:
+            cur.execute("SELECT crear_particiones_mensuales(%s, %s::date, %s::date)",
+                        (tabla, desde, hasta or desde))
+        creadas = cur.fetchone()[0]
+    if creadas:
+        logger.info(f"🗂️ {tabla}: {creadas} particiones mensuales creadas")
+    return creadas
+
+
+def listar_particiones(conn, tabla: str) -> List[Tuple[str, date, date, int]]:
+    """(particion, desde, hasta, filas_estimadas) de cada mes de `tabla`."""
+    if not esta_particionada(conn, tabla):
+        return []
+    with conn.cursor() as cur:
+        cur.execute("SELECT particion, desde, hasta, filas_estimadas FROM particiones_mensuales(%s)", (tabla,))
+        return [tuple(fila) for fila in cur.fetchall()]
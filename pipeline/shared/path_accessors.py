@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Accesores precompilados para rutas con notación punto
+Cada ruta ('client.nif_titular.value') se trocea UNA sola vez y se guarda
+como getter en un registro compartido por todos los mapeadores N0/N1
+"""
+
+import logging
+from typing import Dict, Any, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Centinela para distinguir "clave ausente" de "clave con valor None"
+_AUSENTE = object()
+
+# Registro compartido ruta → getter compilado
+_REGISTRO_ACCESORES: Dict[str, Callable[..., Any]] = {}
+
+
+def _generar_getter(claves: Tuple[str, ...]) -> Callable[..., Any]:
+    """
+    Genera un getter especializado para una tupla de claves.
+    Las rutas de 1 y 2 niveles (la gran mayoría en N0) evitan el bucle.
+
+    Args:
+        claves: Claves de la ruta ya troceadas
+
+    Returns:
+        Función getter(datos, default=None)
+    """
+    if len(claves) == 1:
+        k0 = claves[0]
+
+        def getter(datos: Any, default: Any = None) -> Any:
+            if isinstance(datos, dict):
+                return datos.get(k0, default)
+            return default
+
+    elif len(claves) == 2:
+        k0, k1 = claves
+
+        def getter(datos: Any, default: Any = None) -> Any:
+            if isinstance(datos, dict):
+                nivel = datos.get(k0, _AUSENTE)
+                if isinstance(nivel, dict):
+                    return nivel.get(k1, default)
+            return default
+
+    else:
+        def getter(datos: Any, default: Any = None) -> Any:
+            valor = datos
+            for clave in claves:
+                if not isinstance(valor, dict):
+                    return default
+                valor = valor.get(clave, _AUSENTE)
+                if valor is _AUSENTE:
+                    return default
+            return valor
+
+    getter.claves = claves
+    return getter
+
+
+def compile_path(field_path: str) -> Callable[..., Any]:
+    """
+    Devuelve el getter compilado para una ruta, creándolo si no existe.
+
+    Args:
+        field_path: Ruta del campo usando puntos (ej: 'client.nombre_cliente')
+
+    Returns:
+        Función getter(datos, default=None)
+    """
+    getter = _REGISTRO_ACCESORES.get(field_path)
+    if getter is None:
+        getter = _generar_getter(tuple(field_path.split('.')))
+        _REGISTRO_ACCESORES[field_path] = getter
+    return getter
+
+
+def get_path(data: Any, field_path: str, default: Any = None) -> Any:
+    """
+    Extrae un campo de una estructura anidada usando el registro compilado.
+    Equivale a recorrer field_path.split('.') pero sin trocear en cada llamada.
+
+    Args:
+        data: Diccionario con datos anidados
+        field_path: Ruta del campo usando puntos
+        default: Valor por defecto si algún nivel no existe
+
+    Returns:
+        Valor del campo o default
+    """
+    getter = _REGISTRO_ACCESORES.get(field_path)
+    if getter is None:
+        getter = compile_path(field_path)
+    return getter(data, default)
+
+
+def registered_paths() -> int:
+    """Número de rutas compiladas en el registro (útil para diagnóstico)."""
+    return len(_REGISTRO_ACCESORES)
@@ -7,6 +7,7 @@ Proporciona endpoints para gestionar cuestionarios de completitud de datos
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import logging
+from datetime import datetime
 from questionnaire_manager import QuestionnaireManager
 
 # Configurar logging
@@ -16,7 +17,7 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-# Inicializar gestor de cuestionarios
+# Inicializar gestor de cuestionarios (pool compartido de N1 y preguntas en memoria)
 questionnaire_manager = QuestionnaireManager()
 
 @app.route('/api/questionnaire/<session_token>', methods=['GET'])
@@ -54,20 +55,18 @@ def save_response(session_token):
                 'error': 'Datos requeridos: field_name, response_value'
             }), 400
         
-        success = questionnaire_manager.save_response(
+        # Guarda y devuelve el progreso actualizado en un único viaje a BD
+        progress = questionnaire_manager.save_response_with_progress(
             session_token,
             data['field_name'],
             data['response_value']
         )
         
-        if success:
-            # Obtener progreso actualizado
-            questionnaire_data = questionnaire_manager.get_questionnaire_data(session_token)
-            
+        if progress:
             return jsonify({
                 'success': True,
                 'message': 'Respuesta guardada correctamente',
-                'completion_percentage': questionnaire_data.get('completion_percentage', 0) if questionnaire_data else 0
+                'completion_percentage': progress.get('completion_percentage') or 0
             })
         else:
             return jsonify({
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+API REST asíncrona (ASGI) para Cuestionarios Dinámicos
+Mismos endpoints y mismo contrato JSON que questionnaire_api.py (Flask), sobre
+Starlette + asyncpg: cada petición espera a la BD sin bloquear un hilo, de modo que
+los picos de campañas de mailing se atienden con un solo proceso y un pool acotado.
+
+Ejecución:
+    uvicorn questionnaire_api_async:app --host 0.0.0.0 --port 5002
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from questionnaire_manager import (
+    CRITICAL_FIELDS,
+    INTERVALO_REFRESCO_PREGUNTAS,
+    POOL_MAX_CONEXIONES,
+    build_questions,
+    is_valid_response,
+    merge_question_definitions,
+)
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Mismas variables de entorno que core/db_connections (BD N1)
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': int(os.getenv('DB_PORT', '5432')),
+    'user': os.getenv('DB_USER', 'postgres'),
+    'password': os.getenv('DB_PASSWORD', 'admin'),
+    'database': f"db_{os.getenv('DB_N1', 'N1')}"
+}
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+
+
+def _json_default(valor):
+    """Serialización equivalente al proveedor JSON de Flask (Decimal → str)."""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, uuid.UUID):
+        return str(valor)
+    raise TypeError(f"Objeto no serializable: {type(valor).__name__}")
+
+
+class FlaskJSONResponse(JSONResponse):
+    """JSONResponse con la misma salida que jsonify (claves ordenadas, ASCII escapado)"""
+
+    def render(self, content: Any) -> bytes:
+        return json.dumps(content, sort_keys=True, default=_json_default).encode('utf-8')
+
+
+def _jsonb(valor):
+    """asyncpg devuelve json/jsonb como texto si no hay codec registrado."""
+    return json.loads(valor) if isinstance(valor, str) else valor
+
+
+def _texto(valor) -> Optional[str]:
+    """
+    Parámetro como texto, igual que lo enviaría psycopg2 en el literal SQL: asyncpg
+    no convierte tipos y rechaza un número del JSON en un parámetro text.
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    return str(valor)
+
+
+class AsyncQuestionnaireStore:
+    """
+    Acceso asíncrono a las tablas de cuestionarios de N1: mismas consultas y mismo
+    tratamiento de errores que QuestionnaireManager (se registran y devuelven None/{})
+    """
+
+    def __init__(self, db_config: Optional[Dict[str, Any]] = None,
+                 max_conn: int = POOL_MAX_CONEXIONES,
+                 intervalo_refresco: float = INTERVALO_REFRESCO_PREGUNTAS):
+        self.db_config = db_config or DB_CONFIG
+        self.max_conn = max_conn
+        self.intervalo_refresco = intervalo_refresco
+        self.critical_fields = {campo: dict(config) for campo, config in CRITICAL_FIELDS.items()}
+        self.pool: Optional[asyncpg.Pool] = None
+
+        # Caché de definiciones de preguntas (misma huella que QuestionnaireManager)
+        self._preguntas: Dict[str, Dict[str, Any]] = {}
+        self._version_preguntas = None
+        self._ultima_comprobacion = 0.0
+        self._preguntas_lock = asyncio.Lock()
+
+    async def open(self):
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(min_size=1, max_size=self.max_conn, **self.db_config)
+            logger.info(f"✅ Pool asyncpg N1 abierto ({self.db_config['database']}, máx {self.max_conn})")
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("🔒 Pool asyncpg N1 cerrado")
+
+    # ------------------------------------------------------------------
+    # Caché de preguntas
+    # ------------------------------------------------------------------
+
+    async def question_definitions(self) -> Dict[str, Dict[str, Any]]:
+        ahora = time.monotonic()
+        if self._preguntas and ahora - self._ultima_comprobacion < self.intervalo_refresco:
+            return self._preguntas
+
+        async with self._preguntas_lock:
+            if self._preguntas and ahora - self._ultima_comprobacion < self.intervalo_refresco:
+                return self._preguntas
+            try:
+                async with self.pool.acquire(timeout=POOL_TIMEOUT) as conn:
+                    fila = await conn.fetchrow("""
+                        SELECT COUNT(*) AS total, MAX(updated_at) AS ultima, MAX(id) AS max_id
+                        FROM questionnaire_questions
+                    """)
+                    version = (fila['total'], fila['ultima'], fila['max_id'])
+                    if version != self._version_preguntas or not self._preguntas:
+                        filas = await conn.fetch("""
+                            SELECT DISTINCT ON (field_name)
+                                   id, field_name, question_text, field_type,
+                                   is_critical, validation_rules, help_text
+                            FROM questionnaire_questions
+                            ORDER BY field_name, id
+                        """)
+                        self._preguntas = merge_question_definitions(
+                            self.critical_fields, [dict(f) for f in filas])
+                        self._version_preguntas = version
+                        logger.info(f"📋 Preguntas de cuestionario cargadas: {len(self._preguntas)}")
+            except Exception as e:
+                logger.error(f"Error cargando preguntas de cuestionario: {e}")
+                if not self._preguntas:
+                    return merge_question_definitions(self.critical_fields, [])
+            self._ultima_comprobacion = ahora
+            return self._preguntas
+
+    def invalidate_question_cache(self):
+        """Fuerza la recarga de preguntas en la siguiente petición."""
+        self._ultima_comprobacion = 0.0
+        self._version_preguntas = None
+
+    # ------------------------------------------------------------------
+    # Operaciones de los endpoints
+    # ------------------------------------------------------------------
+
+    async def create_questionnaire_session(self, cups: str, missing_fields: List[str],
+                                           document_id: Optional[int] = None) -> Optional[str]:
+        session_token = str(uuid.uuid4())
+        critical_missing = [field for field in missing_fields if field in self.critical_fields]
+        if not critical_missing:
+            logger.info(f"No hay campos críticos faltantes para CUPS {cups}")
+            return None
+
+        try:
+            async with self.pool.acquire(timeout=POOL_TIMEOUT) as conn:
+                await conn.execute("""
+                    INSERT INTO questionnaire_sessions
+                    (session_token, cups, missing_fields, total_questions, document_id)
+                    VALUES ($1, $2, $3::jsonb, $4, $5::text::integer)
+                """, session_token, cups, json.dumps(critical_missing), len(critical_missing), _texto(document_id))
+        except Exception as e:
+            logger.error(f"Error creando sesión cuestionario: {e}")
+            return None
+
+        logger.info(f"✅ Sesión cuestionario creada: {session_token} para CUPS {cups}")
+        return session_token
+
+    async def get_questionnaire_data(self, session_token: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with self.pool.acquire(timeout=POOL_TIMEOUT) as conn:
+                session = await conn.fetchrow("""
+                    SELECT cups, missing_fields, completion_percentage, status, expires_at
+                    FROM questionnaire_sessions
+                    WHERE session_token = $1 AND status != 'expired'
+                """, session_token)
+        except Exception as e:
+            logger.error(f"Error obteniendo cuestionario: {e}")
+            return None
+
+        if not session:
+            logger.warning(f"Sesión no encontrada o expirada: {session_token}")
+            return None
+
+        questions = build_questions(_jsonb(session['missing_fields']) or [],
+                                    self.critical_fields, await self.question_definitions())
+        return {
+            'session_token': session_token,
+            'cups': session['cups'],
+            'questions': questions,
+            'total_questions': len(questions),
+            'completion_percentage': session['completion_percentage'],
+            'status': session['status'],
+            'expires_at': session['expires_at'].isoformat()
+        }
+
+    async def save_response_with_progress(self, session_token: str, field_name: str,
+                                          response_value: str) -> Optional[Dict[str, Any]]:
+        """Misma sentencia única que QuestionnaireManager.save_response_with_progress."""
+        definiciones = await self.question_definitions()
+        field_config = definiciones.get(field_name, {})
+        # El JSON puede traer números o booleanos; la columna es TEXT
+        response_value = _texto(response_value)
+
+        if not is_valid_response(field_name, response_value, self.critical_fields, definiciones):
+            logger.warning(f"Respuesta no válida para {field_name}: {response_value}")
+            return None
+
+        try:
+            async with self.pool.acquire(timeout=POOL_TIMEOUT) as conn:
+                progreso = await conn.fetchrow("""
+                    WITH sesion AS (
+                        SELECT id, document_id
+                        FROM questionnaire_sessions
+                        WHERE session_token = $1
+                        FOR UPDATE
+                    ),
+                    pregunta_existente AS (
+                        SELECT id FROM questionnaire_questions
+                        WHERE id = $2::int
+                           OR ($2::int IS NULL AND field_name = $3)
+                        ORDER BY id
+                        LIMIT 1
+                    ),
+                    pregunta_nueva AS (
+                        INSERT INTO questionnaire_questions
+                            (field_name, question_text, field_type, is_critical)
+                        SELECT $3, $4, $5, TRUE
+                        WHERE NOT EXISTS (SELECT 1 FROM pregunta_existente)
+                          AND EXISTS (SELECT 1 FROM sesion)
+                        RETURNING id
+                    ),
+                    pregunta AS (
+                        SELECT id FROM pregunta_existente
+                        UNION ALL
+                        SELECT id FROM pregunta_nueva
+                    ),
+                    respuesta AS (
+                        INSERT INTO questionnaire_responses
+                            (document_id, question_id, response_value, user_session, is_validated)
+                        SELECT sesion.document_id, pregunta.id, $6, $1, TRUE
+                        FROM sesion, pregunta
+                        ON CONFLICT (document_id, question_id)
+                        DO UPDATE SET
+                            response_value = EXCLUDED.response_value,
+                            response_timestamp = CURRENT_TIMESTAMP,
+                            is_validated = EXCLUDED.is_validated
+                        RETURNING (xmax = 0) AS nueva
+                    ),
+                    progreso AS (
+                        UPDATE questionnaire_sessions qs
+                        SET answered_questions = LEAST(qs.answered_questions + r.incremento, qs.total_questions),
+                            completion_percentage = LEAST(qs.answered_questions + r.incremento, qs.total_questions)
+                                                    * 100.0 / NULLIF(qs.total_questions, 0),
+                            status = CASE
+                                WHEN qs.answered_questions + r.incremento >= qs.total_questions THEN 'completed'
+                                ELSE 'in_progress'
+                            END,
+                            completed_at = CASE
+                                WHEN qs.answered_questions + r.incremento >= qs.total_questions
+                                THEN COALESCE(qs.completed_at, CURRENT_TIMESTAMP)
+                                ELSE qs.completed_at
+                            END
+                        FROM sesion,
+                             (SELECT COUNT(*) FILTER (WHERE nueva)::int AS incremento FROM respuesta
+                              HAVING COUNT(*) > 0) r
+                        WHERE qs.id = sesion.id
+                        RETURNING qs.completion_percentage, qs.status
+                    )
+                    SELECT completion_percentage, status FROM progreso
+                """, session_token, field_config.get('id'), field_name,
+                    field_config.get('question', f'Valor para {field_name}'),
+                    field_config.get('type', 'text'), response_value)
+        except Exception as e:
+            logger.error(f"Error guardando respuesta: {e}")
+            return None
+
+        if not progreso:
+            return None
+        if not field_config.get('id'):
+            # Pregunta creada o encontrada en BD: recargar para conocer su id
+            self.invalidate_question_cache()
+        logger.info(f"✅ Respuesta guardada: {field_name} = {response_value}")
+        return dict(progreso)
+
+    async def get_completed_responses(self, session_token: str) -> Dict[str, str]:
+        try:
+            async with self.pool.acquire(timeout=POOL_TIMEOUT) as conn:
+                filas = await conn.fetch("""
+                    SELECT qq.field_name, qr.response_value
+                    FROM questionnaire_responses qr
+                    JOIN questionnaire_questions qq ON qr.question_id = qq.id
+                    JOIN questionnaire_sessions qs ON qr.document_id = qs.document_id
+                    WHERE qs.session_token = $1 AND qr.is_validated = TRUE
+                """, session_token)
+        except Exception as e:
+            logger.error(f"Error obteniendo respuestas: {e}")
+            return {}
+        return {fila['field_name']: fila['response_value'] for fila in filas}
+
+
+store = AsyncQuestionnaireStore()
+
+
+def _error_interno(e: Exception) -> FlaskJSONResponse:
+    return FlaskJSONResponse({
+        'error': 'Error interno del servidor',
+        'details': str(e)
+    }, status_code=500)
+
+
+async def _json_body(request) -> Optional[Dict[str, Any]]:
+    """Cuerpo JSON o None si no es JSON válido (como request.get_json() + comprobación)."""
+    try:
+        data = await request.json()
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def get_questionnaire(request):
+    """Obtener cuestionario por token de sesión"""
+    session_token = request.path_params['session_token']
+    try:
+        questionnaire_data = await store.get_questionnaire_data(session_token)
+
+        if not questionnaire_data:
+            return FlaskJSONResponse({
+                'error': 'Cuestionario no encontrado o expirado',
+                'session_token': session_token
+            }, status_code=404)
+
+        return FlaskJSONResponse({
+            'success': True,
+            'data': questionnaire_data
+        })
+
+    except Exception as e:
+        logger.error(f"Error obteniendo cuestionario: {e}")
+        return _error_interno(e)
+
+
+async def save_response(request):
+    """Guardar respuesta del cuestionario"""
+    session_token = request.path_params['session_token']
+    try:
+        data = await _json_body(request)
+
+        if not data or 'field_name' not in data or 'response_value' not in data:
+            return FlaskJSONResponse({
+                'error': 'Datos requeridos: field_name, response_value'
+            }, status_code=400)
+
+        # Guarda y devuelve el progreso actualizado en un único viaje a BD
+        progress = await store.save_response_with_progress(
+            session_token,
+            data['field_name'],
+            data['response_value']
+        )
+
+        if progress:
+            return FlaskJSONResponse({
+                'success': True,
+                'message': 'Respuesta guardada correctamente',
+                'completion_percentage': progress.get('completion_percentage') or 0
+            })
+        else:
+            return FlaskJSONResponse({
+                'error': 'No se pudo guardar la respuesta'
+            }, status_code=400)
+
+    except Exception as e:
+        logger.error(f"Error guardando respuesta: {e}")
+        return _error_interno(e)
+
+
+async def get_responses(request):
+    """Obtener todas las respuestas de una sesión"""
+    session_token = request.path_params['session_token']
+    try:
+        responses = await store.get_completed_responses(session_token)
+
+        return FlaskJSONResponse({
+            'success': True,
+            'data': responses
+        })
+
+    except Exception as e:
+        logger.error(f"Error obteniendo respuestas: {e}")
+        return _error_interno(e)
+
+
+async def create_questionnaire(request):
+    """Crear nuevo cuestionario"""
+    try:
+        data = await _json_body(request)
+
+        if not data or 'cups' not in data or 'missing_fields' not in data:
+            return FlaskJSONResponse({
+                'error': 'Datos requeridos: cups, missing_fields'
+            }, status_code=400)
+
+        session_token = await store.create_questionnaire_session(
+            data['cups'],
+            data['missing_fields'],
+            data.get('document_id')
+        )
+
+        if session_token:
+            return FlaskJSONResponse({
+                'success': True,
+                'session_token': session_token,
+                'message': 'Cuestionario creado correctamente'
+            })
+        else:
+            return FlaskJSONResponse({
+                'error': 'No se pudo crear el cuestionario'
+            }, status_code=400)
+
+    except Exception as e:
+        logger.error(f"Error creando cuestionario: {e}")
+        return _error_interno(e)
+
+
+async def health_check(request):
+    """Endpoint de salud"""
+    return FlaskJSONResponse({
+        'status': 'healthy',
+        'service': 'questionnaire-api',
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+app = Starlette(
+    routes=[
+        # /create antes que /{session_token} para que no se interprete como token
+        Route('/api/questionnaire/create', create_questionnaire, methods=['POST']),
+        Route('/api/questionnaire/{session_token}', get_questionnaire, methods=['GET']),
+        Route('/api/questionnaire/{session_token}/response', save_response, methods=['POST']),
+        Route('/api/questionnaire/{session_token}/responses', get_responses, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    on_startup=[store.open],
+    on_shutdown=[store.close],
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    logger.info("🚀 Iniciando API asíncrona de Cuestionarios Dinámicos...")
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('QUESTIONNAIRE_ASYNC_PORT', '5002')))
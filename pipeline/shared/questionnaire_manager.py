@@ -6,65 +6,188 @@ basados en campos faltantes detectados por el validador de integridad.
 """
 
 import json
+import os
+import re
+import sys
+import time
 import uuid
 import logging
+import threading
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Dict, List, Optional, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+
+from psycopg2.extras import execute_values
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from core.db_connections import db_manager as shared_db_manager
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Conexiones simultáneas a N1 del pool compartido (picos de campañas de mailing)
+POOL_MAX_CONEXIONES = int(os.getenv('QUESTIONNAIRE_POOL_MAX', '20'))
+# Estados de sesión que se reutilizan en lugar de crear otra para el mismo CUPS
+ESTADOS_SESION_ABIERTA = ('pending', 'in_progress')
+# Cada cuánto se comprueba si cambiaron las preguntas en BD (segundos)
+INTERVALO_REFRESCO_PREGUNTAS = float(os.getenv('QUESTIONNAIRE_REFRESH_SECONDS', '60'))
+
+# Mapeo de campos críticos detectados por análisis masivo (base de las preguntas)
+CRITICAL_FIELDS = {
+    'cups': {
+        'question': '¿Cuál es el código CUPS de su punto de suministro?',
+        'type': 'text',
+        'validation': r'^ES\d{18}[A-Z]{2}\d{1}[A-Z]{1}$',
+        'help': 'El CUPS es un código único que identifica su punto de suministro. Lo encuentra en su factura.'
+    },
+    'potencia_contratada': {
+        'question': '¿Cuál es su potencia contratada en kW?',
+        'type': 'number',
+        'validation': r'^\d+(\.\d{1,2})?$',
+        'help': 'La potencia contratada aparece en su factura eléctrica, expresada en kW.'
+    },
+    'tarifa_acceso': {
+        'question': '¿Qué tarifa de acceso tiene contratada?',
+        'type': 'select',
+        'options': ['2.0TD', '3.0TD', '6.1TD', '6.2TD', '6.3TD', '6.4TD'],
+        'help': 'La tarifa de acceso aparece en su factura eléctrica.'
+    }
+}
+
+
+def merge_question_definitions(critical_fields: Dict[str, Dict[str, Any]],
+                               filas: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """critical_fields como base; las filas de questionnaire_questions aportan id y textos actualizados."""
+    definiciones = {campo: dict(config, id=None) for campo, config in critical_fields.items()}
+    for fila in filas:
+        reglas = fila.get('validation_rules') or {}
+        if isinstance(reglas, str):
+            reglas = json.loads(reglas)
+        config = definiciones.setdefault(fila['field_name'], {})
+        config['id'] = fila['id']
+        config['question'] = fila['question_text'] or config.get('question')
+        config['type'] = fila['field_type'] or config.get('type', 'text')
+        if fila.get('help_text'):
+            config['help'] = fila['help_text']
+        if reglas.get('pattern'):
+            config['validation'] = reglas['pattern']
+        if reglas.get('options'):
+            config['options'] = reglas['options']
+    return definiciones
+
+
+def build_questions(missing_fields: List[str], critical_fields: Dict[str, Dict[str, Any]],
+                    definiciones: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Preguntas a mostrar para los campos faltantes de una sesión."""
+    questions = []
+    for field in missing_fields:
+        if field in critical_fields:
+            field_config = definiciones.get(field, critical_fields[field])
+            question = {
+                'field_name': field,
+                'question_text': field_config['question'],
+                'field_type': field_config['type'],
+                'help_text': field_config['help'],
+                'is_critical': True
+            }
+            
+            if 'options' in field_config:
+                question['options'] = field_config['options']
+            if 'validation' in field_config:
+                question['validation_pattern'] = field_config['validation']
+            
+            questions.append(question)
+    return questions
+
+
+def is_valid_response(field_name: str, response_value: str, critical_fields: Dict[str, Dict[str, Any]],
+                      definiciones: Dict[str, Dict[str, Any]]) -> bool:
+    """Comprueba la respuesta contra el patrón de validación del campo (si lo tiene)."""
+    field_config = definiciones.get(field_name, {})
+    if field_name in critical_fields and 'validation' in field_config:
+        return re.match(field_config['validation'], response_value) is not None
+    return True
+
+
 class QuestionnaireManager:
     """Gestor de cuestionarios dinámicos para completar datos faltantes"""
     
-    def __init__(self, db_config: Dict[str, str] = None):
+    def __init__(self, db_name: str = 'N1', db_manager=None,
+                 intervalo_refresco: float = INTERVALO_REFRESCO_PREGUNTAS):
         """
         Inicializar gestor de cuestionarios
         
         Args:
-            db_config: Configuración de conexión a BD N1
+            db_name: BD de cuestionarios en DatabaseManager (N1)
+            db_manager: Gestor de conexiones (por defecto el pool compartido de core)
+            intervalo_refresco: Segundos entre comprobaciones de cambios en questionnaire_questions
         """
-        self.db_config = db_config or {
-            'host': 'localhost',
-            'port': '5432',
-            'database': 'db_N1',
-            'user': 'postgres',
-            'password': 'password'
-        }
+        self.db_name = db_name
+        self.db_manager = db_manager or shared_db_manager
+        self.db_manager.configure_pool(db_name, min_conn=1, max_conn=POOL_MAX_CONEXIONES)
+        self.intervalo_refresco = intervalo_refresco
         
         # Mapeo de campos críticos detectados por análisis masivo
-        self.critical_fields = {
-            'cups': {
-                'question': '¿Cuál es el código CUPS de su punto de suministro?',
-                'type': 'text',
-                'validation': r'^ES\d{18}[A-Z]{2}\d{1}[A-Z]{1}$',
-                'help': 'El CUPS es un código único que identifica su punto de suministro. Lo encuentra en su factura.'
-            },
-            'potencia_contratada': {
-                'question': '¿Cuál es su potencia contratada en kW?',
-                'type': 'number',
-                'validation': r'^\d+(\.\d{1,2})?$',
-                'help': 'La potencia contratada aparece en su factura eléctrica, expresada en kW.'
-            },
-            'tarifa_acceso': {
-                'question': '¿Qué tarifa de acceso tiene contratada?',
-                'type': 'select',
-                'options': ['2.0TD', '3.0TD', '6.1TD', '6.2TD', '6.3TD', '6.4TD'],
-                'help': 'La tarifa de acceso aparece en su factura eléctrica.'
-            }
-        }
+        self.critical_fields = {campo: dict(config) for campo, config in CRITICAL_FIELDS.items()}
+        
+        # Caché de definiciones de preguntas (critical_fields + questionnaire_questions)
+        self._preguntas: Dict[str, Dict[str, Any]] = {}
+        self._version_preguntas = None
+        self._ultima_comprobacion = 0.0
+        self._preguntas_lock = threading.Lock()
     
-    def _get_db_connection(self):
-        """Obtener conexión a base de datos N1"""
-        try:
-            conn = psycopg2.connect(**self.db_config)
-            return conn
-        except Exception as e:
-            logger.error(f"Error conectando a BD N1: {e}")
-            return None
+    # ------------------------------------------------------------------
+    # Caché de preguntas
+    # ------------------------------------------------------------------
+    
+    def _question_definitions(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Definiciones de preguntas por campo, en memoria. Se recargan cuando cambia
+        questionnaire_questions (recuento + último updated_at), comprobado como mucho
+        cada `intervalo_refresco` segundos.
+        """
+        ahora = time.monotonic()
+        if self._preguntas and ahora - self._ultima_comprobacion < self.intervalo_refresco:
+            return self._preguntas
+        
+        with self._preguntas_lock:
+            if self._preguntas and ahora - self._ultima_comprobacion < self.intervalo_refresco:
+                return self._preguntas
+            try:
+                with self.db_manager.transaction(self.db_name) as cursor:
+                    cursor.execute("""
+                        SELECT COUNT(*) AS total, MAX(updated_at) AS ultima, MAX(id) AS max_id
+                        FROM questionnaire_questions
+                    """)
+                    fila = cursor.fetchone()
+                    version = (fila['total'], fila['ultima'], fila['max_id'])
+                    if version != self._version_preguntas or not self._preguntas:
+                        cursor.execute("""
+                            SELECT DISTINCT ON (field_name)
+                                   id, field_name, question_text, field_type,
+                                   is_critical, validation_rules, help_text
+                            FROM questionnaire_questions
+                            ORDER BY field_name, id
+                        """)
+                        self._preguntas = self._merge_definitions(cursor.fetchall())
+                        self._version_preguntas = version
+                        logger.info(f"📋 Preguntas de cuestionario cargadas: {len(self._preguntas)}")
+            except Exception as e:
+                logger.error(f"Error cargando preguntas de cuestionario: {e}")
+                if not self._preguntas:
+                    return self._merge_definitions([])
+            self._ultima_comprobacion = ahora
+            return self._preguntas
+    
+    def _merge_definitions(self, filas: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        return merge_question_definitions(self.critical_fields, filas)
+    
+    def invalidate_question_cache(self):
+        """Fuerza la recarga de preguntas en la siguiente petición."""
+        with self._preguntas_lock:
+            self._ultima_comprobacion = 0.0
+            self._version_preguntas = None
     
     def create_questionnaire_session(self, cups: str, missing_fields: List[str], 
                                    document_id: Optional[int] = None) -> Optional[str]:
@@ -80,12 +203,6 @@ class QuestionnaireManager:
             Token de sesión único o None si falla
         """
         try:
-            conn = self._get_db_connection()
-            if not conn:
-                return None
-            
-            cursor = conn.cursor()
-            
             # Generar token único
             session_token = str(uuid.uuid4())
             
@@ -98,19 +215,19 @@ class QuestionnaireManager:
                 return None
             
             # Insertar sesión de cuestionario
-            cursor.execute("""
-                INSERT INTO questionnaire_sessions 
-                (session_token, cups, missing_fields, total_questions, document_id)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (
-                session_token,
-                cups,
-                json.dumps(critical_missing),
-                len(critical_missing),
-                document_id
-            ))
+            with self.db_manager.transaction(self.db_name) as cursor:
+                cursor.execute("""
+                    INSERT INTO questionnaire_sessions 
+                    (session_token, cups, missing_fields, total_questions, document_id)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (
+                    session_token,
+                    cups,
+                    json.dumps(critical_missing),
+                    len(critical_missing),
+                    document_id
+                ))
             
-            conn.commit()
             logger.info(f"✅ Sesión cuestionario creada: {session_token} para CUPS {cups}")
             logger.info(f"   📋 Campos faltantes: {critical_missing}")
             
@@ -119,9 +236,6 @@ class QuestionnaireManager:
         except Exception as e:
             logger.error(f"Error creando sesión cuestionario: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
     
     def get_questionnaire_data(self, session_token: str) -> Optional[Dict[str, Any]]:
         """
@@ -134,44 +248,24 @@ class QuestionnaireManager:
             Datos del cuestionario o None si no existe
         """
         try:
-            conn = self._get_db_connection()
-            if not conn:
-                return None
-            
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            # Obtener sesión
-            cursor.execute("""
-                SELECT * FROM questionnaire_sessions 
-                WHERE session_token = %s AND status != 'expired'
-            """, (session_token,))
+            with self.db_manager.transaction(self.db_name) as cursor:
+                # Obtener sesión
+                cursor.execute("""
+                    SELECT cups, missing_fields, completion_percentage, status, expires_at
+                    FROM questionnaire_sessions 
+                    WHERE session_token = %s AND status != 'expired'
+                """, (session_token,))
+                session = cursor.fetchone()
             
-            session = cursor.fetchone()
             if not session:
                 logger.warning(f"Sesión no encontrada o expirada: {session_token}")
                 return None
             
-            # Generar preguntas basadas en campos faltantes
-            missing_fields = json.loads(session['missing_fields'])
-            questions = []
-            
-            for field in missing_fields:
-                if field in self.critical_fields:
-                    field_config = self.critical_fields[field]
-                    question = {
-                        'field_name': field,
-                        'question_text': field_config['question'],
-                        'field_type': field_config['type'],
-                        'help_text': field_config['help'],
-                        'is_critical': True
-                    }
-                    
-                    if 'options' in field_config:
-                        question['options'] = field_config['options']
-                    if 'validation' in field_config:
-                        question['validation_pattern'] = field_config['validation']
-                    
-                    questions.append(question)
+            # Generar preguntas basadas en campos faltantes (definiciones en memoria)
+            missing_fields = session['missing_fields']
+            if isinstance(missing_fields, str):
+                missing_fields = json.loads(missing_fields)
+            questions = build_questions(missing_fields, self.critical_fields, self._question_definitions())
             
             return {
                 'session_token': session_token,
@@ -186,9 +280,6 @@ class QuestionnaireManager:
         except Exception as e:
             logger.error(f"Error obteniendo cuestionario: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
     
     def save_response(self, session_token: str, field_name: str, 
                      response_value: str) -> bool:
@@ -203,98 +294,110 @@ class QuestionnaireManager:
         Returns:
             True si se guardó correctamente
         """
+        return self.save_response_with_progress(session_token, field_name, response_value) is not None
+    
+    def save_response_with_progress(self, session_token: str, field_name: str,
+                                    response_value: str) -> Optional[Dict[str, Any]]:
+        """
+        Guarda la respuesta y actualiza el progreso en una única sentencia (un viaje a BD):
+        sesión, pregunta (se crea si no existe), upsert de respuesta y progreso.
+        El progreso solo avanza cuando la pregunta no tenía respuesta previa.
+        
+        Returns:
+            {'completion_percentage', 'status'} de la sesión, o None si no se guardó
+        """
+        definiciones = self._question_definitions()
+        field_config = definiciones.get(field_name, {})
+        
+        # Validar respuesta si hay patrón de validación
+        if not is_valid_response(field_name, response_value, self.critical_fields, definiciones):
+            logger.warning(f"Respuesta no válida para {field_name}: {response_value}")
+            return None
+        
         try:
-            conn = self._get_db_connection()
-            if not conn:
-                return False
-            
-            cursor = conn.cursor()
-            
-            # Validar respuesta si hay patrón de validación
-            if field_name in self.critical_fields:
-                field_config = self.critical_fields[field_name]
-                if 'validation' in field_config:
-                    import re
-                    if not re.match(field_config['validation'], response_value):
-                        logger.warning(f"Respuesta no válida para {field_name}: {response_value}")
-                        return False
-            
-            # Obtener información de la sesión
-            cursor.execute("""
-                SELECT id, document_id FROM questionnaire_sessions 
-                WHERE session_token = %s
-            """, (session_token,))
-            
-            session = cursor.fetchone()
-            if not session:
-                return False
-            
-            session_id, document_id = session
-            
-            # Obtener ID de pregunta (crear si no existe)
-            cursor.execute("""
-                SELECT id FROM questionnaire_questions 
-                WHERE field_name = %s
-            """, (field_name,))
-            
-            question = cursor.fetchone()
-            if not question:
-                # Crear pregunta si no existe
-                field_config = self.critical_fields.get(field_name, {})
+            with self.db_manager.transaction(self.db_name) as cursor:
                 cursor.execute("""
-                    INSERT INTO questionnaire_questions 
-                    (field_name, question_text, field_type, is_critical)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                """, (
-                    field_name,
-                    field_config.get('question', f'Valor para {field_name}'),
-                    field_config.get('type', 'text'),
-                    True
-                ))
-                question_id = cursor.fetchone()[0]
-            else:
-                question_id = question[0]
-            
-            # Guardar respuesta
-            cursor.execute("""
-                INSERT INTO questionnaire_responses 
-                (document_id, question_id, response_value, user_session, is_validated)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (document_id, question_id) 
-                DO UPDATE SET 
-                    response_value = EXCLUDED.response_value,
-                    response_timestamp = CURRENT_TIMESTAMP,
-                    is_validated = EXCLUDED.is_validated
-            """, (document_id, question_id, response_value, session_token, True))
-            
-            # Actualizar progreso de sesión
-            cursor.execute("""
-                UPDATE questionnaire_sessions 
-                SET answered_questions = answered_questions + 1,
-                    completion_percentage = (answered_questions + 1) * 100.0 / total_questions,
-                    status = CASE 
-                        WHEN (answered_questions + 1) >= total_questions THEN 'completed'
-                        ELSE 'in_progress'
-                    END,
-                    completed_at = CASE 
-                        WHEN (answered_questions + 1) >= total_questions THEN CURRENT_TIMESTAMP
-                        ELSE completed_at
-                    END
-                WHERE session_token = %s
-            """, (session_token,))
-            
-            conn.commit()
+                    WITH sesion AS (
+                        SELECT id, document_id
+                        FROM questionnaire_sessions
+                        WHERE session_token = %(token)s
+                        FOR UPDATE
+                    ),
+                    pregunta_existente AS (
+                        SELECT id FROM questionnaire_questions
+                        WHERE id = %(question_id)s
+                           OR (%(question_id)s IS NULL AND field_name = %(field_name)s)
+                        ORDER BY id
+                        LIMIT 1
+                    ),
+                    pregunta_nueva AS (
+                        INSERT INTO questionnaire_questions
+                            (field_name, question_text, field_type, is_critical)
+                        SELECT %(field_name)s, %(question_text)s, %(field_type)s, TRUE
+                        WHERE NOT EXISTS (SELECT 1 FROM pregunta_existente)
+                          AND EXISTS (SELECT 1 FROM sesion)
+                        RETURNING id
+                    ),
+                    pregunta AS (
+                        SELECT id FROM pregunta_existente
+                        UNION ALL
+                        SELECT id FROM pregunta_nueva
+                    ),
+                    respuesta AS (
+                        INSERT INTO questionnaire_responses
+                            (document_id, question_id, response_value, user_session, is_validated)
+                        SELECT sesion.document_id, pregunta.id, %(response_value)s, %(token)s, TRUE
+                        FROM sesion, pregunta
+                        ON CONFLICT (document_id, question_id)
+                        DO UPDATE SET
+                            response_value = EXCLUDED.response_value,
+                            response_timestamp = CURRENT_TIMESTAMP,
+                            is_validated = EXCLUDED.is_validated
+                        RETURNING (xmax = 0) AS nueva
+                    ),
+                    progreso AS (
+                        UPDATE questionnaire_sessions qs
+                        SET answered_questions = LEAST(qs.answered_questions + r.incremento, qs.total_questions),
+                            completion_percentage = LEAST(qs.answered_questions + r.incremento, qs.total_questions)
+                                                    * 100.0 / NULLIF(qs.total_questions, 0),
+                            status = CASE
+                                WHEN qs.answered_questions + r.incremento >= qs.total_questions THEN 'completed'
+                                ELSE 'in_progress'
+                            END,
+                            completed_at = CASE
+                                WHEN qs.answered_questions + r.incremento >= qs.total_questions
+                                THEN COALESCE(qs.completed_at, CURRENT_TIMESTAMP)
+                                ELSE qs.completed_at
+                            END
+                        FROM sesion,
+                             (SELECT COUNT(*) FILTER (WHERE nueva)::int AS incremento FROM respuesta
+                              HAVING COUNT(*) > 0) r
+                        WHERE qs.id = sesion.id
+                        RETURNING qs.completion_percentage, qs.status
+                    )
+                    SELECT completion_percentage, status FROM progreso
+                """, {
+                    'token': session_token,
+                    'question_id': field_config.get('id'),
+                    'field_name': field_name,
+                    'question_text': field_config.get('question', f'Valor para {field_name}'),
+                    'field_type': field_config.get('type', 'text'),
+                    'response_value': response_value,
+                })
+                progreso = cursor.fetchone()
+            
+            if not progreso:
+                return None
+            if not field_config.get('id'):
+                # Pregunta creada o encontrada en BD: recargar para conocer su id
+                self.invalidate_question_cache()
             logger.info(f"✅ Respuesta guardada: {field_name} = {response_value}")
             
-            return True
+            return dict(progreso)
             
         except Exception as e:
             logger.error(f"Error guardando respuesta: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+            return None
     
     def get_completed_responses(self, session_token: str) -> Dict[str, str]:
         """
@@ -307,60 +410,162 @@ class QuestionnaireManager:
             Diccionario con respuestas completadas
         """
         try:
-            conn = self._get_db_connection()
-            if not conn:
-                return {}
-            
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            cursor.execute("""
-                SELECT qq.field_name, qr.response_value
-                FROM questionnaire_responses qr
-                JOIN questionnaire_questions qq ON qr.question_id = qq.id
-                JOIN questionnaire_sessions qs ON qr.document_id = qs.document_id
-                WHERE qs.session_token = %s AND qr.is_validated = TRUE
-            """, (session_token,))
-            
-            responses = cursor.fetchall()
+            with self.db_manager.transaction(self.db_name) as cursor:
+                cursor.execute("""
+                    SELECT qq.field_name, qr.response_value
+                    FROM questionnaire_responses qr
+                    JOIN questionnaire_questions qq ON qr.question_id = qq.id
+                    JOIN questionnaire_sessions qs ON qr.document_id = qs.document_id
+                    WHERE qs.session_token = %s AND qr.is_validated = TRUE
+                """, (session_token,))
+                responses = cursor.fetchall()
             return {row['field_name']: row['response_value'] for row in responses}
             
         except Exception as e:
             logger.error(f"Error obteniendo respuestas: {e}")
             return {}
-        finally:
-            if conn:
-                conn.close()
     
-    def generate_questionnaire_from_validation(self, validation_report: Dict[str, Any]) -> Optional[str]:
+    def create_questionnaire_sessions_batch(self, requests: List[Dict[str, Any]]) -> Dict[str, str]:
         """
-        Generar cuestionario basado en reporte de validación de integridad
+        Crear en bloque las sesiones de una ejecución completa (un INSERT multi-fila)
+        
+        - Agrupa por CUPS: varios documentos del mismo cliente dan una sola sesión con la
+          unión de sus campos faltantes
+        - Si el CUPS ya tiene una sesión abierta y vigente se reutiliza su token
+          (no se envía otro cuestionario al mismo cliente); si faltan campos nuevos
+          se añaden a esa sesión (unión de missing_fields y total_questions ajustado)
+        - El CUPS se compara normalizado (mayúsculas, sin espacios) en ambos lados
         
         Args:
-            validation_report: Reporte del IntegrityValidator
+            requests: Lista de {'cups', 'missing_fields', 'document_id' (opcional)}
             
         Returns:
-            Token de sesión del cuestionario generado
+            Diccionario CUPS → token de sesión (nuevas y reutilizadas)
         """
+        por_cups: Dict[str, Dict[str, Any]] = {}
+        for peticion in requests:
+            cups = (peticion.get('cups') or '').strip().upper()
+            critical_missing = [field for field in peticion.get('missing_fields') or []
+                                if field in self.critical_fields]
+            if not cups or cups == 'UNKNOWN' or not critical_missing:
+                continue
+            agrupada = por_cups.setdefault(cups, {'missing_fields': [], 'document_id': None})
+            for field in critical_missing:
+                if field not in agrupada['missing_fields']:
+                    agrupada['missing_fields'].append(field)
+            if agrupada['document_id'] is None:
+                agrupada['document_id'] = peticion.get('document_id')
+        
+        if not por_cups:
+            logger.info("No hay campos críticos faltantes con CUPS en el lote")
+            return {}
+        
         try:
-            if not validation_report.get('missing_critical_fields'):
-                logger.info("No hay campos críticos faltantes, no se genera cuestionario")
-                return None
-            
-            cups = validation_report.get('cups', 'UNKNOWN')
-            missing_fields = validation_report['missing_critical_fields']
-            
-            session_token = self.create_questionnaire_session(cups, missing_fields)
+            with self.db_manager.transaction(self.db_name) as cursor:
+                # Sesiones abiertas ya existentes para esos CUPS (normalizado igual que las claves)
+                cursor.execute("""
+                    SELECT DISTINCT ON (upper(btrim(cups)))
+                           upper(btrim(cups)) AS cups, session_token, missing_fields
+                    FROM questionnaire_sessions
+                    WHERE upper(btrim(cups)) = ANY(%s)
+                      AND status = ANY(%s)
+                      AND expires_at > CURRENT_TIMESTAMP
+                    ORDER BY upper(btrim(cups)), created_at DESC
+                """, (list(por_cups), list(ESTADOS_SESION_ABIERTA)))
+                abiertas = cursor.fetchall()
+                tokens = {row['cups']: row['session_token'] for row in abiertas}
+                
+                # Sesiones reutilizadas a las que les faltan campos del lote: se amplían
+                ampliadas = []
+                for row in abiertas:
+                    campos = row['missing_fields'] or []
+                    if isinstance(campos, str):
+                        campos = json.loads(campos)
+                    nuevos = [field for field in por_cups[row['cups']]['missing_fields']
+                              if field not in campos]
+                    if nuevos:
+                        union = list(campos) + nuevos
+                        ampliadas.append((row['session_token'], json.dumps(union), len(union)))
+                if ampliadas:
+                    execute_values(cursor, """
+                        UPDATE questionnaire_sessions qs
+                        SET missing_fields = v.missing_fields::jsonb,
+                            total_questions = v.total_questions,
+                            completion_percentage = LEAST(qs.answered_questions, v.total_questions)
+                                                    * 100.0 / NULLIF(v.total_questions, 0)
+                        FROM (VALUES %s) AS v(session_token, missing_fields, total_questions)
+                        WHERE qs.session_token = v.session_token
+                    """, ampliadas, page_size=1000)
+                
+                nuevas = [
+                    (str(uuid.uuid4()), cups, json.dumps(datos['missing_fields']),
+                     len(datos['missing_fields']), datos['document_id'])
+                    for cups, datos in por_cups.items() if cups not in tokens
+                ]
+                if nuevas:
+                    creadas = execute_values(cursor, """
+                        INSERT INTO questionnaire_sessions
+                        (session_token, cups, missing_fields, total_questions, document_id)
+                        VALUES %s
+                        RETURNING cups, session_token
+                    """, nuevas, page_size=1000, fetch=True)
+                    tokens.update({row['cups']: row['session_token'] for row in creadas})
+            
+            logger.info(f"✅ Sesiones cuestionario: {len(nuevas)} creadas, "
+                        f"{len(por_cups) - len(nuevas)} reutilizadas ({len(ampliadas)} ampliadas, "
+                        f"{len(requests)} peticiones)")
+            return tokens
             
-            if session_token:
-                logger.info(f"🎯 Cuestionario generado automáticamente para CUPS {cups}")
-                logger.info(f"   🔗 Token: {session_token}")
-                logger.info(f"   📋 Campos: {missing_fields}")
+        except Exception as e:
+            logger.error(f"Error creando sesiones de cuestionario en bloque: {e}")
+            return {}
+    
+    def generate_questionnaires_from_validations(self, validation_reports: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Generar en bloque los cuestionarios de los reportes de validación de una ejecución
+        
+        Args:
+            validation_reports: Reportes del IntegrityValidator
             
-            return session_token
+        Returns:
+            Diccionario CUPS → token de sesión
+        """
+        requests = [
+            {
+                'cups': report.get('cups'),
+                'missing_fields': report.get('missing_critical_fields') or [],
+                'document_id': report.get('document_id')
+            }
+            for report in validation_reports
+            if report.get('missing_critical_fields')
+        ]
+        if not requests:
+            logger.info("No hay campos críticos faltantes, no se generan cuestionarios")
+            return {}
+        
+        tokens = self.create_questionnaire_sessions_batch(requests)
+        if tokens:
+            logger.info(f"🎯 Cuestionarios generados automáticamente para {len(tokens)} CUPS")
+        return tokens
+    
+    def generate_questionnaire_from_validation(self, validation_report: Dict[str, Any]) -> Optional[str]:
+        """
+        Generar cuestionario basado en reporte de validación de integridad
+        
+        Args:
+            validation_report: Reporte del IntegrityValidator
             
-        except Exception as e:
-            logger.error(f"Error generando cuestionario desde validación: {e}")
-            return None
+        Returns:
+            Token de sesión del cuestionario generado
+        """
+        tokens = self.generate_questionnaires_from_validations([validation_report])
+        session_token = tokens.get((validation_report.get('cups') or '').strip().upper())
+        
+        if session_token:
+            logger.info(f"   🔗 Token: {session_token}")
+            logger.info(f"   📋 Campos: {validation_report['missing_critical_fields']}")
+        
+        return session_token
 
 def main():
     """Función principal para pruebas"""
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Archivo de respuestas crudas de los jobs de ingesta
+- Objetos direccionados por contenido: objetos/<sha[:2]>/<sha256>.gz (gzip del cuerpo tal cual)
+- Índice SQLite (indice.sqlite, modo WAL) por (fuente, clave, sha256) con primera y última
+  recepción: un payload repetido no duplica ni objeto ni fila
+- Reproceso en paralelo (procesos) sin red: permite reconstruir las tablas normalizadas
+  cuando cambia el parseo
+
+Convención de claves: cada job elige una clave ordenable por fecha (p. ej. '2025-01-01/1001')
+para poder pedir rangos con `entradas(fuente, desde, hasta)`.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Directorio por defecto del archivo (sobrescribible con RAW_ARCHIVE_DIR)
+DIRECTORIO_ARCHIVO_RAW = Path(os.getenv('RAW_ARCHIVE_DIR', Path(__file__).parent / '.raw_archive'))
+
+
+@dataclass(frozen=True)
+class EntradaArchivo:
+    """Una respuesta archivada: contenido `sha256` recibido para (fuente, clave)."""
+    fuente: str
+    clave: str
+    sha256: str
+    url: str
+    primera_recepcion: float
+    ultima_recepcion: float
+
+
+class ArchivoRaw:
+    """Archivo de respuestas crudas (objetos gzip + índice SQLite)."""
+
+    def __init__(self, directorio: Path = DIRECTORIO_ARCHIVO_RAW):
+        self.directorio = Path(directorio)
+        self._local = threading.local()
+        self._inicializado = False
+        self._lock = threading.Lock()
+
+    # --- Índice -------------------------------------------------------------
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Conexión SQLite por hilo (sqlite3 no comparte conexiones entre hilos)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.directorio / 'indice.sqlite', timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._lock:
+                if not self._inicializado:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS respuestas (
+                            fuente TEXT NOT NULL,
+                            clave TEXT NOT NULL,
+                            sha256 TEXT NOT NULL,
+                            url TEXT,
+                            primera_recepcion REAL NOT NULL,
+                            ultima_recepcion REAL NOT NULL,
+                            PRIMARY KEY (fuente, clave, sha256)
+                        )
+                    """)
+                    conn.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_respuestas_ultima
+                        ON respuestas (fuente, clave, ultima_recepcion)
+                    """)
+                    conn.commit()
+                    self._inicializado = True
+            self._local.conn = conn
+        return conn
+
+    # --- Objetos ------------------------------------------------------------
+
+    def _ruta_objeto(self, sha256: str) -> Path:
+        return self.directorio / 'objetos' / sha256[:2] / f"{sha256}.gz"
+
+    def guardar(self, fuente: str, clave: str, contenido: bytes, url: str = '') -> str:
+        """Archiva `contenido` para (fuente, clave). Devuelve su sha256."""
+        sha256 = hashlib.sha256(contenido).hexdigest()
+        ruta = self._ruta_objeto(sha256)
+        if not ruta.exists():
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            temporal.write_bytes(gzip.compress(contenido, compresslevel=6))
+            os.replace(temporal, ruta)
+
+        ahora = time.time()
+        conn = self._conexion()
+        with conn:
+            conn.execute("""
+                INSERT INTO respuestas (fuente, clave, sha256, url, primera_recepcion, ultima_recepcion)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (fuente, clave, sha256) DO UPDATE SET ultima_recepcion = excluded.ultima_recepcion
+            """, (fuente, clave, sha256, url, ahora, ahora))
+        return sha256
+
+    def leer(self, sha256: str) -> bytes:
+        return gzip.decompress(self._ruta_objeto(sha256).read_bytes())
+
+    def leer_json(self, sha256: str) -> Any:
+        return json.loads(self.leer(sha256))
+
+    # --- Consultas ----------------------------------------------------------
+
+    def ultima(self, fuente: str, clave: str) -> Optional[EntradaArchivo]:
+        """Última respuesta recibida para (fuente, clave)."""
+        fila = self._conexion().execute("""
+            SELECT fuente, clave, sha256, url, primera_recepcion, ultima_recepcion
+            FROM respuestas
+            WHERE fuente = ? AND clave = ?
+            ORDER BY ultima_recepcion DESC
+            LIMIT 1
+        """, (fuente, clave)).fetchone()
+        return EntradaArchivo(*fila) if fila else None
+
+    def entradas(self, fuente: str, desde: Optional[str] = None, hasta: Optional[str] = None,
+                 solo_ultimas: bool = True) -> List[EntradaArchivo]:
+        """
+        Entradas de `fuente` con desde <= clave <= hasta (comparación de cadenas),
+        en orden de clave y recepción. Con `solo_ultimas` solo la más reciente por clave.
+        """
+        condiciones, params = ['fuente = ?'], [fuente]
+        if desde is not None:
+            condiciones.append('clave >= ?')
+            params.append(desde)
+        if hasta is not None:
+            condiciones.append('clave <= ?')
+            params.append(hasta)
+        filas = self._conexion().execute(f"""
+            SELECT fuente, clave, sha256, url, primera_recepcion, ultima_recepcion
+            FROM respuestas
+            WHERE {' AND '.join(condiciones)}
+            ORDER BY clave, ultima_recepcion
+        """, params).fetchall()
+        entradas = [EntradaArchivo(*f) for f in filas]
+        if solo_ultimas:
+            # En cada clave la última fila es la más reciente
+            por_clave = {e.clave: e for e in entradas}
+            entradas = list(por_clave.values())
+        return entradas
+
+
+def _reprocesar_lote(directorio: str, lote: List[EntradaArchivo],
+                     parsear: Callable[[EntradaArchivo, Any], Any]) -> List[Tuple[EntradaArchivo, Any]]:
+    """Worker: lee, descomprime, decodifica JSON y aplica `parsear` a un lote de entradas."""
+    archivo = ArchivoRaw(Path(directorio))
+    resultados = []
+    for entrada in lote:
+        try:
+            resultados.append((entrada, parsear(entrada, archivo.leer_json(entrada.sha256))))
+        except Exception as e:
+            logger.warning(f"⚠️ {entrada.fuente}/{entrada.clave}: no se pudo reprocesar ({e})")
+            resultados.append((entrada, None))
+    return resultados
+
+
+def reprocesar(archivo: ArchivoRaw, entradas: List[EntradaArchivo],
+               parsear: Callable[[EntradaArchivo, Any], Any],
+               workers: Optional[int] = None, tam_lote: int = 16) -> Iterator[Tuple[EntradaArchivo, Any]]:
+    """
+    Aplica `parsear(entrada, json)` a cada entrada en un pool de procesos, sin red.
+    `parsear` debe ser una función de nivel de módulo (picklable). Devuelve pares
+    (entrada, resultado) en el orden de `entradas`; resultado None si falló el parseo.
+    """
+    lotes = [entradas[i:i + tam_lote] for i in range(0, len(entradas), tam_lote)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(lotes) <= 1:
+        for lote in lotes:
+            yield from _reprocesar_lote(str(archivo.directorio), lote, parsear)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(lotes))) as pool:
+        futuros = [pool.submit(_reprocesar_lote, str(archivo.directorio), lote, parsear) for lote in lotes]
+        for futuro in futuros:
+            yield from futuro.result()
+
+
+# Archivo compartido por proceso
+_archivo: Optional[ArchivoRaw] = None
+_archivo_lock = threading.Lock()
+
+
+def obtener_archivo(directorio: Optional[Path] = None) -> ArchivoRaw:
+    """Archivo de respuestas compartido en el proceso (directorio solo en la primera llamada)."""
+    global _archivo
+    with _archivo_lock:
+        if _archivo is None:
+            _archivo = ArchivoRaw(directorio or DIRECTORIO_ARCHIVO_RAW)
+        return _archivo
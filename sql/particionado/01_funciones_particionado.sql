@@ -0,0 +1,271 @@
+-- =====================================================
+-- Particionado mensual de series horarias - Funciones
+-- Bases: db_Ncore y db_sistema_electrico (ejecutar en ambas)
+-- Requiere PostgreSQL 12+
+-- =====================================================
+--
+-- Convención: particiones <tabla>_pYYYYMM con rango [primer día del mes, primer día del mes siguiente)
+-- y una partición <tabla>_default para filas fuera de rango. Las particiones retiradas en modo
+-- 'archivar' se desacoplan y se mueven al esquema `archivo` (consultables y exportables con pg_dump).
+
+CREATE SCHEMA IF NOT EXISTS archivo;
+
+-- Columna de partición (RANGE de una sola columna) de una tabla particionada; NULL si no lo es
+CREATE OR REPLACE FUNCTION columna_particion_mensual(p_tabla text)
+RETURNS text
+LANGUAGE sql STABLE AS $$
+  SELECT a.attname::text
+  FROM pg_partitioned_table pt
+  JOIN pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0]
+  WHERE pt.partrelid = to_regclass(p_tabla)
+    AND pt.partstrat = 'r'
+    AND pt.partnatts = 1
+$$;
+
+
+-- Crea las particiones mensuales que falten para cubrir [p_desde, p_hasta].
+-- Si hay partición DEFAULT con filas del mes, se mueven a la nueva partición antes de acoplarla.
+CREATE OR REPLACE FUNCTION crear_particiones_mensuales(p_tabla text, p_desde date, p_hasta date)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_columna text := columna_particion_mensual(p_tabla);
+  v_default text := p_tabla || '_default';
+  v_mes date := date_trunc('month', p_desde)::date;
+  v_fin date;
+  v_nombre text;
+  v_creadas integer := 0;
+BEGIN
+  IF v_columna IS NULL THEN
+    RAISE EXCEPTION 'La tabla % no está particionada por rango de una columna', p_tabla;
+  END IF;
+
+  WHILE v_mes <= p_hasta LOOP
+    v_fin := (v_mes + interval '1 month')::date;
+    v_nombre := p_tabla || '_p' || to_char(v_mes, 'YYYYMM');
+
+    IF to_regclass(v_nombre) IS NULL THEN
+      IF to_regclass(v_default) IS NOT NULL THEN
+        -- Crear suelta, trasladar filas del DEFAULT y acoplar (ATTACH valida el DEFAULT)
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_nombre, p_tabla);
+        EXECUTE format(
+          'WITH movidas AS (DELETE FROM %I WHERE %I >= $1 AND %I < $2 RETURNING *) INSERT INTO %I SELECT * FROM movidas',
+          v_default, v_columna, v_columna, v_nombre
+        ) USING v_mes, v_fin;
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       p_tabla, v_nombre, v_mes, v_fin);
+      ELSE
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                       v_nombre, p_tabla, v_mes, v_fin);
+      END IF;
+      v_creadas := v_creadas + 1;
+    END IF;
+
+    v_mes := v_fin;
+  END LOOP;
+
+  RETURN v_creadas;
+END;
+$$;
+
+
+-- Asegura particiones desde el mes actual hasta p_meses_futuros meses por delante (para jobs/cron)
+CREATE OR REPLACE FUNCTION asegurar_particiones_mensuales(p_tabla text, p_meses_futuros integer DEFAULT 2)
+RETURNS integer
+LANGUAGE sql AS $$
+  SELECT crear_particiones_mensuales(
+    p_tabla,
+    date_trunc('month', CURRENT_DATE)::date,
+    (date_trunc('month', CURRENT_DATE) + make_interval(months => p_meses_futuros))::date
+  )
+$$;
+
+
+-- Particiones mensuales de una tabla con su rango (solo las que siguen la convención _pYYYYMM)
+CREATE OR REPLACE FUNCTION particiones_mensuales(p_tabla text)
+RETURNS TABLE (particion text, desde date, hasta date, filas_estimadas bigint)
+LANGUAGE sql STABLE AS $$
+  SELECT c.relname::text,
+         to_date(right(c.relname, 6), 'YYYYMM'),
+         (to_date(right(c.relname, 6), 'YYYYMM') + interval '1 month')::date,
+         c.reltuples::bigint
+  FROM pg_inherits i
+  JOIN pg_class c ON c.oid = i.inhrelid
+  WHERE i.inhparent = to_regclass(p_tabla)
+    AND c.relname ~ ('^' || p_tabla || '_p[0-9]{6}$')
+  ORDER BY 2
+$$;
+
+
+-- Retira las particiones cuyo mes termina antes de p_antes_de.
+-- p_modo: 'archivar' (DETACH + mover al esquema archivo) o 'eliminar' (DETACH + DROP).
+CREATE OR REPLACE FUNCTION retirar_particiones_mensuales(p_tabla text, p_antes_de date, p_modo text DEFAULT 'archivar')
+RETURNS SETOF text
+LANGUAGE plpgsql AS $$
+DECLARE
+  r record;
+BEGIN
+  IF p_modo NOT IN ('archivar', 'eliminar') THEN
+    RAISE EXCEPTION 'Modo de retirada no válido: % (archivar|eliminar)', p_modo;
+  END IF;
+
+  FOR r IN SELECT * FROM particiones_mensuales(p_tabla) WHERE hasta <= p_antes_de LOOP
+    EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', p_tabla, r.particion);
+    IF p_modo = 'eliminar' THEN
+      EXECUTE format('DROP TABLE %I', r.particion);
+    ELSE
+      EXECUTE format('ALTER TABLE %I SET SCHEMA archivo', r.particion);
+    END IF;
+    RETURN NEXT r.particion;
+  END LOOP;
+END;
+$$;
+
+
+-- Migración: convierte una tabla normal en particionada mensual por p_columna.
+-- - La tabla original se conserva como <tabla>_legacy (borrar tras verificar)
+-- - PK con la columna de partición (se añade si faltaba), índices no únicos, FKs y
+--   secuencias propias se trasladan; las vistas dependientes se recrean sobre la nueva tabla
+-- - Índices y restricciones UNIQUE que incluyen la columna de partición se recrean en la
+--   tabla padre (los upserts ON CONFLICT siguen funcionando); el resto se omite con aviso
+-- - Particiones desde el mes de la fila más antigua hasta p_meses_futuros por delante + DEFAULT
+CREATE OR REPLACE FUNCTION convertir_a_particionada_mensual(p_tabla text, p_columna text, p_meses_futuros integer DEFAULT 2)
+RETURNS bigint
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_legacy text := p_tabla || '_legacy';
+  v_oid oid := to_regclass(p_tabla);
+  v_pk text[];
+  v_min date;
+  v_max date;
+  v_filas bigint;
+  v_vistas text[] := '{}';
+  v_defs text[] := '{}';
+  r record;
+  i integer;
+BEGIN
+  IF v_oid IS NULL THEN
+    RAISE EXCEPTION 'La tabla % no existe', p_tabla;
+  END IF;
+  IF columna_particion_mensual(p_tabla) IS NOT NULL THEN
+    RAISE NOTICE '% ya está particionada; nada que hacer', p_tabla;
+    RETURN 0;
+  END IF;
+
+  -- Vistas que dependen de la tabla (definición con los nombres actuales)
+  FOR r IN
+    SELECT DISTINCT v.oid, v.oid::regclass::text AS vista
+    FROM pg_depend d
+    JOIN pg_rewrite rw ON rw.oid = d.objid
+    JOIN pg_class v ON v.oid = rw.ev_class AND v.relkind = 'v'
+    WHERE d.refobjid = v_oid AND d.classid = 'pg_rewrite'::regclass AND v.oid <> v_oid
+  LOOP
+    v_vistas := v_vistas || r.vista;
+    v_defs := v_defs || pg_get_viewdef(r.oid);
+  END LOOP;
+
+  -- Columnas de la PK original
+  SELECT array_agg(a.attname::text ORDER BY k.ord)
+  INTO v_pk
+  FROM pg_index ix
+  CROSS JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ord)
+  JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum
+  WHERE ix.indrelid = v_oid AND ix.indisprimary;
+
+  EXECUTE format('ALTER TABLE %I RENAME TO %I', p_tabla, v_legacy);
+  EXECUTE format(
+    'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED INCLUDING STORAGE INCLUDING COMMENTS) PARTITION BY RANGE (%I)',
+    p_tabla, v_legacy, p_columna
+  );
+
+  IF v_pk IS NOT NULL THEN
+    IF NOT p_columna = ANY (v_pk) THEN
+      RAISE NOTICE '%: la PK (%) no incluye %, se añade a la clave', p_tabla, array_to_string(v_pk, ', '), p_columna;
+      v_pk := v_pk || p_columna;
+    END IF;
+    EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (%s)', p_tabla,
+                   (SELECT string_agg(quote_ident(c), ', ') FROM unnest(v_pk) AS c));
+  END IF;
+
+  -- Índices secundarios. Los únicos solo son válidos en tablas particionadas si incluyen
+  -- la columna de partición: esos se recrean (como restricción UNIQUE si lo eran) y el resto
+  -- se omite con aviso
+  FOR r IN
+    SELECT pg_get_indexdef(ix.indexrelid) AS def, ix.indisunique,
+           c.conname IS NOT NULL AS es_restriccion,
+           (SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY k.ord)
+            FROM unnest(ix.indkey[0:ix.indnkeyatts - 1]) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum) AS columnas,
+           EXISTS (SELECT 1
+                   FROM unnest(ix.indkey[0:ix.indnkeyatts - 1]) AS k(attnum)
+                   JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum
+                   WHERE a.attname = p_columna) AS incluye_particion,
+           ix.indexprs IS NULL AND ix.indpred IS NULL AS solo_columnas
+    FROM pg_index ix
+    LEFT JOIN pg_constraint c ON c.conindid = ix.indexrelid AND c.contype = 'u'
+    WHERE ix.indrelid = to_regclass(v_legacy) AND NOT ix.indisprimary
+  LOOP
+    IF NOT r.indisunique THEN
+      EXECUTE regexp_replace(r.def, '^CREATE INDEX \S+ ON (\S+\.)?\S+', format('CREATE INDEX ON %I', p_tabla));
+      CONTINUE;
+    END IF;
+
+    IF NOT (r.incluye_particion AND r.solo_columnas) THEN
+      RAISE NOTICE '%: índice único sin la columna de partición %, omitido (revisar): %', p_tabla, p_columna, r.def;
+      CONTINUE;
+    END IF;
+
+    BEGIN
+      IF r.es_restriccion THEN
+        EXECUTE format('ALTER TABLE %I ADD UNIQUE (%s)', p_tabla, r.columnas);
+      ELSE
+        EXECUTE regexp_replace(r.def, '^CREATE UNIQUE INDEX \S+ ON (\S+\.)?\S+',
+                               format('CREATE UNIQUE INDEX ON %I', p_tabla));
+      END IF;
+    EXCEPTION WHEN OTHERS THEN
+      RAISE NOTICE '%: índice único no recreado (%), revisar: %', p_tabla, SQLERRM, r.def;
+    END;
+  END LOOP;
+
+  -- Claves foráneas salientes
+  FOR r IN
+    SELECT conname, pg_get_constraintdef(oid) AS def
+    FROM pg_constraint
+    WHERE conrelid = to_regclass(v_legacy) AND contype = 'f'
+  LOOP
+    EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I %s', p_tabla, r.conname, r.def);
+  END LOOP;
+
+  -- Secuencias (serial/identity por DEFAULT) pasan a pertenecer a la nueva tabla
+  FOR r IN
+    SELECT s.oid::regclass::text AS secuencia, a.attname
+    FROM pg_depend d
+    JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+    JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+    WHERE d.refobjid = to_regclass(v_legacy) AND d.deptype = 'a'
+  LOOP
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.%I', r.secuencia, p_tabla, r.attname);
+  END LOOP;
+
+  EXECUTE format('SELECT min(%I)::date, max(%I)::date FROM %I', p_columna, p_columna, v_legacy) INTO v_min, v_max;
+  PERFORM crear_particiones_mensuales(
+    p_tabla,
+    COALESCE(v_min, CURRENT_DATE),
+    (date_trunc('month', greatest(COALESCE(v_max, CURRENT_DATE), CURRENT_DATE))
+      + make_interval(months => p_meses_futuros))::date
+  );
+  EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', p_tabla || '_default', p_tabla);
+
+  EXECUTE format('INSERT INTO %I SELECT * FROM %I', p_tabla, v_legacy);
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+
+  FOR i IN 1 .. coalesce(array_length(v_vistas, 1), 0) LOOP
+    EXECUTE format('CREATE OR REPLACE VIEW %s AS %s', v_vistas[i], v_defs[i]);
+  END LOOP;
+
+  EXECUTE format('ANALYZE %I', p_tabla);
+  RAISE NOTICE '%: % filas migradas a particiones mensuales (% vistas recreadas)',
+               p_tabla, v_filas, coalesce(array_length(v_vistas, 1), 0);
+  RETURN v_filas;
+END;
+$$;
@@ -0,0 +1,24 @@
+-- =====================================================
+-- Particionado mensual - db_Ncore
+-- Requiere: 01_funciones_particionado.sql ejecutado en db_Ncore
+-- Ejecutar en ventana de mantenimiento (bloquea las tablas durante la copia)
+-- =====================================================
+
+BEGIN;
+
+-- Valores horarios ESIOS (PK: indicator_id, fecha_hora, geo_id)
+SELECT convertir_a_particionada_mensual('core_esios_valor_horario', 'fecha_hora');
+
+-- Precios OMIE horarios (PK: timestamp_hora)
+SELECT convertir_a_particionada_mensual('core_precios_omie', 'timestamp_hora');
+
+COMMIT;
+
+-- Verificación
+SELECT 'core_esios_valor_horario' AS tabla, count(*) AS particiones FROM particiones_mensuales('core_esios_valor_horario')
+UNION ALL
+SELECT 'core_precios_omie', count(*) FROM particiones_mensuales('core_precios_omie');
+
+-- Tras verificar conteos y vistas (v_esios_*):
+--   DROP TABLE core_esios_valor_horario_legacy;
+--   DROP TABLE core_precios_omie_legacy;
@@ -0,0 +1,33 @@
+-- =====================================================
+-- Particionado mensual - db_sistema_electrico
+-- Requiere: 01_funciones_particionado.sql ejecutado en db_sistema_electrico
+-- Ejecutar en ventana de mantenimiento (bloquea las tablas durante la copia)
+-- =====================================================
+
+BEGIN;
+
+-- Precios OMIE horarios (fecha, hora, periodo, zona)
+SELECT convertir_a_particionada_mensual('omie_precios', 'fecha');
+
+-- PVPC horario (ON CONFLICT (fecha, hora) en los jobs de actualización)
+SELECT convertir_a_particionada_mensual('precios_horarios_pvpc', 'fecha');
+
+-- Perfiles de consumo ESIOS (fecha, periodo, tipo_perfil)
+SELECT convertir_a_particionada_mensual('perfiles_consumo', 'fecha');
+
+COMMIT;
+
+-- Verificación
+SELECT 'omie_precios' AS tabla, count(*) AS particiones FROM particiones_mensuales('omie_precios')
+UNION ALL
+SELECT 'precios_horarios_pvpc', count(*) FROM particiones_mensuales('precios_horarios_pvpc')
+UNION ALL
+SELECT 'perfiles_consumo', count(*) FROM particiones_mensuales('perfiles_consumo');
+
+-- Comprobar la poda de particiones (solo debe aparecer perfiles_consumo_p202501):
+--   EXPLAIN SELECT * FROM perfiles_consumo WHERE fecha >= '2025-01-01' AND fecha < '2025-02-01';
+
+-- Tras verificar conteos:
+--   DROP TABLE omie_precios_legacy;
+--   DROP TABLE precios_horarios_pvpc_legacy;
+--   DROP TABLE perfiles_consumo_legacy;
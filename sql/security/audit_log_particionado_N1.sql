@@ -0,0 +1,48 @@
+-- =====================================================
+-- data_audit_log append-only y particionada por mes
+-- Base de datos: db_N1
+-- Requiere: sql/particionado/01_funciones_particionado.sql instalado en db_N1
+--           y security_tables_N1.sql ejecutado (tabla data_audit_log); PostgreSQL 13+
+-- =====================================================
+--
+-- - El AuditLogger (core/data_security.py) escribe por lotes con COPY
+-- - Las filas no se modifican ni se borran: la retención se aplica retirando
+--   particiones mensuales completas (TTLManager.manage_partitions)
+
+-- Marca de tiempo obligatoria: decide la partición de cada registro
+UPDATE data_audit_log SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL;
+ALTER TABLE data_audit_log ALTER COLUMN timestamp SET NOT NULL;
+
+-- Convierte a particionada por timestamp (PK pasa a (id, timestamp)); no hace nada si ya lo está
+SELECT convertir_a_particionada_mensual('data_audit_log', 'timestamp', 2);
+
+-- Solo inserción: UPDATE/DELETE/TRUNCATE rechazados (DETACH de particiones sigue permitido)
+CREATE OR REPLACE FUNCTION data_audit_log_solo_insercion()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  RAISE EXCEPTION 'data_audit_log es append-only (% no permitido)', TG_OP;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_audit_log_sin_modificar ON data_audit_log;
+CREATE TRIGGER trg_audit_log_sin_modificar
+  BEFORE UPDATE OR DELETE ON data_audit_log
+  FOR EACH ROW EXECUTE FUNCTION data_audit_log_solo_insercion();
+
+DROP TRIGGER IF EXISTS trg_audit_log_sin_truncar ON data_audit_log;
+CREATE TRIGGER trg_audit_log_sin_truncar
+  BEFORE TRUNCATE ON data_audit_log
+  FOR EACH STATEMENT EXECUTE FUNCTION data_audit_log_solo_insercion();
+
+-- Retención de 2 años por particiones (sustituye al DELETE anterior)
+CREATE OR REPLACE FUNCTION cleanup_audit_logs()
+RETURNS INTEGER AS $$
+BEGIN
+    RETURN (SELECT COUNT(*) FROM retirar_particiones_mensuales(
+        'data_audit_log', (CURRENT_DATE - INTERVAL '2 years')::date, 'archivar'))::integer;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Verificación
+SELECT particion, desde, hasta, filas_estimadas FROM particiones_mensuales('data_audit_log');
@@ -0,0 +1,28 @@
+-- =====================================================
+-- Detección de cambios en client_versions
+-- Base de datos: db_N1 (después de security_tables_N1.sql)
+-- =====================================================
+--
+-- DataVersionManager (core/data_security.py) solo inserta una versión cuando cambia
+-- el hash canónico del contenido del cliente. field_hashes guarda un hash corto y
+-- salado por campo para calcular qué campos cambiaron sin almacenar valores en claro.
+
+ALTER TABLE client_versions ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+ALTER TABLE client_versions ADD COLUMN IF NOT EXISTS field_hashes JSONB;
+
+CREATE INDEX IF NOT EXISTS idx_client_versions_hash_fecha
+    ON client_versions (client_hash, created_at DESC);
+
+-- Última versión de cada cliente (una fila por cliente): consulta por clave primaria
+CREATE TABLE IF NOT EXISTS client_version_heads (
+    client_hash VARCHAR(64) PRIMARY KEY,
+    version_id VARCHAR(50) NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    field_hashes JSONB NOT NULL DEFAULT '{}'::jsonb,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE client_version_heads IS 'Versión vigente por cliente y hash de su contenido (DataVersionManager)';
+
+-- Verificación
+SELECT COUNT(*) AS clientes_con_cabecera FROM client_version_heads;
@@ -0,0 +1,23 @@
+-- =====================================================
+-- CACHÉ PERSISTENTE DE GEOCODIFICACIÓN
+-- =====================================================
+-- Propósito: Resultados de pipeline/shared/geocoding.py (GeocodingService)
+-- Base de datos: db_enriquecimiento
+--
+-- La clave es el hash SHA256 de la consulta normalizada (no se guarda la
+-- dirección en claro). Los resultados exactos no caducan; los aproximados
+-- (centroide de código postal o municipio) y los vacíos caducan para que la
+-- dirección se vuelva a intentar con el proveedor remoto.
+
+CREATE TABLE IF NOT EXISTS geocoding_cache (
+    clave_hash VARCHAR(64) PRIMARY KEY,
+    latitud DECIMAL(10,6),
+    longitud DECIMAL(10,6),
+    precision VARCHAR(20) NOT NULL, -- 'direccion', 'codigo_postal', 'municipio', 'sin_resultado'
+    fuente VARCHAR(50),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_geocoding_cache_expires
+ON geocoding_cache(expires_at) WHERE expires_at IS NOT NULL;
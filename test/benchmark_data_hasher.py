@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de pseudonimización en bloque
+Compara el bucle clásico (hash_cups / hash_direccion por elemento) con las APIs
+en bloque de DataHasher (*_many) en un proceso y repartidas en un pool de procesos.
+Comprueba además que los tres caminos dan exactamente los mismos hashes.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+# Añadir raíz del proyecto al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.data_security import DataHasher
+
+
+def generar_datos(n: int):
+    cups = [f" es{random.randint(0, 10 ** 18 - 1):018d}ab1c " for _ in range(n)]
+    fechas = [f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}" for _ in range(n)]
+    direcciones = [f"Calle Mayor {random.randint(1, 300)}, {random.randint(1, 9)}º A" for _ in range(n)]
+    codigos_postales = [f"{random.randint(1000, 52999):05d}" for _ in range(n)]
+    return cups, fechas, direcciones, codigos_postales
+
+
+def cronometrar(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de DataHasher por elemento vs en bloque')
+    parser.add_argument('--filas', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    hasher = DataHasher()
+    cups, fechas, direcciones, codigos_postales = generar_datos(args.filas)
+    print(f"🧪 {args.filas:,} filas, {args.workers} procesos\n")
+
+    casos = [
+        ('CUPS', hasher.hash_cups, hasher.hash_cups_many, cups, fechas),
+        ('Dirección', hasher.hash_direccion, hasher.hash_direccion_many, direcciones, codigos_postales),
+    ]
+    for nombre, unitario, en_bloque, primeros, segundos in casos:
+        base, t_bucle = cronometrar(lambda: [unitario(a, b) for a, b in zip(primeros, segundos)])
+        serie, t_serie = cronometrar(lambda: en_bloque(primeros, segundos, workers=1))
+        paralelo, t_paralelo = cronometrar(lambda: en_bloque(primeros, segundos, workers=args.workers))
+
+        iguales = base == serie == paralelo
+        print(f"{'✅' if iguales else '❌'} {nombre}")
+        print(f"   Bucle por elemento: {t_bucle:8.2f} s  ({args.filas / t_bucle:12,.0f} hashes/s)")
+        print(f"   *_many (1 proceso): {t_serie:8.2f} s  ({args.filas / t_serie:12,.0f} hashes/s)  x{t_bucle / t_serie:.2f}")
+        print(f"   *_many ({args.workers} procesos): {t_paralelo:6.2f} s  ({args.filas / t_paralelo:12,.0f} hashes/s)  "
+              f"x{t_bucle / t_paralelo:.2f}\n")
+
+
+if __name__ == '__main__':
+    main()
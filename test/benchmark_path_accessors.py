@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de accesores de rutas N0
+Compara el coste por factura del recorrido clásico (split('.') en cada llamada)
+frente al registro de accesores precompilados de pipeline/shared/path_accessors.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+# Añadir directorios del pipeline al path
+sys.path.append(str(Path(__file__).parent.parent / 'pipeline' / 'shared'))
+sys.path.append(str(Path(__file__).parent.parent / 'pipeline' / 'N0'))
+
+from path_accessors import get_path
+from field_mappings import N1_BASE_FIELD_MAPPING, map_n0_to_n1_base
+
+FACTURA_EJEMPLO = {
+    'client': {
+        'nombre_cliente': 'EMPRESA TEST SL',
+        'nif_titular': {'value': 'B12345678', 'confidence': 0.97, 'pattern': 'NIF', 'source': 'ocr'}
+    },
+    'supply_point': {
+        'datos_suministro': {
+            'direccion_suministro': {
+                'tipo_via': 'CALLE', 'nombre_via': 'MAYOR', 'numero': 12,
+                'poblacion': 'MADRID', 'provincia': 'MADRID', 'codigo_postal': '28001'
+            }
+        }
+    },
+    'contract_2x3': {
+        'cups_electricidad': 'ES0031406319157001JZ0F', 'comercializadora': 'COMERCIALIZADORA TEST',
+        'tarifa_acceso': '2.0TD', 'distribuidora': 'DISTRIBUIDORA TEST',
+        'potencia_contratada_p1': 4.6, 'potencia_contratada_p2': 4.6
+    },
+    'invoice_2x3': {
+        'numero_factura': 'F2024-0001', 'total_a_pagar': 85.32,
+        'fecha_inicio_periodo': '01/01/2024', 'fecha_fin_periodo': '31/01/2024',
+        'fecha_emision': '05/02/2024', 'dias_periodo_facturado': 31
+    },
+    'consumo_energia': {
+        'consumo_medido_kwh': 310.0, 'consumo_facturado_kwh': 310.0,
+        'precio_energia_eur_kwh': 0.12, 'coste_energia_eur': 37.2
+    },
+    'termino_potencia': {
+        'potencia_contratada_kw': 4.6, 'dias_facturacion': 31, 'coste_potencia_eur': 15.4
+    },
+    'metering_2x3': {
+        'numero_contador': 'CNT-001', 'lectura_actual_contador_p1': 1200, 'lectura_anterior_contador_p1': 1100
+    }
+}
+
+
+def get_nested_field_legacy(data, field_path):
+    """Implementación previa: trocea la ruta en cada llamada."""
+    try:
+        keys = field_path.split('.')
+        value = data
+        for key in keys:
+            if isinstance(value, dict) and key in value:
+                value = value[key]
+            else:
+                return None
+        return value
+    except (KeyError, TypeError):
+        return None
+
+
+def mapear_legacy(factura):
+    """Coste de las búsquedas de map_n0_to_n1_base con el accesor clásico."""
+    return [get_nested_field_legacy(factura, ruta) for _, _, ruta in N1_BASE_FIELD_MAPPING]
+
+
+def mapear_compilado(factura):
+    """Mismas búsquedas con el registro de accesores precompilados."""
+    return [get_path(factura, ruta) for _, _, ruta in N1_BASE_FIELD_MAPPING]
+
+
+def medir(funcion, repeticiones: int = 20000) -> float:
+    """Devuelve microsegundos por factura (mejor de 5 rondas)."""
+    tiempos = timeit.repeat(lambda: funcion(FACTURA_EJEMPLO), number=repeticiones, repeat=5)
+    return min(tiempos) / repeticiones * 1e6
+
+
+def main():
+    """Ejecuta el benchmark y verifica que ambos accesores coinciden."""
+    print("⏱️ BENCHMARK ACCESORES DE RUTAS N0")
+    print("=" * 50)
+
+    if mapear_legacy(FACTURA_EJEMPLO) != mapear_compilado(FACTURA_EJEMPLO):
+        print("❌ Los accesores devuelven resultados distintos")
+        return False
+    print(f"✅ Resultados idénticos en {len(N1_BASE_FIELD_MAPPING)} rutas")
+
+    legacy_us = medir(mapear_legacy)
+    compilado_us = medir(mapear_compilado)
+    completo_us = medir(map_n0_to_n1_base, repeticiones=5000)
+
+    print(f"  📋 Búsquedas con split por llamada: {legacy_us:.2f} µs/factura")
+    print(f"  🚀 Búsquedas con accesor compilado: {compilado_us:.2f} µs/factura")
+    print(f"  📊 Mejora: {legacy_us / compilado_us:.2f}x")
+    print(f"  🧩 map_n0_to_n1_base completo: {completo_us:.2f} µs/factura")
+
+    return compilado_us < legacy_us
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.INFO)
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de la API de cuestionarios
+Compara la variante Flask (questionnaire_api.py) con la ASGI (questionnaire_api_async.py)
+con el mismo tráfico: apertura del cuestionario, envío de respuestas y consulta de respuestas.
+Reporta p50 / p99 de latencia y peticiones por segundo de cada servidor.
+
+Requisitos: PostgreSQL local con db_N1 y ambos servidores arrancados, p. ej.
+    python pipeline/shared/questionnaire_api.py                 # :5001
+    cd pipeline/shared && uvicorn questionnaire_api_async:app --port 5002 --workers 1
+
+Uso:
+    python test/benchmark_questionnaire_api.py --concurrencia 50 --duracion 30
+"""
+
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+
+# CUPS válidos para las respuestas (patrón de questionnaire_manager.CRITICAL_FIELDS)
+def _cups(n: int) -> str:
+    return f"ES{n:018d}AB1C"
+
+
+class Cliente:
+    """Conexión HTTP persistente (keep-alive) por hilo"""
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        url = urlparse(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def peticion(self, metodo: str, ruta: str, cuerpo=None):
+        datos = json.dumps(cuerpo) if cuerpo is not None else None
+        cabeceras = {'Content-Type': 'application/json'} if datos else {}
+        for intento in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(metodo, ruta, body=datos, headers=cabeceras)
+                respuesta = self.conn.getresponse()
+                return respuesta.status, respuesta.read()
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if intento:
+                    raise
+
+
+def crear_sesiones(base_url: str, n: int) -> list:
+    """Sesiones de prueba creadas con /create (todos los campos críticos pendientes)"""
+    cliente = Cliente(base_url)
+    tokens = []
+    for i in range(n):
+        estado, cuerpo = cliente.peticion('POST', '/api/questionnaire/create', {
+            'cups': _cups(random.randint(1, 10 ** 12)),
+            'missing_fields': ['cups', 'potencia_contratada', 'tarifa_acceso']
+        })
+        if estado == 200:
+            tokens.append(json.loads(cuerpo)['session_token'])
+    return tokens
+
+
+def operacion_aleatoria(tokens: list):
+    """Mezcla de tráfico de una campaña: 50% GET cuestionario, 35% POST respuesta, 15% GET respuestas"""
+    token = random.choice(tokens)
+    tirada = random.random()
+    if tirada < 0.50:
+        return 'GET', f'/api/questionnaire/{token}', None
+    if tirada < 0.85:
+        campo, valor = random.choice([
+            ('cups', _cups(random.randint(1, 10 ** 12))),
+            ('potencia_contratada', f"{random.uniform(2, 15):.2f}"),
+            ('tarifa_acceso', random.choice(['2.0TD', '3.0TD'])),
+        ])
+        return 'POST', f'/api/questionnaire/{token}/response', {'field_name': campo, 'response_value': valor}
+    return 'GET', f'/api/questionnaire/{token}/responses', None
+
+
+def medir(nombre: str, base_url: str, concurrencia: int, duracion: float, n_sesiones: int) -> dict:
+    tokens = crear_sesiones(base_url, n_sesiones)
+    if not tokens:
+        print(f"❌ {nombre}: no se pudieron crear sesiones en {base_url}")
+        return {}
+
+    latencias = []
+    errores = [0]
+    lock = threading.Lock()
+    fin = time.perf_counter() + duracion
+
+    def trabajador():
+        cliente = Cliente(base_url)
+        propias, fallos = [], 0
+        while time.perf_counter() < fin:
+            metodo, ruta, cuerpo = operacion_aleatoria(tokens)
+            inicio = time.perf_counter()
+            try:
+                estado, _ = cliente.peticion(metodo, ruta, cuerpo)
+                if estado >= 500:
+                    fallos += 1
+            except Exception:
+                fallos += 1
+            propias.append(time.perf_counter() - inicio)
+        with lock:
+            latencias.extend(propias)
+            errores[0] += fallos
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - inicio
+
+    latencias.sort()
+    percentiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+    return {
+        'peticiones': len(latencias),
+        'errores': errores[0],
+        'rps': len(latencias) / transcurrido,
+        'p50_ms': percentiles[49] * 1000,
+        'p99_ms': percentiles[98] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga Flask vs ASGI de la API de cuestionarios')
+    parser.add_argument('--flask-url', default='http://localhost:5001')
+    parser.add_argument('--async-url', default='http://localhost:5002')
+    parser.add_argument('--concurrencia', type=int, default=50, help='Clientes simultáneos')
+    parser.add_argument('--duracion', type=float, default=30, help='Segundos por servidor')
+    parser.add_argument('--sesiones', type=int, default=200, help='Sesiones creadas antes de medir')
+    args = parser.parse_args()
+
+    print(f"🧪 Carga: {args.concurrencia} clientes durante {args.duracion:.0f}s por servidor\n")
+    resultados = {}
+    for nombre, url in (('Flask', args.flask_url), ('ASGI', args.async_url)):
+        print(f"⏱️  {nombre} ({url})...")
+        resultados[nombre] = medir(nombre, url, args.concurrencia, args.duracion, args.sesiones)
+
+    print(f"\n{'Servidor':<10}{'Peticiones':>12}{'Errores':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for nombre, r in resultados.items():
+        if r:
+            print(f"{nombre:<10}{r['peticiones']:>12}{r['errores']:>10}{r['rps']:>10.1f}"
+                  f"{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+
+    if resultados.get('Flask') and resultados.get('ASGI'):
+        print(f"\n📊 ASGI/Flask: x{resultados['ASGI']['rps'] / resultados['Flask']['rps']:.2f} req/s, "
+              f"p99 x{resultados['ASGI']['p99_ms'] / resultados['Flask']['p99_ms']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dobles de prueba compartidos por los tests sin base de datos
+BDFalsa sustituye a DatabaseManager: transaction(db) entrega un cursor de la clase
+indicada y, si el bloque termina sin excepción, confirma sus filas pendientes
+(igual que el commit/rollback de core.db_connections).
+"""
+
+from contextlib import contextmanager
+
+
+class CursorFalso:
+    """
+    Cursor base: registra cada consulta en bd.consultas y delega la respuesta en
+    responder(sql, params), que devuelve las filas de fetchone/fetchall.
+    Lo que se añade a `pendientes` solo llega a bd.filas al confirmar.
+    """
+
+    def __init__(self, bd):
+        self.bd = bd
+        self.rowcount = 0
+        self.pendientes = []
+        self._filas = []
+
+    def execute(self, sql, params=None):
+        self.bd.consultas.append(sql)
+        self._filas = self.responder(sql, params) or []
+
+    def responder(self, sql, params):
+        return []
+
+    def fetchone(self):
+        return self._filas[0] if self._filas else None
+
+    def fetchall(self):
+        return self._filas
+
+
+class BDFalsa:
+    """DatabaseManager falso con estado libre (atributos de `estado`) y registro de consultas."""
+
+    def __init__(self, clase_cursor=CursorFalso, filas=None, **estado):
+        self.clase_cursor = clase_cursor
+        self.filas = [] if filas is None else filas
+        self.consultas = []
+        for nombre, valor in estado.items():
+            setattr(self, nombre, valor)
+
+    @contextmanager
+    def transaction(self, db_name):
+        cursor = self.clase_cursor(self)
+        yield cursor
+        if isinstance(self.filas, list):
+            self.filas.extend(cursor.pendientes)
+
+
+class RespuestaHTTPFalsa:
+    """Respuesta mínima de requests (status_code, content, headers, url)."""
+
+    def __init__(self, status_code, content=b'', headers=None, url='https://ejemplo.test/datos'):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.url = url
+
+
+class SesionHTTPFalsa:
+    """
+    requests.Session falsa: devuelve las respuestas en orden (la última se repite),
+    cuenta las peticiones y guarda las cabeceras de cada una.
+    """
+
+    def __init__(self, respuestas):
+        self.respuestas = list(respuestas)
+        self.peticiones = 0
+        self.cabeceras_enviadas = []
+        self.headers = {}
+
+    def mount(self, *args):
+        pass
+
+    def request(self, metodo, url, **kwargs):
+        self.peticiones += 1
+        self.cabeceras_enviadas.append(dict(kwargs.get('headers') or {}))
+        return self.respuestas.pop(0) if len(self.respuestas) > 1 else self.respuestas[0]
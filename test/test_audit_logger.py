@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test del AuditLogger sin base de datos
+Verifica el reintento fila a fila cuando el COPY falla por un registro inválido,
+el volcado a disco solo ante errores de conexión y el reclamo de ficheros .sending.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import psycopg2
+
+# Añadir directorio padre (y el de los tests) al path para imports
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+from core.data_security import AuditLogger
+from dobles_prueba import BDFalsa, CursorFalso
+
+
+class CursorAuditoria(CursorFalso):
+    """Simula data_audit_log: table_name VARCHAR(50) y user_id NOT NULL."""
+
+    def __init__(self, bd):
+        super().__init__(bd)
+        self.savepoint = 0
+
+    @staticmethod
+    def _validar(user, table):
+        if user is None:
+            raise psycopg2.IntegrityError('null value in column "user_id"')
+        if table is not None and len(table) > 50:
+            raise psycopg2.DataError('value too long for type character varying(50)')
+
+    def copy_expert(self, sql, datos):
+        if self.bd.caida:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        for linea in datos.getvalue().splitlines():
+            campos = linea.split('\t')
+            self._validar(None if campos[1] == '\\N' else campos[1], campos[3])
+            self.pendientes.append(campos[3])
+
+    def responder(self, sql, params):
+        if sql.startswith('SAVEPOINT'):
+            self.savepoint = len(self.pendientes)
+        elif sql.startswith('ROLLBACK TO'):
+            del self.pendientes[self.savepoint:]
+        elif sql.startswith('INSERT'):
+            self._validar(params[1], params[3])
+            self.pendientes.append(params[3])
+        return []
+
+
+def _bd():
+    return BDFalsa(CursorAuditoria, caida=False)
+
+
+def _registro(tabla, user='tester'):
+    return {'timestamp': '2026-01-01T00:00:00', 'user': user, 'operation': 'SELECT',
+            'table': tabla, 'client_hash': None, 'details': {}}
+
+
+def _logger(bd, directorio):
+    return AuditLogger(bd, batch_size=100, spool_dir=Path(directorio))
+
+
+def test_registro_invalido_no_bloquea_el_lote():
+    """9 registros válidos y 1 con tabla demasiado larga: se escriben los 9 y se aparta 1."""
+    with tempfile.TemporaryDirectory() as directorio:
+        bd = _bd()
+        auditoria = _logger(bd, directorio)
+        lote = [_registro(f'tabla_{i}') for i in range(9)] + [_registro('x' * 60)]
+        assert auditoria._write(lote) == 9
+        assert bd.filas == [f'tabla_{i}' for i in range(9)]
+
+        assert not list(Path(directorio).glob('audit_*'))
+        rechazados = list(Path(directorio).glob('rechazados_*.jsonl'))
+        assert len(rechazados) == 1
+        lineas = rechazados[0].read_text(encoding='utf-8').splitlines()
+        assert len(lineas) == 1 and json.loads(lineas[0])['record']['table'] == 'x' * 60
+
+
+def test_user_nulo_se_aparta():
+    with tempfile.TemporaryDirectory() as directorio:
+        bd = _bd()
+        auditoria = _logger(bd, directorio)
+        assert auditoria._write([_registro('a'), _registro('b', user=None)]) == 1
+        assert bd.filas == ['a']
+
+
+def test_sin_conexion_vuelca_y_reenvia():
+    with tempfile.TemporaryDirectory() as directorio:
+        bd = _bd()
+        bd.caida = True
+        auditoria = _logger(bd, directorio)
+        assert auditoria._write([_registro('a'), _registro('b')]) is None
+        assert len(list(Path(directorio).glob('audit_*.jsonl'))) == 1
+
+        bd.caida = False
+        assert auditoria._replay_spool() == 2
+        assert bd.filas == ['a', 'b']
+        assert not list(Path(directorio).glob('audit_*'))
+
+
+def test_solo_se_reclaman_sending_huerfanos():
+    """Un .sending del propio proceso está en curso en otro hilo; el de un PID muerto se recupera."""
+    with tempfile.TemporaryDirectory() as directorio:
+        bd = _bd()
+        auditoria = _logger(bd, directorio)
+        linea = json.dumps(_registro('propio')) + '\n'
+        en_curso = Path(directorio) / f"audit_20260101.{os.getpid()}.aaaa0000.sending"
+        en_curso.write_text(linea, encoding='utf-8')
+        # PID por encima de pid_max: ningún proceso vivo lo tiene
+        huerfano = Path(directorio) / "audit_20260101.99999999.bbbb0000.sending"
+        huerfano.write_text(json.dumps(_registro('huerfano')) + '\n', encoding='utf-8')
+
+        assert auditoria._replay_spool() == 1
+        assert bd.filas == ['huerfano']
+        assert en_curso.exists()
+
+
+def main():
+    pruebas = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+
+
+if __name__ == "__main__":
+    main()
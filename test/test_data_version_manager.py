@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de la comprobación de esquema de DataVersionManager sin base de datos
+Verifica que sin la migración client_versions_cambios_N1.sql el error nombra el
+script y que, con ella aplicada, el esquema se consulta una sola vez.
+"""
+
+import sys
+from pathlib import Path
+
+# Añadir directorio raíz (y el de los tests) al path para imports
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+from dobles_prueba import BDFalsa, CursorFalso
+from core.data_security import DataSource, DataVersionManager
+
+
+class CursorEsquema(CursorFalso):
+    def responder(self, sql, params):
+        if 'to_regclass' in sql:
+            return [{'heads': self.bd.migrada, 'hashes': self.bd.migrada}]
+        return []
+
+
+def test_sin_migracion_error_claro():
+    manager = DataVersionManager(BDFalsa(CursorEsquema, migrada=False))
+    for _ in range(2):
+        try:
+            manager.create_version({'nif_cif': 'B12345678', 'nombre_fiscal': 'ACME'}, DataSource.FACTURA)
+        except RuntimeError as e:
+            assert DataVersionManager.SCHEMA_MIGRATION in str(e)
+        else:
+            raise AssertionError('se esperaba RuntimeError')
+
+
+def test_esquema_se_comprueba_una_vez():
+    bd = BDFalsa(CursorEsquema, migrada=True)
+    manager = DataVersionManager(bd)
+    manager._load_heads(['a'])
+    manager._load_heads(['b'])
+    assert sum('to_regclass' in sql for sql in bd.consultas) == 1
+    assert sum('client_version_heads' in sql and 'to_regclass' not in sql for sql in bd.consultas) == 2
+
+
+def main():
+    pruebas = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de paridad del índice de campos (pipeline/shared/field_index.py)
+Compara las búsquedas de N0FieldMapper y N0ReadinessChecker sobre el índice con las
+búsquedas recursivas originales, en casos fijos (coincidencias con valor None) y en
+facturas anidadas aleatorias.
+"""
+
+import random
+import sys
+from pathlib import Path
+
+# Añadir directorios del pipeline al path para imports
+sys.path.append(str(Path(__file__).parent.parent / 'pipeline' / 'shared'))
+sys.path.append(str(Path(__file__).parent.parent / 'pipeline' / 'N0' / 'data_versioning'))
+
+from n0_field_mapper import N0FieldMapper
+from n0_readiness_checker import N0ReadinessChecker
+
+
+# --- Búsquedas recursivas originales (referencia) ---
+
+def _referencia_recursivo(mapper, datos, campo_objetivo):
+    def buscar_en_nivel(obj):
+        if isinstance(obj, dict):
+            if campo_objetivo in obj:
+                valor = obj[campo_objetivo]
+                if isinstance(valor, dict) and 'value' in valor:
+                    return valor['value']
+                return valor
+            for key, value in obj.items():
+                if mapper._son_similares(key, campo_objetivo):
+                    if isinstance(value, dict) and 'value' in value:
+                        return value['value']
+                    elif not isinstance(value, dict):
+                        return value
+            for value in obj.values():
+                if isinstance(value, dict):
+                    resultado = buscar_en_nivel(value)
+                    if resultado is not None:
+                        return resultado
+        return None
+    return buscar_en_nivel(datos)
+
+
+def _referencia_patron(datos, patrones, campo_objetivo):
+    def buscar_en_nivel(obj):
+        if isinstance(obj, dict):
+            for key, value in obj.items():
+                key_lower = key.lower()
+                if any(patron in key_lower for patron in patrones):
+                    if any(parte in key_lower for parte in campo_objetivo.lower().split('_')):
+                        if isinstance(value, dict) and 'value' in value:
+                            return value['value']
+                        elif not isinstance(value, dict):
+                            return value
+                if isinstance(value, dict):
+                    resultado = buscar_en_nivel(value)
+                    if resultado is not None:
+                        return resultado
+        return None
+    return buscar_en_nivel(datos)
+
+
+def _referencia_similar_ruta(checker, datos, campo_objetivo, prefijo=""):
+    if isinstance(datos, dict):
+        for key, value in datos.items():
+            ruta_actual = f"{prefijo}.{key}" if prefijo else key
+            if checker._son_similares(key, campo_objetivo):
+                if isinstance(value, dict) and 'value' in value:
+                    return ruta_actual
+                elif not isinstance(value, dict):
+                    return ruta_actual
+            if isinstance(value, dict):
+                resultado = _referencia_similar_ruta(checker, value, campo_objetivo, ruta_actual)
+                if resultado:
+                    return resultado
+    return None
+
+
+def _referencia_exacta_ruta(datos, campo_objetivo, prefijo=""):
+    if isinstance(datos, dict):
+        for key, value in datos.items():
+            ruta_actual = f"{prefijo}.{key}" if prefijo else key
+            if key == campo_objetivo:
+                if isinstance(value, dict) and 'value' in value:
+                    return ruta_actual
+                elif not isinstance(value, dict):
+                    return ruta_actual
+            if isinstance(value, dict):
+                resultado = _referencia_exacta_ruta(value, campo_objetivo, ruta_actual)
+                if resultado:
+                    return resultado
+    return None
+
+
+# --- Generador de facturas aleatorias ---
+
+CLAVES = ['consumo_kwh', 'consumo_energia', 'potencia_p1', 'potencia_contratada', 'importe_total',
+          'fecha_factura', 'cups', 'invoice', 'datos', 'value', 'tarifa_acceso', 'energia_activa',
+          'reactiva_kvarh', 'termino_energia', 'consumo']
+VALORES = [None, None, 0, 120, 'x', 3.5, '', False]
+
+
+def _factura_aleatoria(rnd, profundidad=0):
+    nodo = {}
+    for clave in rnd.sample(CLAVES, rnd.randint(1, 5)):
+        tirada = rnd.random()
+        if profundidad < 3 and tirada < 0.35:
+            nodo[clave] = _factura_aleatoria(rnd, profundidad + 1)
+        elif tirada < 0.5:
+            nodo[clave] = {'value': rnd.choice(VALORES), 'confidence': rnd.random()}
+        else:
+            nodo[clave] = rnd.choice(VALORES)
+    return nodo
+
+
+# --- Pruebas ---
+
+def test_coincidencia_none_sigue_buscando():
+    """Caso de la revisión: una coincidencia exacta con None no oculta la siguiente."""
+    mapper = N0FieldMapper()
+    datos = {'consumo_energia': {'consumo_kwh': None}, 'invoice': {'consumo_kwh': 120}}
+    assert _referencia_recursivo(mapper, datos, 'consumo_kwh') == 120
+    assert mapper._buscar_recursivo(datos, 'consumo_kwh') == 120
+
+
+def test_coincidencia_none_descarta_su_nivel():
+    """Un None elegido en un nivel no deja pasar a sus hermanos ni a sus hijos."""
+    mapper = N0FieldMapper()
+    datos = {'a': {'consumo_kwh': {'value': None}, 'b': {'consumo_kwh': 5}}, 'c': {'consumo_kwh': 7}}
+    assert mapper._buscar_recursivo(datos, 'consumo_kwh') == 7
+
+    patrones = ['consumo', 'kwh']
+    datos = {'a': {'consumo_kwh': None, 'consumo_total': 5}, 'b': {'consumo_kwh': 9}}
+    assert _referencia_patron(datos, patrones, 'consumo_kwh') == 9
+    assert mapper._buscar_por_patron(datos, patrones, 'consumo_kwh') == 9
+
+
+def test_paridad_facturas_aleatorias():
+    rnd = random.Random(28)
+    mapper = N0FieldMapper()
+    checker = N0ReadinessChecker()
+    objetivos = ['consumo_kwh', 'potencia_contratada', 'importe_total', 'fecha_factura', 'energia']
+    for _ in range(2000):
+        datos = _factura_aleatoria(rnd)
+        for objetivo in objetivos:
+            assert mapper._buscar_recursivo(datos, objetivo) == _referencia_recursivo(mapper, datos, objetivo), \
+                (datos, objetivo)
+            patrones = objetivo.split('_')
+            assert mapper._buscar_por_patron(datos, patrones, objetivo) == \
+                _referencia_patron(datos, patrones, objetivo), (datos, objetivo)
+            assert checker._buscar_similar(datos, objetivo) == \
+                _referencia_similar_ruta(checker, datos, objetivo), (datos, objetivo)
+            assert checker._buscar_recursivo(datos, objetivo) == \
+                _referencia_exacta_ruta(datos, objetivo), (datos, objetivo)
+
+
+def main():
+    pruebas = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test del cliente HTTP compartido sin red
+Verifica la revalidación condicional (304 desde disco), el respeto de Retry-After,
+que get_json reintenta en una sola capa (los intentos no se multiplican) y que la
+caché en disco retira entradas por antigüedad y por tamaño.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir directorio shared (y el de los tests) al path para imports
+sys.path.append(str(Path(__file__).parent.parent / 'pipeline' / 'shared'))
+sys.path.append(str(Path(__file__).parent))
+
+from dobles_prueba import RespuestaHTTPFalsa as RespuestaFalsa, SesionHTTPFalsa
+from http_fetch import CacheRespuestas, HttpFetcher, PoliticaReintentos, RespuestaFetch
+
+
+def _fetcher(respuestas, directorio_cache=None):
+    fetcher = HttpFetcher(politica=PoliticaReintentos(intentos=3, base=0), directorio_cache=directorio_cache)
+    fetcher.sesion = SesionHTTPFalsa(respuestas)
+    return fetcher
+
+
+def test_304_se_sirve_desde_cache():
+    with tempfile.TemporaryDirectory() as directorio:
+        fetcher = _fetcher([RespuestaFalsa(200, b'{"v": 1}', {'ETag': '"1"'}), RespuestaFalsa(304)], directorio)
+        assert fetcher.get_json('https://ejemplo.test/datos') == {'v': 1}
+        respuesta = fetcher.get('https://ejemplo.test/datos')
+        assert respuesta.revalidada and respuesta.content == b'{"v": 1}'
+        assert fetcher.sesion.cabeceras_enviadas[1]['If-None-Match'] == '"1"'
+        assert fetcher.estadisticas.revalidadas == 1 and fetcher.estadisticas.descargas == 1
+
+
+def test_retry_after_aplaza_el_host():
+    """El 429 con Retry-After fija la espera y aplaza el turno de todo el host."""
+    fetcher = _fetcher([RespuestaFalsa(429, headers={'Retry-After': '1'}), RespuestaFalsa(200, b'{}')])
+    esperas = []
+    fetcher._esperar = esperas.append
+    inicio = time.monotonic()
+    assert fetcher.get_json('https://ejemplo.test/datos', cache=False) == {}
+    assert esperas == [1.0] and fetcher.sesion.peticiones == 2
+    # _esperar no duerme aquí: la pausa la impone el limitador del host
+    assert time.monotonic() - inicio >= 0.9
+
+
+def test_json_invalido_agota_una_sola_politica():
+    fetcher = _fetcher([RespuestaFalsa(200, b'no es json')])
+    try:
+        fetcher.get_json('https://ejemplo.test/datos', cache=False)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('se esperaba ValueError')
+    assert fetcher.sesion.peticiones == 3
+
+
+def test_errores_de_servidor_y_validacion_comparten_intentos():
+    def validar(datos):
+        if not datos.get('ok'):
+            raise ValueError('contenido incompleto')
+
+    respuestas = [RespuestaFalsa(503, b''), RespuestaFalsa(200, b'{"ok": false}'), RespuestaFalsa(200, b'{"ok": true}')]
+    fetcher = _fetcher(respuestas)
+    assert fetcher.get_json('https://ejemplo.test/datos', cache=False, validar=validar) == {'ok': True}
+    assert fetcher.sesion.peticiones == 3
+
+
+def test_intentos_no_se_multiplican():
+    """503 y contenido inválido alternos: como mucho `intentos` peticiones en total."""
+    fetcher = _fetcher([RespuestaFalsa(503, b''), RespuestaFalsa(200, b'roto')] * 5)
+    try:
+        fetcher.get_json('https://ejemplo.test/datos', cache=False)
+    except Exception:
+        pass
+    assert fetcher.sesion.peticiones == 3
+
+
+def test_copia_en_cache_invalida_se_descarta():
+    with tempfile.TemporaryDirectory() as directorio:
+        fetcher = _fetcher([RespuestaFalsa(200, b'{"v": 2}', {'ETag': '"2"'})], directorio)
+        clave = CacheRespuestas.clave('https://ejemplo.test/datos')
+        fetcher.cache.guardar(clave, RespuestaFetch(200, b'roto', {'ETag': '"1"'}, 'https://ejemplo.test/datos'))
+
+        assert fetcher.get_json('https://ejemplo.test/datos') == {'v': 2}
+        assert fetcher.sesion.peticiones == 1
+        assert fetcher.cache.leer(clave)[1] == b'{"v": 2}'
+
+
+def test_purga_por_antiguedad_y_tamano():
+    with tempfile.TemporaryDirectory() as directorio:
+        cache = CacheRespuestas(Path(directorio), max_dias=1, max_mb=2500 / 1024 / 1024)
+        ahora = time.time()
+        for i, edad in enumerate([3 * 86400, 300, 200, 100]):
+            clave = CacheRespuestas.clave(f'https://ejemplo.test/{i}')
+            cache.guardar(clave, RespuestaFetch(200, b'x' * 1000, {}, f'https://ejemplo.test/{i}'))
+            ruta_meta, _ = cache._rutas(clave)
+            os.utime(ruta_meta, (ahora - edad, ahora - edad))
+
+        # La de hace 3 días por antigüedad; la más antigua de las restantes por tamaño
+        assert cache.purgar() == 2
+        vivas = [i for i in range(4) if cache.leer(CacheRespuestas.clave(f'https://ejemplo.test/{i}'))]
+        assert vivas == [2, 3]
+
+
+def main():
+    pruebas = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+
+
+if __name__ == "__main__":
+    main()
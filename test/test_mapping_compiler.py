@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test del compilador de mapeos (pipeline/shared/mapping_compiler.py)
+Verifica la conversión de fechas con año de 2 dígitos, que las cadenas de fuentes
+se comportan como `a or b` y que las columnas crudas conservan 0/0.0.
+"""
+
+import sys
+from pathlib import Path
+
+# Añadir directorios del pipeline al path para imports
+sys.path.append(str(Path(__file__).parent.parent / 'pipeline' / 'shared'))
+sys.path.append(str(Path(__file__).parent.parent / 'pipeline' / 'N0'))
+
+from mapping_compiler import ProgramaMapeo, campo, parsear_fecha
+from mapeos_N0 import PROGRAMA_N0, limpiar_valor_n0
+
+
+def test_fechas():
+    assert parsear_fecha('01/02/2024') == '2024-02-01'
+    assert parsear_fecha('1/2/24') == '2024-02-01'
+    assert parsear_fecha('15/06/98') == '1998-06-15'
+    assert parsear_fecha('1/2/202') is None
+    assert parsear_fecha('2024-02-01') == '2024-02-01'
+
+
+def test_confianza_cero_se_conserva():
+    """Columna de fuente única leída antes con .get() directo: el 0.0 se guarda."""
+    fila = PROGRAMA_N0.mapear_tabla('client', {'client': {'nif_titular_confidence': 0.0}})
+    assert fila['nif_titular_confidence'] == 0.0
+
+
+def test_cero_pasa_a_la_siguiente_fuente():
+    """Como el mapeador original (`a or b`): un 0 no gana la cadena de fuentes."""
+    fila = PROGRAMA_N0.mapear_tabla('contract', {'contract': {
+        'potencia_contratada_p4': 0, 'potencia_p4': 3.3, 'potencia_contratada_p5': 0}})
+    assert fila['potencia_contratada_p4'] == 3.3
+    assert fila['potencia_contratada_p5'] is None
+
+
+def test_fuentes_multiples_con_vacios():
+    programa = ProgramaMapeo({'s': ('s',)}, {'t': [campo('x', 's:a', 's:b')]}, limpiar_valor_n0)
+    assert programa.mapear_tabla('t', {'s': {'a': 0, 'b': 5}})['x'] == 5
+    assert programa.mapear_tabla('t', {'s': {'a': '  ', 'b': 5}})['x'] == 5
+    assert programa.mapear_tabla('t', {'s': {'a': 0, 'b': 0}})['x'] is None
+
+
+def main():
+    pruebas = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+
+
+if __name__ == "__main__":
+    main()
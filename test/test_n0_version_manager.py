@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test del escaneo incremental de N0VersionManager
+Verifica que una factura que falla al registrarse se reintenta en la siguiente
+ejecución, que las rutas se reconocen con data_dir relativo, que los agregados
+acumulados coinciden con un recálculo completo y que un fallo del DDL inicial
+se propaga sin quedar tapado por la recarga del estado en memoria.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+# Añadir directorio del módulo al path para imports
+sys.path.append(str(Path(__file__).parent.parent / 'pipeline' / 'N0' / 'data_versioning'))
+
+from n0_version_manager import N0VersionManager
+
+CUPS = 'ES003140631915700123AB1C'
+
+
+def _escribir_factura(directorio: Path, nombre: str, numero: str, **extra):
+    datos = {'numero_factura': numero, 'cups': CUPS, 'fecha_factura': '2024-01-01', 'consumo_p1': 1}
+    datos.update(extra)
+    (directorio / nombre).write_text(json.dumps(datos), encoding='utf-8')
+
+
+def test_fallo_de_registro_se_reintenta():
+    with tempfile.TemporaryDirectory() as tmp:
+        datos = Path(tmp) / 'data'
+        datos.mkdir()
+        _escribir_factura(datos, 'f1.json', 'F1')
+
+        with N0VersionManager(str(Path(tmp) / 'v.db'), str(datos)) as manager:
+            registrar = manager.registrar_version_factura
+
+            def falla(*args):
+                raise RuntimeError('fallo simulado')
+
+            manager.registrar_version_factura = falla
+            primera = manager.procesar_directorio_facturas()
+            assert primera['errores'] == 1
+
+            manager.registrar_version_factura = registrar
+            segunda = manager.procesar_directorio_facturas()
+            assert segunda['facturas_nuevas'] == 1 and segunda['facturas_sin_cambios'] == 0
+
+            tercera = manager.procesar_directorio_facturas()
+            assert tercera['facturas_sin_cambios'] == 1 and tercera['facturas_nuevas'] == 0
+
+            filas = manager._conn.execute('SELECT COUNT(*) FROM facturas_versiones').fetchone()[0]
+            assert filas == 1
+
+
+def test_fallo_a_mitad_no_deja_filas():
+    """Si el registro falla después de insertar la versión, el savepoint la descarta."""
+    with tempfile.TemporaryDirectory() as tmp:
+        datos = Path(tmp) / 'data'
+        datos.mkdir()
+        _escribir_factura(datos, 'f1.json', 'F1')
+
+        with N0VersionManager(str(Path(tmp) / 'v.db'), str(datos)) as manager:
+            actualizar = manager._actualizar_agregados
+
+            def falla(*args):
+                raise RuntimeError('fallo simulado')
+
+            manager._actualizar_agregados = falla
+            assert manager.procesar_directorio_facturas()['errores'] == 1
+            assert manager._conn.execute('SELECT COUNT(*) FROM facturas_versiones').fetchone()[0] == 0
+            assert manager.obtener_version_actual('F1', CUPS, '2024-01-01') is None
+
+            manager._actualizar_agregados = actualizar
+            assert manager.procesar_directorio_facturas()['facturas_nuevas'] == 1
+
+
+def test_data_dir_relativo():
+    with tempfile.TemporaryDirectory() as tmp:
+        _escribir_factura(Path(tmp), 'f1.json', 'F1')
+        directorio_anterior = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with N0VersionManager(str(Path(tmp) / 'v.db'), '.') as manager:
+                assert manager.procesar_directorio_facturas()['facturas_nuevas'] == 1
+                segunda = manager.procesar_directorio_facturas()
+                assert segunda['facturas_sin_cambios'] == 1
+                assert len(manager._archivos_escaneados) == 1
+        finally:
+            os.chdir(directorio_anterior)
+
+
+def test_agregados_coinciden_con_recalculo():
+    with tempfile.TemporaryDirectory() as tmp:
+        datos = Path(tmp) / 'data'
+        datos.mkdir()
+        for i in range(4):
+            _escribir_factura(datos, f'f{i}.json', f'F{i}')
+
+        with N0VersionManager(str(Path(tmp) / 'v.db'), str(datos)) as manager:
+            manager.procesar_directorio_facturas()
+            _escribir_factura(datos, 'f1.json', 'F1', importe_total_factura=3, tarifa_acceso='2.0TD')
+            manager.procesar_directorio_facturas()
+
+            generales = manager.generar_reporte_mejoras()['estadisticas_generales']
+            unicas, versiones, promedio, maxima = manager._conn.execute('''
+                SELECT COUNT(DISTINCT numero_factura), COUNT(*), AVG(calidad_extraccion), MAX(version)
+                FROM facturas_versiones
+            ''').fetchone()
+            assert (generales['total_facturas_unicas'], generales['total_versiones'],
+                    generales['version_maxima']) == (unicas, versiones, maxima) == (4, 5, 2)
+            assert abs(generales['calidad_promedio'] - promedio) < 1e-9
+
+
+def test_fallo_de_ddl_inicial_se_propaga():
+    """Una tabla previa incompatible hace fallar el DDL: sale ese error, no el de la recarga."""
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = str(Path(tmp) / 'v.db')
+        conn = sqlite3.connect(ruta)
+        conn.execute('CREATE TABLE facturas_versiones (numero_factura TEXT, version INTEGER)')
+        conn.close()
+        try:
+            N0VersionManager(ruta, tmp)
+        except sqlite3.OperationalError as e:
+            assert 'fecha_procesamiento' in str(e)
+        else:
+            raise AssertionError('se esperaba OperationalError')
+
+
+def main():
+    pruebas = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de TTLManager sin base de datos
+Verifica que la comprobación de particionado no invoca funciones que pueden no estar
+instaladas y que el borrado por lotes avanza por keyset sobre claves dispersas.
+"""
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Añadir directorio padre (y el de los tests) al path para imports
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+from core.data_security import TTLManager
+from dobles_prueba import BDFalsa, CursorFalso
+
+
+class CursorTTL(CursorFalso):
+    """Responde a las consultas de TTLManager sobre una tabla en memoria (bd.filas: clave → created_at)."""
+
+    def responder(self, sql, params):
+        if 'FROM pg_partitioned_table' in sql:
+            return [{'columna': self.bd.columna_particion, 'funciones': self.bd.funciones}] \
+                if self.bd.columna_particion else []
+        if 'retirar_particiones_mensuales(%s' in sql:
+            return [{'particion': 'documents_p202001'}]
+        if 'FROM pg_index' in sql:
+            return [{'columna': 'id'}]
+        if sql.lstrip().startswith('SELECT id AS clave'):
+            corte, desde, _, limite = params
+            claves = sorted(k for k, creado in self.bd.filas.items()
+                            if creado < corte and (desde is None or k >= desde))
+            return [{'clave': k} for k in claves[:limite]]
+        if sql.lstrip().startswith('DELETE'):
+            claves, corte = params
+            borradas = [k for k in claves if self.bd.filas.get(k, corte) < corte]
+            for k in borradas:
+                del self.bd.filas[k]
+            self.rowcount = len(borradas)
+        return []
+
+
+def _bd(filas, columna_particion=None, funciones=False):
+    return BDFalsa(CursorTTL, filas=filas, columna_particion=columna_particion, funciones=funciones)
+
+
+def _filas_dispersas():
+    """50 filas expiradas con claves muy separadas y 10 vigentes."""
+    viejo = datetime.now() - timedelta(days=400)
+    nuevo = datetime.now()
+    filas = {i * 1_000_000: viejo for i in range(1, 51)}
+    filas.update({i * 1_000_000 + 1: nuevo for i in range(1, 11)})
+    return filas
+
+
+def _ttl(bd, batch_size=20):
+    ttl = TTLManager(bd)
+    ttl.BATCH_PAUSE = 0
+    return ttl._cleanup_table('N0', 'documents', 30, batch_size=batch_size)
+
+
+def test_sin_funciones_de_particionado_borra_por_lotes():
+    """Bases sin sql/particionado: la tabla se limpia igualmente y no se llama a la función."""
+    bd = _bd(_filas_dispersas())
+    resultado = _ttl(bd)
+    assert resultado.deleted == 50
+    assert resultado.partitions_dropped == 0
+    assert not any('columna_particion_mensual(%s' in sql for sql in bd.consultas)
+    assert len(bd.filas) == 10
+
+
+def test_particionada_sin_funciones_no_retira_particiones():
+    bd = _bd(_filas_dispersas(), columna_particion='created_at', funciones=False)
+    resultado = _ttl(bd)
+    assert resultado.partitions_dropped == 0
+    assert resultado.deleted == 50
+
+
+def test_particionada_por_created_at_retira_particiones():
+    bd = _bd(_filas_dispersas(), columna_particion='created_at', funciones=True)
+    resultado = _ttl(bd)
+    assert resultado.partitions_dropped == 1
+    assert resultado.deleted == 50
+
+
+def test_claves_dispersas_sin_lotes_vacios():
+    """Claves separadas un millón: 50 filas en lotes de 20 son 3 lotes, no millones de ventanas."""
+    bd = _bd(_filas_dispersas())
+    resultado = _ttl(bd, batch_size=20)
+    assert resultado.batches == 3
+
+
+def test_cancelacion_reanuda_desde_ultima_clave():
+    bd = _bd(_filas_dispersas())
+    ttl = TTLManager(bd)
+    ttl.BATCH_PAUSE = 0
+    ejecutar_lote = ttl._run_batch
+
+    def lote_y_cancelar(*args):
+        borradas = ejecutar_lote(*args)
+        ttl.cancel()
+        return borradas
+
+    ttl._run_batch = lote_y_cancelar
+    primera = ttl._cleanup_table('N0', 'documents', 30, batch_size=20)
+    assert primera.cancelled and primera.deleted == 20
+    assert primera.resume_from == 20 * 1_000_000 + 1
+
+    ttl._cancel.clear()
+    ttl._run_batch = ejecutar_lote
+    segunda = ttl._cleanup_table('N0', 'documents', 30, batch_size=20)
+    assert segunda.deleted == 30 and not segunda.cancelled
+
+
+def main():
+    pruebas = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+
+
+if __name__ == "__main__":
+    main()